@@ -0,0 +1,2 @@
+from .time_domain import NLMS, FxNLMS
+from .frequency_domain import PBFDAF, FxPBFDAF
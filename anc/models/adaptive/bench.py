@@ -0,0 +1,107 @@
+import argparse
+import json
+import time
+from typing import Dict
+
+import numpy as np
+from scipy.signal import lfilter
+
+from . import FxNLMS, FxPBFDAF, NLMS, PBFDAF
+
+
+def python_nlms(x: np.ndarray, d: np.ndarray, n_taps: int, mu: float = 0.5, eps: float = 1e-6) -> np.ndarray:
+    """Per-sample NLMS in plain Python/NumPy, the baseline the streaming filters are compared to."""
+    w = np.zeros(n_taps)
+    xext = np.concatenate([np.zeros(n_taps - 1), x])
+    e = np.empty(len(x))
+    for i in range(len(x)):
+        window = xext[i: i + n_taps][::-1]
+        e[i] = d[i] - w @ window
+        w += mu * e[i] * window / (window @ window + eps)
+    return e
+
+
+def _scenario(sr: int, seconds: float, seed: int):
+    """Coloured reference noise and its echo through a delayed, decaying primary path."""
+    rng = np.random.default_rng(seed)
+    n = int(sr * seconds)
+    x = lfilter([1.0], [1.0, -0.7], rng.standard_normal(n))
+    primary = np.concatenate([np.zeros(8), rng.standard_normal(64) * np.exp(-np.arange(64) / 10)])
+    secondary = np.array([0.0, 0.0, 0.8, 0.3, -0.1])
+    return x, lfilter(primary, [1.0], x), secondary
+
+
+def _run(filt, x: np.ndarray, d: np.ndarray, block_size: int, sr: int, budget_ms: float) -> Dict[str, float]:
+    n_blocks = len(x) // block_size
+    # one warm-up block compiles the Numba kernels
+    filt.process(x[:block_size], d[:block_size])
+    filt.reset()
+    latencies = np.empty(n_blocks)
+    e = np.empty(n_blocks * block_size)
+    for i in range(n_blocks):
+        sl = slice(i * block_size, (i + 1) * block_size)
+        start = time.perf_counter()
+        _, e[sl] = filt.process(x[sl], d[sl])
+        latencies[i] = time.perf_counter() - start
+    tail = slice(len(e) // 2, len(e))
+    return {
+        "samples_per_s": len(e) / latencies.sum(),
+        "realtime_factor": len(e) / sr / latencies.sum(),
+        "p50_block_ms": float(np.percentile(latencies, 50) * 1e3),
+        "p99_block_ms": float(np.percentile(latencies, 99) * 1e3),
+        "within_budget": bool(np.percentile(latencies, 99) * 1e3 < budget_ms),
+        "attenuation_db": float(10 * np.log10(np.mean(d[tail] ** 2) / np.mean(e[tail] ** 2))),
+    }
+
+
+def benchmark(sr: int = 48000, seconds: float = 10.0, block_ms: float = 10.0, n_taps: int = 512,
+              budget_ms: float = 10.0, python_seconds: float = 0.5, seed: int = 0) -> Dict[str, dict]:
+    """
+    Throughput, per-block latency and steady-state attenuation of the adaptive filters.
+
+    Blocks of ``block_ms`` are fed one at a time, as from an audio callback; ``within_budget`` tells
+    whether the p99 block latency stays below ``budget_ms`` (the design doc's 10 ms). The per-sample
+    Python loop is only timed on ``python_seconds`` of audio.
+    """
+    x, d, secondary = _scenario(sr, seconds, seed)
+    block_size = int(sr * block_ms / 1000)
+    # partitions of a power of two that divide the block keep the FFTs short
+    partition = block_size
+    while partition > 128 and partition % 2 == 0:
+        partition //= 2
+    n_partitions = max(n_taps // partition, 1)
+    filters = {
+        "nlms": NLMS(n_taps),
+        "pbfdaf": PBFDAF(partition, n_partitions),
+        "fxnlms": FxNLMS(n_taps, secondary, mu=0.1),
+        "fxpbfdaf": FxPBFDAF(partition, n_partitions, secondary, mu=0.1),
+    }
+    report = {name: _run(filt, x, d, block_size, sr, budget_ms) for name, filt in filters.items()}
+
+    n = int(sr * python_seconds)
+    start = time.perf_counter()
+    python_nlms(x[:n], d[:n], n_taps)
+    elapsed = time.perf_counter() - start
+    report["python_nlms"] = {
+        "samples_per_s": n / elapsed,
+        "realtime_factor": n / sr / elapsed,
+        "p50_block_ms": elapsed / n * block_size * 1e3,
+        "within_budget": bool(elapsed / n * block_size * 1e3 < budget_ms),
+    }
+    return report
+
+
+def main():
+    """CLI printing the adaptive filter benchmark as JSON."""
+    parser = argparse.ArgumentParser(description="Benchmark of the streaming adaptive filters.")
+    parser.add_argument("--sr", type=int, default=48000)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--block_ms", type=float, default=10.0)
+    parser.add_argument("--taps", type=int, default=512)
+    args = parser.parse_args()
+    print(json.dumps(benchmark(sr=args.sr, seconds=args.seconds, block_ms=args.block_ms, n_taps=args.taps),
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import numpy as np
+from typing import Optional, Tuple
+
+from scipy.signal import lfilter
+
+
+class PBFDAF:
+    """
+    Partitioned-block frequency-domain adaptive filter (overlap-save, per-bin normalized).
+
+    A filter of ``n_partitions * block_size`` taps is split into partitions of ``block_size`` taps,
+    each applied as a product with the spectrum of an earlier input block. Filtering and adaptation
+    of a block cost a handful of FFTs of size ``2 * block_size`` instead of ``block_size * n_taps``
+    multiply-adds, and every step is a vectorized NumPy operation over bins and partitions.
+
+    ``process(x, d)`` has the meaning of `NLMS.process`; blocks must be a multiple of ``block_size``
+    samples, so the algorithmic delay is one block.
+
+    Arguments:
+        block_size {int} -- Samples per partition and per update.
+        n_partitions {int} -- Number of partitions.
+
+    Keyword Arguments:
+        mu {float} -- Step size (default: {0.5}).
+        eps {float} -- Regularization of the per-bin power (default: {1e-6}).
+        leak {float} -- Leakage per block (default: {0.0}).
+        smoothing {float} -- Forgetting factor of the per-bin input power (default: {0.9}).
+        constrained {bool} -- Project the update back to ``block_size`` taps per partition, slower but
+                              converges to the true Wiener solution (default: {True}).
+    """
+
+    def __init__(self, block_size: int, n_partitions: int, mu: float = 0.5, eps: float = 1e-6, leak: float = 0.0,
+                 smoothing: float = 0.9, constrained: bool = True):
+        self.block_size = block_size
+        self.n_partitions = n_partitions
+        self.mu = mu
+        self.eps = eps
+        self.leak = leak
+        self.smoothing = smoothing
+        self.constrained = constrained
+        self.reset()
+
+    @property
+    def n_taps(self) -> int:
+        return self.block_size * self.n_partitions
+
+    @property
+    def latency_samples(self) -> int:
+        return self.block_size
+
+    def reset(self) -> None:
+        """Zero the taps, the spectra of past blocks and the power estimate."""
+        n_bins = self.block_size + 1
+        self.W = np.zeros((self.n_partitions, n_bins), dtype=np.complex128)
+        # spectra of the last n_partitions input frames, newest first
+        self._X = np.zeros((self.n_partitions, n_bins), dtype=np.complex128)
+        self._x_prev = np.zeros(self.block_size)
+        self._power = np.zeros(n_bins)
+
+    @property
+    def weights(self) -> np.ndarray:
+        """Current impulse response of the filter."""
+        return np.fft.irfft(self.W, axis=-1)[:, :self.block_size].ravel()
+
+    def _push_frame(self, X: np.ndarray, x_prev: np.ndarray, block: np.ndarray) -> np.ndarray:
+        frame = np.fft.rfft(np.concatenate([x_prev, block]))
+        X[1:] = X[:-1]
+        X[0] = frame
+        x_prev[:] = block
+        return frame
+
+    def _filter(self) -> np.ndarray:
+        return np.fft.irfft(np.sum(self.W * self._X, axis=0))[self.block_size:]
+
+    def _adapt(self, X: np.ndarray, frame: np.ndarray, e: np.ndarray) -> None:
+        B = self.block_size
+        self._power = self.smoothing * self._power + (1 - self.smoothing) * np.abs(frame) ** 2
+        E = np.fft.rfft(np.concatenate([np.zeros(B), e]))
+        G = self.mu * np.conj(X) * (E / (self._power + self.eps))
+        if self.constrained:
+            # keep the causal half, the other half would wrap around in the circular convolution
+            g = np.fft.irfft(G, axis=-1)
+            g[:, B:] = 0.0
+            G = np.fft.rfft(g, axis=-1)
+        self.W *= 1.0 - self.leak
+        self.W += G
+
+    def _check(self, x: np.ndarray, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        x = np.asarray(x, dtype=np.float64)
+        d = np.asarray(d, dtype=np.float64)
+        if x.shape != d.shape or x.ndim != 1:
+            raise ValueError(f"x and d must be 1D blocks of the same length, got {x.shape} and {d.shape}")
+        if len(x) % self.block_size:
+            raise ValueError(f"Block length must be a multiple of {self.block_size}, got {len(x)}")
+        return x, d
+
+    def process(self, x: np.ndarray, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Filter ``k * block_size`` samples, returns the output ``y`` and the error ``d - y``."""
+        x, d = self._check(x, d)
+        B = self.block_size
+        y = np.empty_like(x)
+        for i in range(0, len(x), B):
+            frame = self._push_frame(self._X, self._x_prev, x[i:i + B])
+            y[i:i + B] = self._filter()
+            self._adapt(self._X, frame, d[i:i + B] - y[i:i + B])
+        return y, d - y
+
+
+class FxPBFDAF(PBFDAF):
+    """
+    Filtered-x variant of `PBFDAF` for feedforward active noise cancellation.
+
+    The controller runs on the reference spectra, the update on the spectra of the reference
+    filtered by the secondary path estimate. As in `FxNLMS`, ``process(x, d)`` simulates the acoustic
+    loop through ``secondary_path`` (the estimate by default) and returns the drive ``y`` and the
+    residual ``e = d - s * y``.
+
+    Arguments:
+        block_size, n_partitions -- See `PBFDAF`.
+        secondary_path_estimate {np.ndarray} -- FIR estimate of the secondary path.
+
+    Keyword Arguments:
+        secondary_path {[np.ndarray]} -- True secondary path of the simulation (default: {None}).
+        mu, eps, leak, smoothing, constrained -- See `PBFDAF`.
+    """
+
+    def __init__(self, block_size: int, n_partitions: int, secondary_path_estimate: np.ndarray, mu: float = 0.1,
+                 eps: float = 1e-6, leak: float = 0.0, smoothing: float = 0.9, constrained: bool = True,
+                 secondary_path: Optional[np.ndarray] = None):
+        self.s_hat = np.asarray(secondary_path_estimate, dtype=np.float64)
+        self.s = self.s_hat if secondary_path is None else np.asarray(secondary_path, dtype=np.float64)
+        super().__init__(block_size, n_partitions, mu=mu, eps=eps, leak=leak, smoothing=smoothing,
+                         constrained=constrained)
+
+    def reset(self) -> None:
+        super().reset()
+        self._Xf = np.zeros_like(self._X)
+        self._xf_prev = np.zeros(self.block_size)
+        self._s_hat_state = np.zeros(len(self.s_hat) - 1)
+        self._s_state = np.zeros(len(self.s) - 1)
+
+    def process(self, x: np.ndarray, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Drive ``k * block_size`` samples, returns the anti-noise drive ``y`` and the residual ``e``."""
+        x, d = self._check(x, d)
+        B = self.block_size
+        xf, self._s_hat_state = lfilter(self.s_hat, [1.0], x, zi=self._s_hat_state)
+        y = np.empty_like(x)
+        e = np.empty_like(x)
+        for i in range(0, len(x), B):
+            self._push_frame(self._X, self._x_prev, x[i:i + B])
+            frame_f = self._push_frame(self._Xf, self._xf_prev, xf[i:i + B])
+            y[i:i + B] = self._filter()
+            anti, self._s_state = lfilter(self.s, [1.0], y[i:i + B], zi=self._s_state)
+            e[i:i + B] = d[i:i + B] - anti
+            self._adapt(self._Xf, frame_f, e[i:i + B])
+        return y, e
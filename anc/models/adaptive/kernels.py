@@ -0,0 +1,84 @@
+import numpy as np
+from numba import jit
+
+
+@jit(nopython = True)
+def nlms_block(w, xext, d, mu, eps, leak):
+    """
+    Sample-by-sample NLMS over one block.
+
+    :param w: Filter taps, updated in place.
+    :param xext: ``len(w) - 1`` samples of reference history followed by the block.
+    :param d: Desired (primary) signal of the block.
+    :param mu: Step size.
+    :param eps: Regularization of the input power.
+    :param leak: Leakage factor, taps decay by ``1 - leak`` per sample.
+    :return: Filter output and error ``d - y`` of the block.
+    """
+    n_taps = w.shape[0]
+    n = d.shape[0]
+    y = np.empty(n)
+    e = np.empty(n)
+    energy = 0.0
+    for k in range(n_taps - 1):
+        energy += xext[k] * xext[k]
+    for i in range(n):
+        newest = i + n_taps - 1
+        # sliding power of the tap window
+        energy += xext[newest] * xext[newest]
+        if i > 0:
+            energy -= xext[i - 1] * xext[i - 1]
+        if energy < 0.0:
+            energy = 0.0
+        acc = 0.0
+        for k in range(n_taps):
+            acc += w[k] * xext[newest - k]
+        y[i] = acc
+        e[i] = d[i] - acc
+        g = mu * e[i] / (energy + eps)
+        for k in range(n_taps):
+            w[k] = (1.0 - leak) * w[k] + g * xext[newest - k]
+    return y, e
+
+
+@jit(nopython = True)
+def fxnlms_block(w, xext, xfext, yext, s, d, mu, eps, leak):
+    """
+    Sample-by-sample filtered-x NLMS over one block, with the secondary path simulated in the loop.
+
+    :param w: Controller taps, updated in place.
+    :param xext: ``len(w) - 1`` samples of reference history followed by the block.
+    :param xfext: Same layout for the reference filtered by the secondary path estimate.
+    :param yext: ``len(s) - 1`` samples of controller output history followed by ``len(d)`` slots that
+                 are filled with the block's output.
+    :param s: Impulse response of the secondary path the anti-noise travels to the error microphone.
+    :param d: Primary noise at the error microphone.
+    :return: Residual at the error microphone ``d - s * y``.
+    """
+    n_taps = w.shape[0]
+    n_sec = s.shape[0]
+    n = d.shape[0]
+    e = np.empty(n)
+    energy = 0.0
+    for k in range(n_taps - 1):
+        energy += xfext[k] * xfext[k]
+    for i in range(n):
+        newest = i + n_taps - 1
+        energy += xfext[newest] * xfext[newest]
+        if i > 0:
+            energy -= xfext[i - 1] * xfext[i - 1]
+        if energy < 0.0:
+            energy = 0.0
+        acc = 0.0
+        for k in range(n_taps):
+            acc += w[k] * xext[newest - k]
+        ynew = i + n_sec - 1
+        yext[ynew] = acc
+        anti = 0.0
+        for k in range(n_sec):
+            anti += s[k] * yext[ynew - k]
+        e[i] = d[i] - anti
+        g = mu * e[i] / (energy + eps)
+        for k in range(n_taps):
+            w[k] = (1.0 - leak) * w[k] + g * xfext[newest - k]
+    return e
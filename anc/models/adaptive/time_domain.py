@@ -0,0 +1,107 @@
+import numpy as np
+from typing import Optional, Tuple
+
+from scipy.signal import lfilter
+
+from .kernels import fxnlms_block, nlms_block
+
+
+class NLMS:
+    """
+    Normalized LMS adaptive FIR filter, streamed block by block.
+
+    ``process(x, d)`` filters the reference ``x`` so that the output ``y`` follows the primary ``d``
+    and returns the output together with the error ``e = d - y``. In adaptive noise cancellation
+    ``x`` is the noise reference, ``d`` the noisy signal and ``e`` the cleaned signal; ``-y`` is
+    the anti-noise. The per-sample recursion runs in a Numba kernel.
+
+    Arguments:
+        n_taps {int} -- Filter length.
+
+    Keyword Arguments:
+        mu {float} -- Step size, stable for 0 < mu < 2 (default: {0.5}).
+        eps {float} -- Regularization of the input power (default: {1e-6}).
+        leak {float} -- Leakage per sample, keeps the taps bounded for coloured inputs (default: {0.0}).
+    """
+
+    latency_samples = 0
+
+    def __init__(self, n_taps: int, mu: float = 0.5, eps: float = 1e-6, leak: float = 0.0):
+        self.n_taps = n_taps
+        self.mu = mu
+        self.eps = eps
+        self.leak = leak
+        self.reset()
+
+    def reset(self) -> None:
+        """Zero the taps and the signal history."""
+        self.w = np.zeros(self.n_taps)
+        self._x_history = np.zeros(self.n_taps - 1)
+
+    @property
+    def weights(self) -> np.ndarray:
+        """Current impulse response of the filter."""
+        return self.w.copy()
+
+    def _extend(self, history: np.ndarray, block: np.ndarray) -> np.ndarray:
+        ext = np.concatenate([history, block])
+        history[:] = ext[len(ext) - len(history):]
+        return ext
+
+    def process(self, x: np.ndarray, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Filter one block of any length, returns the output ``y`` and the error ``d - y``."""
+        x = np.asarray(x, dtype=np.float64)
+        d = np.asarray(d, dtype=np.float64)
+        if x.shape != d.shape or x.ndim != 1:
+            raise ValueError(f"x and d must be 1D blocks of the same length, got {x.shape} and {d.shape}")
+        xext = self._extend(self._x_history, x)
+        return nlms_block(self.w, xext, d, self.mu, self.eps, self.leak)
+
+
+class FxNLMS(NLMS):
+    """
+    Filtered-x NLMS controller for feedforward active noise cancellation.
+
+    The anti-noise ``y`` reaches the error microphone through the secondary path (speaker, air,
+    microphone). The update uses the reference filtered by an estimate of that path, which keeps the
+    adaptation stable as long as the estimate's phase error stays below 90 degrees.
+
+    ``process(x, d)`` simulates the loop: ``d`` is the primary noise at the error microphone and the
+    residual ``e = d - s * y`` is returned along with the drive signal ``y``, where ``s`` is
+    ``secondary_path`` (the estimate itself by default).
+
+    Arguments:
+        n_taps {int} -- Controller length.
+        secondary_path_estimate {np.ndarray} -- FIR estimate of the secondary path.
+
+    Keyword Arguments:
+        secondary_path {[np.ndarray]} -- True secondary path of the simulation (default: {None}).
+        mu, eps, leak -- See `NLMS`.
+    """
+
+    def __init__(self, n_taps: int, secondary_path_estimate: np.ndarray, mu: float = 0.1, eps: float = 1e-6,
+                 leak: float = 0.0, secondary_path: Optional[np.ndarray] = None):
+        self.s_hat = np.asarray(secondary_path_estimate, dtype=np.float64)
+        self.s = self.s_hat if secondary_path is None else np.asarray(secondary_path, dtype=np.float64)
+        super().__init__(n_taps, mu=mu, eps=eps, leak=leak)
+
+    def reset(self) -> None:
+        super().reset()
+        self._xf_history = np.zeros(self.n_taps - 1)
+        self._y_history = np.zeros(len(self.s) - 1)
+        self._s_hat_state = np.zeros(len(self.s_hat) - 1)
+
+    def process(self, x: np.ndarray, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Drive one block of any length, returns the anti-noise drive ``y`` and the residual ``e``."""
+        x = np.asarray(x, dtype=np.float64)
+        d = np.asarray(d, dtype=np.float64)
+        if x.shape != d.shape or x.ndim != 1:
+            raise ValueError(f"x and d must be 1D blocks of the same length, got {x.shape} and {d.shape}")
+        # the filtered reference does not depend on the taps, so it is computed for the whole block
+        xf, self._s_hat_state = lfilter(self.s_hat, [1.0], x, zi=self._s_hat_state)
+        xext = self._extend(self._x_history, x)
+        xfext = self._extend(self._xf_history, xf)
+        yext = np.concatenate([self._y_history, np.empty(len(x))])
+        e = fxnlms_block(self.w, xext, xfext, yext, self.s, d, self.mu, self.eps, self.leak)
+        self._y_history[:] = yext[len(yext) - len(self._y_history):]
+        return yext[len(self.s) - 1:].copy(), e
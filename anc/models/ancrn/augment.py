@@ -0,0 +1,305 @@
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader, Sampler, get_worker_info
+from typing import Callable, Optional, Sequence, Union
+
+from anc.models.ancrn.generate_noise import NoiseGenerator
+
+
+def _power(x: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Mean power of every row of ``x`` over its first ``lengths`` samples."""
+    return np.einsum("ij,ij->i", x, x) / np.maximum(lengths, 1)
+
+
+def mix_at_snr(
+    clean: np.ndarray,
+    noise: np.ndarray,
+    snr_db: np.ndarray,
+    lengths: Optional[np.ndarray] = None,
+    eps: float = 1e-10,
+) -> np.ndarray:
+    """
+    Mix a batch of clean signals with noise at the requested signal-to-noise ratios.
+
+    Arguments:
+        clean (np.ndarray): ``(batch, samples)`` clean signals, zero padded past ``lengths``.
+        noise (np.ndarray): ``(batch, samples)`` noise signals.
+        snr_db (np.ndarray): ``(batch,)`` target SNR in dB per row.
+        lengths (Optional[np.ndarray]): ``(batch,)`` valid samples per row. Power is measured over the
+                                        valid part only and the noise is zeroed past it. Default: full rows.
+        eps (float): Floor for the noise power.
+
+    Returns:
+        np.ndarray: ``(batch, samples)`` noisy mixture.
+    """
+    n_rows, n_samples = clean.shape
+    if lengths is None:
+        lengths = np.full(n_rows, n_samples)
+    else:
+        valid = np.arange(n_samples)[np.newaxis, :] < lengths[:, np.newaxis]
+        noise = noise * valid
+    clean_power = _power(clean, lengths)
+    noise_power = np.maximum(_power(noise, lengths), eps)
+    scale = np.sqrt(clean_power / (noise_power * 10 ** (np.asarray(snr_db) / 10)))
+    return clean + noise * scale[:, np.newaxis].astype(noise.dtype)
+
+
+class NoiseMixer:
+    """
+    Vectorized noise-mixing augmentation.
+
+    Every call draws, per row of the batch, a noise excerpt, an SNR in ``snr_range_db``, a gain in
+    ``gain_range_db`` applied to both mixture and target, and a circular time shift of the noise of
+    up to ``max_shift`` samples. All of it is done with whole-batch array operations.
+
+    Arguments:
+        noise (Union[np.ndarray, Callable, str]): Noise source. Either a long 1-D noise recording that
+                                                  random excerpts are cropped from, a callable
+                                                  ``(n_signals, n_samples) -> np.ndarray`` or the name
+                                                  of a ``NoiseGenerator`` method such as ``"pink"``.
+        sr (int): Sample rate, only needed to build a ``NoiseGenerator``.
+        snr_range_db (tuple): Range of the uniformly drawn SNR in dB. Default: ``(-5, 20)``.
+        gain_range_db (tuple): Range of the uniformly drawn output gain in dB. Default: ``(-6, 6)``.
+        max_shift (int): Maximum noise time shift in samples. Default: ``0``.
+        seed (Optional[int]): Seed of the random generator. Default: ``None``.
+    """
+
+    def __init__(
+        self,
+        noise: Union[np.ndarray, Callable, str] = "pink",
+        sr: int = 16000,
+        snr_range_db: tuple = (-5.0, 20.0),
+        gain_range_db: tuple = (-6.0, 6.0),
+        max_shift: int = 0,
+        seed: Optional[int] = None,
+    ):
+        self.sr = sr
+        self.snr_range_db = snr_range_db
+        self.gain_range_db = gain_range_db
+        self.max_shift = max_shift
+        self._noise = noise
+        self.reseed(seed)
+
+    def reseed(self, seed: Optional[int]) -> None:
+        """Reset the random generator, e.g. with a distinct seed in every DataLoader worker."""
+        self.rng = np.random.default_rng(seed)
+        if isinstance(self._noise, str):
+            generator = NoiseGenerator(self.sr, seed=self.rng)
+            self._noise_fn = getattr(generator, self._noise)
+        elif callable(self._noise):
+            self._noise_fn = self._noise
+        else:
+            self._noise_fn = self._crop_noise
+
+    def _crop_noise(self, n_signals: int, n_samples: int) -> np.ndarray:
+        """Random excerpts of the noise recording, gathered in a single fancy-indexing pass."""
+        track = np.asarray(self._noise)
+        if len(track) < n_samples:
+            track = np.tile(track, int(np.ceil(n_samples / len(track))) + 1)
+        offsets = self.rng.integers(0, len(track) - n_samples + 1, size=n_signals)
+        return track[offsets[:, np.newaxis] + np.arange(n_samples)[np.newaxis, :]]
+
+    def _shift(self, noise: np.ndarray) -> np.ndarray:
+        n_signals, n_samples = noise.shape
+        shifts = self.rng.integers(-self.max_shift, self.max_shift + 1, size=n_signals)
+        index = (np.arange(n_samples)[np.newaxis, :] - shifts[:, np.newaxis]) % n_samples
+        return np.take_along_axis(noise, index, axis=1)
+
+    def __call__(self, clean: np.ndarray, lengths: Optional[np.ndarray] = None):
+        """
+        Augment a batch.
+
+        Arguments:
+            clean (np.ndarray): ``(batch, samples)`` clean (or cabin) segments, zero padded.
+            lengths (Optional[np.ndarray]): ``(batch,)`` valid samples per row.
+
+        Returns:
+            tuple: ``(noisy, target, snr_db)``, the gained mixture, the equally gained clean target
+                   and the SNR drawn for every row.
+        """
+        n_signals, n_samples = clean.shape
+        noise = np.asarray(self._noise_fn(n_signals, n_samples), dtype=clean.dtype)
+        if self.max_shift:
+            noise = self._shift(noise)
+        snr_db = self.rng.uniform(*self.snr_range_db, size=n_signals)
+        noisy = mix_at_snr(clean, noise, snr_db, lengths)
+        gain = 10 ** (self.rng.uniform(*self.gain_range_db, size=(n_signals, 1)) / 20)
+        gain = gain.astype(clean.dtype)
+        return noisy * gain, clean * gain, snr_db
+
+
+class SegmentDataset(Dataset):
+    """
+    Clean segments for on-the-fly augmentation.
+
+    Arguments:
+        segments (Sequence): 1-D arrays, or anything ``loader`` turns into one (e.g. file paths).
+        loader (Optional[Callable]): Called on an item to load it lazily inside the worker.
+        lengths (Optional[Sequence[int]]): Segment lengths, needed for bucketing when ``loader`` is set.
+    """
+
+    def __init__(
+        self,
+        segments: Sequence,
+        loader: Optional[Callable] = None,
+        lengths: Optional[Sequence[int]] = None,
+    ):
+        self.segments = segments
+        self.loader = loader
+        if lengths is None:
+            if loader is not None:
+                raise ValueError("lengths are needed to bucket lazily loaded segments")
+            lengths = [len(segment) for segment in segments]
+        self.lengths = np.asarray(lengths)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __getitem__(self, idx):
+        segment = self.segments[idx]
+        if self.loader is not None:
+            segment = self.loader(segment)
+        return np.asarray(segment, dtype=np.float32)
+
+
+class BucketBatchSampler(Sampler):
+    """
+    Yield batches of indices with similar lengths, so padding stays small.
+
+    Indices are sorted by length, cut into buckets of ``batch_size * bucket_batches`` neighbours,
+    shuffled inside every bucket and split into batches. The batch order is shuffled too. Call
+    ``set_epoch`` to get a different (but reproducible) order every epoch, with ``start_batch`` to
+    resume an epoch after its first batches without loading them again.
+
+    Arguments:
+        lengths (Sequence[int]): Length of every item.
+        batch_size (int): Items per batch.
+        bucket_batches (int): Batches per bucket, more means more randomness but more padding.
+        drop_last (bool): Drop the last incomplete batch of every bucket.
+        seed (int): Base seed of the shuffling.
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: int,
+        bucket_batches: int = 8,
+        drop_last: bool = False,
+        seed: int = 0,
+    ):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.bucket_size = batch_size * bucket_batches
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+        self.start_batch = 0
+
+    def set_epoch(self, epoch: int, start_batch: int = 0) -> None:
+        self.epoch = epoch
+        self.start_batch = start_batch
+
+    def _batches(self):
+        rng = np.random.default_rng((self.seed, self.epoch))
+        # random tie-breaking keeps equal-length items from always landing in the same batch
+        order = np.lexsort((rng.random(len(self.lengths)), self.lengths))
+        batches = []
+        for start in range(0, len(order), self.bucket_size):
+            bucket = rng.permutation(order[start:start + self.bucket_size])
+            for b in range(0, len(bucket), self.batch_size):
+                batch = bucket[b:b + self.batch_size]
+                if self.drop_last and len(batch) < self.batch_size:
+                    continue
+                batches.append(batch.tolist())
+        return [batches[i] for i in rng.permutation(len(batches))]
+
+    def __iter__(self):
+        return iter(self._batches()[self.start_batch:])
+
+    def __len__(self):
+        if self.drop_last:
+            n_buckets, rest = divmod(len(self.lengths), self.bucket_size)
+            n_batches = n_buckets * (self.bucket_size // self.batch_size) + rest // self.batch_size
+        else:
+            n_batches = len(self._batches())
+        return max(n_batches - self.start_batch, 0)
+
+
+class MixingCollate:
+    """
+    ``collate_fn`` that pads a bucket of clean segments and augments it in one vectorized call.
+
+    It runs inside the DataLoader workers, so mixing overlaps with training. Returns
+    ``(noisy, target, lengths)`` tensors of shape ``(batch, samples)``, ``(batch, samples)``
+    and ``(batch,)``.
+
+    Arguments:
+        mixer (NoiseMixer): Augmentation applied to every batch.
+        pad_multiple (int): Round the padded length up to a multiple of this, e.g. the STFT hop.
+    """
+
+    def __init__(self, mixer: NoiseMixer, pad_multiple: int = 1):
+        self.mixer = mixer
+        self.pad_multiple = pad_multiple
+        self._worker_seed = None
+
+    def _seed_worker(self) -> None:
+        """Give the mixer copy of every worker its own random stream (seeded from torch)."""
+        info = get_worker_info()
+        if info is not None and info.seed != self._worker_seed:
+            self._worker_seed = info.seed
+            self.mixer.reseed(info.seed % 2 ** 32)
+
+    def __call__(self, batch):
+        self._seed_worker()
+        lengths = np.fromiter((len(item) for item in batch), dtype=np.int64, count=len(batch))
+        n_samples = int(-(-lengths.max() // self.pad_multiple) * self.pad_multiple)
+        clean = np.zeros((len(batch), n_samples), dtype=np.float32)
+        for i, item in enumerate(batch):
+            clean[i, :len(item)] = item
+        noisy, target, _ = self.mixer(clean, lengths)
+        return torch.from_numpy(noisy), torch.from_numpy(target), torch.from_numpy(lengths)
+
+
+def make_augmented_loader(
+    dataset: SegmentDataset,
+    mixer: NoiseMixer,
+    batch_size: int = 16,
+    num_workers: int = 2,
+    prefetch_factor: int = 4,
+    bucket_batches: int = 8,
+    pad_multiple: int = 1,
+    seed: int = 0,
+    pin_memory: bool = False,
+) -> DataLoader:
+    """
+    Build a DataLoader that serves freshly mixed, length-bucketed batches every epoch.
+
+    Arguments:
+        dataset (SegmentDataset): Clean segments.
+        mixer (NoiseMixer): Augmentation, reseeded from ``torch.initial_seed`` in every worker.
+        batch_size (int): Items per batch.
+        num_workers (int): Number of worker processes, ``0`` mixes in the main process.
+        prefetch_factor (int): Batches prefetched per worker.
+        bucket_batches (int): Batches per length bucket, see ``BucketBatchSampler``.
+        pad_multiple (int): Round the padded length up to a multiple of this.
+        seed (int): Seed of the bucket shuffling.
+        pin_memory (bool): Pin batches for faster host to device copies.
+
+    Returns:
+        DataLoader: Yields ``(noisy, target, lengths)``. Call ``loader.batch_sampler.set_epoch``
+                    every epoch to reshuffle.
+    """
+    collate = MixingCollate(mixer, pad_multiple=pad_multiple)
+    sampler = BucketBatchSampler(dataset.lengths, batch_size, bucket_batches=bucket_batches, seed=seed)
+    kwargs = {}
+    if num_workers > 0:
+        kwargs = dict(prefetch_factor=prefetch_factor, persistent_workers=True)
+    return DataLoader(
+        dataset,
+        batch_sampler=sampler,
+        collate_fn=collate,
+        num_workers=num_workers,
+        pin_memory=pin_memory,
+        **kwargs,
+    )
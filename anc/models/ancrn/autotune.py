@@ -0,0 +1,330 @@
+import json
+import os
+import socket
+import tempfile
+import time
+
+import numpy as np
+
+from anc.models.ancrn.generate_noise import NoiseGenerator
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+# bump when the profile layout or the tuning procedure changes, old entries are then ignored
+_PROFILE_VERSION = 1
+# rough number of float64 spectrogram-sized temporaries alive while a channel is gated
+_STFT_TEMPORARIES = 6
+
+
+def default_profile_path():
+    """Where tuned profiles are stored, ``$ANC_AUTOTUNE_CACHE`` or ``~/.cache/anc/autotune.json``."""
+    return os.environ.get(
+        "ANC_AUTOTUNE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "anc", "autotune.json")
+    )
+
+
+def _stft_params(n_fft, win_length, hop_length):
+    win_length = n_fft if win_length is None else win_length
+    hop_length = win_length // 4 if hop_length is None else hop_length
+    return win_length, hop_length
+
+
+def min_safe_padding(
+        sr,
+        stationary=False,
+        time_constant_s=2.0,
+        n_fft=1024,
+        win_length=None,
+        hop_length=None,
+        time_mask_smooth_ms=50,
+        use_torch=False,
+        tol=1e-4,
+):
+    """
+    Smallest chunk padding, in samples, that keeps chunk edges from changing the output.
+
+    A sample influences the output through the STFT window, the time extent of the mask
+    smoothing filter and, for the non-stationary gate, the noise floor estimate. The numpy gate
+    estimates the floor with a forward-backward one-pole IIR filter whose impulse response decays
+    below ``tol`` after ``log(tol) / log(1 - b)`` frames; the torch gate uses a centred moving
+    average of ``time_constant_s`` seconds.
+
+    Parameters
+    ----------
+    sr : int
+        sample rate of the signal
+    stationary : bool, optional
+        whether the stationary gate is used, by default False
+    time_constant_s : float, optional
+        noise floor time constant of the non-stationary gate, by default 2.0
+    n_fft, win_length, hop_length : int, optional
+        STFT parameters, as in ``reduce_noise``
+    time_mask_smooth_ms : float, optional
+        time extent of the mask smoothing filter, by default 50
+    use_torch : bool, optional
+        whether the torch gate is used, by default False
+    tol : float, optional
+        relative weight of the IIR impulse response considered negligible, by default 1e-4
+
+    Returns
+    -------
+    int
+        padding in samples, a multiple of the hop length
+    """
+    win_length, hop_length = _stft_params(n_fft, win_length, hop_length)
+    context_frames = 0
+    if time_mask_smooth_ms is not None:
+        context_frames += int(time_mask_smooth_ms / ((hop_length / sr) * 1000)) + 1
+    if not stationary:
+        t_frames = time_constant_s * sr / float(hop_length)
+        if use_torch:
+            context_frames += int(t_frames) // 2 + 1
+        else:
+            # same coefficient as `get_time_smoothed_representation`
+            b = (np.sqrt(1 + 4 * t_frames ** 2) - 1) / (2 * t_frames ** 2)
+            context_frames += int(np.ceil(np.log(tol) / np.log(1 - b)))
+    padding = context_frames * hop_length + win_length
+    return int(-(-padding // hop_length) * hop_length)
+
+
+def available_memory():
+    """Available physical memory in bytes, ``None`` when it cannot be determined."""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def chunk_memory(chunk_size, padding, n_channels, n_fft, hop_length):
+    """Estimated peak bytes needed to gate one padded chunk of all channels."""
+    n_samples = chunk_size + 2 * padding
+    n_bins = n_fft // 2 + 1
+    stft_bytes = 16 * n_bins * (n_samples // hop_length + 1)
+    return n_channels * (8 * n_samples * 2 + _STFT_TEMPORARIES * stft_bytes)
+
+
+def _profile_key(sr, n_channels, stationary, time_constant_s, n_fft, win_length, hop_length,
+                 freq_mask_smooth_hz, time_mask_smooth_ms):
+    return "sr={}|ch={}|stationary={}|tc={}|n_fft={}|win={}|hop={}|fsmooth={}|tsmooth={}".format(
+        sr, n_channels, bool(stationary), time_constant_s, n_fft, win_length, hop_length,
+        freq_mask_smooth_hz, time_mask_smooth_ms,
+    )
+
+
+def _read_profiles(path):
+    try:
+        with open(path) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_profiles(path, profiles):
+    """Atomically replace the profile file, so concurrent readers never see a partial write."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".tmp") as fp:
+        json.dump(profiles, fp, indent=2, sort_keys=True)
+        tmp = fp.name
+    os.replace(tmp, path)
+
+
+def load_profile(sr, n_channels=1, stationary=False, time_constant_s=2.0, n_fft=1024, win_length=None,
+                 hop_length=None, freq_mask_smooth_hz=500, time_mask_smooth_ms=50, path=None):
+    """Return the stored profile of this host for the given gate configuration, or ``None``."""
+    profiles = _read_profiles(path or default_profile_path())
+    key = _profile_key(sr, n_channels, stationary, time_constant_s, n_fft, win_length, hop_length,
+                       freq_mask_smooth_hz, time_mask_smooth_ms)
+    profile = profiles.get(socket.gethostname(), {}).get(key)
+    if profile is None or profile.get("version") != _PROFILE_VERSION:
+        return None
+    return profile
+
+
+def _run(y, sr, stationary, time_constant_s, n_fft, win_length, hop_length, freq_mask_smooth_hz,
+         time_mask_smooth_ms, chunk_size, padding, n_jobs, backend, use_torch, device):
+    # imported here, `noisereduce` imports this module for `reduce_noise(autotune=True)`
+    from anc.models.ancrn.noisereduce import reduce_noise
+
+    start = time.perf_counter()
+    out = reduce_noise(
+        y,
+        sr,
+        stationary=stationary,
+        time_constant_s=time_constant_s,
+        n_fft=n_fft,
+        win_length=win_length,
+        hop_length=hop_length,
+        freq_mask_smooth_hz=freq_mask_smooth_hz,
+        time_mask_smooth_ms=time_mask_smooth_ms,
+        chunk_size=chunk_size,
+        padding=padding,
+        n_jobs=n_jobs,
+        backend=backend,
+        use_torch=use_torch,
+        device=device,
+    )
+    return out, time.perf_counter() - start
+
+
+def _relative_error(out, reference):
+    return float(np.sqrt(np.mean((out - reference) ** 2) / max(np.mean(reference ** 2), 1e-20)))
+
+
+def autotune(
+        sr,
+        n_channels=1,
+        stationary=False,
+        time_constant_s=2.0,
+        n_fft=1024,
+        win_length=None,
+        hop_length=None,
+        freq_mask_smooth_hz=500,
+        time_mask_smooth_ms=50,
+        calibration_s=None,
+        chunk_sizes_s=(1, 2, 5, 10, 30),
+        tolerance=1e-3,
+        memory_fraction=0.5,
+        consider_torch=True,
+        persist=True,
+        path=None,
+        seed=0,
+):
+    """
+    Pick chunk size, padding, parallel backend, worker count and numpy vs torch for this host.
+
+    Short calibration passes of ``reduce_noise`` are run on synthetic pink plus engine noise for
+    every candidate. A candidate is only eligible when its output matches the unchunked output of
+    the same backend within ``tolerance`` (relative RMS error); the numpy and torch gates implement
+    different noise floor estimators and are therefore not compared with each other. The fastest
+    eligible candidate wins and, with ``persist``, is stored per host and configuration, so
+    ``reduce_noise(..., autotune=True)`` picks it up later without calibrating again.
+
+    Parameters
+    ----------
+    sr : int
+        sample rate of the signals to be processed
+    n_channels : int, optional
+        number of channels of the signals to be processed, by default 1
+    stationary, time_constant_s, n_fft, win_length, hop_length, freq_mask_smooth_hz, time_mask_smooth_ms
+        gate configuration, as in ``reduce_noise``
+    calibration_s : float, optional
+        length of the calibration signal, by default three times the largest candidate chunk
+        (capped at 60 s)
+    chunk_sizes_s : tuple, optional
+        candidate chunk sizes in seconds, by default (1, 2, 5, 10, 30)
+    tolerance : float, optional
+        maximum relative RMS difference to the unchunked reference, by default 1e-3
+    memory_fraction : float, optional
+        fraction of the available memory all parallel chunks together may use, by default 0.5
+    consider_torch : bool, optional
+        whether torch candidates are measured when torch is installed, by default True
+    persist : bool, optional
+        whether to store the chosen profile, by default True
+    path : str, optional
+        profile file, by default ``default_profile_path()``
+    seed : int, optional
+        seed of the calibration signal, by default 0
+
+    Returns
+    -------
+    dict
+        the chosen profile with ``chunk_size``, ``padding``, ``n_jobs``, ``backend``,
+        ``use_torch``, ``device`` and the measured ``candidates``
+    """
+    win_length_, hop_length_ = _stft_params(n_fft, win_length, hop_length)
+    n_cpus = os.cpu_count() or 1
+    memory = available_memory()
+
+    backends = [{"use_torch": False, "device": "cpu"}]
+    if consider_torch and TORCH_AVAILABLE:
+        backends.append({"use_torch": True, "device": "cpu"})
+        if torch.cuda.is_available():
+            backends.append({"use_torch": True, "device": "cuda"})
+
+    # chunks start at `ich * chunk_size - padding`, both must be hop multiples for every chunk to
+    # see the same STFT framing as the unchunked signal
+    chunk_sizes = sorted({max(1, int(s * sr) // hop_length_) * hop_length_ for s in chunk_sizes_s})
+    if calibration_s is None:
+        calibration_s = min(3 * chunk_sizes[-1] / sr, 60)
+    n_samples = int(calibration_s * sr)
+    # keep at least two chunks per calibration pass, otherwise chunking is not exercised
+    chunk_sizes = [c for c in chunk_sizes if 2 * c <= n_samples] or [n_samples // 2]
+
+    gen = NoiseGenerator(sr, seed=seed, dtype=np.float64)
+    y = gen.pink(n_channels, n_samples) + gen.engine(n_channels, n_samples, 900, 3000)
+    if n_channels == 1:
+        y = y[0]
+
+    gate_args = dict(
+        stationary=stationary, time_constant_s=time_constant_s, n_fft=n_fft, win_length=win_length,
+        hop_length=hop_length, freq_mask_smooth_hz=freq_mask_smooth_hz,
+        time_mask_smooth_ms=time_mask_smooth_ms,
+    )
+    candidates = []
+    for backend in backends:
+        padding = min_safe_padding(
+            sr, stationary=stationary, time_constant_s=time_constant_s, n_fft=n_fft,
+            win_length=win_length, hop_length=hop_length, time_mask_smooth_ms=time_mask_smooth_ms,
+            use_torch=backend["use_torch"],
+        )
+        reference, _ = _run(y, sr, chunk_size=None, padding=padding, n_jobs=1, backend=None,
+                            **backend, **gate_args)
+        jobs = [(1, None)]
+        if not backend["use_torch"] and n_cpus > 1:
+            jobs += [(n_cpus, "loky"), (n_cpus, "threading")]
+        for chunk_size in chunk_sizes:
+            for n_jobs, parallel_backend in jobs:
+                needed = n_jobs * chunk_memory(chunk_size, padding, n_channels, n_fft, hop_length_)
+                if memory is not None and needed > memory_fraction * memory:
+                    continue
+                out, elapsed = _run(y, sr, chunk_size=chunk_size, padding=padding, n_jobs=n_jobs,
+                                    backend=parallel_backend, **backend, **gate_args)
+                error = _relative_error(out, reference)
+                candidates.append({
+                    "chunk_size": chunk_size,
+                    "padding": padding,
+                    "n_jobs": n_jobs,
+                    "backend": parallel_backend,
+                    "use_torch": backend["use_torch"],
+                    "device": backend["device"],
+                    "seconds_per_second": elapsed / calibration_s,
+                    "relative_error": error,
+                    "eligible": error <= tolerance,
+                })
+
+    eligible = [c for c in candidates if c["eligible"]]
+    if not eligible:
+        raise RuntimeError(
+            "No candidate matched the unchunked reference within tolerance={}".format(tolerance)
+        )
+    best = min(eligible, key=lambda c: c["seconds_per_second"])
+    profile = {key: best[key] for key in ("chunk_size", "padding", "n_jobs", "backend", "use_torch", "device")}
+    profile.update(
+        version=_PROFILE_VERSION,
+        host=socket.gethostname(),
+        n_cpus=n_cpus,
+        tuned_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        candidates=candidates,
+    )
+
+    if persist:
+        path = path or default_profile_path()
+        profiles = _read_profiles(path)
+        key = _profile_key(sr, n_channels, stationary, time_constant_s, n_fft, win_length, hop_length,
+                           freq_mask_smooth_hz, time_mask_smooth_ms)
+        profiles.setdefault(profile["host"], {})[key] = profile
+        _write_profiles(path, profiles)
+    return profile
+
+
+def get_profile(sr, n_channels=1, path=None, **gate_args):
+    """Stored profile for this host and configuration, running ``autotune`` first if there is none."""
+    profile = load_profile(sr, n_channels=n_channels, path=path, **gate_args)
+    if profile is None:
+        profile = autotune(sr, n_channels=n_channels, path=path, **gate_args)
+    return profile
@@ -0,0 +1,308 @@
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import torch
+
+from anc.models.ancrn.gates.torchgate import TorchGate
+
+_EPS = 1e-12
+
+# per-worker gate, built once by `_init_worker`
+_WORKER = {}
+
+
+def snr_db(estimate: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """Signal-to-noise ratio of ``estimate`` against ``reference`` along the last axis."""
+    signal = np.sum(reference ** 2, axis=-1)
+    noise = np.sum((estimate - reference) ** 2, axis=-1)
+    return 10 * np.log10((signal + _EPS) / (noise + _EPS))
+
+
+def segmental_snr_db(estimate: np.ndarray, reference: np.ndarray, frame_length: int,
+                     hop_length: Optional[int] = None, min_db: float = -10.0, max_db: float = 35.0) -> np.ndarray:
+    """
+    Mean of the frame-wise SNRs along the last axis, each clipped to ``[min_db, max_db]``.
+
+    The clipping keeps silent or perfectly reconstructed frames from dominating the mean.
+    """
+    hop_length = frame_length if hop_length is None else hop_length
+    n = estimate.shape[-1]
+    if n < frame_length:
+        return np.clip(snr_db(estimate, reference), min_db, max_db)
+    frames_est = np.lib.stride_tricks.sliding_window_view(estimate, frame_length, axis=-1)[..., ::hop_length, :]
+    frames_ref = np.lib.stride_tricks.sliding_window_view(reference, frame_length, axis=-1)[..., ::hop_length, :]
+    return np.mean(np.clip(snr_db(frames_est, frames_ref), min_db, max_db), axis=-1)
+
+
+def mse(estimate: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """Mean squared error along the last axis."""
+    return np.mean((estimate - reference) ** 2, axis=-1)
+
+
+def log_spectral_distance(estimate_mag: np.ndarray, reference_mag: np.ndarray, floor_db: float = -80.0) -> np.ndarray:
+    """
+    Log-spectral distance in dB between magnitude spectrograms of shape (..., freq_bins, frames).
+
+    RMS over frequency of the log power difference, averaged over frames. Both spectrograms are
+    floored at ``floor_db`` below the reference peak, so silent bins do not dominate the distance.
+    """
+    ref_db = 10 * np.log10(reference_mag ** 2 + _EPS)
+    est_db = 10 * np.log10(estimate_mag ** 2 + _EPS)
+    floor = np.max(ref_db, axis=(-2, -1), keepdims=True) + floor_db
+    diff = np.maximum(ref_db, floor) - np.maximum(est_db, floor)
+    return np.mean(np.sqrt(np.mean(diff ** 2, axis=-2)), axis=-1)
+
+
+def spectral_convergence(estimate_mag: np.ndarray, reference_mag: np.ndarray) -> np.ndarray:
+    """Frobenius norm of the magnitude error relative to the reference magnitude, over the last two axes."""
+    error = np.sqrt(np.sum((reference_mag - estimate_mag) ** 2, axis=(-2, -1)))
+    return error / (np.sqrt(np.sum(reference_mag ** 2, axis=(-2, -1))) + _EPS)
+
+
+def make_gate(
+    sr: int,
+    stationary: bool = False,
+    prop_decrease: float = 1.0,
+    time_constant_s: float = 2.0,
+    freq_mask_smooth_hz: float = 500,
+    time_mask_smooth_ms: float = 50,
+    thresh_n_mult_nonstationary: float = 2,
+    sigmoid_slope_nonstationary: float = 10,
+    n_std_thresh_stationary: float = 1.5,
+    n_fft: int = 1024,
+    win_length: Optional[int] = None,
+    hop_length: Optional[int] = None,
+    precision: Optional[str] = None,
+    n_mask_bands: Optional[int] = None,
+    band_scale: str = "erb",
+    synthesis_length: Optional[int] = None,
+) -> TorchGate:
+    """`TorchGate` configured from `reduce_noise` style parameters."""
+    win_length = n_fft if win_length is None else win_length
+    hop_length = win_length // 4 if hop_length is None else hop_length
+    return TorchGate(
+        sr=sr,
+        nonstationary=not stationary,
+        n_std_thresh_stationary=n_std_thresh_stationary,
+        n_thresh_nonstationary=thresh_n_mult_nonstationary,
+        temp_coeff_nonstationary=1 / sigmoid_slope_nonstationary,
+        n_movemean_nonstationary=int(time_constant_s / hop_length * sr),
+        prop_decrease=prop_decrease,
+        n_fft=n_fft,
+        win_length=win_length,
+        hop_length=hop_length,
+        freq_mask_smooth_hz=freq_mask_smooth_hz,
+        time_mask_smooth_ms=time_mask_smooth_ms,
+        precision=precision,
+        n_mask_bands=n_mask_bands,
+        band_scale=band_scale,
+        synthesis_length=synthesis_length,
+    )
+
+
+@torch.no_grad()
+def evaluate_pair(gate: TorchGate, noisy: np.ndarray, reference: np.ndarray, segment_ms: float = 20.0,
+                  device: str = "cpu") -> Dict[str, float]:
+    """
+    Denoise one (noisy, reference) pair and compute its metrics, averaged over channels.
+
+    The spectral metrics use the input and masked STFTs the gate computed anyway, only the
+    reference is transformed here.
+
+    Returns:
+        dict: input and output SNR and segmental SNR (dB), SNR improvement, input and output MSE,
+        log-spectral distance (dB) and spectral convergence.
+    """
+    noisy = np.atleast_2d(noisy)
+    reference = np.atleast_2d(reference)
+    if noisy.shape != reference.shape:
+        raise ValueError(f"noisy {noisy.shape} and reference {reference.shape} differ in shape")
+    x = torch.from_numpy(np.ascontiguousarray(noisy)).to(device)
+    y, X, Y = gate(x, return_stft=True)
+    estimate = y.cpu().numpy().astype(np.float64)
+    # the ISTFT drops the samples past the last full hop
+    n = estimate.shape[-1]
+    noisy, reference = noisy[:, :n].astype(np.float64), reference[:, :n].astype(np.float64)
+
+    R = gate._stft(torch.from_numpy(np.ascontiguousarray(reference)).to(device), X.real.dtype)
+    R_mag, X_mag, Y_mag = (S.abs().double().cpu().numpy() for S in (R, X, Y))
+
+    frame_length = max(int(segment_ms * gate.sr / 1000), 1)
+    snr_in, snr_out = snr_db(noisy, reference), snr_db(estimate, reference)
+    return {
+        "n_samples": n,
+        "snr_in_db": float(np.mean(snr_in)),
+        "snr_out_db": float(np.mean(snr_out)),
+        "snr_improvement_db": float(np.mean(snr_out - snr_in)),
+        "seg_snr_in_db": float(np.mean(segmental_snr_db(noisy, reference, frame_length))),
+        "seg_snr_out_db": float(np.mean(segmental_snr_db(estimate, reference, frame_length))),
+        "mse_in": float(np.mean(mse(noisy, reference))),
+        "mse_out": float(np.mean(mse(estimate, reference))),
+        "lsd_in_db": float(np.mean(log_spectral_distance(X_mag, R_mag))),
+        "lsd_out_db": float(np.mean(log_spectral_distance(Y_mag, R_mag))),
+        "spectral_convergence": float(np.mean(spectral_convergence(Y_mag, R_mag))),
+    }
+
+
+def _load(item: Union[str, os.PathLike, np.ndarray], sr: int) -> np.ndarray:
+    if isinstance(item, np.ndarray):
+        return item
+    import librosa
+
+    audio, _ = librosa.load(item, sr=sr, mono=False)
+    return audio
+
+
+def _init_worker(sr: int, gate_kwargs: dict, device: str) -> None:
+    # one torch thread per process, the pool provides the parallelism
+    torch.set_num_threads(1)
+    _WORKER["gate"] = make_gate(sr, **gate_kwargs).to(device)
+    _WORKER["sr"] = sr
+    _WORKER["device"] = device
+
+
+def _evaluate_item(item: Tuple[int, str, object, object], segment_ms: float) -> dict:
+    index, name, noisy, reference = item
+    row = {"index": index, "name": name}
+    try:
+        sr = _WORKER["sr"]
+        row.update(evaluate_pair(_WORKER["gate"], _load(noisy, sr), _load(reference, sr), segment_ms,
+                                 _WORKER["device"]))
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def evaluate_corpus(
+    pairs: Sequence[Tuple[object, object]],
+    sr: int,
+    n_workers: int = 0,
+    out_path: Optional[str] = None,
+    names: Optional[Sequence[str]] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    segment_ms: float = 20.0,
+    device: str = "cpu",
+    **gate_kwargs,
+) -> pd.DataFrame:
+    """
+    Run a gate configuration over a corpus of (noisy, reference) pairs and tabulate the metrics.
+
+    Files are spread over ``n_workers`` processes, each holding one gate; rows are appended to
+    ``out_path`` (CSV) as soon as a file is done, so partial results survive an interrupted run.
+
+    Arguments:
+        pairs: (noisy, reference) pairs of audio file paths (loaded with librosa at ``sr``) or arrays.
+        sr: Sample rate.
+        n_workers: Worker processes, 0 evaluates in the calling process.
+        out_path: CSV file the rows are streamed to.
+        names: Row names, default the noisy file names or the pair index.
+        shard: ``(i, n)`` evaluates only every n-th pair starting at i, to split a corpus over CI jobs.
+        segment_ms: Frame length of the segmental SNR.
+        device: Device of the gate.
+        **gate_kwargs: Gate configuration in `reduce_noise` terms, see ``make_gate``.
+
+    Returns:
+        pandas.DataFrame: one row per pair in corpus order, float32 metric columns and an ``error``
+        column for pairs that failed.
+    """
+    items = []
+    for index, (noisy, reference) in enumerate(pairs):
+        if names is not None:
+            name = names[index]
+        elif isinstance(noisy, (str, os.PathLike)):
+            name = os.path.basename(os.fspath(noisy))
+        else:
+            name = str(index)
+        items.append((index, name, noisy, reference))
+    if shard is not None:
+        items = items[shard[0]::shard[1]]
+
+    rows = []
+    writer = None
+    fp = open(out_path, "w", newline="") if out_path is not None else None
+    try:
+        for row in _iter_rows(items, sr, n_workers, segment_ms, device, gate_kwargs):
+            rows.append(row)
+            if fp is not None:
+                if writer is None:
+                    writer = csv.DictWriter(fp, fieldnames=_columns(row), extrasaction="ignore")
+                    writer.writeheader()
+                writer.writerow(row)
+                fp.flush()
+    finally:
+        if fp is not None:
+            fp.close()
+
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    table = table.sort_values("index").set_index("index")
+    if "error" not in table:
+        table["error"] = None
+    metric_columns = [c for c in table.columns if c not in ("name", "error", "n_samples")]
+    return table.astype({c: np.float32 for c in metric_columns})
+
+
+def _columns(row: dict) -> List[str]:
+    columns = ["index", "name", "n_samples", "snr_in_db", "snr_out_db", "snr_improvement_db", "seg_snr_in_db",
+               "seg_snr_out_db", "mse_in", "mse_out", "lsd_in_db", "lsd_out_db", "spectral_convergence", "error"]
+    return columns + [c for c in row if c not in columns]
+
+
+def _iter_rows(items, sr, n_workers, segment_ms, device, gate_kwargs) -> Iterable[dict]:
+    if n_workers == 0:
+        previous = dict(_WORKER)
+        threads = torch.get_num_threads()
+        _init_worker(sr, gate_kwargs, device)
+        torch.set_num_threads(threads)
+        try:
+            for item in items:
+                yield _evaluate_item(item, segment_ms)
+        finally:
+            _WORKER.clear()
+            _WORKER.update(previous)
+        return
+    with ProcessPoolExecutor(n_workers, initializer=_init_worker, initargs=(sr, gate_kwargs, device)) as pool:
+        futures = [pool.submit(_evaluate_item, item, segment_ms) for item in items]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summarize(table: pd.DataFrame) -> pd.DataFrame:
+    """Mean, median and 10th percentile of every metric over the pairs that did not fail."""
+    ok = table[table["error"].isna()] if "error" in table else table
+    metrics = ok.drop(columns=[c for c in ("name", "error", "n_samples") if c in ok])
+    return metrics.agg(["mean", "median", lambda s: s.quantile(0.1)]).rename(index={"<lambda>": "p10"})
+
+
+def main():
+    """CLI evaluating a gate configuration over a CSV of ``noisy,reference`` file pairs."""
+    parser = argparse.ArgumentParser(description="Offline validation of the spectral gate.")
+    parser.add_argument("pairs", type=str, help="CSV with noisy and reference columns of audio paths.")
+    parser.add_argument("--sr", type=int, default=16000)
+    parser.add_argument("--out", type=str, default=None, help="CSV the per-file rows are streamed to.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard", type=str, default=None, help="i/n, evaluate every n-th pair starting at i.")
+    parser.add_argument("--stationary", action="store_true", help="Use the stationary gate.")
+    parser.add_argument("--prop_decrease", type=float, default=1.0)
+    parser.add_argument("--time_constant_s", type=float, default=2.0)
+    parser.add_argument("--n_fft", type=int, default=1024)
+    args = parser.parse_args()
+
+    corpus = pd.read_csv(args.pairs)
+    shard = tuple(int(v) for v in args.shard.split("/")) if args.shard else None
+    table = evaluate_corpus(
+        list(zip(corpus["noisy"], corpus["reference"])), args.sr, n_workers=args.workers, out_path=args.out,
+        shard=shard, stationary=args.stationary, prop_decrease=args.prop_decrease,
+        time_constant_s=args.time_constant_s, n_fft=args.n_fft,
+    )
+    print(summarize(table).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Spectral features of audio files and a content-addressed disk cache for them.
+
+`compute_features` is the packaged version of the notebooks' ``AudioPreprocessor.get_spectrogram``
+(magnitude, dB, log-mel and MFCC variants of the same STFT). `FeatureCache` stores its results
+under a key made of a hash of the file's bytes and every feature parameter, so renamed or copied
+files hit the cache, edited files miss it, and several feature configurations share one directory.
+"""
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional, Union
+
+import librosa
+import numpy as np
+
+FEATURE_KINDS = ("magnitude", "db", "mel_db", "mfcc")
+
+# bumped when the stored layout or the feature maths change, so old entries stop matching
+_FORMAT_VERSION = 1
+# temporary files older than this are left over from writers that died, and are removed
+_STALE_TMP_S = 600.0
+
+
+def compute_features(
+    y: np.ndarray,
+    sr: int,
+    kind: str = "db",
+    n_fft: int = 2048,
+    hop_length: int = 512,
+    win_length: Optional[int] = None,
+    ref: Union[str, float] = "max",
+    amin: float = 1e-10,
+    top_db: Optional[float] = 80.0,
+    n_mels: int = 128,
+    n_mfcc: int = 20,
+    fmin: float = 0.0,
+    fmax: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Spectral features ``(features, frames)`` of a mono signal.
+
+    Arguments:
+        y (np.ndarray): Mono signal.
+        sr (int): Its sample rate.
+        kind (str): "magnitude" for the STFT magnitude, "db" for it in dB, "mel_db" for the dB power on
+                    ``n_mels`` mel bands, "mfcc" for ``n_mfcc`` cepstral coefficients of those. Default: "db".
+        n_fft, hop_length, win_length: STFT framing, see ``librosa.stft``.
+        ref (Union[str, float]): dB reference, "max" for the loudest bin of the signal. Default: "max".
+        amin (float): Floor of the amplitudes (power for the mel variants) before the log.
+        top_db (Optional[float]): Dynamic range of the dB features below their maximum. Default: 80.
+        n_mels, n_mfcc, fmin, fmax: Mel filterbank and MFCC size, only used by "mel_db" and "mfcc".
+
+    Returns:
+        np.ndarray: float32 features.
+    """
+    if kind not in FEATURE_KINDS:
+        raise ValueError(f"kind must be one of {FEATURE_KINDS}, got {kind}")
+    ref_value = np.max if ref == "max" else ref
+    magnitude = np.abs(librosa.stft(np.asarray(y, dtype=np.float32), n_fft=n_fft, hop_length=hop_length,
+                                    win_length=win_length))
+    if kind == "magnitude":
+        return magnitude.astype(np.float32)
+    if kind == "db":
+        return librosa.amplitude_to_db(magnitude, ref=ref_value, amin=amin, top_db=top_db).astype(np.float32)
+    mel = librosa.feature.melspectrogram(S=magnitude ** 2, sr=sr, n_mels=n_mels, fmin=fmin, fmax=fmax)
+    mel_db = librosa.power_to_db(mel, ref=ref_value, amin=amin, top_db=top_db)
+    if kind == "mel_db":
+        return mel_db.astype(np.float32)
+    return librosa.feature.mfcc(S=mel_db, n_mfcc=n_mfcc).astype(np.float32)
+
+
+def file_digest(path: str, block_size: int = 2 ** 20) -> str:
+    """Hash of the bytes of a file."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class FeatureCache:
+    """
+    Disk cache of `compute_features` results, shared between processes.
+
+    Entries are ``.npy`` files named by their key. Every entry is written to a temporary file in
+    the cache directory and moved into place, so parallel workers can fill and read the same
+    directory without locks: readers see whole entries or none, and two workers computing the same
+    entry just write it twice. A hit refreshes the entry's modification time. After every write
+    the directory is scanned and the least recently used entries are deleted until it fits
+    ``max_bytes``.
+
+    Arguments:
+        cache_dir (str): Directory of the entries, created if missing.
+        max_bytes (int): Size cap of the directory. Default: 1 GiB.
+        dtype (str): Storage type, "float16" halves the size of "float32" at about 3 significant
+                     digits. Entries that would overflow float16 are stored as float32. Default: "float16".
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 ** 30, dtype: str = "float16"):
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"dtype must be 'float16' or 'float32', got {dtype}")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.dtype = dtype
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # digests of the files hashed in this process, by (path, size, mtime)
+        self._digests = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def _file_digest(self, path: str) -> str:
+        st = os.stat(path)
+        signature = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(signature)
+        if digest is None:
+            digest = file_digest(path)
+            with self._lock:
+                self._digests[signature] = digest
+        return digest
+
+    def key(self, path: str, sr: Optional[int] = None, **params) -> str:
+        """Key of the features of a file, resampled to ``sr`` (None keeps its rate), with `compute_features` params."""
+        bound = inspect.signature(compute_features).bind(None, sr, **params)
+        bound.apply_defaults()
+        config = {name: value for name, value in bound.arguments.items() if name != "y"}
+        config.update(version=_FORMAT_VERSION, dtype=self.dtype)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self._file_digest(path).encode())
+        h.update(json.dumps(config, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """float32 features stored under ``key``, or None."""
+        path = self._path(key)
+        try:
+            features = np.load(path)
+            os.utime(path)
+        except (FileNotFoundError, ValueError, EOFError):
+            # missing, or deleted by another process's eviction while being read
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return features.astype(np.float32)
+
+    def _stored(self, features: np.ndarray) -> np.ndarray:
+        """Features as they are stored, in float32 if they would overflow float16."""
+        features = np.asarray(features)
+        largest = np.max(np.abs(features), initial=0.0, where=np.isfinite(features))
+        if self.dtype == "float16" and largest > np.finfo(np.float16).max:
+            return features.astype(np.float32)
+        return features.astype(self.dtype)
+
+    def put(self, key: str, features: np.ndarray) -> None:
+        """Store features under ``key``, then evict down to ``max_bytes``."""
+        stored = self._stored(features)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                np.save(fp, stored)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def features(self, path: str, sr: Optional[int] = None, **params) -> np.ndarray:
+        """Features of a file (mixed down to mono), from the cache or computed and cached."""
+        key = self.key(path, sr, **params)
+        features = self.get(key)
+        if features is None:
+            y, file_sr = librosa.load(path, sr=sr, mono=True)
+            # rounded to the stored type, so a miss returns what later hits will
+            features = self._stored(compute_features(y, file_sr, **params))
+            self.put(key, features)
+            features = features.astype(np.float32)
+        return features
+
+    def _entries(self):
+        entries = []
+        now = time.time()
+        for f in os.scandir(self.cache_dir):
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            if f.name.endswith(".npy"):
+                entries.append((st.st_mtime, st.st_size, f.path))
+            elif f.name.endswith(".tmp") and now - st.st_mtime > _STALE_TMP_S:
+                _remove(f.path)
+        return entries
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the entries on disk."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        """Delete the least recently used entries until the directory fits ``max_bytes``."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if _remove(path):
+                with self._lock:
+                    self.evictions += 1
+            total -= size
+
+    def clear(self) -> None:
+        """Delete every entry."""
+        for _, _, path in self._entries():
+            _remove(path)
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "nbytes": sum(size for _, size, _ in entries),
+        }
+
+
+def _remove(path: str) -> bool:
+    """Delete a file another process may have deleted already, True if this call did."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
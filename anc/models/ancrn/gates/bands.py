@@ -0,0 +1,90 @@
+"""
+Perceptual band filterbanks for computing gate masks per band instead of per FFT bin.
+
+``band_matrices`` returns a sparse analysis matrix that averages bin magnitudes into overlapping
+triangular bands with centers equally spaced on the ERB or mel scale, and a synthesis matrix that
+linearly interpolates band values back to the bins between band centers. Rows of both matrices sum
+to one, so a band mask in [0, 1] expands to a bin mask in [0, 1].
+"""
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+from scipy import sparse
+
+BAND_SCALES = ("erb", "mel")
+# ways of combining the channels' magnitudes into the one spectrogram a shared mask is computed from
+SHARED_MASKS = ("mean", "max")
+
+
+def hz_to_erb(hz):
+    """ERB-rate (Glasberg & Moore) of a frequency in Hz."""
+    return 21.4 * np.log10(1 + 0.00437 * np.asarray(hz, dtype=np.float64))
+
+
+def erb_to_hz(erb):
+    """Inverse of `hz_to_erb`."""
+    return (10 ** (np.asarray(erb, dtype=np.float64) / 21.4) - 1) / 0.00437
+
+
+def hz_to_mel(hz):
+    """Mel (HTK) of a frequency in Hz."""
+    return 2595 * np.log10(1 + np.asarray(hz, dtype=np.float64) / 700)
+
+
+def mel_to_hz(mel):
+    """Inverse of `hz_to_mel`."""
+    return 700 * (10 ** (np.asarray(mel, dtype=np.float64) / 2595) - 1)
+
+
+def band_centers(sr: int, n_bands: int, scale: str = "erb") -> np.ndarray:
+    """Center frequencies of ``n_bands`` bands from 0 Hz to Nyquist, equally spaced on ``scale``."""
+    if scale not in BAND_SCALES:
+        raise ValueError(f"scale must be one of {BAND_SCALES}, got {scale}")
+    to_scale, from_scale = (hz_to_erb, erb_to_hz) if scale == "erb" else (hz_to_mel, mel_to_hz)
+    return from_scale(np.linspace(0.0, to_scale(sr / 2), n_bands))
+
+
+@lru_cache(maxsize=32)
+def band_matrices(sr: int, n_fft: int, n_bands: int = 48, scale: str = "erb") -> Tuple[sparse.csr_matrix,
+                                                                                      sparse.csr_matrix]:
+    """
+    Analysis and synthesis matrices of a triangular band filterbank.
+
+    Arguments:
+        sr {int} -- Sample rate.
+        n_fft {int} -- FFT size, the bins are ``n_fft // 2 + 1``.
+
+    Keyword Arguments:
+        n_bands {int} -- Number of bands (default: {48}).
+        scale {str} -- "erb" or "mel" (default: {"erb"}).
+
+    Returns:
+        Tuple[csr_matrix, csr_matrix] -- ``(analysis, synthesis)`` of shapes ``(n_bands, n_bins)`` and
+        ``(n_bins, n_bands)``, float32. Both are cached and must not be modified.
+    """
+    n_bins = n_fft // 2 + 1
+    if not 2 <= n_bands <= n_bins:
+        raise ValueError(f"n_bands must be between 2 and {n_bins}, got {n_bands}")
+    freqs = np.linspace(0, sr / 2, n_bins)
+    centers = band_centers(sr, n_bands, scale)
+
+    # interpolation weights of every bin between its two neighbouring band centers
+    upper = np.clip(np.searchsorted(centers, freqs, side="right"), 1, n_bands - 1)
+    lower = upper - 1
+    frac = np.clip((freqs - centers[lower]) / (centers[upper] - centers[lower]), 0.0, 1.0)
+    rows = np.concatenate([np.arange(n_bins), np.arange(n_bins)])
+    cols = np.concatenate([lower, upper])
+    weights = np.concatenate([1 - frac, frac])
+    synthesis = sparse.csr_matrix((weights, (rows, cols)), shape=(n_bins, n_bands), dtype=np.float64)
+    synthesis.eliminate_zeros()
+
+    # a band's triangle is the transpose of the interpolation weights, normalized to a weighted mean
+    analysis = synthesis.T.tolil()
+    for band, row in enumerate(analysis.rows):
+        if not row:
+            # bands narrower than a bin take the nearest bin
+            analysis[band, int(np.argmin(np.abs(freqs - centers[band])))] = 1.0
+    analysis = analysis.tocsr()
+    analysis = sparse.diags(1 / np.asarray(analysis.sum(axis=1)).ravel()) @ analysis
+    return analysis.astype(np.float32).tocsr(), synthesis.astype(np.float32).tocsr()
@@ -0,0 +1,143 @@
+"""
+Low-delay STFT framing with asymmetric analysis and synthesis windows.
+
+With a symmetric window, a sample is only complete after every frame overlapping it has been
+synthesized, which delays the output by about a window length (21 ms for ``n_fft=1024`` at
+48 kHz). The framing here (Mauler & Martin, "A low delay, variable resolution, perfect
+reconstruction spectral analysis-synthesis system for speech enhancement", 2007) keeps the long
+analysis window, and with it the frequency resolution of the masks, but synthesizes only the last
+``synthesis_length`` samples of every frame:
+
+* the analysis window rises over ``n_fft - synthesis_length / 2`` samples (the first half of a long
+  square-root Hann) and falls over the last ``synthesis_length / 2`` (the second half of a short one);
+* the synthesis window is zero except on the last ``synthesis_length`` samples, where the product
+  of both windows is a Hann window of ``synthesis_length`` samples.
+
+Products of consecutive frames then overlap-add to a constant, so analysis followed by synthesis
+reconstructs the input exactly, and the output lags the input by only
+``synthesis_length - hop_length`` samples. Frames are aligned to end on hop boundaries, frame ``t``
+covering samples ``[(t + 1) * hop - n_fft, (t + 1) * hop)``, as a block-wise stream sees them.
+"""
+from typing import Tuple
+
+import numpy as np
+import torch
+from torch.nn.functional import fold, pad
+
+
+def low_delay_windows(n_fft: int, hop_length: int, synthesis_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Analysis and synthesis windows of the low-delay framing.
+
+    Arguments:
+        n_fft {int} -- Frame and analysis window length.
+        hop_length {int} -- Hop between frames, must divide ``synthesis_length`` at least twice.
+        synthesis_length {int} -- Non-zero samples of the synthesis window, at most ``n_fft``;
+                                  ``n_fft`` gives square-root Hann windows on both sides.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray] -- ``(analysis, synthesis)``, float64 arrays of ``n_fft`` samples.
+    """
+    if not 2 * hop_length <= synthesis_length <= n_fft or synthesis_length % hop_length:
+        raise ValueError(
+            f"synthesis_length must be a multiple of hop_length {hop_length} between {2 * hop_length} and "
+            f"n_fft {n_fft}, got {synthesis_length}"
+        )
+    half = synthesis_length // 2
+    long_half = n_fft - half
+    long_hann = np.hanning(2 * long_half + 1)[:-1]
+    short_hann = np.hanning(synthesis_length + 1)[:-1]
+
+    analysis = np.concatenate([np.sqrt(long_hann[:long_half]), np.sqrt(short_hann[half:])])
+    synthesis = np.zeros(n_fft)
+    rising = analysis[n_fft - synthesis_length:long_half]
+    synthesis[n_fft - synthesis_length:long_half] = np.divide(
+        short_hann[:half], rising, out=np.zeros(half), where=rising > 0
+    )
+    synthesis[long_half:] = np.sqrt(short_hann[half:])
+    return analysis, synthesis
+
+
+class LowDelayFraming:
+    """
+    STFT and inverse of the low-delay framing, for NumPy arrays and torch tensors.
+
+    Arguments:
+        n_fft {int} -- Frame length.
+        hop_length {int} -- Hop between frames.
+        synthesis_length {int} -- Non-zero samples of the synthesis window, see `low_delay_windows`.
+    """
+
+    def __init__(self, n_fft: int, hop_length: int, synthesis_length: int):
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.synthesis_length = synthesis_length
+        self.analysis, self.synthesis = low_delay_windows(n_fft, hop_length, synthesis_length)
+        # overlap-added window products over one hop, starting at an input sample on a hop boundary
+        products = self.analysis * self.synthesis
+        self.norm = np.roll([products[j::hop_length].sum() for j in range(hop_length)], -(n_fft % hop_length))
+
+    @property
+    def latency_samples(self) -> int:
+        """Samples the synthesized output lags the input."""
+        return self.synthesis_length - self.hop_length
+
+    def n_frames(self, length: int) -> int:
+        """Frames of a signal of ``length`` samples, enough for every sample to be complete."""
+        return -(-(length + self.latency_samples) // self.hop_length)
+
+    def _padding(self, length: int) -> Tuple[int, int]:
+        total = self.n_fft - self.hop_length + self.n_frames(length) * self.hop_length
+        return self.n_fft - self.hop_length, total - length - (self.n_fft - self.hop_length)
+
+    def stft(self, y: np.ndarray) -> np.ndarray:
+        """Complex spectrogram ``(..., n_fft // 2 + 1, frames)`` of ``(..., samples)``."""
+        y = np.asarray(y)
+        left, right = self._padding(y.shape[-1])
+        return self.stft_padded(np.pad(y, [(0, 0)] * (y.ndim - 1) + [(left, right)]))
+
+    def stft_padded(self, padded: np.ndarray) -> np.ndarray:
+        """`stft` of samples padded by the caller, frame ``k`` starting at sample ``k * hop_length``."""
+        frames = np.lib.stride_tricks.sliding_window_view(padded, self.n_fft, axis=-1)[..., ::self.hop_length, :]
+        return np.swapaxes(np.fft.rfft(frames * self.analysis, axis=-1), -1, -2)
+
+    def istft(self, spec: np.ndarray, length: int) -> np.ndarray:
+        """Signal ``(..., length)`` of a spectrogram computed by `stft`."""
+        frames = np.fft.irfft(np.swapaxes(spec, -1, -2), n=self.n_fft, axis=-1) * self.synthesis
+        # frames zero padded in front to a whole number of hops, then overlap-added as that many
+        # strided adds of non-overlapping frame sets
+        per_hop = -(-self.n_fft // self.hop_length)
+        extra = per_hop * self.hop_length - self.n_fft
+        frames = np.pad(frames, [(0, 0)] * (frames.ndim - 1) + [(extra, 0)])
+        n_frames = frames.shape[-2]
+        out = np.zeros(frames.shape[:-2] + ((n_frames - 1 + per_hop) * self.hop_length,))
+        for offset in range(per_hop):
+            chunk = frames[..., offset::per_hop, :]
+            chunk = chunk.reshape(chunk.shape[:-2] + (-1,))
+            start = offset * self.hop_length
+            out[..., start:start + chunk.shape[-1]] += chunk
+        left = self.n_fft - self.hop_length + extra
+        return out[..., left:left + length] / np.tile(self.norm, -(-length // self.hop_length))[:length]
+
+    def _windows(self, like: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        dtype = like.real.dtype if like.is_complex() else like.dtype
+        return tuple(torch.as_tensor(w, dtype=dtype, device=like.device)
+                     for w in (self.analysis, self.synthesis, self.norm))
+
+    def stft_torch(self, x: torch.Tensor) -> torch.Tensor:
+        """Complex spectrogram ``(..., n_fft // 2 + 1, frames)`` of a tensor ``(..., samples)``."""
+        analysis, _, _ = self._windows(x)
+        frames = pad(x, self._padding(x.shape[-1])).unfold(-1, self.n_fft, self.hop_length)
+        return torch.fft.rfft(frames * analysis, dim=-1).transpose(-1, -2)
+
+    def istft_torch(self, spec: torch.Tensor, length: int) -> torch.Tensor:
+        """Signal ``(..., length)`` of a spectrogram computed by `stft_torch`."""
+        _, synthesis, norm = self._windows(spec)
+        frames = torch.fft.irfft(spec.transpose(-1, -2), n=self.n_fft, dim=-1) * synthesis
+        batch_shape, n_frames = frames.shape[:-2], frames.shape[-2]
+        total = (n_frames - 1) * self.hop_length + self.n_fft
+        out = fold(frames.reshape(-1, n_frames, self.n_fft).transpose(1, 2), output_size=(1, total),
+                   kernel_size=(1, self.n_fft), stride=(1, self.hop_length))
+        left = self.n_fft - self.hop_length
+        out = out.reshape(batch_shape + (total,))[..., left:left + length]
+        return out / norm.repeat(-(-length // self.hop_length))[:length]
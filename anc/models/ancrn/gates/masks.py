@@ -0,0 +1,148 @@
+"""
+Compact storage of gate masks.
+
+Gate masks are spectrogram-shaped float64 arrays, 8 bytes per time-frequency bin, which adds up
+quickly when masks are kept as training targets or for plotting. `CompactMask` stores them as
+
+* ``"binary"`` -- one bit per bin, for the stationary gate's thresholded mask before smoothing
+  (64x smaller than float64);
+* ``"uint8"`` -- 256 levels over the mask's value range, for soft (smoothed or sigmoid) masks
+  (8x smaller, at most ``(high - low) / 510`` off).
+
+Values are only dequantized when indexed, so slicing a few frames out of a long mask touches only
+those frames. Masks are packed along the last (frame) axis.
+"""
+from typing import Sequence, Tuple
+
+import numpy as np
+
+MASK_KINDS = ("binary", "uint8")
+
+
+class CompactMask:
+    """
+    Quantized mask, dequantized on access.
+
+    Build one with `from_binary` or `from_soft`. Indexing returns float32 values, ``np.asarray``
+    returns the whole mask, `save` and `load` keep the compact form on disk.
+
+    Arguments:
+        data {np.ndarray} -- Packed bits (``"binary"``) or codes (``"uint8"``).
+        shape {Tuple[int, ...]} -- Shape of the mask.
+        kind {str} -- "binary" or "uint8".
+
+    Keyword Arguments:
+        low {float} -- Value of a 0 bit or code 0 (default: {0.0}).
+        high {float} -- Value of a 1 bit or code 255 (default: {1.0}).
+    """
+
+    def __init__(self, data: np.ndarray, shape: Tuple[int, ...], kind: str, low: float = 0.0, high: float = 1.0):
+        if kind not in MASK_KINDS:
+            raise ValueError(f"kind must be one of {MASK_KINDS}, got {kind}")
+        self.data = data
+        self.shape = tuple(int(n) for n in shape)
+        self.kind = kind
+        self.low = float(low)
+        self.high = float(high)
+
+    @classmethod
+    def from_binary(cls, mask: np.ndarray, low: float = 0.0, high: float = 1.0) -> "CompactMask":
+        """Bit-pack a boolean mask, ``True`` reading back as ``high`` and ``False`` as ``low``."""
+        mask = np.asarray(mask, dtype=bool)
+        return cls(np.packbits(mask, axis=-1), mask.shape, "binary", low, high)
+
+    @classmethod
+    def from_soft(cls, mask: np.ndarray, low: float = 0.0, high: float = 1.0) -> "CompactMask":
+        """Quantize a mask with values in ``[low, high]`` to uint8, values outside are clipped."""
+        mask = np.asarray(mask)
+        scale = 255.0 / (high - low) if high > low else 0.0
+        codes = np.rint(np.clip((mask - low) * scale, 0, 255)).astype(np.uint8)
+        return cls(codes, mask.shape, "uint8", low, high)
+
+    @classmethod
+    def concatenate(cls, masks: Sequence["CompactMask"]) -> "CompactMask":
+        """
+        Join masks of the same kind and range along the frame axis, without dequantizing them.
+
+        Packed bits are shifted into place a piece at a time, so joining the masks of many chunks
+        never holds more than one chunk unpacked.
+        """
+        first = masks[0]
+        layout = (first.kind, first.shape[:-1], first.low, first.high)
+        if any((mask.kind, mask.shape[:-1], mask.low, mask.high) != layout for mask in masks):
+            raise ValueError("Only masks of the same kind, range and leading shape can be concatenated")
+        n_frames = sum(mask.shape[-1] for mask in masks)
+        shape = first.shape[:-1] + (n_frames,)
+        if first.kind == "uint8":
+            return cls(np.concatenate([mask.data for mask in masks], axis=-1), shape, "uint8", first.low, first.high)
+        packed = []
+        # frames left over from the previous pieces, fewer than 8
+        carry = np.zeros(first.shape[:-1] + (0,), dtype=np.uint8)
+        for mask in masks:
+            bits = np.concatenate([carry, np.unpackbits(mask.data, axis=-1, count=mask.shape[-1])], axis=-1)
+            whole = bits.shape[-1] // 8 * 8
+            packed.append(np.packbits(bits[..., :whole], axis=-1))
+            carry = bits[..., whole:]
+        packed.append(np.packbits(carry, axis=-1))
+        return cls(np.concatenate(packed, axis=-1), shape, "binary", first.low, first.high)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the stored mask."""
+        return self.data.nbytes
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        return f"CompactMask(shape={self.shape}, kind={self.kind!r}, low={self.low}, high={self.high})"
+
+    def _dequantize(self, data: np.ndarray, count: int, dtype) -> np.ndarray:
+        if self.kind == "binary":
+            values = np.unpackbits(data, axis=-1, count=count)
+            return np.where(values.astype(bool), dtype(self.high), dtype(self.low))
+        return (data * dtype((self.high - self.low) / 255.0) + dtype(self.low)).astype(dtype, copy=False)
+
+    def dequantize(self, dtype=np.float32) -> np.ndarray:
+        """The whole mask as ``dtype`` values."""
+        return self._dequantize(self.data, self.shape[-1], np.dtype(dtype).type)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return self.dequantize(np.float32 if dtype is None else dtype)
+
+    def __getitem__(self, key) -> np.ndarray:
+        key = key if isinstance(key, tuple) else (key,)
+        if any(k is Ellipsis or k is None for k in key) or len(key) > self.ndim:
+            return self.dequantize()[key]
+        # leading axes index the stored array, the frame axis is indexed once dequantized
+        leading, frames = (key[:-1], key[-1]) if len(key) == self.ndim else (key, slice(None))
+        if self.kind == "uint8":
+            return self._dequantize(self.data[leading + (frames,)], self.shape[-1], np.float32)
+        return self._dequantize(self.data[leading], self.shape[-1], np.float32)[..., frames]
+
+    def save(self, path: str) -> None:
+        """Write the compact mask to a ``.npz`` file."""
+        np.savez(path, data=self.data, shape=np.asarray(self.shape), kind=self.kind, low=self.low, high=self.high)
+
+    @classmethod
+    def load(cls, path: str) -> "CompactMask":
+        """Read a mask written by `save`."""
+        with np.load(path) as f:
+            return cls(f["data"], tuple(f["shape"]), str(f["kind"]), float(f["low"]), float(f["high"]))
+
+
+def soft_mask_range(prop_decrease: float) -> Tuple[float, float]:
+    """
+    ``(low, high)`` of a gate's soft mask.
+
+    Gating scales the mask to ``[1 - prop_decrease, 1]``, but the stationary gate smooths it
+    afterwards and the zero padding of the smoothing pulls it towards 0 at the edges, so the range
+    always includes 0 and 1.
+    """
+    low = 1.0 - prop_decrease
+    return min(low, 0.0), max(low, 1.0)
+
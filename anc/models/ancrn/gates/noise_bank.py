@@ -0,0 +1,191 @@
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from librosa import stft
+
+# floor of the log-magnitudes, as `amp_to_db` of the torch gate
+_TOP_DB = 40.0
+_EPS = np.finfo(np.float64).eps
+
+
+def _amp_to_db(abs_stft: np.ndarray) -> np.ndarray:
+    """NumPy version of the torch gate's ``amp_to_db``: 20 log10, floored 40 dB below each bin's peak."""
+    db = 20 * np.log10(abs_stft + _EPS)
+    return np.maximum(db, db.max(axis=-1, keepdims=True) - _TOP_DB)
+
+
+def _band_matrix(n_bins: int, n_bands: int) -> np.ndarray:
+    """``(n_bands, n_bins)`` averaging matrix over log-spaced bands, DC excluded."""
+    edges = np.unique(np.round(np.geomspace(1, n_bins, n_bands + 1)).astype(int))
+    bands = np.zeros((len(edges) - 1, n_bins), dtype=np.float32)
+    for i, (lo, hi) in enumerate(zip(edges[:-1], edges[1:])):
+        bands[i, lo:hi] = 1.0 / (hi - lo)
+    return bands
+
+
+class NoiseProfileBank:
+    """
+    Bank of stationary noise profiles with nearest-profile lookup.
+
+    Each profile holds the per-bin mean and standard deviation of a noise's dB spectrogram, the
+    statistics the stationary gates otherwise compute from a ``y_noise`` clip on every run. Profiles
+    are stored as two ``(n_profiles, n_bins)`` float32 arrays.
+
+    Lookup compares band signatures: the mean dB in ``n_bands`` log-spaced bands relative to their
+    average, floored at -40 dB. The average over the bands within 40 dB of the loudest one is the
+    profile's level, so a recording of the same noise at another level
+    matches the same profile; the returned statistics are shifted by the level difference. The
+    nearest signature is found with one matrix-vector product over all profiles, so a lookup costs
+    a few microseconds plus the STFT of the query.
+
+    All profiles share the STFT configuration of the bank, which must match the gate's.
+
+    Arguments:
+        sr {int} -- Sample rate.
+
+    Keyword Arguments:
+        n_fft {int} -- Size of FFT (default: {1024}).
+        win_length {[int]} -- Window length, defaults to `n_fft` (default: {None}).
+        hop_length {[int]} -- Hop length, defaults to `win_length` // 4 (default: {None}).
+        n_bands {int} -- Bands of the lookup signatures (default: {32}).
+        query_s {float} -- Audio `reduce_noise` looks a profile up from (default: {0.5}).
+    """
+
+    def __init__(self, sr: int, n_fft: int = 1024, win_length: Optional[int] = None,
+                 hop_length: Optional[int] = None, n_bands: int = 32, query_s: float = 0.5):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.win_length = n_fft if win_length is None else win_length
+        self.hop_length = self.win_length // 4 if hop_length is None else hop_length
+        self.n_bins = n_fft // 2 + 1
+        self.query_s = query_s
+        self._bands = _band_matrix(self.n_bins, n_bands)
+        self.names: List[str] = []
+        self.mean_db = np.zeros((0, self.n_bins), dtype=np.float32)
+        self.std_db = np.zeros((0, self.n_bins), dtype=np.float32)
+        self._signatures = np.zeros((0, len(self._bands)), dtype=np.float32)
+        self._levels = np.zeros(0, dtype=np.float32)
+        self._sq_norms = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _config(self) -> Tuple[int, int, int, int]:
+        return self.sr, self.n_fft, self.win_length, self.hop_length
+
+    def check_gate(self, sr: int, n_fft: int, win_length: Optional[int] = None,
+                   hop_length: Optional[int] = None) -> None:
+        """Raise ValueError if a gate's STFT configuration differs from the bank's."""
+        win_length = n_fft if win_length is None else win_length
+        hop_length = win_length // 4 if hop_length is None else hop_length
+        if (sr, n_fft, win_length, hop_length) != self._config():
+            raise ValueError(
+                f"Bank profiles are for sr, n_fft, win_length, hop_length = {self._config()}, "
+                f"the gate uses {(sr, n_fft, win_length, hop_length)}"
+            )
+
+    def spectrogram_db(self, y: np.ndarray) -> np.ndarray:
+        """dB spectrogram ``(n_bins, n_frames)`` of a clip, channels are averaged first."""
+        y = np.asarray(y, dtype=np.float32)
+        if y.ndim == 2:
+            y = y.mean(axis=0)
+        return _amp_to_db(np.abs(stft(y, n_fft=self.n_fft, hop_length=self.hop_length,
+                                      win_length=self.win_length)))
+
+    def _signature(self, mean_db: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        bands = mean_db @ self._bands.T
+        # empty bands sit at an arbitrary floor, the level averages the bands within 40 dB of the loudest
+        active = bands > bands.max(axis=-1, keepdims=True) - _TOP_DB
+        level = np.sum(bands * active, axis=-1) / np.sum(active, axis=-1)
+        signature = np.maximum(bands - level[..., None], -_TOP_DB)
+        return signature.astype(np.float32), level.astype(np.float32)
+
+    def _append(self, names: List[str], mean_db: np.ndarray, std_db: np.ndarray) -> None:
+        if mean_db.shape[1:] != (self.n_bins,) or std_db.shape != mean_db.shape:
+            raise ValueError(f"Profile statistics must have {self.n_bins} bins, got {mean_db.shape} and {std_db.shape}")
+        signatures, levels = self._signature(mean_db)
+        self.names.extend(names)
+        self.mean_db = np.concatenate([self.mean_db, mean_db])
+        self.std_db = np.concatenate([self.std_db, std_db])
+        self._signatures = np.concatenate([self._signatures, signatures])
+        self._levels = np.concatenate([self._levels, levels])
+        self._sq_norms = np.concatenate([self._sq_norms, np.sum(signatures ** 2, axis=-1)])
+
+    def add_stats(self, name: str, mean_db: np.ndarray, std_db: np.ndarray) -> int:
+        """Add a profile from precomputed per-bin statistics, returns its index."""
+        self._append([name], np.asarray(mean_db, dtype=np.float32)[None], np.asarray(std_db, dtype=np.float32)[None])
+        return len(self.names) - 1
+
+    def add(self, name: str, y_noise: np.ndarray) -> int:
+        """Analyse a noise clip and add it as a profile, returns its index."""
+        noise_db = self.spectrogram_db(y_noise)
+        return self.add_stats(name, noise_db.mean(axis=-1), noise_db.std(axis=-1))
+
+    def nearest(self, y: np.ndarray) -> Tuple[int, float, float]:
+        """
+        Profile closest to a clip of incoming audio.
+
+        Arguments:
+            y {np.ndarray} -- A few hundred milliseconds of audio, ``(n_samples,)`` or
+                              ``(n_channels, n_samples)``.
+
+        Returns:
+            Tuple[int, float, float] -- ``(index, distance, level_offset_db)``: the profile, the RMS
+            distance of the band signatures in dB and the clip's level above the profile's.
+        """
+        if not len(self):
+            raise ValueError("The bank holds no profiles")
+        signature, level = self._signature(self.spectrogram_db(y).mean(axis=-1))
+        # |p - q|^2 = |p|^2 - 2 p.q + |q|^2, the query norm does not change the ranking
+        distances = self._sq_norms - 2 * (self._signatures @ signature)
+        index = int(np.argmin(distances))
+        distance = float(np.sqrt(max(distances[index] + signature @ signature, 0.0) / len(signature)))
+        return index, distance, float(level - self._levels[index])
+
+    def stats(self, index: int, level_offset_db: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        """``(std_db, mean_db)`` of a profile, the mean shifted by ``level_offset_db``."""
+        return self.std_db[index], self.mean_db[index] + np.float32(level_offset_db)
+
+    def threshold(self, index: int, n_std_thresh_stationary: float = 1.5, level_offset_db: float = 0.0) -> np.ndarray:
+        """Per-bin dB threshold of a profile, as the stationary gates compute it from ``y_noise``."""
+        std_db, mean_db = self.stats(index, level_offset_db)
+        return mean_db + std_db * np.float32(n_std_thresh_stationary)
+
+    def match(self, y: np.ndarray, n_std_thresh_stationary: float = 1.5) -> Dict[str, object]:
+        """Nearest profile of a clip with its level-corrected statistics and threshold."""
+        index, distance, offset = self.nearest(y)
+        std_db, mean_db = self.stats(index, offset)
+        return {
+            "index": index,
+            "name": self.names[index],
+            "distance_db": distance,
+            "level_offset_db": offset,
+            "std_db": std_db,
+            "mean_db": mean_db,
+            "threshold_db": mean_db + std_db * np.float32(n_std_thresh_stationary),
+        }
+
+    def save(self, path: str) -> None:
+        """Write the bank to a ``.npz`` file."""
+        np.savez_compressed(
+            path, config=np.array(self._config() + (len(self._bands),)), names=np.array(self.names, dtype=str),
+            mean_db=self.mean_db, std_db=self.std_db,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "NoiseProfileBank":
+        """Read a bank written by `save`."""
+        with np.load(path) as data:
+            sr, n_fft, win_length, hop_length, n_bands = (int(v) for v in data["config"])
+            bank = cls(sr, n_fft=n_fft, win_length=win_length, hop_length=hop_length, n_bands=n_bands)
+            bank._append([str(name) for name in data["names"]], data["mean_db"], data["std_db"])
+        return bank
+
+    @classmethod
+    def from_clips(cls, clips: Union[Dict[str, np.ndarray], Sequence[Tuple[str, np.ndarray]]], sr: int,
+                   **kwargs) -> "NoiseProfileBank":
+        """Bank of ``{name: noise clip}``, keyword arguments as for the constructor."""
+        bank = cls(sr, **kwargs)
+        for name, clip in (clips.items() if isinstance(clips, dict) else clips):
+            bank.add(name, clip)
+        return bank
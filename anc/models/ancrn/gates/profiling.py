@@ -0,0 +1,230 @@
+import logging
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _nbytes(array) -> int:
+    """Size of a numpy array or torch tensor in bytes, 0 for anything else."""
+    nbytes = getattr(array, "nbytes", None)
+    if nbytes is None and hasattr(array, "element_size"):
+        nbytes = array.element_size() * array.nelement()
+    return int(nbytes or 0)
+
+
+class _NullStage:
+    """Shared no-op stage, entering it costs one attribute lookup and two calls."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def track(self, *arrays):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class NullProfiler:
+    """Profiler used when instrumentation is disabled. Every method is a no-op."""
+
+    enabled = False
+
+    def stage(self, name: str) -> _NullStage:
+        return _NULL_STAGE
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class StageStats:
+    """Aggregated measurements of one pipeline stage."""
+
+    __slots__ = ("calls", "total_s", "max_s", "bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.bytes = 0
+
+    @property
+    def mean_s(self) -> float:
+        return self.total_s / self.calls if self.calls else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_s": self.total_s,
+            "mean_s": self.mean_s,
+            "max_s": self.max_s,
+            "bytes": self.bytes,
+        }
+
+
+class _Stage:
+    __slots__ = ("_profiler", "name", "nbytes", "_start")
+
+    def __init__(self, profiler: "GateProfiler", name: str):
+        self._profiler = profiler
+        self.name = name
+        self.nbytes = 0
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def track(self, *arrays) -> None:
+        """Account the arrays the stage allocated."""
+        for array in arrays:
+            self.nbytes += _nbytes(array)
+
+    def __exit__(self, *exc):
+        if self._profiler.synchronize is not None:
+            self._profiler.synchronize()
+        self._profiler._record(self.name, perf_counter() - self._start, self.nbytes)
+        return False
+
+
+class GateProfiler:
+    """
+    Collects per-stage wall time, allocated bytes and call (chunk) counts of the gates.
+
+    Attach it to a gate with ``gate.profiler = GateProfiler()`` or temporarily with ``profile(gate)``.
+    Every ``stage`` exit is forwarded to the callbacks as ``callback(name, elapsed_s, nbytes)``.
+
+    Stages timed inside joblib or multiprocessing worker processes (``n_jobs != 1``, the stationary
+    gate's channel pool) run on an empty copy of the profiler, without callbacks, and are not collected.
+
+    Arguments:
+        callbacks {[List[Callable]]} -- Called on every stage exit (default: {None}).
+        synchronize {[Callable]} -- Called before a stage is closed, e.g. ``torch.cuda.synchronize``
+                                    so asynchronous device work is attributed correctly (default: {None}).
+    """
+
+    enabled = True
+
+    def __init__(self, callbacks: Optional[List[Callable]] = None, synchronize: Optional[Callable] = None):
+        self.callbacks = list(callbacks or [])
+        self.synchronize = synchronize
+        self._stats: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # gates are pickled into worker processes, whose stats never come back: ship the profiler empty
+        state = dict(self.__dict__)
+        state.update(_lock=None, _stats={}, callbacks=[], synchronize=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def add_callback(self, callback: Callable) -> None:
+        self.callbacks.append(callback)
+
+    def _record(self, name: str, elapsed_s: float, nbytes: int) -> None:
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = StageStats()
+            stats.calls += 1
+            stats.total_s += elapsed_s
+            stats.bytes += nbytes
+            if elapsed_s > stats.max_s:
+                stats.max_s = elapsed_s
+        for callback in self.callbacks:
+            callback(name, elapsed_s, nbytes)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    @property
+    def stats(self) -> Dict[str, StageStats]:
+        with self._lock:
+            return dict(self._stats)
+
+    def as_dict(self) -> Dict[str, dict]:
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def summary(self) -> str:
+        """Plain-text report of every stage, slowest first."""
+        stats = sorted(self.stats.items(), key=lambda item: item[1].total_s, reverse=True)
+        lines = [
+            "{:<16} {:>8} {:>12} {:>12} {:>12} {:>12}".format(
+                "stage", "calls", "total ms", "mean ms", "max ms", "MB"
+            )
+        ]
+        for name, s in stats:
+            lines.append(
+                "{:<16} {:>8d} {:>12.2f} {:>12.3f} {:>12.3f} {:>12.2f}".format(
+                    name, s.calls, s.total_s * 1e3, s.mean_s * 1e3, s.max_s * 1e3, s.bytes / 2 ** 20
+                )
+            )
+        return "\n".join(lines)
+
+
+class LatencyAlarm:
+    """
+    Profiler callback raising an alarm when a stage exceeds a time budget.
+
+    Arguments:
+        threshold_s {float} -- Time budget of a single stage call in seconds.
+
+    Keyword Arguments:
+        stages {[List[str]]} -- Stages to watch, ``None`` watches every stage (default: {None}).
+        handler {[Callable]} -- Called as ``handler(name, elapsed_s)`` on a breach, logs a warning
+                                by default (default: {None}).
+    """
+
+    def __init__(self, threshold_s: float, stages: Optional[List[str]] = None, handler: Optional[Callable] = None):
+        self.threshold_s = threshold_s
+        self.stages = None if stages is None else set(stages)
+        self.handler = handler
+        self.breaches = 0
+
+    def __call__(self, name: str, elapsed_s: float, nbytes: int) -> None:
+        if elapsed_s <= self.threshold_s or (self.stages is not None and name not in self.stages):
+            return
+        self.breaches += 1
+        if self.handler is None:
+            logger.warning(
+                "Stage %s took %.2f ms, budget is %.2f ms", name, elapsed_s * 1e3, self.threshold_s * 1e3
+            )
+        else:
+            self.handler(name, elapsed_s)
+
+
+@contextmanager
+def profile(*gates, callbacks: Optional[List[Callable]] = None, synchronize: Optional[Callable] = None):
+    """
+    Attach a fresh ``GateProfiler`` to ``gates`` for the duration of the block.
+
+    The profilers the gates had before are restored on exit.
+
+    Example:
+        >>> with profile(sg) as prof:
+        ...     sg.get_traces()
+        >>> print(prof.summary())
+    """
+    profiler = GateProfiler(callbacks=callbacks, synchronize=synchronize)
+    previous = [gate.profiler for gate in gates]
+    for gate in gates:
+        gate.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        for gate, prev in zip(gates, previous):
+            gate.profiler = prev
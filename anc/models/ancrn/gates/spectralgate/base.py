@@ -2,6 +2,20 @@ import numpy as np
 from joblib import Parallel, delayed
 import tempfile
 from tqdm.auto import tqdm
+from anc.models.ancrn.gates.profiling import NULL_PROFILER
+from anc.models.ancrn.gates.bands import SHARED_MASKS, band_matrices
+from anc.models.ancrn.gates.framing import LowDelayFraming
+from anc.models.ancrn.gates.masks import CompactMask, soft_mask_range
+from anc.models.ancrn.utils import float_to_pcm_, pcm_scale, pcm_to_float
+from librosa import stft, istft
+from .cache import chunk_key, gate_fingerprint
+
+
+def _combine_channels(abs_sig_stft, shared_mask):
+    """Collapse the channel axis of a ``(channels, freq, frames)`` magnitude to ``(1, freq, frames)``"""
+    if shared_mask == "max":
+        return np.max(abs_sig_stft, axis=0, keepdims=True)
+    return np.mean(abs_sig_stft, axis=0, keepdims=True)
 
 
 def _smoothing_filter(n_grad_freq, n_grad_time):
@@ -46,12 +60,22 @@ class SpectralGate:
             tmp_folder,
             use_tqdm,
             n_jobs,
+            profiler=None,
+            backend=None,
+            cache=None,
+            shared_mask=None,
+            n_mask_bands=None,
+            band_scale="erb",
+            synthesis_length=None,
     ):
         self.sr = sr
+        # per-stage instrumentation, see `anc.models.ancrn.gates.profiling`
+        self.profiler = NULL_PROFILER if profiler is None else profiler
         # if this is a 1D single channel recording
         self.flat = False
 
-        y = np.array(y)
+        # not copied: integer PCM is converted chunk by chunk in `_read_chunk`
+        y = np.asarray(y)
         # reshape data to (#channels, #frames)
         if len(y.shape) == 1:
             self.y = np.expand_dims(y, 0)
@@ -62,11 +86,21 @@ class SpectralGate:
             self.y = y
 
         self._dtype = y.dtype
+        # full scale of integer PCM input (e.g. int16), which is gated in [-1, 1) and written back as integers
+        self._pcm_scale = pcm_scale(y.dtype)
         # get the number of channels and frames in data
         self.n_channels, self.n_frames = self.y.shape
         self._chunk_size = chunk_size
         self.padding = padding
         self.n_jobs = n_jobs
+        # joblib backend for parallel chunks, None keeps joblib's default
+        self.backend = backend
+        # `ChunkCache` of filtered chunks, reused across get_traces calls when chunking is on
+        self.cache = cache
+        # None gates every channel on its own, "mean"/"max" computes one mask from the combined channels
+        if shared_mask is not None and shared_mask not in SHARED_MASKS:
+            raise ValueError(f"shared_mask must be None or one of {SHARED_MASKS}, got {shared_mask}")
+        self._shared_mask = shared_mask
 
         self.use_tqdm = use_tqdm
         # where to create a temp file for parallel
@@ -85,10 +119,22 @@ class SpectralGate:
         else:
             self._hop_length = hop_length
 
+        # low-delay framing with a short synthesis window, see `anc.models.ancrn.gates.framing`
+        self._framing = None
+        if synthesis_length is not None:
+            if self._win_length != self._n_fft:
+                raise ValueError("synthesis_length needs win_length equal to n_fft")
+            self._framing = LowDelayFraming(self._n_fft, self._hop_length, synthesis_length)
+
         self._time_constant_s = time_constant_s
 
         self._prop_decrease = prop_decrease
 
+        # (analysis, synthesis) filterbank when masks are computed per perceptual band, see `bands.py`
+        self._mask_bands = None
+        if n_mask_bands is not None:
+            self._mask_bands = band_matrices(self.sr, self._n_fft, n_mask_bands, band_scale)
+
         if (freq_mask_smooth_hz is None) & (time_mask_smooth_ms is None):
             self.smooth_mask = False
         else:
@@ -126,6 +172,53 @@ class SpectralGate:
         else:
             self.smooth_mask = True
             self._smoothing_filter = _smoothing_filter(n_grad_freq, n_grad_time)
+            if self._mask_bands is not None:
+                # band masks are smoothed over time only, the interpolation to bins smooths over frequency
+                self._smoothing_filter = self._smoothing_filter.sum(axis=0, keepdims=True)
+
+    def _stft(self, y):
+        """Complex spectrogram ``(..., freq, frames)`` of ``(..., samples)``"""
+        if self._framing is not None:
+            return self._framing.stft(y)
+        return stft(y, n_fft = self._n_fft, hop_length = self._hop_length, win_length = self._win_length)
+
+    def _istft(self, sig_stft, length):
+        """Inverse of `_stft`, the low-delay framing returns exactly ``length`` samples"""
+        if self._framing is not None:
+            return self._framing.istft(sig_stft, length)
+        return istft(sig_stft, hop_length = self._hop_length, win_length = self._win_length)
+
+    def _frame_segment(self, y, first, last):
+        """Samples of ``(channels, samples)`` ``y`` covered by frames [first, last) of `_stft`, zero padded, as float"""
+        left = self._n_fft - self._hop_length if self._framing is not None else self._n_fft // 2
+        i1 = first * self._hop_length - left
+        i2 = (last - 1) * self._hop_length - left + self._n_fft
+        segment = np.zeros((y.shape[0], i2 - i1))
+        i1b, i2b = max(i1, 0), min(i2, y.shape[-1])
+        if i2b > i1b:
+            pcm_to_float(y[:, i1b:i2b], out=segment[:, i1b - i1: i2b - i1])
+        return segment
+
+    def _stft_segment(self, segment):
+        """Frames of `_stft` over a `_frame_segment`, the first one starting at its first sample"""
+        if self._framing is not None:
+            return self._framing.stft_padded(segment)
+        return stft(segment, n_fft = self._n_fft, hop_length = self._hop_length, win_length = self._win_length,
+                    center = False)
+
+    def _to_bands(self, abs_sig_stft):
+        """Average bin magnitudes ``(..., freq, frames)`` into the mask bands, a no-op without bands"""
+        if self._mask_bands is None:
+            return abs_sig_stft
+        analysis = self._mask_bands[0]
+        return np.stack([analysis @ a for a in abs_sig_stft.reshape((-1,) + abs_sig_stft.shape[-2:])]).reshape(
+            abs_sig_stft.shape[:-2] + (analysis.shape[0], abs_sig_stft.shape[-1]))
+
+    def _from_bands(self, sig_mask):
+        """Interpolate a band mask ``(bands, frames)`` back to the FFT bins, a no-op without bands"""
+        if self._mask_bands is None:
+            return sig_mask
+        return self._mask_bands[1] @ sig_mask
 
     def _read_chunk(self, i1, i2):
         """read chunk and pad with zerros"""
@@ -137,39 +230,179 @@ class SpectralGate:
             i2b = self.n_frames
         else:
             i2b = i2
-        chunk = np.zeros((self.n_channels, i2 - i1))
-        chunk[:, i1b - i1: i2b - i1] = self.y[:, i1b:i2b]
+        with self.profiler.stage("read_chunk") as stage:
+            chunk = np.zeros((self.n_channels, i2 - i1))
+            pcm_to_float(self.y[:, i1b:i2b], out=chunk[:, i1b - i1: i2b - i1])
+            stage.track(chunk)
         return chunk
 
-    def filter_chunk(self, start_frame, end_frame):
-        """Pad and perform filtering"""
-        i1 = start_frame - self.padding
-        i2 = end_frame + self.padding
-        padded_chunk = self._read_chunk(i1, i2)
-        filtered_padded_chunk = self._do_filter(padded_chunk)
-        return filtered_padded_chunk[:, start_frame - i1: end_frame - i1]
+    def _write_output(self, out, filtered_chunk):
+        """Write a filtered chunk into the output, back in integer PCM for integer input"""
+        if self._pcm_scale is None:
+            out[...] = filtered_chunk
+            return
+        if not filtered_chunk.flags.writeable:
+            # chunks from the cache are shared
+            filtered_chunk = filtered_chunk.copy()
+        out[...] = float_to_pcm_(filtered_chunk, self._dtype)
+
+    def filter_chunk(self, start_frame, end_frame, return_mask=None, mask_range=None):
+        """Pad and perform filtering
+
+        With ``return_mask`` ("soft" or "binary", see `get_traces`) the mask the chunk was gated with is
+        quantized too, and ``(filtered, mask)`` is returned with the mask frames of the samples in
+        ``mask_range`` (default: {(start_frame, end_frame)}), see `_owned_frames`.
+        """
+        with self.profiler.stage("chunk"):
+            i1 = start_frame - self.padding
+            i2 = end_frame + self.padding
+            padded_chunk = self._read_chunk(i1, i2)
+            if return_mask is None:
+                filtered_padded_chunk = self._do_filter(padded_chunk)
+                return filtered_padded_chunk[:, start_frame - i1: end_frame - i1]
+            filtered_padded_chunk, sig_mask = self._do_filter(padded_chunk, return_mask)
+            sig_mask = self._owned_frames(sig_mask, i1, *(mask_range or (start_frame, end_frame)))
+            return filtered_padded_chunk[:, start_frame - i1: end_frame - i1], self._compact_mask(sig_mask, return_mask)
 
-    def _get_filtered_chunk(self, ind):
+    def _get_filtered_chunk(self, ind, return_mask=None, mask_range=None):
         """Grabs a single chunk"""
         start0 = ind * self._chunk_size
         end0 = (ind + 1) * self._chunk_size
-        return self.filter_chunk(start_frame=start0, end_frame=end0)
+        return self.filter_chunk(start_frame=start0, end_frame=end0, return_mask=return_mask, mask_range=mask_range)
 
-    def _do_filter(self, chunk):
-        """Do the actual filtering"""
+    def _do_filter(self, chunk, return_mask=None):
+        """Do the actual filtering, returning ``(filtered, mask)`` with `_export_mask` masks if ``return_mask``"""
         raise NotImplementedError
 
-    def _iterate_chunk(self, filtered_chunk, pos, end0, start0, ich):
-        filtered_chunk0 = self._get_filtered_chunk(ich)
-        filtered_chunk[:, pos: pos + end0 - start0] = filtered_chunk0[:, start0:end0]
+    def _export_mask(self, sig_mask, return_mask):
+        """Quantize a ``(freq, frames)`` mask as it is exported: bools for "binary", uint8 codes for "soft" """
+        if return_mask == "binary":
+            return np.asarray(sig_mask, dtype=bool)
+        return CompactMask.from_soft(sig_mask, *soft_mask_range(self._prop_decrease)).data
+
+    def _n_stft_frames(self, length):
+        """Frames of `_stft` of ``length`` samples"""
+        if self._framing is not None:
+            return self._framing.n_frames(length)
+        return 1 + length // self._hop_length
+
+    def _owned_frames(self, sig_mask, i1, start_frame, end_frame):
+        """Frames of a mask computed from samples ``i1`` on that belong to the samples [start_frame, end_frame)
+
+        The samples own the frames of `_stft` of the whole signal centred (or ending, with the low-delay
+        framing) in them, the last samples also the frames past the end of the signal. Each is taken from
+        the mask's frame nearest to it, the same frame when ``i1`` is a multiple of the hop length, so the
+        masks of consecutive ranges join up to the frames of the whole signal.
+        """
+        hop = self._hop_length
+        first = -(-start_frame // hop)
+        last = self._n_stft_frames(self.n_frames) if end_frame >= self.n_frames else -(-end_frame // hop)
+        offset = (first * hop - i1 + hop // 2) // hop
+        return sig_mask[..., max(offset, 0): max(offset + last - first, 0)]
+
+    def _compact_mask(self, sig_mask, return_mask):
+        """`CompactMask` of exported mask frames ``(channels, freq, frames)``"""
+        if return_mask == "binary":
+            return CompactMask.from_binary(sig_mask)
+        return CompactMask(sig_mask, sig_mask.shape, "uint8", *soft_mask_range(self._prop_decrease))
+
+    def closed_mask(self, start_frame, end_frame, return_mask, n_channels=None):
+        """Mask of the samples [start_frame, end_frame) when they skip the gate for its closed output
+
+        Arguments:
+            start_frame {int} -- First sample of the range
+            end_frame {int} -- End sample of the range
+            return_mask {str} -- "soft" or "binary", see `get_traces`
+            n_channels {[int]} -- Channels of the gate's masks (default: {None}, those of the input, or
+                                  one with a shared mask)
+        """
+        if n_channels is None:
+            n_channels = 1 if self._shared_mask is not None else self.n_channels
+        n_bins = self._n_fft // 2 + 1
+        if return_mask == "binary" and self._mask_bands is not None:
+            n_bins = self._mask_bands[0].shape[0]
+        n_frames = self._owned_frames(np.empty((0, self._n_stft_frames(self.n_frames))), 0,
+                                      start_frame, end_frame).shape[-1]
+        shape = (n_channels, n_bins, n_frames)
+        if return_mask == "binary":
+            sig_mask = CompactMask.from_binary(np.zeros(shape, dtype=bool))
+        else:
+            low, high = soft_mask_range(self._prop_decrease)
+            code = CompactMask.from_soft(np.full(1, 1.0 - self._prop_decrease), low, high).data[0]
+            sig_mask = CompactMask(np.full(shape, code, dtype=np.uint8), shape, "uint8", low, high)
+        return self._flat_mask(sig_mask)
+
+    def _flat_mask(self, sig_mask):
+        """Drop the channel axis of a mask of 1D input"""
+        if not self.flat:
+            return sig_mask
+        return CompactMask(sig_mask.data[0], sig_mask.shape[1:], sig_mask.kind, sig_mask.low, sig_mask.high)
+
+    def _iterate_chunk(self, filtered_chunk, pos, end0, start0, ich, return_mask=None):
+        mask_range = (ich * self._chunk_size + start0, ich * self._chunk_size + end0)
+        filtered_chunk0 = self._get_filtered_chunk(ich, return_mask=return_mask, mask_range=mask_range)
+        sig_mask = None
+        if return_mask is not None:
+            filtered_chunk0, sig_mask = filtered_chunk0
+        with self.profiler.stage("write"):
+            self._write_output(filtered_chunk[:, pos: pos + end0 - start0], filtered_chunk0[:, start0:end0])
         pos += end0 - start0
+        return sig_mask
+
+    def _get_cached_traces(self, start_frame, end_frame):
+        """Assemble a range from cached chunks, filtering only the chunks not cached yet"""
+        ich1 = int(start_frame / self._chunk_size)
+        ich2 = int((end_frame - 1) / self._chunk_size)
+        fingerprint = gate_fingerprint(self)
+        keys = {}
+        chunks = {}
+        for ich in range(ich1, ich2 + 1):
+            i1 = ich * self._chunk_size - self.padding
+            keys[ich] = chunk_key(fingerprint, ich, self._read_chunk(i1, i1 + self._chunk_size + 2 * self.padding))
+            chunks[ich] = self.cache.get(keys[ich])
 
-    def get_traces(self, start_frame=None, end_frame=None):
-        """Grab filtered data iterating over chunks"""
+        missing = [ich for ich, chunk in chunks.items() if chunk is None]
+        filtered_missing = Parallel(n_jobs=self.n_jobs, backend=self.backend)(
+            delayed(self._get_filtered_chunk)(ich) for ich in tqdm(missing, disable=not (self.use_tqdm))
+        )
+        for ich, filtered_chunk0 in zip(missing, filtered_missing):
+            self.cache.put(keys[ich], filtered_chunk0)
+            chunks[ich] = filtered_chunk0
+
+        with self.profiler.stage("write") as stage:
+            filtered = np.empty((self.n_channels, end_frame - start_frame), dtype=self._dtype)
+            for ich, filtered_chunk0 in chunks.items():
+                start0 = max(start_frame - ich * self._chunk_size, 0)
+                end0 = min(end_frame - ich * self._chunk_size, self._chunk_size)
+                pos = ich * self._chunk_size + start0 - start_frame
+                self._write_output(filtered[:, pos: pos + end0 - start0], filtered_chunk0[:, start0:end0])
+            if self.flat:
+                filtered = filtered.flatten()
+            stage.track(filtered)
+        return filtered
+
+    def get_traces(self, start_frame=None, end_frame=None, return_mask=None):
+        """Grab filtered data iterating over chunks
+
+        Keyword Arguments:
+            return_mask {[str]} -- Also return the mask the range was gated with, quantized chunk by chunk
+                                   as it is computed, as ``(filtered, CompactMask)``: "soft" for the applied
+                                   mask quantized to uint8, "binary" for the stationary gate's bit-packed
+                                   threshold mask before smoothing (on the mask bands if any). The mask is
+                                   ``(channels, freq, frames)``, ``(freq, frames)`` for 1D input and one
+                                   channel with a shared mask; its frames are those of the chunks, see
+                                   `_owned_frames`. Chunks are always gated again, the cache is not used
+                                   (default: {None}, audio only)
+        """
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = self.n_frames
+        if return_mask not in (None, "soft", "binary"):
+            raise ValueError(f"return_mask must be None, 'soft' or 'binary', got {return_mask}")
+
+        if self._chunk_size is not None and self.cache is not None and return_mask is None:
+            return self._get_cached_traces(start_frame, end_frame)
 
         if self._chunk_size is not None:
             if end_frame - start_frame > self._chunk_size:
@@ -203,9 +436,9 @@ class SpectralGate:
                         end_list.append(end0)
                         pos += end0 - start0
 
-                    Parallel(n_jobs=self.n_jobs)(
+                    sig_masks = Parallel(n_jobs=self.n_jobs, backend=self.backend)(
                         delayed(self._iterate_chunk)(
-                            filtered_chunk, pos, end0, start0, ich
+                            filtered_chunk, pos, end0, start0, ich, return_mask
                         )
                         for pos, start0, end0, ich in zip(
                             tqdm(pos_list, disable=not (self.use_tqdm)),
@@ -214,13 +447,26 @@ class SpectralGate:
                             range(ich1, ich2 + 1),
                         )
                     )
-                    if self.flat:
-                        return filtered_chunk.astype(self._dtype).flatten()
-                    else:
-                        return filtered_chunk.astype(self._dtype)
-
-        filtered_chunk = self.filter_chunk(start_frame=0, end_frame=end_frame)
-        if self.flat:
-            return filtered_chunk.astype(self._dtype).flatten()
-        else:
-            return filtered_chunk.astype(self._dtype)
\ No newline at end of file
+                    # the chunks were written to the memmap above, this is the copy out of it
+                    with self.profiler.stage("copy_out") as stage:
+                        if self.flat:
+                            filtered = filtered_chunk.astype(self._dtype).flatten()
+                        else:
+                            filtered = filtered_chunk.astype(self._dtype)
+                        stage.track(filtered)
+                    if return_mask is None:
+                        return filtered
+                    return filtered, self._flat_mask(CompactMask.concatenate(sig_masks))
+
+        filtered_chunk = self.filter_chunk(start_frame=start_frame, end_frame=end_frame, return_mask=return_mask)
+        if return_mask is not None:
+            filtered_chunk, sig_mask = filtered_chunk
+        with self.profiler.stage("write") as stage:
+            filtered = np.empty(filtered_chunk.shape, dtype=self._dtype)
+            self._write_output(filtered, filtered_chunk)
+            if self.flat:
+                filtered = filtered.reshape(-1)
+            stage.track(filtered)
+        if return_mask is None:
+            return filtered
+        return filtered, self._flat_mask(sig_mask)
\ No newline at end of file
@@ -0,0 +1,201 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+# attributes that change how a gate runs but not what it computes
+_RUNTIME_ATTRS = {"y", "profiler", "_profiler", "n_jobs", "backend", "use_tqdm", "_tmp_folder", "cache", "device",
+                  "_input_dtype"}
+
+
+def _update(h, value):
+    """Feed a gate attribute into a hash, recursing into containers and plain objects."""
+    if value is None or isinstance(value, (bool, int, float, str, bytes, np.generic)):
+        h.update(repr((type(value).__name__, value)).encode())
+    elif isinstance(value, np.ndarray):
+        h.update(repr((value.dtype.str, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif hasattr(value, "detach") and hasattr(value, "cpu"):
+        # torch tensors, compared by value rather than by device
+        _update(h, value.detach().cpu().numpy())
+    elif isinstance(value, (list, tuple)):
+        h.update(b"[")
+        for v in value:
+            _update(h, v)
+        h.update(b"]")
+    elif isinstance(value, dict):
+        h.update(b"{")
+        for k in sorted(value, key=str):
+            if k not in _RUNTIME_ATTRS:
+                h.update(str(k).encode())
+                _update(h, value[k])
+        h.update(b"}")
+    elif hasattr(value, "__dict__") and (not callable(value) or hasattr(value, "forward")):
+        # plain objects and torch modules (callable, but configured through their attributes)
+        h.update(type(value).__qualname__.encode())
+        _update(h, vars(value))
+    else:
+        h.update(repr(type(value)).encode())
+
+
+def gate_fingerprint(gate) -> str:
+    """
+    Digest of everything a gate's output depends on apart from the input chunk itself.
+
+    Hashes the gate class and its attributes (parameters, smoothing filter, noise statistics, the
+    wrapped `TorchGate` of a `StreamedTorchGate`, ...) and leaves out the signal, purely
+    operational settings such as ``n_jobs`` or the profiler, and the attributes a gate class lists
+    in ``_fingerprint_exclude`` because other attributes already capture them.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(type(gate).__qualname__.encode())
+    exclude = getattr(gate, "_fingerprint_exclude", ())
+    _update(h, {k: v for k, v in vars(gate).items() if k not in exclude})
+    return h.hexdigest()
+
+
+def chunk_key(fingerprint: str, ich: int, padded_chunk: np.ndarray) -> str:
+    """Cache key of one filtered chunk: gate fingerprint, chunk index and a digest of its padded input."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{fingerprint}:{ich}".encode())
+    _update(h, padded_chunk)
+    return h.hexdigest()
+
+
+class ChunkCache:
+    """
+    LRU cache of filtered chunks, shared between gates and calls of `SpectralGate.get_traces`.
+
+    Chunks are kept in memory up to ``max_bytes``. Least recently used chunks are then dropped or,
+    with a ``spill_dir``, written there as ``.npy`` files and read back on the next hit. A spill
+    directory outlives the process, so a later session over the same recording starts warm.
+
+    Keys identify the gate parameters, the chunk index and the chunk input (see ``chunk_key``), so a
+    single cache can serve several gates and recordings.
+
+    Keyword Arguments:
+        max_bytes {int} -- Memory budget (default: {256 MiB}).
+        spill_dir {[str]} -- Directory evicted chunks are spilled to, None drops them (default: {None}).
+        max_spill_bytes {[int]} -- Disk budget of the spill directory, None for unbounded (default: {None}).
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2 ** 20, spill_dir: Optional[str] = None,
+                 max_spill_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()
+        self.nbytes = 0
+        self.spill_nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # the threading joblib backend fills the cache from several workers
+        self._lock = threading.RLock()
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+            files = sorted(
+                (f for f in os.scandir(spill_dir) if f.name.endswith(".npy")), key=lambda f: f.stat().st_mtime
+            )
+            for f in files:
+                self._disk[f.name[:-4]] = f.stat().st_size
+                self.spill_nbytes += f.stat().st_size
+
+    def __getstate__(self):
+        # gates are pickled into joblib workers, which never read the cache: ship it empty
+        state = dict(self.__dict__)
+        state.update(_lock=None, _memory=OrderedDict(), nbytes=0)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._memory) + len(self._disk)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._memory or key in self._disk
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, key + ".npy")
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Filtered chunk of ``key`` (read-only) or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            if key in self._disk:
+                try:
+                    chunk = np.load(self._path(key))
+                except OSError:
+                    self._drop_spilled(key)
+                else:
+                    self._drop_spilled(key)
+                    self.disk_hits += 1
+                    self._insert(key, chunk)
+                    return self._memory[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, chunk: np.ndarray) -> None:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._insert(key, np.array(chunk))
+
+    def clear(self) -> None:
+        """Empty the memory tier and delete the spilled chunks."""
+        with self._lock:
+            self._memory.clear()
+            self.nbytes = 0
+            for key in list(self._disk):
+                self._drop_spilled(key)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "chunks": len(self._memory),
+            "spilled_chunks": len(self._disk),
+            "nbytes": self.nbytes,
+            "spill_nbytes": self.spill_nbytes,
+        }
+
+    def _insert(self, key: str, chunk: np.ndarray) -> None:
+        chunk.flags.writeable = False
+        self._memory[key] = chunk
+        self.nbytes += chunk.nbytes
+        # the newest chunk always stays, even if it alone exceeds the budget
+        while self.nbytes > self.max_bytes and len(self._memory) > 1:
+            old_key, old = self._memory.popitem(last=False)
+            self.nbytes -= old.nbytes
+            if self.spill_dir is not None:
+                self._spill(old_key, old)
+
+    def _spill(self, key: str, chunk: np.ndarray) -> None:
+        path = self._path(key)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fp:
+            np.save(fp, chunk)
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        self._disk[key] = size
+        self.spill_nbytes += size
+        while self.max_spill_bytes is not None and self.spill_nbytes > self.max_spill_bytes and self._disk:
+            self._drop_spilled(next(iter(self._disk)))
+
+    def _drop_spilled(self, key: str) -> None:
+        self.spill_nbytes -= self._disk.pop(key)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
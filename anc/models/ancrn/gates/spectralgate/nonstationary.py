@@ -1,6 +1,5 @@
-from anc.models.ancrn.gates.spectralgate.base import SpectralGate
+from anc.models.ancrn.gates.spectralgate.base import SpectralGate, _combine_channels
 import numpy as np
-from librosa import stft, istft
 from scipy.signal import filtfilt, fftconvolve
 from .utils import sigmoid
 from .config import FFTConfig, NoiseConfigStationary, NoiseConfigNonStationary
@@ -17,56 +16,97 @@ class SpectralGateNonStationary(SpectralGate):
             self._sigmoid_slope_nonstationary = kwargs.pop('sigmoid_slope_nonstationary')
         super().__init__(*args, **kwargs)
 
-    def spectral_gating_nonstationary(self, chunk):
+    def spectral_gating_nonstationary(self, chunk, return_mask=None):
         """Non-stationary version of spectral gating."""
+        if self._shared_mask is not None:
+            return self._gate_shared(chunk, return_mask)
         denoised_channels = np.zeros_like(chunk)
+        sig_masks = []
         for ci, channel in enumerate(chunk):
-            abs_sig_stft, sig_stft_denoised = self._process_channel(channel)
-            denoised_signal = istft(
-                sig_stft_denoised,
-                hop_length=self._hop_length,
-                win_length=self._win_length,
-            )
+            abs_sig_stft, sig_stft_denoised, sig_mask = self._process_channel(channel, return_mask)
+            with self.profiler.stage("istft") as stage:
+                denoised_signal = self._istft(sig_stft_denoised, chunk.shape[-1])
+                stage.track(denoised_signal)
             denoised_channels[ci, :len(denoised_signal)] = denoised_signal
-        return denoised_channels
+            sig_masks.append(sig_mask)
+        if return_mask is None:
+            return denoised_channels
+        return denoised_channels, np.stack(sig_masks)
 
-    def _process_channel(self, channel):
-        """Process an individual channel for denoising."""
-        sig_stft = stft(
-            channel,
-            n_fft=self._n_fft,
-            hop_length=self._hop_length,
-            win_length=self._win_length,
-        )
-        abs_sig_stft = np.abs(sig_stft)
-        sig_stft_smooth = get_time_smoothed_representation(
-            abs_sig_stft,
-            self.sr,
-            self._hop_length,
-            time_constant_s=self._time_constant_s,
-        )
+    def _process_channel(self, channel, return_mask=None):
+        """Process an individual channel for denoising, also returning its `_export_mask` mask if ``return_mask``."""
+        with self.profiler.stage("stft") as stage:
+            sig_stft = self._stft(channel)
+            abs_sig_stft = self._to_bands(np.abs(sig_stft))
+            stage.track(sig_stft, abs_sig_stft)
+        with self.profiler.stage("time_smoothing") as stage:
+            sig_stft_smooth = get_time_smoothed_representation(
+                abs_sig_stft,
+                self.sr,
+                self._hop_length,
+                time_constant_s=self._time_constant_s,
+            )
+            stage.track(sig_stft_smooth)
         sig_mask = self._compute_mask(abs_sig_stft, sig_stft_smooth)
-        sig_stft_denoised = sig_stft * sig_mask
-        return abs_sig_stft, sig_stft_denoised
+        with self.profiler.stage("apply_mask") as stage:
+            sig_stft_denoised = sig_stft * sig_mask
+            stage.track(sig_stft_denoised)
+        if return_mask is not None:
+            return abs_sig_stft, sig_stft_denoised, self._export_mask(sig_mask, return_mask)
+        return abs_sig_stft, sig_stft_denoised, None
+
+    def _gate_shared(self, chunk, return_mask=None):
+        """Gate all channels with one mask computed from their combined magnitude."""
+        chunk = np.asarray(chunk)
+        with self.profiler.stage("stft") as stage:
+            sig_stft = self._stft(chunk)
+            abs_sig_stft = self._to_bands(_combine_channels(np.abs(sig_stft), self._shared_mask))
+            stage.track(sig_stft, abs_sig_stft)
+        with self.profiler.stage("time_smoothing") as stage:
+            sig_stft_smooth = get_time_smoothed_representation(
+                abs_sig_stft,
+                self.sr,
+                self._hop_length,
+                time_constant_s=self._time_constant_s,
+            )
+            stage.track(sig_stft_smooth)
+        sig_mask = self._compute_mask(abs_sig_stft[0], sig_stft_smooth[0])
+        with self.profiler.stage("apply_mask") as stage:
+            sig_stft_denoised = sig_stft * sig_mask
+            stage.track(sig_stft_denoised)
+        with self.profiler.stage("istft") as stage:
+            denoised_signal = self._istft(sig_stft_denoised, chunk.shape[-1])
+            stage.track(denoised_signal)
+        denoised_channels = np.zeros_like(chunk)
+        denoised_channels[:, :denoised_signal.shape[-1]] = denoised_signal
+        if return_mask is None:
+            return denoised_channels
+        return denoised_channels, self._export_mask(sig_mask, return_mask)[np.newaxis]
 
     def _compute_mask(self, abs_sig_stft, sig_stft_smooth):
         """Compute the mask for spectral gating."""
-        sig_mult_above_thresh = (abs_sig_stft - sig_stft_smooth) / sig_stft_smooth
-        sig_mask = sigmoid(
-            sig_mult_above_thresh,
-            -self._thresh_n_mult_nonstationary,
-            self._sigmoid_slope_nonstationary,
-        )
+        with self.profiler.stage("mask") as stage:
+            sig_mult_above_thresh = (abs_sig_stft - sig_stft_smooth) / sig_stft_smooth
+            sig_mask = sigmoid(
+                sig_mult_above_thresh,
+                -self._thresh_n_mult_nonstationary,
+                self._sigmoid_slope_nonstationary,
+            )
+            stage.track(sig_mult_above_thresh, sig_mask)
 
         if self.smooth_mask:
-            sig_mask = fftconvolve(sig_mask, self._smoothing_filter, mode="same")
+            with self.profiler.stage("mask_smoothing") as stage:
+                sig_mask = fftconvolve(sig_mask, self._smoothing_filter, mode="same")
+                stage.track(sig_mask)
 
         sig_mask = sig_mask * self._prop_decrease + (1.0 - self._prop_decrease)
-        return sig_mask
+        return self._from_bands(sig_mask)
 
-    def _do_filter(self, chunk):
+    def _do_filter(self, chunk, return_mask=None):
         """Do the actual filtering."""
-        return self.spectral_gating_nonstationary(chunk)
+        if return_mask == "binary":
+            raise ValueError("The non-stationary mask is a soft sigmoid mask, there is no binary mask to export")
+        return self.spectral_gating_nonstationary(chunk, return_mask)
 
 
 def get_time_smoothed_representation(
@@ -1,107 +1,179 @@
 import numpy as np
-from anc.models.ancrn.gates.spectralgate.base import SpectralGate
-from librosa import stft, istft
+from anc.models.ancrn.gates.spectralgate.base import SpectralGate, _combine_channels
 from scipy.signal import fftconvolve
-from .utils import _amp_to_db
+from .utils import _TOP_DB, _amp_to_db
 import multiprocessing
 from .config import FFTConfig, NoiseConfigStationary, NoiseConfigNonStationary
 
 
 class SpectralGateStationary(SpectralGate):
+    # the noise clip only matters through noise_thresh, which the cache fingerprint hashes instead
+    _fingerprint_exclude = ("y_noise",)
+
     def __init__(self, *args, **kwargs):
+        noise_config_stationary = kwargs.pop('noise_config_stationary', None)
+        n_std_thresh_stationary = kwargs.pop('n_std_thresh_stationary', None)
+        y_noise = kwargs.pop('y_noise', None)
+        clip_noise_stationary = kwargs.pop('clip_noise_stationary', None)
+        # per-bin dB threshold, e.g. from a `NoiseProfileBank`, replaces the analysis of y_noise
+        noise_thresh = kwargs.pop('noise_thresh', None)
         super().__init__(*args, **kwargs)
-        noise_config_stationary = kwargs.get('noise_config_stationary')
 
         if noise_config_stationary:
             self.n_std_thresh_stationary = noise_config_stationary.n_std_thresh_stationary
             self.y_noise = self._prepare_noise(noise_config_stationary.y_noise,
                                                noise_config_stationary.clip_noise_stationary)
         else:
-            self.n_std_thresh_stationary = kwargs.get('n_std_thresh_stationary')
-            y_noise = kwargs.get('y_noise')
-            self.y_noise = self._prepare_noise(y_noise, kwargs.get('clip_noise_stationary'))
+            self.n_std_thresh_stationary = n_std_thresh_stationary
+            self.y_noise = self._prepare_noise(y_noise, clip_noise_stationary)
 
-        self.noise_thresh = self._compute_noise_threshold()
+        if noise_thresh is None:
+            self.noise_thresh = self._compute_noise_threshold()
+        else:
+            self.noise_thresh = np.asarray(noise_thresh, dtype = np.float64)
+            n_bins = self._n_fft // 2 + 1 if self._mask_bands is None else self._mask_bands[0].shape[0]
+            if self.noise_thresh.shape != (n_bins,):
+                raise ValueError(f"noise_thresh must have {n_bins} bins, got {self.noise_thresh.shape}")
 
     def _prepare_noise(self, y_noise, clip_noise_stationary):
-        """Prepares the noise waveform."""
+        """Prepares the noise waveform ``(channels, samples)``, the signal itself (not copied) by default."""
         if y_noise is None:
             return self.y
-        else:
-            y_noise = np.array(y_noise)
-            if len(y_noise.shape) == 1:
-                y_noise = np.expand_dims(y_noise, 0)
-            elif len(y_noise.shape) > 2:
-                raise ValueError("Waveform must be in shape (# frames, # channels)")
+        y_noise = np.array(y_noise)
+        if len(y_noise.shape) == 1:
+            y_noise = np.expand_dims(y_noise, 0)
+        elif len(y_noise.shape) > 2:
+            raise ValueError("Waveform must be in shape (# frames, # channels)")
 
-            if clip_noise_stationary:
-                y_noise = y_noise[:, :self.chunk_size]
+        if clip_noise_stationary:
+            y_noise = y_noise[:, :self._chunk_size]
+        return y_noise
 
-            # Collapse y_noise to one channel
-            return np.mean(y_noise, axis = 0)
+    def _noise_blocks(self):
+        """Band magnitudes ``(freq, frames)`` of the noise, a chunk of frames at a time.
+
+        With a shared mask the channels' magnitudes are combined like the gated signal's, otherwise
+        the channels are averaged before the STFT.
+        """
+        n_frames = self._n_stft_frames(self.y_noise.shape[-1])
+        step = max((self._chunk_size or self.y_noise.shape[-1]) // self._hop_length, 1)
+        for first in range(0, n_frames, step):
+            # integer PCM is scaled like the gated chunks
+            segment = self._frame_segment(self.y_noise, first, min(first + step, n_frames))
+            if self._shared_mask is not None:
+                abs_noise_stft = _combine_channels(np.abs(self._stft_segment(segment)), self._shared_mask)[0]
+            else:
+                abs_noise_stft = np.abs(self._stft_segment(np.mean(segment, axis = 0)))
+            yield self._to_bands(abs_noise_stft)
 
     def _compute_noise_threshold(self):
-        """Computes the threshold for noise."""
-        abs_noise_stft = np.abs(
-            stft(
-                self.y_noise,
-                n_fft = self._n_fft,
-                hop_length = self._hop_length,
-                win_length = self._win_length,
-            )
-        )
-        noise_stft_db = _amp_to_db(abs_noise_stft)
-        mean_freq_noise = np.mean(noise_stft_db, axis = 1)
-        std_freq_noise = np.std(noise_stft_db, axis = 1)
+        """Computes the threshold for noise.
+
+        The per-bin dB mean and std over every frame of the noise are accumulated chunk by chunk, so
+        no full-length copy of a long signal is made: a first pass finds the loudest bin, which sets
+        the ``top_db`` floor of the dB conversion, the second merges the statistics of the chunks.
+        """
+        peak = max(np.max(block) for block in self._noise_blocks())
+        floor = _amp_to_db(np.array([peak]), top_db = None)[0] - _TOP_DB
+        count, mean_freq_noise, m2 = 0, 0.0, 0.0
+        for block in self._noise_blocks():
+            noise_stft_db = np.maximum(_amp_to_db(block, top_db = None), floor)
+            n = noise_stft_db.shape[1]
+            block_mean = np.mean(noise_stft_db, axis = 1)
+            delta = block_mean - mean_freq_noise
+            total = count + n
+            mean_freq_noise = mean_freq_noise + delta * n / total
+            m2 = (m2 + np.sum((noise_stft_db - block_mean[:, np.newaxis]) ** 2, axis = 1)
+                  + delta ** 2 * count * n / total)
+            count = total
+        std_freq_noise = np.sqrt(m2 / count)
 
         return mean_freq_noise + std_freq_noise * self.n_std_thresh_stationary
 
-    def spectral_gating_stationary(self, chunk):
+    def spectral_gating_stationary(self, chunk, return_mask=None):
         """Non-stationary version of spectral gating."""
+        if self._shared_mask is not None:
+            return self._gate_shared(chunk, return_mask)
         denoised_channels = np.zeros_like(chunk)
         with multiprocessing.Pool() as pool:
-            results = pool.map(_parallel_channel_processing, [(ci, channel, self) for ci, channel in enumerate(chunk)])
-        for ci, denoised_signal in results:
+            results = pool.map(_parallel_channel_processing,
+                               [(ci, channel, self, return_mask) for ci, channel in enumerate(chunk)])
+        for ci, denoised_signal, _ in results:
             denoised_channels[ci, :len(denoised_signal)] = denoised_signal
-        return denoised_channels
-
-    def _process_channel(self, channel):
-        """Process an individual channel for denoising."""
-        sig_stft = stft(
-            channel,
-            n_fft = self._n_fft,
-            hop_length = self._hop_length,
-            win_length = self._win_length,
-        )
-        sig_stft_db = _amp_to_db(np.abs(sig_stft))
-        sig_mask = self._compute_mask(sig_stft_db)
-        sig_stft_denoised = sig_stft * sig_mask
-        return sig_stft, sig_stft_denoised
+        if return_mask is None:
+            return denoised_channels
+        return denoised_channels, np.stack([sig_mask for _, _, sig_mask in results])
 
-    def _compute_mask(self, sig_stft_db):
-        """Compute the mask for spectral gating."""
+    def _process_channel(self, channel, return_mask=None):
+        """Process an individual channel for denoising, also returning its `_export_mask` mask if ``return_mask``."""
+        with self.profiler.stage("stft") as stage:
+            sig_stft = self._stft(channel)
+            sig_stft_db = _amp_to_db(self._to_bands(np.abs(sig_stft)))
+            stage.track(sig_stft, sig_stft_db)
+        binary_mask, sig_mask = self._compute_masks(sig_stft_db)
+        with self.profiler.stage("apply_mask") as stage:
+            sig_stft_denoised = sig_stft * sig_mask
+            stage.track(sig_stft_denoised)
+        return sig_stft, sig_stft_denoised, self._exported(binary_mask, sig_mask, return_mask)
+
+    def _exported(self, binary_mask, sig_mask, return_mask):
+        if return_mask is None:
+            return None
+        return self._export_mask(binary_mask if return_mask == "binary" else sig_mask, return_mask)
+
+    def _gate_shared(self, chunk, return_mask=None):
+        """Gate all channels with one mask computed from their combined magnitude."""
+        chunk = np.asarray(chunk)
+        with self.profiler.stage("stft") as stage:
+            sig_stft = self._stft(chunk)
+            sig_stft_db = _amp_to_db(self._to_bands(_combine_channels(np.abs(sig_stft), self._shared_mask)[0]))
+            stage.track(sig_stft, sig_stft_db)
+        binary_mask, sig_mask = self._compute_masks(sig_stft_db)
+        with self.profiler.stage("apply_mask") as stage:
+            sig_stft_denoised = sig_stft * sig_mask
+            stage.track(sig_stft_denoised)
+        with self.profiler.stage("istft") as stage:
+            denoised_signal = self._istft(sig_stft_denoised, chunk.shape[-1])
+            stage.track(denoised_signal)
+        denoised_channels = np.zeros_like(chunk)
+        denoised_channels[:, :denoised_signal.shape[-1]] = denoised_signal
+        if return_mask is None:
+            return denoised_channels
+        return denoised_channels, self._exported(binary_mask, sig_mask, return_mask)[np.newaxis]
+
+    def _binary_mask(self, sig_stft_db):
+        """Bins (or bands) above the noise threshold."""
         db_thresh = np.repeat(
             self.noise_thresh[:, np.newaxis],
             sig_stft_db.shape[1],
             axis = 1,
         )
-        sig_mask = sig_stft_db > db_thresh
-        sig_mask = sig_mask * self._prop_decrease + 1.0 - self._prop_decrease
+        return sig_stft_db > db_thresh
+
+    def _compute_masks(self, sig_stft_db):
+        """The thresholded mask and the mask applied after ``prop_decrease`` and smoothing."""
+        with self.profiler.stage("mask") as stage:
+            binary_mask = self._binary_mask(sig_stft_db)
+            sig_mask = binary_mask * self._prop_decrease + 1.0 - self._prop_decrease
+            stage.track(sig_mask)
         if self.smooth_mask:
-            sig_mask = fftconvolve(sig_mask, self._smoothing_filter, mode = "same")
-        return sig_mask
+            with self.profiler.stage("mask_smoothing") as stage:
+                sig_mask = fftconvolve(sig_mask, self._smoothing_filter, mode = "same")
+                stage.track(sig_mask)
+        return binary_mask, self._from_bands(sig_mask)
+
+    def _compute_mask(self, sig_stft_db):
+        """Compute the mask for spectral gating."""
+        return self._compute_masks(sig_stft_db)[1]
 
-    def _do_filter(self, chunk):
+    def _do_filter(self, chunk, return_mask=None):
         """Do the actual filtering."""
-        return self.spectral_gating_stationary(chunk)
+        return self.spectral_gating_stationary(chunk, return_mask)
 
 
 def _parallel_channel_processing(data):
-    ci, channel, instance = data
-    abs_sig_stft, sig_stft_denoised = instance._process_channel(channel)
-    denoised_signal = istft(
-        sig_stft_denoised,
-        hop_length = instance._hop_length,
-        win_length = instance._win_length
-    )
-    return ci, denoised_signal
+    ci, channel, instance, return_mask = data
+    abs_sig_stft, sig_stft_denoised, sig_mask = instance._process_channel(channel, return_mask)
+    with instance.profiler.stage("istft"):
+        denoised_signal = instance._istft(sig_stft_denoised, len(channel))
+    return ci, denoised_signal, sig_mask
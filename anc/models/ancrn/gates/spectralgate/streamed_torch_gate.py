@@ -2,6 +2,7 @@ import torch
 from anc.models.ancrn.gates.spectralgate.base import SpectralGate
 from anc.models.ancrn.gates.torchgate import TorchGate as TG
 import numpy as np
+from anc.models.ancrn.utils import pcm_scale, pcm_to_float
 
 
 class StreamedTorchGate(SpectralGate):
@@ -32,6 +33,14 @@ class StreamedTorchGate(SpectralGate):
             use_tqdm=False,
             n_jobs=1,
             device="cuda",
+            profiler=None,
+            precision=None,
+            cache=None,
+            noise_stats=None,
+            shared_mask=None,
+            n_mask_bands=None,
+            band_scale="erb",
+            synthesis_length=None,
     ):
         super().__init__(
             y=y,
@@ -48,19 +57,35 @@ class StreamedTorchGate(SpectralGate):
             prop_decrease=prop_decrease,
             use_tqdm=use_tqdm,
             n_jobs=n_jobs,
+            profiler=profiler,
+            cache=cache,
+            shared_mask=shared_mask,
+            n_mask_bands=n_mask_bands,
+            band_scale=band_scale,
+            synthesis_length=synthesis_length,
         )
 
         self.device = torch.device(device if torch.cuda.is_available() else 'cpu')
+        # reduced precisions also move float32 instead of float64 chunks to the device
+        self._input_dtype = np.float32 if precision in ("float32", "bfloat16", torch.float32, torch.bfloat16) else None
 
         # noise convert to torch if needed
         if y_noise is not None:
             if y_noise.shape[-1] > y.shape[-1] and clip_noise_stationary:
                 y_noise = y_noise[: y.shape[-1]]
-            y_noise = torch.from_numpy(y_noise).to(device)
+            if pcm_scale(y_noise.dtype) is not None:
+                y_noise = pcm_to_float(y_noise)
+            if self._input_dtype is not None:
+                y_noise = y_noise.astype(self._input_dtype, copy=False)
+            y_noise = torch.from_numpy(y_noise).to(self.device)
             # ensure that y_noise is in shape (#channels, #frames)
             if len(y_noise.shape) == 1:
                 y_noise = y_noise.unsqueeze(0)
         self.y_noise = y_noise
+        # per-bin (std, mean) dB of the noise, e.g. from a `NoiseProfileBank`, replaces the analysis of y_noise
+        if noise_stats is not None:
+            noise_stats = tuple(torch.as_tensor(np.asarray(v)).to(self.device) for v in noise_stats)
+        self.noise_stats = noise_stats
 
         # create a torch object
         self.tg = TG(
@@ -76,12 +101,31 @@ class StreamedTorchGate(SpectralGate):
             hop_length=self._hop_length,
             freq_mask_smooth_hz=freq_mask_smooth_hz,
             time_mask_smooth_ms=time_mask_smooth_ms,
-        ).to(device)
+            profiler=self.profiler,
+            precision=precision,
+            shared_mask=shared_mask,
+            n_mask_bands=n_mask_bands,
+            band_scale=band_scale,
+            synthesis_length=synthesis_length,
+        ).to(self.device)
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    @profiler.setter
+    def profiler(self, profiler):
+        # the wrapped TorchGate reports its stages to the same profiler
+        self._profiler = profiler
+        if hasattr(self, "tg"):
+            self.tg.profiler = profiler
 
     def _do_filter(self, chunk):
         """Do the actual filtering"""
         # convert to torch if needed
         if type(chunk) is np.ndarray:
+            if self._input_dtype is not None:
+                chunk = chunk.astype(self._input_dtype, copy=False)
             chunk = torch.from_numpy(chunk).to(self.device)
-        chunk_filtered = self.tg(x=chunk, xn=self.y_noise)
+        chunk_filtered = self.tg(x=chunk, xn=self.y_noise, noise_stats=self.noise_stats)
         return chunk_filtered.cpu().detach().numpy()
\ No newline at end of file
@@ -21,18 +21,18 @@ def sigmoid(x, shift, mult):
     return 1 / (1 + np.exp(-(x + shift) * mult))
 
 
-@jit(nopython = True)
-def _amp_to_db(x):
+# librosa's conversions cannot be compiled by Numba, they are vectorized numpy already
+def _amp_to_db(x, top_db = _TOP_DB):
     """
     Convert the input tensor from amplitude to decibel scale.
 
     :param x: Input amplitude tensor.
+    :param top_db: Dynamic range below the maximum of ``x``, None for no floor.
     :return: Tensor in decibel scale.
     """
-    return amplitude_to_db(x, ref = _REF, amin = _AMIN, top_db = _TOP_DB)
+    return amplitude_to_db(x, ref = _REF, amin = _AMIN, top_db = top_db)
 
 
-@jit(nopython = True)
 def _db_to_amp(x):
     """
     Convert the input tensor from decibel scale to amplitude.
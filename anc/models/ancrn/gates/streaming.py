@@ -0,0 +1,97 @@
+import numpy as np
+import torch
+from typing import List, Optional, Sequence
+
+from .torchgate import TorchGate
+
+
+class StreamingGate:
+    """
+    Block-by-block interface of a `TorchGate` for live audio.
+
+    The stream state is a sliding window of ``context + block_size + lookahead`` samples. Every
+    ``process(block)`` call shifts the new block into the window, gates the whole window and returns
+    the ``block_size`` samples that start ``context`` samples into it, so the output lags the input
+    by ``lookahead`` samples. The context gives the noise statistics and the STFT/mask smoothing
+    enough history, the lookahead gives the returned samples a complete STFT support.
+
+    Several streams sharing one gate configuration can be gated with a single batched call, see
+    ``process_batch``; that is what the denoise service does for concurrent sessions.
+
+    Arguments:
+        gate {TorchGate} -- Gate applied to the window, shared between streams.
+        block_size {int} -- Samples per processed block. Multiples of the gate's hop length keep
+                            the STFT framing identical from one block to the next.
+
+    Keyword Arguments:
+        context {[int]} -- History samples kept in front of the block, defaults to the span of the
+                           gate's noise-floor moving average plus one window (default: {None}).
+        lookahead {[int]} -- Samples of delay, defaults to the gate's ``latency_samples``: its window length,
+                             or ``synthesis_length - hop_length`` with the low-delay framing (default: {None}).
+        device {str} -- Device the gate lives on (default: {"cpu"}).
+    """
+
+    def __init__(self, gate: TorchGate, block_size: int, context: Optional[int] = None,
+                 lookahead: Optional[int] = None, device: str = "cpu"):
+        self.gate = gate
+        self.device = torch.device(device)
+        self.block_size = block_size
+        if context is None:
+            context = gate.n_movemean_nonstationary * gate.hop_length + gate.win_length
+        self.context = context
+        self.lookahead = gate.latency_samples if lookahead is None else lookahead
+        self.window_length = self.context + self.block_size + self.lookahead
+        if self.window_length < 2 * gate.win_length:
+            raise ValueError(f"context + block_size + lookahead must be at least {2 * gate.win_length}")
+        self.reset()
+
+    @property
+    def latency_samples(self) -> int:
+        """Algorithmic delay between a sample going in and its denoised version coming out."""
+        return self.lookahead
+
+    def reset(self) -> None:
+        """Forget the stream history, the next blocks start from silence."""
+        self._window = np.zeros(self.window_length, dtype=np.float32)
+
+    def push(self, block: np.ndarray) -> np.ndarray:
+        """Shift ``block`` into the stream state and return the window to gate."""
+        block = np.asarray(block, dtype=np.float32)
+        if block.shape != (self.block_size,):
+            raise ValueError(f"block must have shape ({self.block_size},), got {block.shape}")
+        self._window[:-self.block_size] = self._window[self.block_size:]
+        self._window[-self.block_size:] = block
+        return self._window
+
+    def pop(self, filtered_window: np.ndarray) -> np.ndarray:
+        """Cut the output block out of a gated window."""
+        return filtered_window[self.context: self.context + self.block_size]
+
+    @torch.no_grad()
+    def gate_windows(self, windows: np.ndarray) -> np.ndarray:
+        """Gate a ``(batch, window_length)`` stack of windows from `push` on the stream's device."""
+        x = torch.from_numpy(windows).to(self.device)
+        return self.gate(x).cpu().numpy()
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Denoise one block of this stream, the result lags the input by ``latency_samples``."""
+        window = self.push(block)
+        return self.pop(self.gate_windows(window[np.newaxis, :])[0]).copy()
+
+    @staticmethod
+    def process_batch(streams: Sequence["StreamingGate"], blocks: Sequence[np.ndarray]) -> List[np.ndarray]:
+        """
+        Denoise one block of every stream with a single gate call.
+
+        All streams must share the gate and window geometry of ``streams[0]``.
+        """
+        if not streams:
+            return []
+        first = streams[0]
+        windows = np.empty((len(streams), first.window_length), dtype=np.float32)
+        for i, (stream, block) in enumerate(zip(streams, blocks)):
+            if stream.gate is not first.gate or stream.window_length != first.window_length:
+                raise ValueError("Batched streams must share the gate and window geometry")
+            windows[i] = stream.push(block)
+        filtered = first.gate_windows(windows)
+        return [stream.pop(out).copy() for stream, out in zip(streams, filtered)]
@@ -1,7 +1,10 @@
 import torch
 from torch.nn.functional import conv1d, conv2d
-from typing import Union, Optional
-from .utils import linspace, temperature_sigmoid, amp_to_db
+from typing import Union, Optional, Tuple
+from .utils import linspace, temperature_sigmoid, amp_to_db, db_eps, real_dtype
+from ..profiling import NULL_PROFILER
+from ..bands import SHARED_MASKS, band_matrices
+from ..framing import LowDelayFraming
 
 
 class TorchGate(torch.nn.Module):
@@ -26,8 +29,32 @@ class TorchGate(torch.nn.Module):
                                      (default: {500}).
         time_mask_smooth_ms {float} -- Time smoothing width for mask (in ms). If None, no smoothing is applied
                                      (default: {50}).
+        profiler {[GateProfiler]} -- Per-stage instrumentation, see `anc.models.ancrn.gates.profiling`
+                                     (default: {None}).
+        precision {[str, torch.dtype]} -- Precision of the masking maths: "float64", "float32" or "bfloat16".
+                                          The STFT runs in float32 for "bfloat16" (CPU FFTs have no bfloat16
+                                          kernels), only magnitudes, thresholds, sigmoid and mask smoothing
+                                          are computed in bfloat16. None follows the input dtype
+                                          (default: {None}).
+        shared_mask {[str]} -- "mean" or "max": treat the batch as the channels of one capture and compute a
+                               single mask from their combined magnitude, applied to every channel's STFT. Mask
+                               work no longer grows with the channel count and all channels are gated alike
+                               (default: {None}, a mask per batch item).
+        n_mask_bands {[int]} -- Compute thresholds, noise floors and masks on this many perceptual bands (32-64
+                                work well) instead of every FFT bin, see `anc.models.ancrn.gates.bands`. The band
+                                mask is interpolated back to the bins, which replaces the frequency part of the
+                                mask smoothing (default: {None}, per bin).
+        band_scale {str} -- Spacing of the bands, "erb" or "mel" (default: {"erb"}).
+        synthesis_length {[int]} -- Use the low-delay framing of `anc.models.ancrn.gates.framing`: the
+                                    long ``n_fft`` analysis window keeps the mask's frequency resolution,
+                                    a synthesis window of this many samples (a multiple of ``hop_length``,
+                                    at least twice it) cuts the output delay to ``synthesis_length -
+                                    hop_length`` samples. Needs ``win_length == n_fft`` (default: {None},
+                                    centred Hann frames).
     """
 
+    PRECISIONS = {"float64": torch.float64, "float32": torch.float32, "bfloat16": torch.bfloat16}
+
     @torch.no_grad()
     def __init__(
         self,
@@ -43,8 +70,23 @@ class TorchGate(torch.nn.Module):
         hop_length: int = None,
         freq_mask_smooth_hz: float = 500,
         time_mask_smooth_ms: float = 50,
+        profiler=None,
+        precision: Optional[Union[str, torch.dtype]] = None,
+        shared_mask: Optional[str] = None,
+        n_mask_bands: Optional[int] = None,
+        band_scale: str = "erb",
+        synthesis_length: Optional[int] = None,
     ):
         super().__init__()
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        if isinstance(precision, str):
+            if precision not in self.PRECISIONS:
+                raise ValueError(f"precision must be one of {list(self.PRECISIONS)}, got {precision}")
+            precision = self.PRECISIONS[precision]
+        self.precision = precision
+        if shared_mask is not None and shared_mask not in SHARED_MASKS:
+            raise ValueError(f"shared_mask must be None or one of {list(SHARED_MASKS)}, got {shared_mask}")
+        self.shared_mask = shared_mask
 
         # General Params
         self.sr = sr
@@ -56,6 +98,11 @@ class TorchGate(torch.nn.Module):
         self.n_fft = n_fft
         self.win_length = self.n_fft if win_length is None else win_length
         self.hop_length = self.win_length // 4 if hop_length is None else hop_length
+        self.framing = None
+        if synthesis_length is not None:
+            if self.win_length != self.n_fft:
+                raise ValueError("synthesis_length needs win_length equal to n_fft")
+            self.framing = LowDelayFraming(self.n_fft, self.hop_length, synthesis_length)
 
         # Stationary Params
         self.n_std_thresh_stationary = n_std_thresh_stationary
@@ -65,6 +112,19 @@ class TorchGate(torch.nn.Module):
         self.n_movemean_nonstationary = n_movemean_nonstationary
         self.n_thresh_nonstationary = n_thresh_nonstationary
 
+        # Band Params, dense (bands, bins) and (bins, bands) matrices: at 32-64 bands a dense matmul beats
+        # torch's sparse kernels
+        self.n_mask_bands = n_mask_bands
+        self.band_scale = band_scale
+        if n_mask_bands is None:
+            band_analysis = band_synthesis = None
+        else:
+            band_analysis, band_synthesis = (
+                torch.from_numpy(m.toarray()) for m in band_matrices(sr, self.n_fft, n_mask_bands, band_scale)
+            )
+        self.register_buffer("band_analysis", band_analysis)
+        self.register_buffer("band_synthesis", band_synthesis)
+
         # Smooth Mask Params
         self.freq_mask_smooth_hz = freq_mask_smooth_hz
         self.time_mask_smooth_ms = time_mask_smooth_ms
@@ -123,9 +183,117 @@ class TorchGate(torch.nn.Module):
 
         return smoothing_filter / smoothing_filter.sum()
 
+    def _combine_channels(self, X_abs: torch.Tensor) -> torch.Tensor:
+        """Collapse the batch of a magnitude spectrogram to one item for ``shared_mask``, a no-op otherwise."""
+        if self.shared_mask == "max":
+            return X_abs.amax(dim=0, keepdim=True)
+        if self.shared_mask == "mean":
+            return X_abs.mean(dim=0, keepdim=True)
+        return X_abs
+
+    def _to_bands(self, X_abs: torch.Tensor) -> torch.Tensor:
+        """Average a magnitude spectrogram (..., freq_bins, frames) into the mask bands, a no-op without bands."""
+        if self.band_analysis is None:
+            return X_abs
+        return torch.matmul(self.band_analysis.to(X_abs.dtype), X_abs)
+
+    def _from_bands(self, sig_mask: torch.Tensor) -> torch.Tensor:
+        """Interpolate a band mask (..., bands, frames) back to the FFT bins, a no-op without bands."""
+        if self.band_synthesis is None:
+            return sig_mask
+        return torch.matmul(self.band_synthesis.to(sig_mask.dtype), sig_mask)
+
+    @property
+    def latency_samples(self) -> int:
+        """Samples a streamed output has to lag its input for every output sample to be complete."""
+        return self.win_length if self.framing is None else self.framing.latency_samples
+
+    def _stft(self, x: torch.Tensor, dtype: torch.dtype) -> torch.Tensor:
+        """Complex STFT of ``x`` computed in ``dtype``."""
+        if self.framing is not None:
+            return self.framing.stft_torch(x.to(dtype))
+        return torch.stft(
+            x.to(dtype),
+            n_fft=self.n_fft,
+            hop_length=self.hop_length,
+            win_length=self.win_length,
+            return_complex=True,
+            pad_mode="constant",
+            center=True,
+            window=torch.hann_window(self.win_length, dtype=dtype, device=x.device),
+        )
+
+    def _istft(self, Y: torch.Tensor, dtype: torch.dtype, length: Optional[int] = None) -> torch.Tensor:
+        """Inverse of ``_stft``, the low-delay framing returns exactly ``length`` samples."""
+        if self.framing is not None:
+            return self.framing.istft_torch(Y, length)
+        return torch.istft(
+            Y,
+            n_fft=self.n_fft,
+            hop_length=self.hop_length,
+            win_length=self.win_length,
+            center=True,
+            window=torch.hann_window(self.win_length, dtype=dtype, device=Y.device),
+        )
+
     @torch.no_grad()
-    def _stationary_mask(
+    def _noise_stats(
         self, X_db: torch.Tensor, xn: Optional[torch.Tensor] = None
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Per-frequency standard deviation and mean of the noise log-magnitude spectrogram.
+
+        Arguments:
+            X_db (torch.Tensor): Log-magnitude spectrogram of the signal, used as the noise when `xn` is None.
+            xn (torch.Tensor): Noise clip.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: ``(std_freq_noise, mean_freq_noise)``, both of shape
+            (batch, freq_bins).
+        """
+        if xn is not None:
+            stft_dtype = torch.float32 if X_db.dtype == torch.bfloat16 else X_db.dtype
+            XN = self._stft(xn, stft_dtype)
+            XN_db = amp_to_db(self._to_bands(self._combine_channels(XN.abs().to(dtype=X_db.dtype))))
+        else:
+            XN_db = X_db
+
+        # calculate mean and standard deviation along the frequency axis
+        return torch.std_mean(XN_db, dim=-1)
+
+    @torch.no_grad()
+    def _slowness_ratio(self, X_abs: torch.Tensor) -> torch.Tensor:
+        """
+        Relative excess of the magnitude spectrogram over its moving average along time.
+
+        Arguments:
+            X_abs (torch.Tensor): Magnitude spectrogram of shape (batch, freq_bins, frames).
+
+        Returns:
+            torch.Tensor: Slowness ratio of the same shape as X_abs.
+        """
+        X_smoothed = (
+            conv1d(
+                X_abs.reshape(-1, 1, X_abs.shape[-1]),
+                torch.ones(
+                    self.n_movemean_nonstationary,
+                    dtype=X_abs.dtype,
+                    device=X_abs.device,
+                ).view(1, 1, -1),
+                padding="same",
+            ).view(X_abs.shape)
+            / self.n_movemean_nonstationary
+        )
+
+        # the floor keeps silent bins from dividing by 0
+        return (X_abs - X_smoothed) / X_smoothed.clamp_min(db_eps(X_abs.dtype))
+
+    @torch.no_grad()
+    def _stationary_mask(
+        self,
+        X_db: torch.Tensor,
+        xn: Optional[torch.Tensor] = None,
+        noise_stats: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,
     ) -> torch.Tensor:
         """
         Computes a stationary binary mask to filter out noise in a log-magnitude spectrogram.
@@ -133,29 +301,23 @@ class TorchGate(torch.nn.Module):
         Arguments:
             X_db (torch.Tensor): 2D tensor of shape (frames, freq_bins) containing the log-magnitude spectrogram.
             xn (torch.Tensor): 1D tensor containing the audio signal corresponding to X_db.
+            noise_stats (Tuple[torch.Tensor, torch.Tensor]): Precomputed ``(std_freq_noise, mean_freq_noise)``
+                of shape (freq_bins,) or (batch, freq_bins), used instead of analysing `xn`.
 
         Returns:
             sig_mask (torch.Tensor): Binary mask of the same shape as X_db, where values greater than the threshold
             are set to 1, and the rest are set to 0.
         """
-        if xn is not None:
-            XN = torch.stft(
-                xn,
-                n_fft=self.n_fft,
-                hop_length=self.hop_length,
-                win_length=self.win_length,
-                return_complex=True,
-                pad_mode="constant",
-                center=True,
-                window=torch.hann_window(self.win_length).to(xn.device),
-            )
-
-            XN_db = amp_to_db(XN).to(dtype=X_db.dtype)
+        if noise_stats is None:
+            std_freq_noise, mean_freq_noise = self._noise_stats(X_db, xn)
         else:
-            XN_db = X_db
-
-        # calculate mean and standard deviation along the frequency axis
-        std_freq_noise, mean_freq_noise = torch.std_mean(XN_db, dim=-1)
+            if noise_stats[0].shape[-1] != X_db.shape[-2]:
+                raise ValueError(
+                    f"noise_stats have {noise_stats[0].shape[-1]} frequency bins, the mask has {X_db.shape[-2]}"
+                )
+            std_freq_noise, mean_freq_noise = (
+                torch.as_tensor(v, device=X_db.device).to(X_db.dtype).expand(X_db.shape[:-1]) for v in noise_stats
+            )
 
         # compute noise threshold
         noise_thresh = mean_freq_noise + std_freq_noise * self.n_std_thresh_stationary
@@ -176,30 +338,48 @@ class TorchGate(torch.nn.Module):
             sig_mask (torch.Tensor): Binary mask of the same shape as X_abs, where values greater than the threshold
             are set to 1, and the rest are set to 0.
         """
-        X_smoothed = (
-            conv1d(
-                X_abs.reshape(-1, 1, X_abs.shape[-1]),
-                torch.ones(
-                    self.n_movemean_nonstationary,
-                    dtype=X_abs.dtype,
-                    device=X_abs.device,
-                ).view(1, 1, -1),
-                padding="same",
-            ).view(X_abs.shape)
-            / self.n_movemean_nonstationary
-        )
-
         # Compute slowness ratio and apply temperature sigmoid
-        slowness_ratio = (X_abs - X_smoothed) / X_smoothed
+        slowness_ratio = self._slowness_ratio(X_abs)
         sig_mask = temperature_sigmoid(
             slowness_ratio, self.n_thresh_nonstationary, self.temp_coeff_nonstationary
         )
 
         return sig_mask
 
+    @torch.no_grad()
+    def _smooth_mask(self, sig_mask: torch.Tensor) -> torch.Tensor:
+        """
+        Convolve a mask of shape (batch, 1, freq_bins, frames) with the smoothing filter.
+
+        The filter is an outer product, so it is applied as a frequency and a time convolution,
+        which needs neither the memory nor the multiply-adds of the full 2D kernel.
+        """
+        smoothing_filter = self.smoothing_filter.to(sig_mask.dtype)
+        if self.band_analysis is None:
+            # band masks skip this, the interpolation to bins smooths over frequency
+            sig_mask = conv2d(sig_mask, smoothing_filter.sum(dim=-1, keepdim=True), padding="same")
+        return conv2d(sig_mask, smoothing_filter.sum(dim=-2, keepdim=True), padding="same")
+
+    def _dtypes(self, x: torch.Tensor) -> Tuple[torch.dtype, torch.dtype]:
+        """
+        Dtypes of the STFT and of the masking maths for an input.
+
+        Returns:
+            Tuple[torch.dtype, torch.dtype]: ``(stft_dtype, mask_dtype)``.
+        """
+        mask_dtype = real_dtype(x.dtype) if self.precision is None else self.precision
+        if not mask_dtype.is_floating_point:
+            mask_dtype = torch.get_default_dtype()
+        stft_dtype = torch.float32 if mask_dtype in (torch.bfloat16, torch.float16) else mask_dtype
+        return stft_dtype, mask_dtype
+
     def forward(
-        self, x: torch.Tensor, xn: Optional[torch.Tensor] = None
-    ) -> torch.Tensor:
+        self,
+        x: torch.Tensor,
+        xn: Optional[torch.Tensor] = None,
+        return_stft: bool = False,
+        noise_stats: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,
+    ) -> Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor, torch.Tensor]]:
         """
         Apply the proposed algorithm to the input signal.
 
@@ -207,9 +387,15 @@ class TorchGate(torch.nn.Module):
             x (torch.Tensor): The input audio signal, with shape (batch_size, signal_length).
             xn (Optional[torch.Tensor]): The noise signal used for stationary noise reduction. If `None`, the input
                                          signal is used as the noise signal. Default: `None`.
+            return_stft (bool): Also return the STFT of the input and the masked STFT, e.g. to compute
+                                spectral metrics without transforming again. Default: `False`.
+            noise_stats (Optional[Tuple[torch.Tensor, torch.Tensor]]): Per-bin ``(std, mean)`` of the noise in dB
+                                         for stationary masking, e.g. from a `NoiseProfileBank`; `xn` is not
+                                         analysed when given. Default: `None`.
 
         Returns:
-            torch.Tensor: The denoised audio signal, with the same shape as the input signal.
+            torch.Tensor: The denoised audio signal, with the same shape as the input signal. With `return_stft`
+            a tuple ``(y, X, Y)`` of the denoised signal, the input STFT and the masked STFT.
         """
         assert x.ndim == 2
         if x.shape[-1] < self.win_length * 2:
@@ -219,46 +405,41 @@ class TorchGate(torch.nn.Module):
         if xn is not None and xn.shape[-1] < self.win_length * 2:
             raise Exception(f"xn must be bigger than {self.win_length * 2}")
 
+        stft_dtype, mask_dtype = self._dtypes(x)
+
         # Compute short-time Fourier transform (STFT)
-        X = torch.stft(
-            x,
-            n_fft=self.n_fft,
-            hop_length=self.hop_length,
-            win_length=self.win_length,
-            return_complex=True,
-            pad_mode="constant",
-            center=True,
-            window=torch.hann_window(self.win_length).to(x.device),
-        )
+        with self.profiler.stage("stft") as stage:
+            X = self._stft(x, stft_dtype)
+            stage.track(X)
 
         # Compute signal mask based on stationary or nonstationary assumptions
-        if self.nonstationary:
-            sig_mask = self._nonstationary_mask(X.abs())
-        else:
-            sig_mask = self._stationary_mask(amp_to_db(X), xn)
+        with self.profiler.stage("mask") as stage:
+            X_abs = self._to_bands(self._combine_channels(X.abs().to(mask_dtype)))
+            if self.nonstationary:
+                sig_mask = self._nonstationary_mask(X_abs)
+            else:
+                sig_mask = self._stationary_mask(amp_to_db(X_abs), xn, noise_stats).to(mask_dtype)
 
-        # Propagate decrease in signal power
-        sig_mask = self.prop_decrease * (sig_mask * 1.0 - 1.0) + 1.0
+            # Propagate decrease in signal power
+            sig_mask = self.prop_decrease * (sig_mask - 1.0) + 1.0
+            stage.track(sig_mask)
 
         # Smooth signal mask with 2D convolution
         if self.smoothing_filter is not None:
-            sig_mask = conv2d(
-                sig_mask.unsqueeze(1),
-                self.smoothing_filter.to(sig_mask.dtype),
-                padding="same",
-            )
+            with self.profiler.stage("mask_smoothing") as stage:
+                sig_mask = self._smooth_mask(sig_mask.unsqueeze(1))
+                stage.track(sig_mask)
 
         # Apply signal mask to STFT magnitude and phase components
-        Y = X * sig_mask.squeeze(1)
+        with self.profiler.stage("apply_mask") as stage:
+            Y = X * self._from_bands(sig_mask.squeeze(1)).to(stft_dtype)
+            stage.track(Y)
 
         # Inverse STFT to obtain time-domain signal
-        y = torch.istft(
-            Y,
-            n_fft=self.n_fft,
-            hop_length=self.hop_length,
-            win_length=self.win_length,
-            center=True,
-            window=torch.hann_window(self.win_length).to(Y.device),
-        )
+        with self.profiler.stage("istft") as stage:
+            y = self._istft(Y, stft_dtype, x.shape[-1])
+            stage.track(y)
 
+        if return_stft:
+            return y.to(dtype=x.dtype), X, Y
         return y.to(dtype=x.dtype)
\ No newline at end of file
@@ -2,8 +2,43 @@ import torch
 from torch.types import Number
 
 
+def real_dtype(dtype: torch.dtype) -> torch.dtype:
+    """
+    Real counterpart of a (possibly complex) floating point dtype.
+
+    Arguments:
+        dtype {[torch.dtype]} -- [Input dtype, e.g. torch.complex64.]
+
+    Returns:
+        [torch.dtype] -- [torch.float32 for torch.complex64, torch.float64 for torch.complex128,
+                          the input dtype otherwise.]
+    """
+    return {torch.complex64: torch.float32, torch.complex128: torch.float64}.get(dtype, dtype)
+
+
+def db_eps(dtype: torch.dtype) -> float:
+    """
+    Magnitude floor that keeps the log finite in the given dtype.
+
+    float64 keeps the historic ``torch.finfo(torch.float64).eps``. Lower precisions use their smallest
+    normal number instead: float64's eps rounds to zero in float16 and would be far below the
+    resolution of anything computed in float32/bfloat16 anyway, while ``eps`` of bfloat16 (~7.8e-3)
+    would sit above quiet signals.
+
+    Arguments:
+        dtype {[torch.dtype]} -- [Dtype of the magnitudes (complex dtypes map to their real part).]
+
+    Returns:
+        [float] -- [The floor.]
+    """
+    dtype = real_dtype(dtype)
+    if dtype == torch.float64:
+        return torch.finfo(torch.float64).eps
+    return torch.finfo(dtype).tiny
+
+
 @torch.no_grad()
-def amp_to_db(x: torch.Tensor, eps=torch.finfo(torch.float64).eps, top_db=40) -> torch.Tensor:
+def amp_to_db(x: torch.Tensor, eps=None, top_db=40) -> torch.Tensor:
     """
     Convert the input tensor from amplitude to decibel scale.
 
@@ -12,13 +47,15 @@ def amp_to_db(x: torch.Tensor, eps=torch.finfo(torch.float64).eps, top_db=40) ->
 
     Keyword Arguments:
         eps {[float]} -- [Small value to avoid numerical instability.]
-                          (default: {torch.finfo(torch.float64).eps})
+                          (default: {None}, i.e. ``db_eps(x.dtype)``)
         top_db {[float]} -- [threshold the output at ``top_db`` below the peak]
             `             (default: {40})
 
     Returns:
         [torch.Tensor] -- [Output tensor in decibel scale.]
     """
+    if eps is None:
+        eps = db_eps(x.dtype)
     x_db = 20 * torch.log10(x.abs() + eps)
     return torch.max(x_db, (x_db.max(-1).values - top_db).unsqueeze(-1))
 
@@ -1,5 +1,8 @@
+from functools import lru_cache
+
 import numpy as np
 
+
 # from https://stackoverflow.com/questions/33933842/how-to-generate-noise-in-frequency-range-with-numpy
 def fftnoise(f):
     """
@@ -14,7 +17,248 @@ def fftnoise(f):
 
 
 def band_limited_noise(min_freq, max_freq, samples=1024, samplerate=1):
-    freqs = np.abs(np.fft.fftfreq(samples, 1 / samplerate))
-    f = np.zeros(samples)
+    freqs = _rfft_freqs(samples, samplerate)
+    f = np.zeros(len(freqs))
     f[np.logical_and(freqs >= min_freq, freqs <= max_freq)] = 1
-    return fftnoise(f)
\ No newline at end of file
+    # random phases on the half spectrum, the Nyquist/DC bins stay real as in `fftnoise`
+    phases = np.exp(2j * np.pi * np.random.rand(len(freqs)))
+    phases[0] = 1
+    if samples % 2 == 0:
+        phases[-1] = 1
+    return np.fft.irfft(f * phases, n=samples)
+
+
+@lru_cache(maxsize=64)
+def _rfft_freqs(n_samples, samplerate):
+    """Cached, read-only `rfftfreq` grid for a given signal length and sample rate."""
+    freqs = np.fft.rfftfreq(n_samples, 1 / samplerate)
+    freqs.flags.writeable = False
+    return freqs
+
+
+def _rms_scale(magnitude, n_samples):
+    """Factor that gives an `irfft` of complex gaussian bins with `magnitude` an expected RMS of 1."""
+    power = magnitude.astype(np.float64) ** 2
+    # every bin but DC (and Nyquist for even lengths) appears twice in the full spectrum
+    weights = np.full(len(power), 2.0)
+    weights[0] = 1.0
+    if n_samples % 2 == 0:
+        weights[-1] = 1.0
+    # E|X|^2 = 2 * magnitude^2 for a complex gaussian with unit variance per component
+    total = np.sum(weights * 2 * power)
+    if total == 0:
+        return 0.0
+    return n_samples / np.sqrt(total)
+
+
+class NoiseGenerator:
+    """
+    Batched, seeded synthetic noise generator.
+
+    Every signal is produced by shaping complex gaussian spectra and running a single batched
+    ``irfft``, so ``n_signals`` signals cost one FFT call. All signals have an expected RMS of 1,
+    scale them at the call site. The output is ``(n_signals, n_samples)``.
+
+    Arguments:
+        sr {int} -- Sample rate of the generated signals.
+
+    Keyword Arguments:
+        seed {[int, np.random.Generator]} -- Seed or generator to draw from (default: {None}).
+        dtype {[np.dtype]} -- Output dtype (default: {np.float32}).
+    """
+
+    def __init__(self, sr, seed=None, dtype=np.float32):
+        self.sr = sr
+        self.dtype = np.dtype(dtype)
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def rng(self):
+        return self._rng
+
+    def _band_magnitude(self, n_samples, min_freq, max_freq):
+        freqs = _rfft_freqs(n_samples, self.sr)
+        return np.logical_and(freqs >= min_freq, freqs <= max_freq).astype(self.dtype)
+
+    def _colored_magnitude(self, n_samples, exponent, min_freq=None, max_freq=None):
+        """Amplitude spectrum of 1 / f**exponent power noise (0 white, 1 pink, 2 brown)."""
+        freqs = _rfft_freqs(n_samples, self.sr)
+        magnitude = np.zeros(len(freqs), dtype=self.dtype)
+        # DC is left at zero, the lowest bin sets the floor of the 1/f slope
+        magnitude[1:] = freqs[1:] ** (-exponent / 2.0)
+        if min_freq is not None or max_freq is not None:
+            magnitude *= self._band_magnitude(
+                n_samples,
+                0 if min_freq is None else min_freq,
+                np.inf if max_freq is None else max_freq,
+            )
+        return magnitude
+
+    def _shaped(self, n_signals, n_samples, magnitude):
+        """Draw ``n_signals`` gaussian spectra, shape them by ``magnitude`` and inverse transform."""
+        n_bins = len(magnitude)
+        real_dtype = np.float32 if self.dtype == np.float32 else np.float64
+        spectrum = self._rng.standard_normal((n_signals, 2 * n_bins), dtype=real_dtype).view(
+            np.complex64 if real_dtype == np.float32 else np.complex128
+        )
+        spectrum *= magnitude * real_dtype(_rms_scale(magnitude, n_samples))
+        return np.fft.irfft(spectrum, n=n_samples, axis=-1).astype(self.dtype, copy=False)
+
+    def band_limited(self, n_signals, n_samples, min_freq, max_freq):
+        """Flat-spectrum noise between ``min_freq`` and ``max_freq`` (Hz, inclusive)."""
+        return self._shaped(n_signals, n_samples, self._band_magnitude(n_samples, min_freq, max_freq))
+
+    def colored(self, n_signals, n_samples, exponent, min_freq=None, max_freq=None):
+        """Noise with power spectral density ~ 1 / f**exponent, optionally band limited."""
+        return self._shaped(
+            n_signals, n_samples, self._colored_magnitude(n_samples, exponent, min_freq, max_freq)
+        )
+
+    def white(self, n_signals, n_samples):
+        return self.colored(n_signals, n_samples, exponent=0)
+
+    def pink(self, n_signals, n_samples, min_freq=None, max_freq=None):
+        return self.colored(n_signals, n_samples, 1, min_freq=min_freq, max_freq=max_freq)
+
+    def brown(self, n_signals, n_samples, min_freq=None, max_freq=None):
+        return self.colored(n_signals, n_samples, 2, min_freq=min_freq, max_freq=max_freq)
+
+    def engine(
+            self,
+            n_signals,
+            n_samples,
+            rpm_start=1500.0,
+            rpm_end=None,
+            n_cylinders=4,
+            n_harmonics=8,
+            harmonic_decay=0.7,
+            rpm_jitter=0.0,
+            phase=None,
+    ):
+        """
+        Engine order noise: a series of harmonics of the firing frequency following an RPM sweep.
+
+        The firing frequency of a four stroke engine is ``rpm / 60 * n_cylinders / 2``. The RPM is
+        swept linearly from ``rpm_start`` to ``rpm_end`` over the signal and the instantaneous phase
+        is integrated, so sweeps are click-free. Harmonic ``h`` has amplitude ``harmonic_decay ** h``
+        and a random start phase per signal.
+
+        Arguments:
+            n_signals {int} -- Number of signals to generate.
+            n_samples {int} -- Length of every signal.
+
+        Keyword Arguments:
+            rpm_start {float} -- RPM at the first sample (default: {1500.0}).
+            rpm_end {float} -- RPM at the last sample, ``None`` keeps it constant (default: {None}).
+            n_cylinders {int} -- Number of cylinders (default: {4}).
+            n_harmonics {int} -- Number of engine orders to synthesize (default: {8}).
+            harmonic_decay {float} -- Amplitude ratio between consecutive orders (default: {0.7}).
+            rpm_jitter {float} -- Relative per-signal random offset of the RPM (default: {0.0}).
+            phase {[np.ndarray]} -- Start phase of the fundamental per signal, in radians. Used to
+                                    continue a signal block by block (default: {None}).
+
+        Returns:
+            [np.ndarray] -- ``(n_signals, n_samples)`` engine noise with an RMS of about 1.
+        """
+        rpm_scale = None
+        if rpm_jitter:
+            rpm_scale = 1 + rpm_jitter * self._rng.standard_normal((n_signals, 1))
+        out, _ = self._engine(
+            n_signals, n_samples, rpm_start, rpm_end, n_cylinders, n_harmonics,
+            harmonic_decay, rpm_scale, phase, None,
+        )
+        return out
+
+    def _engine(self, n_signals, n_samples, rpm_start, rpm_end, n_cylinders, n_harmonics,
+                harmonic_decay, rpm_scale, phase, offsets):
+        """Synthesize engine orders, returns the block and the state needed to continue it."""
+        if rpm_end is None:
+            rpm_end = rpm_start
+        if offsets is None:
+            offsets = self._rng.uniform(0, 2 * np.pi, size=(n_harmonics, n_signals, 1))
+        rpm = np.linspace(rpm_start, rpm_end, n_samples, endpoint=False)[np.newaxis, :]
+        if rpm_scale is not None:
+            rpm = rpm * rpm_scale
+        f0 = np.broadcast_to(rpm / 60.0 * n_cylinders / 2.0, (n_signals, n_samples))
+        inst_phase = 2 * np.pi * np.cumsum(f0, axis=-1) / self.sr
+        if phase is not None:
+            inst_phase += np.asarray(phase).reshape(n_signals, 1)
+        amplitudes = harmonic_decay ** np.arange(n_harmonics)
+        amplitudes = amplitudes * np.sqrt(2 / np.sum(amplitudes ** 2))
+        nyquist = self.sr / 2
+        out = np.zeros((n_signals, n_samples), dtype=self.dtype)
+        for h in range(n_harmonics):
+            order = h + 1
+            # orders above nyquist would alias back into the band
+            audible = f0 * order < nyquist
+            out += amplitudes[h] * audible * np.sin(order * inst_phase + offsets[h])
+        # integer orders make the fundamental phase modulo 2 pi enough to continue every harmonic
+        return out, (inst_phase[:, -1] % (2 * np.pi), offsets)
+
+    def stream(self, kind, block_size, n_signals=1, n_blocks=None, **kwargs):
+        """
+        Iterator over an arbitrarily long signal, ``(n_signals, block_size)`` blocks at a time.
+
+        Spectral noise (``"band_limited"``, ``"colored"``, ``"white"``, ``"pink"``, ``"brown"``) is
+        synthesized in frames of ``2 * block_size`` with a sine window and overlap-added with a hop
+        of ``block_size``. The squared sine windows sum to one, so the variance is constant across
+        block boundaries and there are no discontinuities. ``"engine"`` carries the harmonic phases
+        over and sweeps the RPM from ``rpm_start`` to ``rpm_end`` over ``n_blocks`` blocks.
+
+        Arguments:
+            kind {str} -- Noise type, one of the generator methods listed above.
+            block_size {int} -- Samples per yielded block.
+
+        Keyword Arguments:
+            n_signals {int} -- Number of parallel signals (default: {1}).
+            n_blocks {[int]} -- Number of blocks to yield, ``None`` streams forever (default: {None}).
+            **kwargs -- Forwarded to the generator method for ``kind``.
+        """
+        if kind == "engine":
+            return self._stream_engine(block_size, n_signals, n_blocks, **kwargs)
+
+        frame = 2 * block_size
+        if kind == "band_limited":
+            magnitude = self._band_magnitude(frame, kwargs["min_freq"], kwargs["max_freq"])
+        elif kind in ("colored", "white", "pink", "brown"):
+            exponent = {"white": 0, "pink": 1, "brown": 2}.get(kind, kwargs.get("exponent"))
+            if exponent is None:
+                raise ValueError("Colored noise needs an exponent (0 white, 1 pink, 2 brown)")
+            magnitude = self._colored_magnitude(
+                frame, exponent, kwargs.get("min_freq"), kwargs.get("max_freq")
+            )
+        else:
+            raise ValueError(f"Unknown noise kind: {kind}")
+        return self._stream_spectral(magnitude, block_size, n_signals, n_blocks)
+
+    def _stream_spectral(self, magnitude, block_size, n_signals, n_blocks):
+        frame = 2 * block_size
+        window = np.sin(np.pi * (np.arange(frame) + 0.5) / frame).astype(self.dtype)
+        tail = self._shaped(n_signals, frame, magnitude)[:, block_size:] * window[block_size:]
+        produced = 0
+        while n_blocks is None or produced < n_blocks:
+            head = self._shaped(n_signals, frame, magnitude)
+            head *= window
+            yield tail + head[:, :block_size]
+            tail = head[:, block_size:]
+            produced += 1
+
+    def _stream_engine(self, block_size, n_signals, n_blocks, rpm_start=1500.0, rpm_end=None,
+                       n_cylinders=4, n_harmonics=8, harmonic_decay=0.7, rpm_jitter=0.0):
+        if rpm_end is None or n_blocks is None:
+            rpm_end = rpm_start
+        rpm_step = 0.0 if n_blocks is None else (rpm_end - rpm_start) / n_blocks
+        rpm_scale = None
+        if rpm_jitter:
+            rpm_scale = 1 + rpm_jitter * self._rng.standard_normal((n_signals, 1))
+        phase = np.zeros(n_signals)
+        offsets = None
+        produced = 0
+        while n_blocks is None or produced < n_blocks:
+            block_start = rpm_start + rpm_step * produced
+            block, (phase, offsets) = self._engine(
+                n_signals, block_size, block_start, block_start + rpm_step, n_cylinders,
+                n_harmonics, harmonic_decay, rpm_scale, phase, offsets,
+            )
+            yield block
+            produced += 1
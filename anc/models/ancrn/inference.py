@@ -0,0 +1,179 @@
+"""
+Frame-streaming CPU inference of `ANCRN` and its latency benchmark.
+
+Run ``python -m anc.models.ancrn.inference`` to time the float, fused and int8 variants of a model
+block by block against the design doc's 10 ms p99 target.
+"""
+import argparse
+import json
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+
+from .model import ANCRN, fuse, load_model, quantize
+
+# p99 processing time of one block the deployment has to stay under, see System_Design.md
+LATENCY_TARGET_MS = 10.0
+
+
+class StreamingANCRN:
+    """
+    Block-by-block interface of an `ANCRN` model for live audio, a drop-in for `StreamingGate`.
+
+    Every ``process(block)`` call frames the block into ``block_size // hop_length`` STFT frames
+    (periodic Hann analysis and synthesis windows), runs the model on just those frames with the
+    cached encoder context and LSTM state of the previous call, applies the mask and overlap-adds the
+    result. Nothing is recomputed from earlier blocks, so the cost per call is constant and the
+    output equals that of `enhance` on the whole signal. The output lags the input by
+    ``n_fft - hop_length`` samples.
+
+    Arguments:
+        model {ANCRN} -- Model in eval mode, float, fused or quantized.
+        block_size {int} -- Samples per processed block, a multiple of ``hop_length``.
+
+    Keyword Arguments:
+        hop_length {[int]} -- Hop of the STFT, defaults to ``n_fft // 4`` (default: {None}).
+        prop_decrease {float} -- Proportion to decrease the signal by where the mask is zero
+                                 (default: {1.0}).
+    """
+
+    def __init__(self, model: ANCRN, block_size: int, hop_length: Optional[int] = None, prop_decrease: float = 1.0):
+        self.model = model
+        self.sr = model.config["sr"]
+        self.n_fft = model.config["n_fft"]
+        self.hop_length = self.n_fft // 4 if hop_length is None else hop_length
+        if block_size % self.hop_length:
+            raise ValueError(f"block_size must be a multiple of hop_length {self.hop_length}, got {block_size}")
+        self.block_size = block_size
+        self.prop_decrease = prop_decrease
+        self.window = torch.hann_window(self.n_fft)
+        # overlap-added squared windows, the same for every hop for a COLA window/hop pair
+        self._squared = (self.window ** 2).reshape(-1, self.hop_length).sum(dim=0)
+        self._norm = self._squared.repeat(block_size // self.hop_length)
+        self.reset()
+
+    @property
+    def latency_samples(self) -> int:
+        """Algorithmic delay between a sample going in and its denoised version coming out."""
+        return self.n_fft - self.hop_length
+
+    def reset(self) -> None:
+        """Forget the stream history, the next blocks start from silence."""
+        self._input = torch.zeros(self.latency_samples + self.block_size)
+        self._overlap = torch.zeros(self.latency_samples)
+        self._state = None
+
+    @torch.no_grad()
+    def _process(self, samples: torch.Tensor) -> torch.Tensor:
+        n = samples.shape[0]
+        buffer = torch.cat([self._input[:self.latency_samples], samples])
+        frames = buffer.unfold(0, self.n_fft, self.hop_length) * self.window
+        spec = torch.fft.rfft(frames)
+        mask, self._state = self.model(self.model.features(spec.abs().T.unsqueeze(0)), self._state)
+        mask = self.model.expand_mask(mask)[0].T
+        if self.prop_decrease != 1.0:
+            mask = mask * self.prop_decrease + 1.0 - self.prop_decrease
+        frames = torch.fft.irfft(spec * mask, n=self.n_fft) * self.window
+
+        out = torch.zeros(self.latency_samples + n)
+        out[:self.latency_samples] = self._overlap
+        # overlap-add as n_fft / hop strided adds of non-overlapping frame sets
+        per_hop = self.n_fft // self.hop_length
+        for offset in range(per_hop):
+            chunk = frames[offset::per_hop].reshape(-1)
+            start = offset * self.hop_length
+            out[start:start + chunk.shape[0]] += chunk
+        self._overlap = out[n:].clone()
+        self._input = buffer[-self.latency_samples:].clone()
+        norm = self._norm if n == self.block_size else self._squared.repeat(n // self.hop_length)
+        return out[:n] / norm
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Denoise one block, the result lags the input by ``latency_samples``."""
+        block = np.asarray(block, dtype=np.float32)
+        if block.shape != (self.block_size,):
+            raise ValueError(f"block must have shape ({self.block_size},), got {block.shape}")
+        return self._process(torch.from_numpy(block)).numpy()
+
+    def enhance(self, y: np.ndarray) -> np.ndarray:
+        """Denoise a whole signal in one call, aligned with the input; resets the stream."""
+        y = np.asarray(y, dtype=np.float32)
+        n = y.shape[-1]
+        total = -(-(n + self.latency_samples) // self.hop_length) * self.hop_length
+        self.reset()
+        out = self._process(torch.from_numpy(np.pad(y, (0, total - n)))).numpy()
+        self.reset()
+        return out[self.latency_samples:self.latency_samples + n]
+
+
+def benchmark_latency(stream: StreamingANCRN, n_blocks: int = 500, warmup: int = 20, seed: int = 0) -> Dict[str, float]:
+    """
+    Wall time of ``stream.process`` per block on white noise.
+
+    Returns:
+        dict -- p50/p99/max milliseconds per block, the block duration in ms, the real-time factor
+        (processing time over audio time, at p99) and whether p99 meets `LATENCY_TARGET_MS`.
+    """
+    rng = np.random.default_rng(seed)
+    blocks = (0.1 * rng.standard_normal((warmup + n_blocks, stream.block_size))).astype(np.float32)
+    stream.reset()
+    timings = np.empty(n_blocks)
+    for i, block in enumerate(blocks):
+        start = time.perf_counter()
+        stream.process(block)
+        if i >= warmup:
+            timings[i - warmup] = time.perf_counter() - start
+    stream.reset()
+    timings *= 1e3
+    block_ms = 1e3 * stream.block_size / stream.sr
+    p99 = float(np.percentile(timings, 99))
+    return {
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p99_ms": p99,
+        "max_ms": float(timings.max()),
+        "block_ms": block_ms,
+        "algorithmic_delay_ms": 1e3 * stream.latency_samples / stream.sr,
+        "rtf_p99": p99 / block_ms,
+        "meets_target": p99 < LATENCY_TARGET_MS,
+    }
+
+
+def _calibration(model: ANCRN, n_blocks: int = 8, seconds: float = 2.0, seed: int = 0):
+    """Features of noise at several levels, for static quantization without data at hand."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * model.config["sr"])
+    for level in np.geomspace(1e-3, 1.0, n_blocks):
+        y = torch.from_numpy((level * rng.standard_normal(n)).astype(np.float32))
+        spec = torch.stft(y, model.config["n_fft"], window=torch.hann_window(model.config["n_fft"]),
+                          return_complex=True)
+        yield model.features(spec.abs().unsqueeze(0))
+
+
+def main():
+    """CLI comparing the per-block latency of the float, fused and quantized model."""
+    parser = argparse.ArgumentParser(description = 'Per-block CPU latency of the streaming ANCRN model.')
+    parser.add_argument('--checkpoint', type = str, default = None,
+                        help = 'Model written by save_model, an untrained default model if omitted.')
+    parser.add_argument('--block_size', type = int, default = 512, help = 'Samples per block.')
+    parser.add_argument('--n_blocks', type = int, default = 500)
+    parser.add_argument('--threads', type = int, default = 1, help = 'torch intra-op threads.')
+    parser.add_argument('--backend', type = str, default = None, help = 'Quantized engine, e.g. fbgemm or qnnpack.')
+
+    args = parser.parse_args()
+    torch.set_num_threads(args.threads)
+    model = ANCRN().eval() if args.checkpoint is None else load_model(args.checkpoint)
+    variants = {
+        "float": model,
+        "fused": fuse(model),
+        "int8_dynamic": quantize(model, "dynamic", backend = args.backend),
+        "int8_static": quantize(model, "static", calibration = _calibration(model), backend = args.backend),
+    }
+    report = {name: benchmark_latency(StreamingANCRN(variant, args.block_size), n_blocks = args.n_blocks)
+              for name, variant in variants.items()}
+    print(json.dumps(report, indent = 2))
+
+
+if __name__ == "__main__":
+    main()
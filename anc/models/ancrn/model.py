@@ -0,0 +1,236 @@
+import copy
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import torch
+from torch import nn
+from torch.ao import quantization
+
+from .gates.bands import band_matrices
+
+# floor of the band magnitudes before the log, the features of silence
+_FEATURE_EPS = 1e-5
+
+QUANTIZATION_MODES = ("dynamic", "static")
+
+
+class ANCRNState(NamedTuple):
+    """Stream state of `ANCRN`: the last input frames of every encoder conv and the LSTM state."""
+    context: List[torch.Tensor]
+    lstm: Tuple[torch.Tensor, torch.Tensor]
+
+
+class ANCRN(nn.Module):
+    """
+    Convolutional recurrent mask estimator, the packaged version of the ``ancrn.ipynb`` model.
+
+    The network keeps the notebook's layout: a conv/BatchNorm/ReLU/max-pool encoder, a two layer
+    LSTM and a transposed-conv decoder with skip connections from the encoder. It differs where the
+    notebook's model cannot run or cannot stream:
+
+    * the input is the log magnitude on ``n_bands`` ERB (or mel) bands, ``(batch, frames, bands)``,
+      and the output is a band mask in [0, 1] of the same shape, expanded to the FFT bins with
+      `expand_mask`;
+    * pooling and upsampling act on the band axis only, the time axis keeps one step per STFT
+      frame, so a frame in gives a frame out;
+    * the encoder convs look ``kernel_time - 1`` frames into the past and never into the future.
+      Their inputs are padded with the cached frames of the previous call, see `ANCRNState`, so
+      running a signal in blocks gives exactly the output of one call on the whole signal;
+    * the decoder concatenates each encoder output at its own resolution, the notebook's skip
+      connections paired mismatched shapes.
+
+    Arguments:
+        sr {int} -- Sample rate of the audio the features are computed from (default: {16000}).
+        n_fft {int} -- Size of the FFT of the features (default: {512}).
+        n_bands {int} -- Number of bands, a multiple of ``2 ** len(channels)`` (default: {64}).
+        channels {Sequence[int]} -- Output channels of the encoder blocks (default: {(16, 32, 64)}).
+        hidden_size {int} -- Hidden size of the LSTM (default: {128}).
+        kernel_time {int} -- Frames seen by each encoder conv (default: {3}).
+        band_scale {str} -- Spacing of the bands, "erb" or "mel" (default: {"erb"}).
+    """
+
+    def __init__(
+        self,
+        sr: int = 16000,
+        n_fft: int = 512,
+        n_bands: int = 64,
+        channels: Sequence[int] = (16, 32, 64),
+        hidden_size: int = 128,
+        kernel_time: int = 3,
+        band_scale: str = "erb",
+    ):
+        super().__init__()
+        if n_bands % 2 ** len(channels):
+            raise ValueError(f"n_bands must be a multiple of {2 ** len(channels)}, got {n_bands}")
+        self.config = dict(sr=sr, n_fft=n_fft, n_bands=n_bands, channels=tuple(channels),
+                           hidden_size=hidden_size, kernel_time=kernel_time, band_scale=band_scale)
+        self.n_bands = n_bands
+        self.kernel_time = kernel_time
+        self.hidden_size = hidden_size
+
+        analysis, synthesis = band_matrices(sr, n_fft, n_bands, band_scale)
+        self.register_buffer("band_analysis", torch.from_numpy(analysis.toarray()), persistent=False)
+        self.register_buffer("band_synthesis", torch.from_numpy(synthesis.toarray()), persistent=False)
+
+        in_channels = (1,) + tuple(channels[:-1])
+        self.encoder = nn.ModuleList(
+            nn.Sequential(
+                nn.Conv2d(c_in, c_out, kernel_size=(kernel_time, 3), padding=(0, 1)),
+                nn.BatchNorm2d(c_out),
+                nn.ReLU(),
+            )
+            for c_in, c_out in zip(in_channels, channels)
+        )
+        self.pool = nn.MaxPool2d(kernel_size=(1, 2))
+
+        bottleneck = channels[-1] * (n_bands // 2 ** len(channels))
+        self.lstm = nn.LSTM(input_size=bottleneck, hidden_size=hidden_size, num_layers=2, batch_first=True)
+        self.project = nn.Linear(hidden_size, bottleneck)
+
+        # every decoder block takes its input concatenated with the encoder output of the same size
+        out_channels = (channels[0],) + tuple(channels[:-1])
+        self.decoder = nn.ModuleList(
+            nn.Sequential(
+                nn.ConvTranspose2d(2 * c_in, c_out, kernel_size=(1, 2), stride=(1, 2)),
+                nn.BatchNorm2d(c_out),
+                nn.ReLU(),
+            )
+            for c_in, c_out in zip(reversed(channels), reversed(out_channels))
+        )
+        self.head = nn.Conv2d(channels[0], 1, kernel_size=1)
+
+        self._context_shapes = [(c_in, n_bands // 2 ** i) for i, c_in in enumerate(in_channels)]
+
+    def features(self, magnitude: torch.Tensor) -> torch.Tensor:
+        """Log band magnitudes ``(batch, frames, bands)`` of STFT magnitudes ``(batch, bins, frames)``."""
+        return torch.log(torch.matmul(self.band_analysis, magnitude) + _FEATURE_EPS).transpose(1, 2)
+
+    def expand_mask(self, mask: torch.Tensor) -> torch.Tensor:
+        """Bin mask ``(batch, bins, frames)`` of a band mask ``(batch, frames, bands)``."""
+        return torch.matmul(self.band_synthesis, mask.transpose(1, 2))
+
+    def initial_state(self, batch_size: int = 1, device: Optional[torch.device] = None) -> ANCRNState:
+        """State of a stream that starts from silence."""
+        device = self.band_analysis.device if device is None else device
+        context = [
+            torch.zeros(batch_size, c, self.kernel_time - 1, f, device=device)
+            for c, f in self._context_shapes
+        ]
+        # silence is the feature floor at the input, and zero behind every ReLU
+        context[0].fill_(torch.log(torch.tensor(_FEATURE_EPS)).item())
+        lstm = tuple(torch.zeros(2, batch_size, self.hidden_size, device=device) for _ in range(2))
+        return ANCRNState(context, lstm)
+
+    def forward(self, features: torch.Tensor, state: Optional[ANCRNState] = None) -> Tuple[torch.Tensor, ANCRNState]:
+        """
+        Band mask of a block of frames.
+
+        Arguments:
+            features {torch.Tensor} -- Log band magnitudes ``(batch, frames, bands)``, see `features`.
+
+        Keyword Arguments:
+            state {[ANCRNState]} -- State returned by the previous block of the same streams
+                                    (default: {None}, streams starting from silence).
+
+        Returns:
+            Tuple[torch.Tensor, ANCRNState] -- The mask ``(batch, frames, bands)`` and the state for
+            the next block.
+        """
+        if state is None:
+            state = self.initial_state(features.shape[0], features.device)
+        x = features.unsqueeze(1)
+        skips, context = [], []
+        for block, past in zip(self.encoder, state.context):
+            x = torch.cat([past, x], dim=2)
+            context.append(x[:, :, x.shape[2] - past.shape[2]:])
+            x = self.pool(block(x))
+            skips.append(x)
+
+        b, c, t, f = x.shape
+        z, lstm = self.lstm(x.permute(0, 2, 1, 3).reshape(b, t, c * f), state.lstm)
+        x = torch.relu(self.project(z)).reshape(b, t, c, f).permute(0, 2, 1, 3)
+
+        for block, skip in zip(self.decoder, reversed(skips)):
+            x = block(torch.cat([x, skip], dim=1))
+        mask = torch.sigmoid(self.head(x)).squeeze(1)
+        return mask, ANCRNState(context, lstm)
+
+
+def save_model(model: ANCRN, path: str) -> None:
+    """Write the configuration and weights of a float model."""
+    torch.save({"config": model.config, "state_dict": model.state_dict()}, path)
+
+
+def load_model(path: str, map_location: str = "cpu") -> ANCRN:
+    """Read a model written by `save_model`, in eval mode."""
+    checkpoint = torch.load(path, map_location=map_location)
+    model = ANCRN(**checkpoint["config"])
+    model.load_state_dict(checkpoint["state_dict"])
+    return model.eval()
+
+
+def fuse(model: ANCRN) -> ANCRN:
+    """
+    Eval-mode copy of a model with every BatchNorm folded into the conv before it.
+
+    Encoder blocks become a single conv+ReLU, decoder blocks a transposed conv followed by ReLU. The
+    output is unchanged up to float rounding.
+    """
+    model = copy.deepcopy(model).eval()
+    for block in model.encoder:
+        quantization.fuse_modules(block, [["0", "1", "2"]], inplace=True)
+    for block in model.decoder:
+        quantization.fuse_modules(block, [["0", "1"]], inplace=True)
+    return model
+
+
+def quantize(
+    model: ANCRN,
+    mode: str = "dynamic",
+    calibration: Optional[Iterable[torch.Tensor]] = None,
+    backend: Optional[str] = None,
+) -> ANCRN:
+    """
+    Fused, int8 quantized copy of a model for CPU inference.
+
+    ``"dynamic"`` stores the LSTM and linear weights as int8 and quantizes their activations on the
+    fly, the convs stay float. ``"static"`` additionally runs every conv block in int8, with
+    activation ranges observed on ``calibration``; each block quantizes its input and dequantizes
+    its output, so the stream state, skip connections and LSTM stay float.
+
+    Arguments:
+        model {ANCRN} -- Trained float model, left untouched.
+
+    Keyword Arguments:
+        mode {str} -- "dynamic" or "static" (default: {"dynamic"}).
+        calibration {[Iterable[torch.Tensor]]} -- Feature blocks ``(batch, frames, bands)`` run
+                                                 through the model to observe activation ranges,
+                                                 required for "static" (default: {None}).
+        backend {[str]} -- Quantized engine, e.g. "fbgemm" (x86) or "qnnpack" (ARM) (default: {None},
+                           the current ``torch.backends.quantized.engine``).
+
+    Returns:
+        ANCRN -- The quantized model, in eval mode.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"mode must be one of {QUANTIZATION_MODES}, got {mode}")
+    if backend is not None:
+        torch.backends.quantized.engine = backend
+    model = fuse(model)
+    if mode == "static":
+        if calibration is None:
+            raise ValueError("Static quantization needs calibration features")
+        qconfig = quantization.get_default_qconfig(torch.backends.quantized.engine)
+        for blocks in (model.encoder, model.decoder):
+            for i, block in enumerate(blocks):
+                blocks[i] = quantization.QuantWrapper(block)
+                blocks[i].qconfig = qconfig
+        # transposed convs only support per-tensor weight scales
+        for block in model.decoder:
+            block.qconfig = quantization.QConfig(activation=qconfig.activation,
+                                                 weight=quantization.default_weight_observer)
+        quantization.prepare(model, inplace=True)
+        with torch.no_grad():
+            for features in calibration:
+                model(features)
+        quantization.convert(model, inplace=True)
+    return quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
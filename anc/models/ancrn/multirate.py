@@ -0,0 +1,135 @@
+"""
+Band-split (multi-rate) spectral gating.
+
+The input is split into a low band, decimated to ``low_sr`` with a polyphase filter, and the
+complementary high band ``y - interpolate(decimate(y))`` at the full rate. Only the low band is
+gated, the high band is passed through with a fixed gain and both are summed again. Splitting and
+recombining is exact: with ``high_band_gain=1`` and a gate that does nothing the output equals the input.
+
+STFT sizes given in samples (``n_fft``, ``win_length``, ``hop_length``, ``chunk_size``,
+``padding``) are rescaled to the low rate so the frequency and time resolution stay about the same; all
+parameters in Hz, ms or s carry over unchanged.
+
+Trade-offs, measured with ``benchmark`` (10 s of 48 kHz engine and brown noise with intermittent
+tones below 2 kHz, default non-stationary gate, numpy / torch on CPU):
+
+=========  ===============  ==============  =============================
+ low_sr     gate time        SNR vs. clean   deviation from full-rate gate
+=========  ===============  ==============  =============================
+ 48000      1.00x / 1.00x    5.7 / 5.4 dB    --
+ 16000      0.44x / 0.41x    6.3 / 6.1 dB    -16 / -13 dB
+  8000      0.32x / 0.20x    6.3 / 6.1 dB    -16 / -13 dB
+=========  ===============  ==============  =============================
+
+The resampling filters cost a fixed share, so the speed-up stays below the rate ratio. The output
+differs from the full-rate gate because ``n_fft`` is rounded to a power of two at the low rate
+and the noise statistics only cover the low band; the high band gain (1 or 0) made no measurable
+difference for this noise.
+
+Content above ``low_sr / 2`` is never gated, so noise there is either kept (gain 1) or removed
+together with any signal there (gain 0); pick ``low_sr`` above the highest frequency that matters.
+"""
+import argparse
+import json
+import time
+from fractions import Fraction
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy.signal import resample_poly
+
+
+def _ratio(sr: int, low_sr: int) -> Tuple[int, int]:
+    ratio = Fraction(low_sr, sr).limit_denominator(1000)
+    if not 0 < ratio < 1:
+        raise ValueError(f"low_sr must be below sr ({sr}), got {low_sr}")
+    return ratio.numerator, ratio.denominator
+
+
+def band_split(y: np.ndarray, sr: int, low_sr: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split ``y`` into its low band at ``low_sr`` and the complementary high band at ``sr``.
+
+    Returns:
+        (low, high): ``low`` has ``ceil(n * low_sr / sr)`` samples, ``high`` the length of ``y``.
+    """
+    up, down = _ratio(sr, low_sr)
+    low = resample_poly(y, up, down, axis=-1)
+    high = y - band_merge(low, np.zeros_like(y), sr, low_sr)
+    return low, high
+
+
+def band_merge(low: np.ndarray, high: np.ndarray, sr: int, low_sr: int, high_gain: float = 1.0) -> np.ndarray:
+    """Interpolate the low band back to ``sr`` and add the high band scaled by ``high_gain``."""
+    up, down = _ratio(sr, low_sr)
+    n = high.shape[-1]
+    low_full = resample_poly(low, down, up, axis=-1)[..., :n]
+    if low_full.shape[-1] < n:
+        low_full = np.concatenate([low_full, np.zeros(low_full.shape[:-1] + (n - low_full.shape[-1],))], axis=-1)
+    return low_full + high_gain * high
+
+
+def scale_samples(n: Optional[int], sr: int, low_sr: int, power_of_two: bool = False) -> Optional[int]:
+    """Rescale a length in samples from ``sr`` to ``low_sr``, optionally to the nearest power of two."""
+    if n is None:
+        return None
+    scaled = max(int(round(n * low_sr / sr)), 1)
+    if power_of_two:
+        scaled = 2 ** int(round(np.log2(scaled)))
+    return scaled
+
+
+def benchmark(sr: int = 48000, seconds: float = 10.0, low_srs=(16000, 8000), seed: int = 0, **gate_kwargs) -> dict:
+    """
+    Gate time and quality of band-split gating against the full-rate gate.
+
+    The test signal is engine plus brown noise with intermittent tones below 2 kHz, the typical cabin
+    case. Reports the gate time relative to the full rate, the SNR against the clean tones and the
+    level of the difference to the full-rate output relative to that output.
+    """
+    from anc.models.ancrn.generate_noise import NoiseGenerator
+    from anc.models.ancrn.noisereduce import reduce_noise
+
+    n = int(sr * seconds)
+    t = np.arange(n) / sr
+    rng = np.random.default_rng(seed)
+    freqs = np.repeat(rng.uniform(200, 2000, n // int(0.2 * sr) + 1), int(0.2 * sr))[:n]
+    clean = 0.3 * np.sin(2 * np.pi * np.cumsum(freqs) / sr) * (np.sin(2 * np.pi * 0.3 * t) > 0)
+    gen = NoiseGenerator(sr, seed=seed, dtype=np.float64)
+    noisy = clean + 0.05 * (gen.engine(1, n, 1500, 3000)[0] + gen.brown(1, n)[0])
+
+    def snr(estimate):
+        return float(10 * np.log10(np.sum(clean ** 2) / np.sum((estimate - clean) ** 2)))
+
+    # the first call compiles the Numba kernels
+    reduce_noise(noisy[:sr], sr, **gate_kwargs)
+    start = time.perf_counter()
+    full = reduce_noise(noisy, sr, **gate_kwargs)
+    full_time = time.perf_counter() - start
+    report = {str(sr): {"relative_time": 1.0, "snr_db": snr(full)}}
+    for low_sr in low_srs:
+        for high_gain in (1.0, 0.0):
+            start = time.perf_counter()
+            out = reduce_noise(noisy, sr, band_split_sr=low_sr, high_band_gain=high_gain, **gate_kwargs)
+            elapsed = time.perf_counter() - start
+            report[f"{low_sr}/gain{high_gain:g}"] = {
+                "relative_time": elapsed / full_time,
+                "snr_db": snr(out),
+                "deviation_db": float(10 * np.log10(np.sum((out - full) ** 2) / np.sum(full ** 2))),
+            }
+    return report
+
+
+def main():
+    """CLI printing the band-split benchmark as JSON."""
+    parser = argparse.ArgumentParser(description="Speed and quality of band-split spectral gating.")
+    parser.add_argument("--sr", type=int, default=48000)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--use_torch", action="store_true")
+    args = parser.parse_args()
+    kwargs = dict(use_torch=True, device="cpu") if args.use_torch else {}
+    print(json.dumps(benchmark(sr=args.sr, seconds=args.seconds, **kwargs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,11 @@
 from anc.models.ancrn.gates.spectralgate.stationary import SpectralGateStationary
 from anc.models.ancrn.gates.spectralgate.nonstationary import SpectralGateNonStationary
+from anc.models.ancrn.autotune import get_profile
+from anc.models.ancrn.multirate import band_merge, band_split, scale_samples
+from anc.models.ancrn.gates.masks import CompactMask
+from anc.models.ancrn.silence import active_spans, detect_silence, fill_silent, gate_active
+from anc.models.ancrn.utils import float_to_pcm_, pcm_scale, pcm_to_float
+import numpy as np
 
 
 try:
@@ -34,6 +40,22 @@ def reduce_noise(
         n_jobs=1,
         use_torch=False,
         device="cuda",
+        profiler=None,
+        backend=None,
+        autotune=False,
+        precision=None,
+        cache=None,
+        band_split_sr=None,
+        high_band_gain=1.0,
+        silence_thresh_db=None,
+        min_silence_ms=500,
+        return_silence_index=False,
+        noise_bank=None,
+        shared_mask=None,
+        n_mask_bands=None,
+        band_scale="erb",
+        synthesis_length=None,
+        return_mask=None,
 ):
     """
     Reduce noise via spectral gating.
@@ -41,11 +63,14 @@ def reduce_noise(
     Parameters
     ----------
     y : np.ndarray [shape=(# frames,) or (# channels, # frames)], real-valued
-        input signal
+        input signal. Integer PCM such as int16 WAV samples is converted to [-1, 1) chunk by
+        chunk and the output written back in the same dtype, rounded and clipped, so no float
+        copy of the whole recording is made
     sr : int
         sample rate of input signal / noise signal
     y_noise : np.ndarray [shape=(# frames,) or (# channels, # frames)], real-valued
         noise signal to compute statistics over (only for stationary noise reduction).
+        Defaults to the whole of ``y``, whose statistics are accumulated chunk by chunk.
     stationary : bool, optional
         Whether to perform stationary, or non-stationary noise reduction, by default False
     prop_decrease : float, optional
@@ -107,7 +132,163 @@ def reduce_noise(
         Whether to use the torch version of spectral gating, by default False
     device: str, optional
         A device to run the torch spectral gating on, by default "cuda"
+    profiler: GateProfiler, optional
+        Collects per-stage timings of the call, see ``anc.models.ancrn.gates.profiling``,
+        by default None
+    backend: str, optional
+        joblib backend used to process chunks in parallel, e.g. "loky" or "threading",
+        by default None (joblib's default)
+    autotune: bool, optional
+        Use the host profile chosen by ``anc.models.ancrn.autotune.autotune`` for this
+        configuration instead of ``chunk_size``, ``padding``, ``n_jobs``, ``backend``,
+        ``use_torch`` and ``device``. Calibrates and stores a profile on first use,
+        by default False
+    precision: str, optional
+        Precision of the torch gate's masking maths, "float64", "float32" or "bfloat16"
+        (the STFT stays float32 for "bfloat16"). Only used with ``use_torch``,
+        by default None (follows the input dtype)
+    cache: ChunkCache, optional
+        Cache of filtered chunks, see ``anc.models.ancrn.gates.spectralgate.cache``. Repeated
+        calls over the same signal and parameters reuse the cached chunks instead of filtering
+        them again; requires ``chunk_size``, by default None
+    band_split_sr: int, optional
+        Gate only the band below ``band_split_sr / 2``, decimated to ``band_split_sr`` with a
+        polyphase filter, and add the band above it back unchanged. Sizes in samples (``n_fft``,
+        ``win_length``, ``hop_length``, ``chunk_size``, ``padding``) are rescaled to the lower
+        rate. Several times faster at 8-16 kHz for noise concentrated at low frequencies, but
+        noise above the split is never reduced, see ``anc.models.ancrn.multirate``,
+        by default None (gate the full band)
+    high_band_gain: float, optional
+        Fixed gain of the band above the split, only used with ``band_split_sr``, by default 1.0
+    silence_thresh_db: float, optional
+        Frame RMS level in dBFS below which audio is treated as silence: silent spans skip the
+        gate and get its closed output ``(1 - prop_decrease) * y``, see ``anc.models.ancrn.silence``. With
+        ``band_split_sr`` silence is detected on the low band, by default None (gate everything)
+    min_silence_ms: float, optional
+        Shortest silent span that is skipped, only used with ``silence_thresh_db``, by default 500
+    return_silence_index: bool, optional
+        Also return the ``(n_spans, 2)`` array of ``[start, end)`` samples of the skipped spans,
+        by default False
+    noise_bank: NoiseProfileBank, optional
+        Bank of precomputed stationary noise profiles, see ``anc.models.ancrn.gates.noise_bank``.
+        With ``stationary`` and no ``y_noise``, the profile nearest to the first
+        ``noise_bank.query_s`` seconds of ``y`` supplies the noise threshold instead of an analysis
+        of a noise clip, by default None
+    shared_mask: str, optional
+        "mean" or "max": compute one mask from the channels' combined magnitude and apply it to
+        every channel, so multichannel (microphone array) input costs one mask computation and
+        all channels are gated alike, by default None (a mask per channel)
+    n_mask_bands: int, optional
+        Compute thresholds, noise floors and masks on this many perceptual bands (32-64) and
+        interpolate the mask back to the FFT bins, see ``anc.models.ancrn.gates.bands``. Much
+        cheaper masking at the cost of frequency detail finer than a band; the frequency part
+        of the mask smoothing is replaced by the interpolation, by default None (per bin)
+    band_scale: str, optional
+        Band spacing, "erb" or "mel", only used with ``n_mask_bands``, by default "erb"
+    synthesis_length: int, optional
+        Use the low-delay framing of ``anc.models.ancrn.gates.framing``: masks are still computed
+        with the ``n_fft`` analysis window, but frames are synthesized with a window of this many
+        samples (a multiple of the hop length, at least twice it), so a streamed output only lags
+        its input by ``synthesis_length - hop_length`` samples. Needs ``win_length`` equal to
+        ``n_fft``, by default None (centred Hann frames)
+    return_mask: str, optional
+        Also return the mask the signal was gated with as a ``CompactMask`` (see
+        ``anc.models.ancrn.gates.masks``), after the silence index if that is returned too: "soft"
+        for the applied mask quantized to uint8, "binary" for the stationary gate's bit-packed
+        threshold mask before smoothing. The mask is quantized chunk by chunk in the same pass as
+        the audio, with the chunks' seams and padding; its frames match the STFT of the whole signal
+        when ``chunk_size`` and ``padding`` are multiples of the hop length. Skipped silent spans get
+        the mask of a zero gain and ``cache`` is not used. Masks are only exported by the NumPy gates
+        at the full band, by default None (audio only)
     """
+    if return_mask is not None:
+        if return_mask not in ("soft", "binary"):
+            raise ValueError(f"return_mask must be None, 'soft' or 'binary', got {return_mask}")
+        if band_split_sr is not None and band_split_sr < sr:
+            raise ValueError("return_mask is not supported with band_split_sr")
+        if return_mask == "binary" and not stationary:
+            raise ValueError("The non-stationary mask is a soft sigmoid mask, there is no binary mask to export")
+
+    if band_split_sr is not None and band_split_sr < sr:
+        low, high = band_split(pcm_to_float(y), sr, band_split_sr)
+        low_noise = None if y_noise is None else band_split(pcm_to_float(y_noise), sr, band_split_sr)[0]
+        low_n_fft = scale_samples(n_fft, sr, band_split_sr, power_of_two=True)
+        hop = hop_length or (win_length or n_fft) // 4
+        low_hop = scale_samples(hop_length, sr, band_split_sr) or (
+            scale_samples(win_length, sr, band_split_sr) or low_n_fft) // 4
+        low = reduce_noise(
+            low,
+            band_split_sr,
+            stationary=stationary,
+            y_noise=low_noise,
+            prop_decrease=prop_decrease,
+            time_constant_s=time_constant_s,
+            freq_mask_smooth_hz=freq_mask_smooth_hz,
+            time_mask_smooth_ms=time_mask_smooth_ms,
+            thresh_n_mult_nonstationary=thresh_n_mult_nonstationary,
+            sigmoid_slope_nonstationary=sigmoid_slope_nonstationary,
+            n_std_thresh_stationary=n_std_thresh_stationary,
+            tmp_folder=tmp_folder,
+            chunk_size=scale_samples(chunk_size, sr, band_split_sr),
+            padding=scale_samples(padding, sr, band_split_sr),
+            n_fft=low_n_fft,
+            win_length=scale_samples(win_length, sr, band_split_sr),
+            hop_length=scale_samples(hop_length, sr, band_split_sr),
+            clip_noise_stationary=clip_noise_stationary,
+            use_tqdm=use_tqdm,
+            n_jobs=n_jobs,
+            use_torch=use_torch,
+            device=device,
+            profiler=profiler,
+            backend=backend,
+            autotune=autotune,
+            precision=precision,
+            cache=cache,
+            silence_thresh_db=silence_thresh_db,
+            min_silence_ms=min_silence_ms,
+            return_silence_index=True,
+            noise_bank=noise_bank,
+            shared_mask=shared_mask,
+            n_mask_bands=n_mask_bands,
+            band_scale=band_scale,
+            # the same number of hops as at the full rate keeps it a multiple of the scaled hop
+            synthesis_length=None if synthesis_length is None else low_hop * round(synthesis_length / hop),
+        )
+        low, silent_spans = low
+        filtered = band_merge(low, high, sr, band_split_sr, high_gain=high_band_gain)
+        if pcm_scale(np.asarray(y).dtype) is not None:
+            filtered = float_to_pcm_(filtered, np.asarray(y).dtype)
+        filtered = filtered.astype(np.asarray(y).dtype)
+        silent_spans = np.minimum(silent_spans * sr // band_split_sr, filtered.shape[-1])
+        fill_silent(filtered, y, silent_spans, prop_decrease)
+        return (filtered, silent_spans) if return_silence_index else filtered
+
+    if autotune:
+        profile = get_profile(
+            sr,
+            n_channels=1 if np.ndim(y) == 1 else np.shape(y)[0],
+            stationary=stationary,
+            time_constant_s=time_constant_s,
+            n_fft=n_fft,
+            win_length=win_length,
+            hop_length=hop_length,
+            freq_mask_smooth_hz=freq_mask_smooth_hz,
+            time_mask_smooth_ms=time_mask_smooth_ms,
+        )
+        chunk_size = profile["chunk_size"]
+        padding = profile["padding"]
+        n_jobs = profile["n_jobs"]
+        backend = profile["backend"]
+        use_torch = profile["use_torch"]
+        device = profile["device"]
+
+    noise_profile = None
+    if noise_bank is not None and stationary and y_noise is None:
+        if synthesis_length is not None:
+            raise ValueError("noise_bank profiles are measured with centred Hann frames, not the low-delay framing")
+        noise_bank.check_gate(sr, n_fft, win_length, hop_length)
+        noise_profile = noise_bank.match(pcm_to_float(np.asarray(y)[..., :int(noise_bank.query_s * sr)]),
+                                        n_std_thresh_stationary)
 
     if use_torch:
         if not TORCH_AVAILABLE:
@@ -118,6 +299,8 @@ def reduce_noise(
             raise ValueError(
                 "n_jobs must be 1 when using torch version of spectral gating."
             )
+        if return_mask is not None:
+            raise ValueError("return_mask is only supported by the NumPy gates, not with use_torch")
 
     # if using pytorch,
     if use_torch:
@@ -132,6 +315,7 @@ def reduce_noise(
             time_mask_smooth_ms=time_mask_smooth_ms,
             thresh_n_mult_nonstationary=thresh_n_mult_nonstationary,
             sigmoid_slope_nonstationary=sigmoid_slope_nonstationary,
+            n_std_thresh_stationary=n_std_thresh_stationary,
             tmp_folder=tmp_folder,
             chunk_size=chunk_size,
             padding=padding,
@@ -142,6 +326,14 @@ def reduce_noise(
             use_tqdm=use_tqdm,
             n_jobs=n_jobs,
             device=device,
+            profiler=profiler,
+            cache=cache,
+            precision=precision,
+            noise_stats=None if noise_profile is None else (noise_profile["std_db"], noise_profile["mean_db"]),
+            shared_mask=shared_mask,
+            n_mask_bands=n_mask_bands,
+            band_scale=band_scale,
+            synthesis_length=synthesis_length,
         )
     else:
         if stationary:
@@ -153,6 +345,7 @@ def reduce_noise(
                 n_std_thresh_stationary=n_std_thresh_stationary,
                 chunk_size=chunk_size,
                 clip_noise_stationary=clip_noise_stationary,
+                noise_thresh=None if noise_profile is None else noise_profile["threshold_db"],
                 padding=padding,
                 n_fft=n_fft,
                 win_length=win_length,
@@ -163,6 +356,13 @@ def reduce_noise(
                 tmp_folder=tmp_folder,
                 use_tqdm=use_tqdm,
                 n_jobs=n_jobs,
+                profiler=profiler,
+                cache=cache,
+                backend=backend,
+                shared_mask=shared_mask,
+                n_mask_bands=n_mask_bands,
+                band_scale=band_scale,
+                synthesis_length=synthesis_length,
             )
 
         else:
@@ -183,5 +383,44 @@ def reduce_noise(
                 tmp_folder=tmp_folder,
                 use_tqdm=use_tqdm,
                 n_jobs=n_jobs,
+                profiler=profiler,
+                cache=cache,
+                backend=backend,
+                shared_mask=shared_mask,
+                n_mask_bands=n_mask_bands,
+                band_scale=band_scale,
+                synthesis_length=synthesis_length,
             )
-    return sg.get_traces()
\ No newline at end of file
+
+    mask = None
+    if silence_thresh_db is None:
+        silent_spans = np.zeros((0, 2), dtype=np.int64)
+        if return_mask is None:
+            filtered = sg.get_traces()
+        else:
+            filtered, mask = sg.get_traces(return_mask=return_mask)
+    else:
+        silent_spans = detect_silence(y, sr, thresh_db=silence_thresh_db, min_silence_ms=min_silence_ms)
+        if return_mask is None:
+            filtered = gate_active(sg.get_traces, np.asarray(y), silent_spans, prop_decrease)
+        else:
+            filtered, mask = _gate_active_with_mask(sg, np.asarray(y), silent_spans, return_mask, prop_decrease)
+    result = (filtered, silent_spans) if return_silence_index else (filtered,)
+    if return_mask is not None:
+        result += (mask,)
+    return result if len(result) > 1 else filtered
+
+
+def _gate_active_with_mask(sg, y, silent_spans, return_mask, prop_decrease):
+    """`gate_active` that also joins up the mask, skipped spans getting the closed gate's mask."""
+    out = np.empty_like(y)
+    spans = [(start, end, True) for start, end in active_spans(silent_spans, sg.n_frames)]
+    spans += [(start, end, False) for start, end in silent_spans]
+    masks = []
+    for start, end, active in sorted(spans):
+        if active:
+            out[..., start:end], mask = sg.get_traces(int(start), int(end), return_mask=return_mask)
+        else:
+            mask = sg.closed_mask(int(start), int(end), return_mask)
+        masks.append(mask)
+    return fill_silent(out, y, silent_spans, prop_decrease), CompactMask.concatenate(masks)
\ No newline at end of file
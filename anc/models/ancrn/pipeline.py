@@ -0,0 +1,707 @@
+"""
+Streaming block pipelines: read, resample, convert, gate, trim, measure and write in one pass.
+
+A `Pipeline` pulls ``(channels, samples)`` blocks from a source and pushes each through a chain of
+`Stage` objects. A stage declares its output format in ``open(sr, n_channels)``, maps a block to a
+block (possibly empty, for stages that buffer) in ``process`` and returns what it still holds in
+``flush`` at the end of the stream. Nothing ever holds the whole recording, so memory is bounded by
+the block size, the stages' own state and the queues between stages.
+
+Two runtimes execute the same chain:
+
+* fused (default): one loop moves every block through all stages before the next block is read;
+* threaded (``threads=True``): every stage runs on its own thread with bounded queues in between, so
+  reading and writing overlap with the gate's compute (numpy, soundfile and torch release the GIL).
+
+Sources and converters fill preallocated buffers that rotate through a pool sized so that no block
+still queued downstream is overwritten. A pipeline can also be declared as a JSON spec, see
+`Pipeline.from_spec`, and run with ``python -m anc.models.ancrn.pipeline spec.json``::
+
+    {"source": {"stage": "read", "path": "in.wav", "block_size": 4096},
+     "stages": [{"stage": "resample", "sr": 16000},
+                {"stage": "gate", "block_size": 512, "stationary": false},
+                {"stage": "trim_silence", "thresh_db": -60},
+                {"stage": "meter"},
+                {"stage": "write", "path": "out.wav", "subtype": "PCM_16"}],
+     "threads": true}
+"""
+import argparse
+import json
+import math
+import queue
+import threading
+import time
+from fractions import Fraction
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.signal import resample_poly
+
+from anc.models.ancrn.silence import frame_energy_db
+from anc.models.ancrn.utils import float_to_pcm_, pcm_scale, pcm_to_float
+
+# marks the end of the stream on the queues of the threaded runtime
+_END = object()
+
+
+class Stage:
+    """
+    Block-in/block-out step of a `Pipeline`.
+
+    Subclasses implement `process` and, if they hold samples back, `flush`. Blocks are
+    ``(channels, samples)`` arrays; a block passed to `process` is only valid during the call,
+    stages that keep samples copy them.
+    """
+
+    # buffers a stage rotates through for its output, set by the pipeline before `open`
+    pool_size = 1
+
+    def open(self, sr: int, n_channels: int) -> Tuple[int, int]:
+        """Prepare for a stream of this format, returns the ``(sr, n_channels)`` of the output."""
+        self.sr, self.n_channels = sr, n_channels
+        return sr, n_channels
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def flush(self) -> Optional[np.ndarray]:
+        """Samples still held at the end of the stream."""
+        return None
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        """What the stage measured, reported by `Pipeline.run`."""
+        return {}
+
+    def _buffer(self, n_channels: int, n: int, dtype) -> np.ndarray:
+        """Next ``(n_channels, n)`` buffer of the pool, reallocated only when it is too small."""
+        if getattr(self, "_pool", None) is None or len(self._pool) != self.pool_size:
+            self._pool, self._next = [None] * self.pool_size, 0
+        buffer = self._pool[self._next]
+        if buffer is None or buffer.shape[0] != n_channels or buffer.shape[1] < n or buffer.dtype != dtype:
+            buffer = self._pool[self._next] = np.empty((n_channels, n), dtype=dtype)
+        self._next = (self._next + 1) % self.pool_size
+        return buffer[:, :n]
+
+
+class Source(Stage):
+    """First stage of a pipeline, produces the blocks."""
+
+    def open(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def blocks(self) -> Iterator[np.ndarray]:
+        raise NotImplementedError
+
+
+class ArraySource(Source):
+    """
+    Blocks of an in-memory signal.
+
+    Arguments:
+        y {np.ndarray} -- ``(samples,)`` or ``(channels, samples)``, any dtype.
+        sr {int} -- Sample rate.
+
+    Keyword Arguments:
+        block_size {int} -- Samples per block (default: {4096}).
+    """
+
+    def __init__(self, y: np.ndarray, sr: int, block_size: int = 4096):
+        self.y = np.atleast_2d(np.asarray(y))
+        self.sr = sr
+        self.block_size = block_size
+
+    def open(self) -> Tuple[int, int]:
+        return self.sr, self.y.shape[0]
+
+    def blocks(self) -> Iterator[np.ndarray]:
+        for start in range(0, self.y.shape[1], self.block_size):
+            yield self.y[:, start:start + self.block_size]
+
+
+class Reader(Source):
+    """
+    Blocks of a sound file, read straight into pooled buffers.
+
+    Arguments:
+        path {str} -- Any format soundfile reads.
+
+    Keyword Arguments:
+        block_size {int} -- Samples per block (default: {4096}).
+        dtype {str} -- "float32", or "int16" to keep PCM samples as integers (default: {"float32"}).
+    """
+
+    def __init__(self, path: str, block_size: int = 4096, dtype: str = "float32"):
+        self.path = path
+        self.block_size = block_size
+        self.dtype = np.dtype(dtype)
+
+    def open(self) -> Tuple[int, int]:
+        import soundfile as sf
+
+        info = sf.info(self.path)
+        return info.samplerate, info.channels
+
+    def blocks(self) -> Iterator[np.ndarray]:
+        import soundfile as sf
+
+        with sf.SoundFile(self.path) as f:
+            while True:
+                # soundfile reads frames-first into a (block_size, channels) buffer, its transpose is the block
+                buffer = self._buffer(self.block_size, f.channels, self.dtype)
+                n = f.read(self.block_size, dtype=self.dtype.name, out=buffer).shape[0]
+                if n == 0:
+                    return
+                yield buffer[:n].T
+
+
+class Resample(Stage):
+    """
+    Polyphase resampling to ``sr``, with the filter of ``scipy.signal.resample_poly``.
+
+    Blocks are resampled in chunks padded with enough input on both sides to cover the filter,
+    so the stream equals ``resample_poly`` of the whole signal and lags it by the padding.
+
+    Arguments:
+        sr {int} -- Output sample rate.
+    """
+
+    def __init__(self, sr: int):
+        self.target_sr = sr
+
+    def open(self, sr: int, n_channels: int) -> Tuple[int, int]:
+        super().open(sr, n_channels)
+        ratio = Fraction(self.target_sr, sr).limit_denominator(1000)
+        self.up, self.down = ratio.numerator, ratio.denominator
+        # the filter spans 10 * max(up, down) upsampled samples on either side of an output sample;
+        # chunks and padding are whole multiples of down so every chunk starts on the same filter phase
+        self.pad = self.down * math.ceil((10 * max(self.up, self.down) / self.up + 1) / self.down)
+        self.chunk = self.down * max(1, 4096 // self.down)
+        self._buffer_in = np.zeros((n_channels, self.pad), dtype=np.float32)
+        self._n_in = self._n_out = 0
+        return self.target_sr, n_channels
+
+    def _drain(self, final: bool) -> np.ndarray:
+        outputs = []
+        while self._buffer_in.shape[1] >= 2 * self.pad + (1 if final else self.chunk):
+            chunk = min(self.chunk, self._buffer_in.shape[1] - 2 * self.pad)
+            chunk = self.down * math.ceil(chunk / self.down)
+            segment = self._buffer_in[:, :2 * self.pad + chunk]
+            if segment.shape[1] < 2 * self.pad + chunk:
+                segment = np.pad(segment, ((0, 0), (0, 2 * self.pad + chunk - segment.shape[1])))
+            out = resample_poly(segment, self.up, self.down, axis=-1)
+            start = self.pad * self.up // self.down
+            outputs.append(out[:, start:start + chunk * self.up // self.down])
+            self._buffer_in = self._buffer_in[:, chunk:]
+        if not outputs:
+            return np.zeros((self.n_channels, 0), dtype=np.float32)
+        out = np.concatenate(outputs, axis=1)
+        if final:
+            out = out[:, :max(math.ceil(self._n_in * self.up / self.down) - self._n_out, 0)]
+        self._n_out += out.shape[1]
+        return out.astype(np.float32, copy=False)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        self._n_in += block.shape[1]
+        self._buffer_in = np.concatenate([self._buffer_in, pcm_to_float(block).astype(np.float32)], axis=1)
+        return self._drain(final=False)
+
+    def flush(self) -> np.ndarray:
+        # the zeros after the end are the padding resample_poly applies to the whole signal
+        self._buffer_in = np.concatenate(
+            [self._buffer_in, np.zeros((self.n_channels, self.pad), dtype=np.float32)], axis=1)
+        return self._drain(final=True)
+
+
+class Convert(Stage):
+    """
+    Conversion between float audio and integer PCM into pooled buffers.
+
+    Integer PCM maps to [-1, 1); float audio written as integers is rounded and clipped.
+
+    Arguments:
+        dtype {str} -- Output dtype, e.g. "float32" or "int16".
+    """
+
+    def __init__(self, dtype: str):
+        self.dtype = np.dtype(dtype)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        out = self._buffer(block.shape[0], block.shape[1], self.dtype)
+        if pcm_scale(self.dtype) is None:
+            out[...] = pcm_to_float(block) if pcm_scale(block.dtype) is not None else block
+        elif pcm_scale(block.dtype) is not None:
+            out[...] = block
+        else:
+            out[...] = float_to_pcm_(np.array(block, dtype=np.float64), self.dtype)
+        return out
+
+
+class _Rebuffer:
+    """Regroups blocks of any size into blocks of ``size`` samples."""
+
+    def __init__(self, n_channels: int, size: int, dtype=np.float32):
+        self.size = size
+        self._buffer = np.zeros((n_channels, size), dtype=dtype)
+        self.fill = 0
+
+    def push(self, block: np.ndarray) -> Iterator[np.ndarray]:
+        """Full blocks completed by ``block``, each valid until the next one is requested."""
+        pos = 0
+        while pos < block.shape[1]:
+            n = min(self.size - self.fill, block.shape[1] - pos)
+            self._buffer[:, self.fill:self.fill + n] = block[:, pos:pos + n]
+            self.fill += n
+            pos += n
+            if self.fill == self.size:
+                self.fill = 0
+                yield self._buffer
+
+    def pad(self) -> Optional[np.ndarray]:
+        """The partial block zero padded, or None if there is none."""
+        if not self.fill:
+            return None
+        self._buffer[:, self.fill:] = 0
+        self.fill = 0
+        return self._buffer
+
+    def partial(self) -> np.ndarray:
+        """The samples of the partial block, possibly none."""
+        fill, self.fill = self.fill, 0
+        return self._buffer[:, :fill]
+
+
+class Denoise(Stage):
+    """
+    Streaming denoiser, one stream object per channel.
+
+    Blocks are regrouped to the streams' ``block_size`` and the streams' ``latency_samples`` are
+    compensated: the output is aligned with the input and has the same length.
+
+    Arguments:
+        make_stream {Callable[[int], object]} -- Builds a stream for a sample rate, e.g. a
+                                                 `StreamingANCRN`; needs ``process(block)``,
+                                                 ``block_size`` and ``latency_samples``.
+    """
+
+    def __init__(self, make_stream: Callable[[int], object]):
+        self.make_stream = make_stream
+
+    def open(self, sr: int, n_channels: int) -> Tuple[int, int]:
+        super().open(sr, n_channels)
+        self.streams = [self.make_stream(sr) for _ in range(n_channels)]
+        self.block_size = self.streams[0].block_size
+        self._rebuffer = _Rebuffer(n_channels, self.block_size)
+        self._skip = self.streams[0].latency_samples
+        self._n_in = self._n_out = 0
+        return sr, n_channels
+
+    def _process_blocks(self, blocks: np.ndarray) -> np.ndarray:
+        return np.stack([stream.process(block) for stream, block in zip(self.streams, blocks)])
+
+    def _run(self, blocks: List[np.ndarray]) -> np.ndarray:
+        outputs = [self._process_blocks(block) for block in blocks]
+        out = np.concatenate(outputs, axis=1) if outputs else np.zeros((self.n_channels, 0), dtype=np.float32)
+        skip = min(self._skip, out.shape[1])
+        self._skip -= skip
+        out = out[:, skip:]
+        self._n_out += out.shape[1]
+        return out
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        self._n_in += block.shape[1]
+        return self._run([full.copy() for full in self._rebuffer.push(pcm_to_float(block).astype(np.float32))])
+
+    def flush(self) -> np.ndarray:
+        remaining = self._n_in - self._n_out
+        blocks = []
+        partial = self._rebuffer.pad()
+        if partial is not None:
+            blocks.append(partial.copy())
+        # silence pushes the delayed end of the input out of the streams
+        missing = self._skip + remaining - len(blocks) * self.block_size
+        blocks += [np.zeros((self.n_channels, self.block_size), dtype=np.float32)] * max(
+            math.ceil(missing / self.block_size), 0)
+        return self._run(blocks)[:, :remaining]
+
+
+class Gate(Denoise):
+    """
+    `TorchGate` streaming stage, all channels gated in one batched call per block.
+
+    Keyword Arguments:
+        block_size {int} -- Samples per gated block (default: {512}).
+        device {str} -- Device of the gate (default: {"cpu"}).
+        **gate_kwargs -- `anc.models.ancrn.evaluate.make_gate` parameters, e.g. ``stationary``.
+    """
+
+    def __init__(self, block_size: int = 512, device: str = "cpu", **gate_kwargs):
+        self.block_size = block_size
+        self.device = device
+        self.gate_kwargs = gate_kwargs
+        super().__init__(self._make_stream)
+
+    def open(self, sr: int, n_channels: int) -> Tuple[int, int]:
+        from anc.models.ancrn.evaluate import make_gate
+
+        self._gate = make_gate(sr, **self.gate_kwargs).to(self.device)
+        return super().open(sr, n_channels)
+
+    def _make_stream(self, sr: int):
+        from anc.models.ancrn.gates.streaming import StreamingGate
+
+        return StreamingGate(self._gate, self.block_size, device=self.device)
+
+    def _process_blocks(self, blocks: np.ndarray) -> np.ndarray:
+        return np.stack(self.streams[0].process_batch(self.streams, blocks))
+
+
+class TrimSilence(Stage):
+    """
+    Drops the silence at the start and the end of the stream.
+
+    Frames whose RMS level (of the loudest channel, see `anc.models.ancrn.silence`) is below
+    ``thresh_db`` are silent. Silent frames before the first loud one are dropped; silent frames
+    after a loud one are held back until the next loud frame and dropped if the stream ends first,
+    so the stage holds at most the longest silence inside the recording.
+
+    Keyword Arguments:
+        thresh_db {float} -- Level in dBFS below which a frame is silent (default: {-60.0}).
+        frame_ms {float} -- Frame length (default: {10.0}).
+    """
+
+    def __init__(self, thresh_db: float = -60.0, frame_ms: float = 10.0):
+        self.thresh_db = thresh_db
+        self.frame_ms = frame_ms
+
+    def open(self, sr: int, n_channels: int) -> Tuple[int, int]:
+        super().open(sr, n_channels)
+        self.frame_length = max(int(sr * self.frame_ms / 1000), 1)
+        self._rebuffer = None
+        self._started = False
+        self._held = []
+        self.trimmed = 0
+        return sr, n_channels
+
+    def _frames(self, frames: Iterable[np.ndarray]) -> np.ndarray:
+        out = []
+        for frame in frames:
+            if frame_energy_db(frame, frame.shape[1])[0] >= self.thresh_db:
+                self._started = True
+                out += self._held
+                self._held = []
+                out.append(frame.copy())
+            elif self._started:
+                self._held.append(frame.copy())
+            else:
+                self.trimmed += frame.shape[1]
+        if not out:
+            return np.zeros((self.n_channels, 0), dtype=self._rebuffer._buffer.dtype)
+        return np.concatenate(out, axis=1)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        if self._rebuffer is None:
+            self._rebuffer = _Rebuffer(self.n_channels, self.frame_length, block.dtype)
+        return self._frames(self._rebuffer.push(block))
+
+    def flush(self) -> Optional[np.ndarray]:
+        if self._rebuffer is None:
+            return None
+        partial = self._rebuffer.partial()
+        out = self._frames([partial] if partial.shape[1] else [])
+        self.trimmed += sum(frame.shape[1] for frame in self._held)
+        self._held = []
+        return out
+
+    def stats(self) -> dict:
+        return {"trimmed_samples": self.trimmed}
+
+
+class Meter(Stage):
+    """Pass-through tap measuring every channel's peak and RMS level in dBFS and its clipped samples."""
+
+    def open(self, sr: int, n_channels: int) -> Tuple[int, int]:
+        super().open(sr, n_channels)
+        self.samples = 0
+        self._sum_squares = np.zeros(n_channels)
+        self._peak = np.zeros(n_channels)
+        self._clipped = np.zeros(n_channels, dtype=np.int64)
+        return sr, n_channels
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        scale = pcm_scale(block.dtype)
+        magnitude = np.abs(block, dtype=np.float64) / (1.0 if scale is None else scale)
+        self.samples += block.shape[1]
+        self._sum_squares += np.einsum("ij,ij->i", magnitude, magnitude)
+        self._peak = np.maximum(self._peak, magnitude.max(axis=1, initial=0.0))
+        # integer PCM clips at either end of its range, float audio at full scale
+        limit = 1.0 if scale is None else (scale - 1) / scale
+        self._clipped += np.count_nonzero(magnitude >= limit, axis=1)
+        return block
+
+    def stats(self) -> dict:
+        rms = np.sqrt(self._sum_squares / max(self.samples, 1))
+        return {
+            "samples": self.samples,
+            "peak_dbfs": (20 * np.log10(self._peak + 1e-20)).tolist(),
+            "rms_dbfs": (20 * np.log10(rms + 1e-20)).tolist(),
+            "clipped_samples": self._clipped.tolist(),
+        }
+
+
+class Writer(Stage):
+    """
+    Pass-through stage writing the stream to a sound file.
+
+    Arguments:
+        path {str} -- Output file, its format follows the extension.
+
+    Keyword Arguments:
+        subtype {[str]} -- soundfile subtype, e.g. "PCM_16" or "FLOAT" (default: {None}, the format's default).
+    """
+
+    def __init__(self, path: str, subtype: Optional[str] = None):
+        self.path = path
+        self.subtype = subtype
+        self._file = None
+
+    def open(self, sr: int, n_channels: int) -> Tuple[int, int]:
+        import soundfile as sf
+
+        super().open(sr, n_channels)
+        self._file = sf.SoundFile(self.path, "w", samplerate=sr, channels=n_channels, subtype=self.subtype)
+        self.samples = 0
+        return sr, n_channels
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        self._file.write(np.ascontiguousarray(block.T))
+        self.samples += block.shape[1]
+        return block
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> dict:
+        return {"samples": self.samples}
+
+
+class Collect(Stage):
+    """Sink keeping a copy of the stream in memory, for tests and short signals."""
+
+    def open(self, sr: int, n_channels: int) -> Tuple[int, int]:
+        super().open(sr, n_channels)
+        self._blocks = []
+        return sr, n_channels
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        self._blocks.append(np.array(block))
+        return block
+
+    def result(self) -> np.ndarray:
+        """``(channels, samples)`` of everything that went through."""
+        if not self._blocks:
+            return np.zeros((self.n_channels, 0), dtype=np.float32)
+        return np.concatenate(self._blocks, axis=1)
+
+
+# stage names of `Pipeline.from_spec`
+STAGES = {
+    "read": Reader,
+    "resample": Resample,
+    "convert": Convert,
+    "gate": Gate,
+    "trim_silence": TrimSilence,
+    "meter": Meter,
+    "write": Writer,
+}
+
+
+class Pipeline:
+    """
+    Chain of stages streaming blocks from a source.
+
+    Arguments:
+        source {Source} -- Produces the blocks, e.g. a `Reader`.
+        stages {Sequence[Stage]} -- Applied in order to every block.
+
+    Keyword Arguments:
+        threads {bool} -- Run the source and every stage on their own thread (default: {False}).
+        queue_depth {int} -- Blocks queued between two threaded stages (default: {4}).
+    """
+
+    def __init__(self, source: Source, stages: Sequence[Stage], threads: bool = False, queue_depth: int = 4):
+        self.source = source
+        self.stages = list(stages)
+        self.threads = threads
+        self.queue_depth = queue_depth
+
+    @classmethod
+    def from_spec(cls, spec: Dict) -> "Pipeline":
+        """
+        Pipeline of a declarative spec.
+
+        ``spec["source"]`` and every entry of ``spec["stages"]`` name a stage of `STAGES` under
+        ``"stage"``, the other keys are its arguments. ``"threads"`` and ``"queue_depth"`` are optional.
+        """
+        def build(entry):
+            entry = dict(entry)
+            name = entry.pop("stage")
+            if name not in STAGES:
+                raise ValueError(f"Unknown stage {name!r}, expected one of {sorted(STAGES)}")
+            return STAGES[name](**entry)
+
+        return cls(build(spec["source"]), [build(entry) for entry in spec.get("stages", [])],
+                   threads=spec.get("threads", False), queue_depth=spec.get("queue_depth", 4))
+
+    def _source_blocks(self, busy: List[float]) -> Iterator[np.ndarray]:
+        blocks = self.source.blocks()
+        while True:
+            start = time.perf_counter()
+            block = next(blocks, None)
+            busy[0] += time.perf_counter() - start
+            if block is None:
+                return
+            self.samples_in += block.shape[1]
+            yield block
+
+    def _push(self, block: Optional[np.ndarray], first: int, busy: List[float]) -> None:
+        for i in range(first, len(self.stages)):
+            if block is None or block.shape[1] == 0:
+                return
+            start = time.perf_counter()
+            block = self.stages[i].process(block)
+            busy[i + 1] += time.perf_counter() - start
+
+    def _run_fused(self, busy: List[float]) -> None:
+        for block in self._source_blocks(busy):
+            self._push(block, 0, busy)
+        for i, stage in enumerate(self.stages):
+            start = time.perf_counter()
+            tail = stage.flush()
+            busy[i + 1] += time.perf_counter() - start
+            self._push(tail, i + 1, busy)
+
+    def _run_threaded(self, busy: List[float]) -> None:
+        n = len(self.stages)
+        queues = [queue.Queue(self.queue_depth) for _ in range(n)]
+        stop = threading.Event()
+        errors = []
+
+        def put(i, item):
+            if i >= n or (item is not _END and (item is None or item.shape[1] == 0)):
+                return
+            while not stop.is_set():
+                try:
+                    queues[i].put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def get(i):
+            while not stop.is_set():
+                try:
+                    return queues[i].get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            return _END
+
+        def feed():
+            for block in self._source_blocks(busy):
+                if stop.is_set():
+                    return
+                put(0, block)
+            put(0, _END)
+
+        def work(i):
+            stage = self.stages[i]
+            while True:
+                block = get(i)
+                if block is _END:
+                    break
+                start = time.perf_counter()
+                out = stage.process(block)
+                busy[i + 1] += time.perf_counter() - start
+                put(i + 1, out)
+            if stop.is_set():
+                return
+            start = time.perf_counter()
+            tail = stage.flush()
+            busy[i + 1] += time.perf_counter() - start
+            put(i + 1, tail)
+            put(i + 1, _END)
+
+        def guard(target, *args):
+            try:
+                target(*args)
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+
+        workers = [threading.Thread(target=guard, args=(feed,), name="pipeline-source")]
+        workers += [threading.Thread(target=guard, args=(work, i), name=f"pipeline-{type(stage).__name__}")
+                    for i, stage in enumerate(self.stages)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if errors:
+            raise errors[0]
+
+    def run(self) -> Dict:
+        """
+        Stream the source through the stages.
+
+        Returns:
+            dict -- Wall time, the input and output formats, the samples read and, per stage, the
+            time it spent processing (``busy_s``) and its `Stage.stats`.
+        """
+        # a pooled block can wait in every queue downstream of its stage and be processed by every stage
+        pool_size = (self.queue_depth + 1) * (len(self.stages) + 1) + 1 if self.threads else 1
+        for stage in [self.source] + self.stages:
+            stage.pool_size = pool_size
+        sr, n_channels = self.source.open()
+        formats = [(sr, n_channels)]
+        self.samples_in = 0
+        busy = [0.0] * (len(self.stages) + 1)
+        start = time.perf_counter()
+        try:
+            for stage in self.stages:
+                formats.append(stage.open(*formats[-1]))
+            if self.threads:
+                self._run_threaded(busy)
+            else:
+                self._run_fused(busy)
+        finally:
+            for stage in self.stages:
+                stage.close()
+        return {
+            "seconds": time.perf_counter() - start,
+            "input": {"sr": formats[0][0], "channels": formats[0][1]},
+            "output": {"sr": formats[-1][0], "channels": formats[-1][1]},
+            "samples_in": self.samples_in,
+            "source_busy_s": busy[0],
+            "stages": [dict(stage=type(stage).__name__, busy_s=busy[i + 1], **stage.stats())
+                       for i, stage in enumerate(self.stages)],
+        }
+
+
+def main():
+    """CLI running a pipeline spec, see the module docstring, and printing its report."""
+    parser = argparse.ArgumentParser(description = 'Run a streaming pipeline declared in a JSON spec.')
+    parser.add_argument('spec', type = str, help = 'JSON file with "source" and "stages".')
+    parser.add_argument('--threads', action = 'store_true', help = 'Run every stage on its own thread.')
+
+    args = parser.parse_args()
+    with open(args.spec) as f:
+        spec = json.load(f)
+    if args.threads:
+        spec["threads"] = True
+    print(json.dumps(Pipeline.from_spec(spec).run(), indent = 2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,146 @@
 import matplotlib.pyplot as plt
 import numpy as np
+from typing import List, Optional, Tuple, Union
 
 
-def plot_spectrogram(signal, title):
-    fig, ax = plt.subplots(figsize = (20, 4))
-    cax = ax.matshow(
-        signal,
-        origin = "lower",
-        aspect = "auto",
-        cmap = plt.cm.afmhot,
-        vmin = -1 * np.max(np.abs(signal)),
-        vmax = np.max(np.abs(signal)),
+def _reduce2(x, axis, reduce):
+    """Halve ``axis`` of ``x`` by pairwise ``reduce``, repeating the last row of odd lengths."""
+    if x.shape[axis] % 2:
+        x = np.concatenate([x, np.take(x, [-1], axis=axis)], axis=axis)
+    shape = list(x.shape)
+    shape[axis: axis + 1] = [shape[axis] // 2, 2]
+    return reduce(x.reshape(shape), axis=axis + 1)
+
+
+class SpectrogramPyramid:
+    """
+    Multi-resolution view of a (freq_bins, frames) array for plotting.
+
+    Level 0 is the array itself, every further level halves the time axis until it fits in ``min_size``
+    frames, and the frequency axis while it has more than ``max_freq_bins`` bins. With ``reduce="max"`` a level keeps
+    the largest value of the cells it covers (peaks of dB spectrograms and masks stay visible at every
+    zoom), ``"min"`` the smallest and ``"mean"`` the average. The colour limits are computed once while
+    the pyramid is built.
+
+    A plot renders the coarsest level that still has at least one value per pixel of the view, so the
+    cost of drawing depends on the figure size and not on the length of the recording.
+
+    Arguments:
+        spec {np.ndarray} -- Array of shape (freq_bins, frames), e.g. a dB spectrogram or a mask.
+
+    Keyword Arguments:
+        reduce {str} -- "max", "min" or "mean" (default: {"max"}).
+        min_size {int} -- Frames below which time is not reduced further (default: {256}).
+        max_freq_bins {int} -- Bins above which frequency is reduced along with time (default: {1024}).
+    """
+
+    REDUCTIONS = {"max": np.max, "min": np.min, "mean": np.mean}
+
+    def __init__(self, spec: np.ndarray, reduce: str = "max", min_size: int = 256, max_freq_bins: int = 1024):
+        if reduce not in self.REDUCTIONS:
+            raise ValueError(f"reduce must be one of {list(self.REDUCTIONS)}, got {reduce}")
+        spec = np.asarray(spec)
+        if spec.ndim != 2:
+            raise ValueError(f"Expected a (freq_bins, frames) array, got shape {spec.shape}")
+        self.shape = spec.shape
+        self.reduce = reduce
+        # one pass over the full array, every view reuses these limits
+        peak = float(np.max(np.abs(spec)))
+        self.clim = (-peak, peak)
+
+        self.levels: List[np.ndarray] = [spec]
+        # (freq, time) size in level-0 cells of one cell of each level
+        self.scales: List[Tuple[int, int]] = [(1, 1)]
+        level, (sf, st) = spec, (1, 1)
+        while level.shape[1] > min_size:
+            level, st = _reduce2(level, 1, self.REDUCTIONS[reduce]), st * 2
+            if level.shape[0] > max_freq_bins:
+                level, sf = _reduce2(level, 0, self.REDUCTIONS[reduce]), sf * 2
+            self.levels.append(level)
+            self.scales.append((sf, st))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels)
+
+    def level_for(self, width_px: int, height_px: int, time_range: Optional[Tuple[float, float]] = None,
+                  freq_range: Optional[Tuple[float, float]] = None) -> int:
+        """Index of the coarsest level with at least one cell per pixel (or all of them) over the given range."""
+        t0, t1 = (0, self.shape[1]) if time_range is None else time_range
+        f0, f1 = (0, self.shape[0]) if freq_range is None else freq_range
+        for i in range(len(self.levels) - 1, 0, -1):
+            sf, st = self.scales[i]
+            if (t1 - t0) / st >= min(width_px, t1 - t0) and (f1 - f0) / sf >= min(height_px, f1 - f0):
+                return i
+        return 0
+
+    def view(self, width_px: int, height_px: int, time_range: Optional[Tuple[float, float]] = None,
+             freq_range: Optional[Tuple[float, float]] = None) -> Tuple[np.ndarray, Tuple[float, float, float, float]]:
+        """
+        Cells covering a range at the resolution of a ``width_px`` x ``height_px`` view.
+
+        Ranges are in level-0 frames and bins. Returns the cells and their extent
+        ``(t0, t1, f0, f1)`` in level-0 coordinates, ready for ``imshow(..., extent=extent)``.
+        """
+        t0, t1 = (0, self.shape[1]) if time_range is None else time_range
+        f0, f1 = (0, self.shape[0]) if freq_range is None else freq_range
+        i = self.level_for(width_px, height_px, (t0, t1), (f0, f1))
+        level, (sf, st) = self.levels[i], self.scales[i]
+        it0, it1 = max(int(np.floor(t0 / st)), 0), min(int(np.ceil(t1 / st)), level.shape[1])
+        if0, if1 = max(int(np.floor(f0 / sf)), 0), min(int(np.ceil(f1 / sf)), level.shape[0])
+        it1, if1 = max(it1, it0 + 1), max(if1, if0 + 1)
+        extent = (it0 * st, min(it1 * st, self.shape[1]), if0 * sf, min(if1 * sf, self.shape[0]))
+        return level[if0:if1, it0:it1], extent
+
+
+def _axes_pixels(ax) -> Tuple[int, int]:
+    bbox = ax.get_window_extent()
+    return max(int(bbox.width), 1), max(int(bbox.height), 1)
+
+
+def draw_spectrogram(ax, pyramid: SpectrogramPyramid, cmap=plt.cm.afmhot):
+    """
+    Draw a pyramid on ``ax`` and redraw it from the matching level whenever the view is zoomed or panned.
+
+    Returns:
+        The image artist.
+    """
+    width, height = _axes_pixels(ax)
+    data, extent = pyramid.view(width, height)
+    vmin, vmax = pyramid.clim
+    image = ax.imshow(
+        data, origin = "lower", aspect = "auto", cmap = cmap, vmin = vmin, vmax = vmax,
+        extent = (extent[0], extent[1], extent[2], extent[3]), interpolation = "nearest",
     )
+    ax.set_xlim(0, pyramid.shape[1])
+    ax.set_ylim(0, pyramid.shape[0])
+
+    def _update(ax):
+        width, height = _axes_pixels(ax)
+        data, extent = pyramid.view(width, height, tuple(sorted(ax.get_xlim())), tuple(sorted(ax.get_ylim())))
+        image.set_data(data)
+        image.set_extent(extent)
+
+    ax.callbacks.connect("xlim_changed", _update)
+    ax.callbacks.connect("ylim_changed", _update)
+    return image
+
+
+def plot_spectrogram(signal: Union[np.ndarray, SpectrogramPyramid], title, show = True):
+    """
+    Plot a (freq_bins, frames) array, e.g. a dB spectrogram or a mask.
+
+    Arrays are wrapped in a `SpectrogramPyramid`; pass one directly to reuse it across plots.
+    """
+    pyramid = signal if isinstance(signal, SpectrogramPyramid) else SpectrogramPyramid(signal)
+    fig, ax = plt.subplots(figsize = (20, 4))
+    cax = draw_spectrogram(ax, pyramid)
     fig.colorbar(cax)
     ax.set_title(title)
     plt.tight_layout()
-    plt.show()
+    if show:
+        plt.show()
+    return fig
 
 
 def plot_statistics_and_filter(
@@ -0,0 +1,318 @@
+"""
+Real-time harness for block processors.
+
+`RealtimeHarness` plays a signal through any object with a ``process(block) -> block`` method
+(`StreamingGate`, `StreamingANCRN`, ...) the way an audio device would. A clock thread delivers one
+input block per period into a ring buffer and, ``buffer_blocks`` periods later, takes the
+processed block out of another one. A dedicated processing thread sits in between. A block that is
+not ready when the clock comes for it is an xrun (the device plays silence), exactly what a user
+would hear as a dropout.
+
+``speed`` shortens the period below the block duration, so replaying a file at ``speed=4`` in CI
+finishes four times faster than real time and a configuration that runs without xruns there
+keeps up at real time with a 4x margin. Run ``python -m anc.models.ancrn.realtime <wav>`` to replay
+a file through the streaming gate or model and fail on xruns.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# part of a wait spent spinning instead of sleeping, sleep() overshoots by up to ~0.1 ms on Linux
+_SPIN_S = 5e-4
+
+
+class RingBuffer:
+    """
+    Single-producer/single-consumer ring buffer over a preallocated NumPy array.
+
+    The producer only advances the write counter and the consumer only the read counter, each after
+    its copy is complete, so one thread can write while another reads without a lock. ``write`` and
+    ``read`` never block or allocate (given ``out``): a full or empty buffer is reported to the
+    caller, which is how the harness detects overruns and underruns.
+
+    Arguments:
+        capacity {int} -- Items the buffer holds.
+
+    Keyword Arguments:
+        dtype {np.dtype} -- Item type (default: {np.float32}).
+    """
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        self.capacity = capacity
+        self._buffer = np.zeros(capacity, dtype=dtype)
+        # total items written and read, the difference is the fill level
+        self._written = 0
+        self._read = 0
+
+    def available(self) -> int:
+        """Items ready to be read."""
+        return self._written - self._read
+
+    def space(self) -> int:
+        """Items that can be written."""
+        return self.capacity - self.available()
+
+    def write(self, data: np.ndarray) -> bool:
+        """Append ``data``, all or nothing; False if it does not fit."""
+        n = len(data)
+        if n > self.space():
+            return False
+        start = self._written % self.capacity
+        first = min(n, self.capacity - start)
+        self._buffer[start:start + first] = data[:first]
+        self._buffer[:n - first] = data[first:]
+        self._written += n
+        return True
+
+    def read(self, n: int, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Take the next ``n`` items, into ``out`` if given; None if fewer are available."""
+        if n > self.available():
+            return None
+        if out is None:
+            out = np.empty(n, dtype=self._buffer.dtype)
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._buffer[start:start + first]
+        out[first:n] = self._buffer[:n - first]
+        self._read += n
+        return out
+
+
+def _wait_until(deadline: float) -> None:
+    remaining = deadline - time.perf_counter()
+    if remaining > _SPIN_S:
+        time.sleep(remaining - _SPIN_S)
+    while time.perf_counter() < deadline:
+        pass
+
+
+class RealtimeHarness:
+    """
+    Drive a block processor from a simulated audio clock.
+
+    Arguments:
+        processor {object} -- Has ``process(block) -> block`` on 1-D float32 blocks of ``block_size``
+                              samples, and optionally ``latency_samples``.
+        block_size {int} -- Samples per period.
+        sr {int} -- Sample rate.
+
+    Keyword Arguments:
+        buffer_blocks {int} -- Periods between a block's arrival and its playout, the budget the
+                               processing thread has per block (default: {2}).
+        speed {float} -- Clock rate relative to real time (default: {1.0}).
+    """
+
+    def __init__(self, processor, block_size: int, sr: int, buffer_blocks: int = 2, speed: float = 1.0):
+        if buffer_blocks < 1:
+            raise ValueError(f"buffer_blocks must be at least 1, got {buffer_blocks}")
+        self.processor = processor
+        self.block_size = block_size
+        self.sr = sr
+        self.buffer_blocks = buffer_blocks
+        self.speed = speed
+        self.period_s = block_size / sr / speed
+
+    def _process_loop(self, inputs: RingBuffer, input_index: RingBuffer, outputs: RingBuffer,
+                      output_index: RingBuffer, wake: threading.Event, stop: threading.Event,
+                      processing_s: np.ndarray, done_at: np.ndarray) -> None:
+        block = np.empty(self.block_size, dtype=np.float32)
+        index = np.empty(1, dtype=np.int64)
+        while True:
+            # the clock writes a block's index after its samples, so a readable index means a whole block
+            if input_index.available() < 1:
+                if stop.is_set():
+                    return
+                wake.wait(self.period_s)
+                wake.clear()
+                continue
+            if inputs.read(self.block_size, out=block) is None or input_index.read(1, out=index) is None:
+                raise RuntimeError("Input ring out of step with its index ring")
+            start = time.perf_counter()
+            out = np.asarray(self.processor.process(block), dtype=np.float32)
+            done = time.perf_counter()
+            processing_s[index[0]] = done - start
+            done_at[index[0]] = done
+            # the clock drains one block per period, the output only fills up if it stopped
+            while not (outputs.space() >= self.block_size and output_index.space() >= 1):
+                if stop.is_set():
+                    return
+                time.sleep(self.period_s / 4)
+            outputs.write(out)
+            output_index.write(index)
+
+    def run(self, y: np.ndarray) -> Tuple[np.ndarray, Dict[str, float]]:
+        """
+        Play ``y`` through the processor.
+
+        Arguments:
+            y {np.ndarray} -- Mono signal, zero padded to whole blocks.
+
+        Returns:
+            Tuple[np.ndarray, dict] -- The output as the device played it (silence for xruns),
+            aligned with the padded input up to the processor's own latency, and the report of
+            `summarize`.
+        """
+        y = np.asarray(y, dtype=np.float32)
+        n_blocks = -(-len(y) // self.block_size)
+        blocks = np.zeros((n_blocks, self.block_size), dtype=np.float32)
+        blocks.reshape(-1)[:len(y)] = y
+        output = np.zeros_like(blocks)
+
+        # room for the blocks in flight plus one, so a slow processor shows up as a late block
+        # rather than as a full ring
+        capacity = self.buffer_blocks + 1
+        inputs, outputs = RingBuffer(capacity * self.block_size), RingBuffer(capacity * self.block_size)
+        input_index, output_index = RingBuffer(capacity, np.int64), RingBuffer(capacity, np.int64)
+        wake, stop = threading.Event(), threading.Event()
+        processing_s = np.full(n_blocks, np.nan)
+        done_at = np.full(n_blocks, np.nan)
+        arrival = np.full(n_blocks, np.nan)
+        lateness = np.empty(n_blocks + self.buffer_blocks)
+        played = np.zeros(n_blocks, dtype=bool)
+        overruns = 0
+
+        worker = threading.Thread(
+            target=self._process_loop, name="block-processor", daemon=True,
+            args=(inputs, input_index, outputs, output_index, wake, stop, processing_s, done_at),
+        )
+        worker.start()
+        index = np.empty(1, dtype=np.int64)
+        start = time.perf_counter()
+        try:
+            for tick in range(n_blocks + self.buffer_blocks):
+                scheduled = start + tick * self.period_s
+                _wait_until(scheduled)
+                now = time.perf_counter()
+                lateness[tick] = now - scheduled
+                if tick < n_blocks:
+                    if inputs.space() >= self.block_size and input_index.space() >= 1:
+                        arrival[tick] = now
+                        inputs.write(blocks[tick])
+                        input_index.write(np.array([tick]))
+                        wake.set()
+                    else:
+                        overruns += 1
+                due = tick - self.buffer_blocks
+                if due < 0:
+                    continue
+                # drop blocks that finished after their playout tick, then play the due one if ready
+                while output_index.available():
+                    output_index.read(1, out=index)
+                    if index[0] >= due:
+                        outputs.read(self.block_size, out=output[index[0]])
+                        played[index[0]] = True
+                        break
+                    outputs.read(self.block_size, out=output[index[0]])
+                    output[index[0]] = 0
+                if not played[due]:
+                    output[due] = 0
+        finally:
+            stop.set()
+            wake.set()
+            worker.join()
+
+        report = self.summarize(processing_s, done_at - arrival, lateness, played, overruns)
+        return output.reshape(-1)[:len(y)], report
+
+    def summarize(self, processing_s: np.ndarray, block_latency_s: np.ndarray, lateness_s: np.ndarray,
+                  played: np.ndarray, overruns: int) -> Dict[str, float]:
+        """
+        Report of a run, times in milliseconds of wall time.
+
+        ``xruns`` counts blocks the device had to replace by silence, ``deadline_misses`` the blocks
+        that finished later than ``buffer_blocks`` periods after arriving. ``block_latency`` runs from
+        a block's arrival to the end of its processing, ``processing`` is the ``process`` call alone
+        and ``clock_jitter`` is how late the clock thread woke up for its ticks.
+        """
+        budget_s = self.buffer_blocks * self.period_s
+        processed = ~np.isnan(block_latency_s)
+        latency_ms = 1e3 * block_latency_s[processed]
+        processing_ms = 1e3 * processing_s[~np.isnan(processing_s)]
+
+        def percentile(values, q):
+            return float(np.percentile(values, q)) if len(values) else float("nan")
+
+        return {
+            "blocks": int(len(played)),
+            "xruns": int(np.sum(~played)),
+            "overruns": int(overruns),
+            "deadline_misses": int(np.sum(block_latency_s[processed] > budget_s) + np.sum(~processed)),
+            "speed": self.speed,
+            "period_ms": 1e3 * self.period_s,
+            "budget_ms": 1e3 * budget_s,
+            "block_latency_p50_ms": percentile(latency_ms, 50),
+            "block_latency_p99_ms": percentile(latency_ms, 99),
+            "block_latency_max_ms": float(latency_ms.max()) if len(latency_ms) else float("nan"),
+            "processing_p99_ms": percentile(processing_ms, 99),
+            "processing_jitter_ms": float(np.std(processing_ms)) if len(processing_ms) else float("nan"),
+            "clock_jitter_p99_ms": percentile(1e3 * lateness_s, 99),
+            "buffer_delay_ms": 1e3 * self.buffer_blocks * self.block_size / self.sr,
+            "algorithmic_delay_ms": 1e3 * getattr(self.processor, "latency_samples", 0) / self.sr,
+        }
+
+
+def replay(path: str, processor, block_size: int, buffer_blocks: int = 2,
+           speed: float = 4.0) -> Tuple[np.ndarray, int, Dict[str, float]]:
+    """
+    Play a sound file through a processor, channels mixed down to mono.
+
+    Returns:
+        Tuple[np.ndarray, int, dict] -- The played output, its sample rate and the run report.
+    """
+    import soundfile as sf
+
+    y, sr = sf.read(path, dtype="float32", always_2d=True)
+    harness = RealtimeHarness(processor, block_size, sr, buffer_blocks=buffer_blocks, speed=speed)
+    output, report = harness.run(y.mean(axis=1))
+    return output, sr, report
+
+
+def main():
+    """CLI replaying a file through the streaming gate or model, exits with 1 on xruns."""
+    import soundfile as sf
+
+    parser = argparse.ArgumentParser(description = 'Replay an audio file through a block processor on a simulated clock.')
+    parser.add_argument('path', type = str, help = 'Audio file to replay.')
+    parser.add_argument('--processor', type = str, default = 'gate', choices = ['gate', 'ancrn'])
+    parser.add_argument('--checkpoint', type = str, default = None, help = 'ANCRN model written by save_model.')
+    parser.add_argument('--block_size', type = int, default = 512)
+    parser.add_argument('--buffer_blocks', type = int, default = 2)
+    parser.add_argument('--speed', type = float, default = 4.0, help = 'Clock rate relative to real time.')
+    parser.add_argument('--stationary', action = 'store_true', help = 'Use the stationary gate.')
+    parser.add_argument('--time_constant_s', type = float, default = 2.0)
+    parser.add_argument('--n_fft', type = int, default = 1024)
+    parser.add_argument('--hop_length', type = int, default = None)
+    parser.add_argument('--synthesis_length', type = int, default = None, help = 'Low-delay framing of the gate.')
+    parser.add_argument('--save_to', type = str, default = None, help = 'Write the played output here.')
+
+    args = parser.parse_args()
+    sr = sf.info(args.path).samplerate
+    if args.processor == 'gate':
+        from anc.models.ancrn.evaluate import make_gate
+        from anc.models.ancrn.gates.streaming import StreamingGate
+
+        gate = make_gate(sr, stationary = args.stationary, time_constant_s = args.time_constant_s, n_fft = args.n_fft,
+                         hop_length = args.hop_length, synthesis_length = args.synthesis_length)
+        processor = StreamingGate(gate, args.block_size)
+    else:
+        from anc.models.ancrn.inference import StreamingANCRN
+        from anc.models.ancrn.model import ANCRN, load_model
+
+        model = ANCRN(sr = sr).eval() if args.checkpoint is None else load_model(args.checkpoint)
+        processor = StreamingANCRN(model, args.block_size)
+
+    output, sr, report = replay(args.path, processor, args.block_size, buffer_blocks = args.buffer_blocks,
+                                speed = args.speed)
+    if args.save_to is not None:
+        sf.write(args.save_to, output, sr)
+    print(json.dumps(report, indent = 2))
+    sys.exit(1 if report["xruns"] else 0)
+
+
+if __name__ == "__main__":
+    main()
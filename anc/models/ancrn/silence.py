@@ -0,0 +1,120 @@
+"""
+Energy-based silence detection in front of the spectral gates.
+
+Frames whose RMS level stays below a threshold are marked silent with one vectorized pass over
+the signal. `gate_active` then runs the gate only over the remaining spans and fills the silent
+ones with what a fully closed gate passes, ``(1 - prop_decrease) * y``, so the STFT, mask and
+ISTFT cost scales with the amount of active audio rather than the duration of the recording.
+
+For the stationary gate this is what gating those frames would have produced: a frame below the
+threshold in total energy is below it in every frequency bin as well (the energy of a bin never
+exceeds that of the frame), so with a threshold at or below the gate's noise threshold the mask of
+such a frame is closed and skipping it only changes the output by the mask smoothing at the span
+edges. The non-stationary gate compares each bin with its own smoothed level instead, so quiet
+frames are not necessarily closed there and skipping them is an approximation.
+"""
+from typing import Callable
+
+import numpy as np
+
+from anc.models.ancrn.utils import pcm_scale
+
+
+def frame_energy_db(y: np.ndarray, frame_length: int) -> np.ndarray:
+    """
+    RMS level in dBFS of non-overlapping frames, the loudest channel for multichannel input.
+
+    The last frame is shorter if the length is not a multiple of ``frame_length``.
+    """
+    y = np.atleast_2d(np.asarray(y))
+    n_channels, n_samples = y.shape
+    n_full = n_samples // frame_length
+    power = np.mean(
+        np.square(y[:, :n_full * frame_length].reshape(n_channels, n_full, frame_length), dtype=np.float64), axis=-1
+    )
+    if n_samples > n_full * frame_length:
+        tail = np.mean(np.square(y[:, n_full * frame_length:], dtype=np.float64), axis=-1)
+        power = np.concatenate([power, tail[:, None]], axis=-1)
+    # integer PCM is measured against its full scale
+    scale = pcm_scale(y.dtype)
+    if scale is not None:
+        power /= scale ** 2
+    return 10 * np.log10(np.max(power, axis=0) + 1e-20)
+
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    """``(start, end)`` index pairs of the runs of True in a boolean array."""
+    edges = np.diff(np.concatenate([[False], mask, [False]]).astype(np.int8))
+    return np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)], axis=-1)
+
+
+def detect_silence(
+        y: np.ndarray,
+        sr: int,
+        thresh_db: float = -60.0,
+        frame_ms: float = 20.0,
+        min_silence_ms: float = 500.0,
+) -> np.ndarray:
+    """
+    Silent spans of a signal.
+
+    Arguments:
+        y {np.ndarray} -- Signal, ``(n_samples,)`` or ``(n_channels, n_samples)``.
+        sr {int} -- Sample rate.
+
+    Keyword Arguments:
+        thresh_db {float} -- Frame RMS level in dBFS below which a frame is silent (default: {-60.0}).
+        frame_ms {float} -- Frame length (default: {20.0}).
+        min_silence_ms {float} -- Shorter silent runs are kept as active audio, so pauses in speech
+                                  do not fragment the gating (default: {500.0}).
+
+    Returns:
+        np.ndarray -- ``(n_spans, 2)`` int64 array of ``[start, end)`` sample indices.
+    """
+    n_samples = np.shape(y)[-1]
+    frame_length = max(int(sr * frame_ms / 1000), 1)
+    silent = frame_energy_db(y, frame_length) < thresh_db
+    runs = _runs(silent)
+    runs = runs[runs[:, 1] - runs[:, 0] >= max(int(np.ceil(min_silence_ms / frame_ms)), 1)]
+    return np.minimum(runs * frame_length, n_samples).astype(np.int64)
+
+
+def active_spans(silent_spans: np.ndarray, n_samples: int) -> np.ndarray:
+    """Complement of ``silent_spans`` in ``[0, n_samples)``, in the same format."""
+    bounds = np.concatenate([[0], np.ravel(silent_spans), [n_samples]]).reshape(-1, 2)
+    return bounds[bounds[:, 1] > bounds[:, 0]].astype(np.int64)
+
+
+def fill_silent(out: np.ndarray, y: np.ndarray, silent_spans: np.ndarray, prop_decrease: float = 1.0) -> np.ndarray:
+    """Fill ``silent_spans`` of ``out`` with the closed gate's output ``(1 - prop_decrease) * y``, in place."""
+    gain = 1.0 - prop_decrease
+    for start, end in silent_spans:
+        if gain == 0:
+            out[..., start:end] = 0
+            continue
+        span = gain * np.asarray(y[..., start:end], dtype=np.float64)
+        if np.issubdtype(out.dtype, np.integer):
+            np.rint(span, out=span)
+        out[..., start:end] = span
+    return out
+
+
+def gate_active(
+        get_traces: Callable, y: np.ndarray, silent_spans: np.ndarray, prop_decrease: float = 1.0
+) -> np.ndarray:
+    """
+    Gate only the audio outside ``silent_spans`` and fill the rest with the closed gate's output.
+
+    Arguments:
+        get_traces {Callable} -- ``get_traces(start_frame, end_frame)`` of a gate built over ``y``.
+        y {np.ndarray} -- The gate's input.
+        silent_spans {np.ndarray} -- Spans from `detect_silence`.
+
+    Keyword Arguments:
+        prop_decrease {float} -- The gate's ``prop_decrease``, silent spans are scaled by
+                                 ``1 - prop_decrease`` (default: {1.0}).
+    """
+    out = np.empty_like(y)
+    for start, end in active_spans(silent_spans, np.shape(y)[-1]):
+        out[..., start:end] = get_traces(start_frame=int(start), end_frame=int(end))
+    return fill_silent(out, y, silent_spans, prop_decrease)
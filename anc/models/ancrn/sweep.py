@@ -0,0 +1,242 @@
+import itertools
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+from anc.models.ancrn.gates.torchgate import TorchGate
+from anc.models.ancrn.gates.torchgate.utils import amp_to_db
+
+# mask parameters a sweep can vary, with the defaults of `reduce_noise`
+SWEEP_DEFAULTS = {
+    "prop_decrease": 1.0,
+    "n_std_thresh_stationary": 1.5,
+    "thresh_n_mult_nonstationary": 2.0,
+    "sigmoid_slope_nonstationary": 10.0,
+}
+
+REFERENCE_METRICS = ("snr_db", "si_sdr_db")
+METRICS = ("reduction_db",) + REFERENCE_METRICS
+
+
+def parameter_grid(grid: Dict[str, Iterable[float]]) -> List[Dict[str, float]]:
+    """
+    Cartesian product of a parameter grid, missing parameters take their `reduce_noise` default.
+
+    Example:
+        >>> parameter_grid({"prop_decrease": [0.5, 1.0]})[0]["prop_decrease"]
+        0.5
+    """
+    unknown = set(grid) - set(SWEEP_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Cannot sweep {sorted(unknown)}, only {list(SWEEP_DEFAULTS)}")
+    names = list(grid)
+    settings = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        setting = dict(SWEEP_DEFAULTS)
+        setting.update(zip(names, values))
+        settings.append(setting)
+    return settings
+
+
+class _Accumulator:
+    """Per-setting sums the metrics are derived from, additive over chunks."""
+
+    def __init__(self, n_settings: int, with_reference: bool):
+        self.with_reference = with_reference
+        self.input_energy = 0.0
+        self.output_energy = np.zeros(n_settings)
+        if with_reference:
+            self.reference_energy = 0.0
+            self.error_energy = np.zeros(n_settings)
+            self.cross = np.zeros(n_settings)
+
+    def update(self, idx: slice, x: np.ndarray, out: np.ndarray, ref: Optional[np.ndarray], first: bool) -> None:
+        # x, ref: (channels, samples), out: (settings, channels, samples)
+        if first:
+            self.input_energy += np.sum(x ** 2)
+            if self.with_reference:
+                self.reference_energy += np.sum(ref ** 2)
+        self.output_energy[idx] += np.sum(out ** 2, axis=(1, 2))
+        if self.with_reference:
+            self.error_energy[idx] += np.sum((out - ref) ** 2, axis=(1, 2))
+            self.cross[idx] += np.sum(out * ref, axis=(1, 2))
+
+    def metrics(self, names: Sequence[str]) -> Dict[str, np.ndarray]:
+        eps = np.finfo(np.float64).eps
+        result = {}
+        for name in names:
+            if name == "reduction_db":
+                result[name] = 10 * np.log10((self.input_energy + eps) / (self.output_energy + eps))
+            elif name == "snr_db":
+                result[name] = 10 * np.log10((self.reference_energy + eps) / (self.error_energy + eps))
+            elif name == "si_sdr_db":
+                target = self.cross ** 2 / (self.reference_energy + eps)
+                result[name] = 10 * np.log10((target + eps) / (np.maximum(self.output_energy - target, 0) + eps))
+        return result
+
+
+@torch.no_grad()
+def sweep(
+    y: np.ndarray,
+    sr: int,
+    grid: Dict[str, Iterable[float]],
+    stationary: bool = False,
+    y_noise: Optional[np.ndarray] = None,
+    reference: Optional[np.ndarray] = None,
+    return_signals: bool = True,
+    metrics: Optional[Sequence[str]] = None,
+    time_constant_s: float = 2.0,
+    freq_mask_smooth_hz: float = 500,
+    time_mask_smooth_ms: float = 50,
+    chunk_size: int = 600000,
+    padding: int = 30000,
+    n_fft: int = 1024,
+    win_length: Optional[int] = None,
+    hop_length: Optional[int] = None,
+    clip_noise_stationary: bool = True,
+    batch_size: int = 16,
+    device: str = "cpu",
+    precision: Optional[str] = None,
+) -> dict:
+    """
+    Evaluate a grid of mask parameters of the torch spectral gate in one pass over the signal.
+
+    The STFT of every chunk and the parameter independent part of the mask (the slowness ratio of
+    the non-stationary gate, the noise statistics of the stationary gate) are computed once; the
+    mask arithmetic, mask smoothing and ISTFT then run for ``batch_size`` settings at once along a
+    leading batch axis. Every setting gives the same output as
+    ``reduce_noise(..., use_torch=True)`` with the same parameters and chunking.
+
+    Parameters
+    ----------
+    y : np.ndarray [shape=(# frames,) or (# channels, # frames)]
+        Input signal.
+    sr : int
+        Sample rate.
+    grid : dict
+        Values per swept parameter, any of ``prop_decrease``, ``n_std_thresh_stationary``,
+        ``thresh_n_mult_nonstationary`` and ``sigmoid_slope_nonstationary``. The sweep covers their
+        cartesian product, see ``parameter_grid``.
+    stationary, y_noise, time_constant_s, freq_mask_smooth_hz, time_mask_smooth_ms, chunk_size,
+    padding, n_fft, win_length, hop_length, clip_noise_stationary, device, precision
+        Fixed gate parameters, as in ``reduce_noise``.
+    reference : np.ndarray, optional
+        Clean signal of the shape of ``y``, enables the ``snr_db`` and ``si_sdr_db`` metrics.
+    return_signals : bool, optional
+        Return the denoised signal of every setting. With False only the metrics are kept, so
+        memory does not grow with the grid, by default True
+    metrics : sequence of str, optional
+        Any of ``reduction_db`` (input over output energy), ``snr_db`` and ``si_sdr_db``; by default
+        all that apply.
+    batch_size : int, optional
+        Settings evaluated per batched call, by default 16
+
+    Returns
+    -------
+    dict
+        ``settings``: list of parameter dicts; ``metrics``: name -> array with one value per
+        setting; ``signals``: array of shape (# settings,) + y.shape, only with ``return_signals``.
+    """
+    settings = parameter_grid(grid)
+    if metrics is None:
+        metrics = METRICS if reference is not None else ("reduction_db",)
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics {sorted(unknown)}, choose from {METRICS}")
+    if reference is None and set(metrics) & set(REFERENCE_METRICS):
+        raise ValueError(f"{REFERENCE_METRICS} need a reference signal")
+
+    flat = np.ndim(y) == 1
+    y = np.atleast_2d(np.asarray(y))
+    if reference is not None:
+        reference = np.atleast_2d(np.asarray(reference))
+        if reference.shape != y.shape:
+            raise ValueError(f"reference must have the shape of y {y.shape}, got {reference.shape}")
+    n_channels, n_frames = y.shape
+    device = torch.device(device if torch.cuda.is_available() else "cpu")
+
+    win_length = n_fft if win_length is None else win_length
+    hop_length = win_length // 4 if hop_length is None else hop_length
+    tg = TorchGate(
+        sr=sr,
+        nonstationary=not stationary,
+        n_movemean_nonstationary=int(time_constant_s / hop_length * sr),
+        n_fft=n_fft,
+        win_length=win_length,
+        hop_length=hop_length,
+        freq_mask_smooth_hz=freq_mask_smooth_hz,
+        time_mask_smooth_ms=time_mask_smooth_ms,
+        precision=precision,
+    ).to(device)
+    input_dtype = np.float32 if precision in ("float32", "bfloat16") else y.dtype
+
+    # noise statistics of a separate noise clip are shared by all chunks
+    xn = None
+    if stationary and y_noise is not None:
+        y_noise = np.atleast_2d(np.asarray(y_noise, dtype=input_dtype))
+        if y_noise.shape[-1] > n_frames and clip_noise_stationary:
+            y_noise = y_noise[:, :n_frames]
+        xn = torch.from_numpy(y_noise).to(device)
+
+    params = {
+        name: torch.tensor([s[name] for s in settings], dtype=torch.float64, device=device)
+        for name in SWEEP_DEFAULTS
+    }
+    n_settings = len(settings)
+    signals = np.zeros((n_settings, n_channels, n_frames), dtype=y.dtype) if return_signals else None
+    acc = _Accumulator(n_settings, reference is not None)
+
+    if chunk_size is None or chunk_size >= n_frames:
+        chunk_size = n_frames
+    for start_frame in range(0, n_frames, chunk_size):
+        end_frame = min(start_frame + chunk_size, n_frames)
+        # the last chunk is zero padded to full size, as in `SpectralGate.get_traces`
+        i1, i2 = start_frame - padding, start_frame + chunk_size + padding
+        chunk = np.zeros((n_channels, i2 - i1), dtype=input_dtype)
+        chunk[:, max(i1, 0) - i1: min(i2, n_frames) - i1] = y[:, max(i1, 0): min(i2, n_frames)]
+        x = torch.from_numpy(chunk).to(device)
+
+        # parameter independent part: STFT and the statistics the mask is thresholded against
+        stft_dtype, mask_dtype = tg._dtypes(x)
+        X = tg._stft(x, stft_dtype)
+        X_abs = X.abs().to(mask_dtype)
+        if stationary:
+            X_db = amp_to_db(X_abs)
+            std_freq_noise, mean_freq_noise = tg._noise_stats(X_db, xn)
+        else:
+            slowness_ratio = tg._slowness_ratio(X_abs)
+
+        x_crop = y[:, start_frame:end_frame]
+        ref_crop = None if reference is None else reference[:, start_frame:end_frame]
+        for b in range(0, n_settings, batch_size):
+            idx = slice(b, min(b + batch_size, n_settings))
+            # settings along a new leading axis: (settings, channels, freq, time)
+            prop = params["prop_decrease"][idx].to(mask_dtype).view(-1, 1, 1, 1)
+            if stationary:
+                n_std = params["n_std_thresh_stationary"][idx].to(mask_dtype).view(-1, 1, 1)
+                noise_thresh = mean_freq_noise.unsqueeze(0) + std_freq_noise.unsqueeze(0) * n_std
+                sig_mask = (X_db.unsqueeze(0) > noise_thresh.unsqueeze(-1)).to(mask_dtype)
+            else:
+                n_thresh = params["thresh_n_mult_nonstationary"][idx].to(mask_dtype).view(-1, 1, 1, 1)
+                temp_coeff = (1 / params["sigmoid_slope_nonstationary"][idx]).to(mask_dtype).view(-1, 1, 1, 1)
+                sig_mask = torch.sigmoid((slowness_ratio.unsqueeze(0) - n_thresh) / temp_coeff)
+            sig_mask = prop * (sig_mask - 1.0) + 1.0
+
+            n_batch = sig_mask.shape[0]
+            sig_mask = sig_mask.reshape(-1, 1, *sig_mask.shape[-2:])
+            if tg.smoothing_filter is not None:
+                sig_mask = tg._smooth_mask(sig_mask)
+
+            Y = X.repeat(n_batch, 1, 1) * sig_mask.squeeze(1).to(stft_dtype)
+            out = tg._istft(Y, stft_dtype).reshape(n_batch, n_channels, -1)
+            out = out[..., start_frame - i1: end_frame - i1].to(torch.float64).cpu().numpy()
+
+            acc.update(idx, x_crop, out, ref_crop, first=b == 0)
+            if return_signals:
+                signals[idx, :, start_frame:end_frame] = out
+
+    result = {"settings": settings, "metrics": acc.metrics(metrics)}
+    if return_signals:
+        result["signals"] = signals[:, 0] if flat else signals
+    return result
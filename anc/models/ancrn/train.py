@@ -0,0 +1,306 @@
+"""
+Training loop of `ANCRN` on noise-mixed clean segments.
+
+Run ``python -m anc.models.ancrn.train <segments dir> --checkpoint run.pt`` to train on a directory
+of clean WAV segments mixed on the fly with generated noise; rerunning the same command resumes
+from the checkpoint, mid-epoch if it was interrupted.
+"""
+import argparse
+import json
+import os
+import resource
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import soundfile as sf
+import torch
+from torch.nn.functional import pad
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+
+from .augment import NoiseMixer, SegmentDataset, make_augmented_loader
+from .model import ANCRN
+
+# magnitude compression of the loss, weighs quiet bins up like the ear does
+_COMPRESSION = 0.3
+_EPS = 1e-8
+
+
+def peak_memory_bytes(device: torch.device) -> int:
+    """Peak allocated CUDA memory since the last reset, or the peak RSS of the process on CPU."""
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated(device)
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Trainer:
+    """
+    Class Trainer for fitting an `ANCRN` model to ``(noisy, target, lengths)`` batches.
+
+    The model predicts a mask from the noisy STFT, framed as `StreamingANCRN` frames it, and the
+    loss is the mean squared error of compressed magnitudes between the masked noisy and the target
+    spectrogram over the valid frames of every row.
+
+    Every optimizer step records its loss, samples/s, the time spent waiting for the loader versus
+    computing, and the peak memory, in ``history`` and, if given, a JSON lines log. Checkpoints are
+    written next to ``checkpoint_path`` and renamed over it, so an interruption never leaves a
+    partial file. They hold the model (readable by `load_model`), the optimizer and the position
+    in the epoch. With a `BucketBatchSampler` a resumed epoch continues at the next batch without
+    loading the ones already trained on; the noise mixed into those later batches is drawn afresh.
+
+    Attributes:
+        model (ANCRN): Model to train, moved to ``device``.
+        loader (DataLoader): Yields ``(noisy, target, lengths)``, see `make_augmented_loader`.
+        optimizer (torch.optim.Optimizer): Default: Adam with ``lr``.
+        accumulation_steps (int): Batches whose gradients are summed per optimizer step (default: 1).
+        device (str): Device to train on (default: "cpu").
+        channels_last (bool): Keep the conv weights and activations in channels-last memory layout,
+            faster for the convs on CPU and on tensor cores (default: True).
+        compile (bool): Run the model through ``torch.compile`` (default: False).
+        max_grad_norm (float): Gradient clipping, None disables it (default: 5.0).
+        checkpoint_path (str): File to checkpoint to and resume from (default: None).
+        checkpoint_every (int): Optimizer steps between checkpoints, one is also written at the end
+            of every epoch (default: 200).
+        log_path (str): JSON lines file the step records are appended to (default: None).
+
+    Methods:
+        loss: Loss of a batch.
+        save_checkpoint: Writes the training state atomically.
+        load_checkpoint: Restores the training state.
+        train: Trains up to a number of epochs.
+    """
+    def __init__(self, model: ANCRN, loader: DataLoader, optimizer: Optional[torch.optim.Optimizer] = None,
+                 lr: float = 1e-3, accumulation_steps: int = 1, device: str = "cpu", channels_last: bool = True,
+                 compile: bool = False, max_grad_norm: Optional[float] = 5.0,
+                 checkpoint_path: Optional[Union[str, Path]] = None, checkpoint_every: int = 200,
+                 log_path: Optional[Union[str, Path]] = None) -> None:
+        self.device = torch.device(device)
+        self.model = model.to(self.device)
+        if channels_last:
+            self.model = self.model.to(memory_format = torch.channels_last)
+        self._forward = torch.compile(self.model) if compile else self.model
+        self.loader = loader
+        self.optimizer = torch.optim.Adam(self.model.parameters(), lr = lr) if optimizer is None else optimizer
+        self.accumulation_steps = accumulation_steps
+        self.max_grad_norm = max_grad_norm
+        self.checkpoint_path = None if checkpoint_path is None else Path(checkpoint_path)
+        self.checkpoint_every = checkpoint_every
+        self.log_path = None if log_path is None else Path(log_path)
+
+        self.n_fft = model.config["n_fft"]
+        self.hop_length = self.n_fft // 4
+        self.window = torch.hann_window(self.n_fft, device = self.device)
+        self.epoch = 0
+        self.batch_in_epoch = 0
+        self.global_step = 0
+        self.history: List[Dict[str, float]] = []
+
+    def _spectrogram(self, x: torch.Tensor) -> torch.Tensor:
+        # left padded like the stream, frame t ends at sample (t + 1) * hop
+        x = pad(x, (self.n_fft - self.hop_length, 0))
+        return torch.stft(x, self.n_fft, self.hop_length, window = self.window, center = False, return_complex = True)
+
+    def loss(self, noisy: torch.Tensor, target: torch.Tensor, lengths: torch.Tensor) -> torch.Tensor:
+        """Compressed-magnitude MSE of the masked noisy spectrogram over the valid frames."""
+        noisy_mag = self._spectrogram(noisy).abs()
+        target_mag = self._spectrogram(target).abs()
+        mask, _ = self._forward(self.model.features(noisy_mag))
+        estimate = self.model.expand_mask(mask) * noisy_mag
+        error = ((estimate + _EPS) ** _COMPRESSION - (target_mag + _EPS) ** _COMPRESSION) ** 2
+        n_frames = error.shape[-1]
+        valid = torch.arange(n_frames, device = self.device)[None, :] < torch.ceil(lengths / self.hop_length)[:, None]
+        return (error.mean(dim = 1) * valid).sum() / valid.sum().clamp_min(1)
+
+    def save_checkpoint(self) -> None:
+        """Write the model, optimizer and loop position, replacing the previous checkpoint atomically."""
+        state = {
+            "config": self.model.config,
+            "state_dict": self.model.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+            "epoch": self.epoch,
+            "batch_in_epoch": self.batch_in_epoch,
+            "global_step": self.global_step,
+            "torch_rng": torch.get_rng_state(),
+        }
+        self.checkpoint_path.parent.mkdir(parents = True, exist_ok = True)
+        part_path = self.checkpoint_path.with_name(self.checkpoint_path.name + ".part")
+        torch.save(state, part_path)
+        os.replace(part_path, self.checkpoint_path)
+
+    def load_checkpoint(self, path: Optional[Union[str, Path]] = None) -> bool:
+        """
+        Restore a checkpoint.
+        :param path: Checkpoint to read, defaults to ``checkpoint_path``.
+        :return: bool: whether a checkpoint was found.
+        """
+        path = self.checkpoint_path if path is None else Path(path)
+        if path is None or not path.exists():
+            return False
+        state = torch.load(path, map_location = self.device)
+        self.model.load_state_dict(state["state_dict"])
+        self.optimizer.load_state_dict(state["optimizer"])
+        self.epoch = state["epoch"]
+        self.batch_in_epoch = state["batch_in_epoch"]
+        self.global_step = state["global_step"]
+        torch.set_rng_state(state["torch_rng"])
+        return True
+
+    def _start_epoch(self):
+        sampler = self.loader.batch_sampler
+        if hasattr(sampler, "start_batch"):
+            sampler.set_epoch(self.epoch, start_batch = self.batch_in_epoch)
+            return iter(self.loader), self.batch_in_epoch + len(self.loader)
+        if hasattr(sampler, "set_epoch"):
+            sampler.set_epoch(self.epoch)
+        # other samplers cannot seek, load and drop the batches already trained on
+        batches = iter(self.loader)
+        for _ in range(self.batch_in_epoch):
+            next(batches)
+        return batches, len(self.loader)
+
+    def _log(self, record: Dict[str, float]) -> None:
+        self.history.append(record)
+        if self.log_path is not None:
+            with self.log_path.open("a") as file:
+                file.write(json.dumps(record) + "\n")
+
+    def _sync(self) -> None:
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+
+    def train(self, epochs: int, max_steps: Optional[int] = None, use_tqdm: bool = False) -> List[Dict[str, float]]:
+        """
+        Train until ``epochs`` epochs (counting those of a resumed checkpoint) are done.
+        :param epochs: Total number of epochs.
+        :param max_steps: Stop after this many optimizer steps in total, e.g. to bound a CI run.
+        :param use_tqdm: Show a progress bar per epoch.
+        :return: List of the step records of this call.
+        """
+        self.model.train()
+        first_record = len(self.history)
+        while self.epoch < epochs:
+            batches, epoch_batches = self._start_epoch()
+            progress = tqdm(total = epoch_batches, initial = self.batch_in_epoch, desc = f"Epoch {self.epoch}",
+                            disable = not use_tqdm)
+            record = {"data_wait_s": 0.0, "compute_s": 0.0, "samples": 0, "loss": 0.0}
+            if self.device.type == "cuda":
+                torch.cuda.reset_peak_memory_stats(self.device)
+            while True:
+                start = time.perf_counter()
+                try:
+                    noisy, target, lengths = next(batches)
+                except StopIteration:
+                    break
+                loaded = time.perf_counter()
+                noisy = noisy.to(self.device, non_blocking = True)
+                target = target.to(self.device, non_blocking = True)
+                lengths = lengths.to(self.device, non_blocking = True)
+                loss = self.loss(noisy, target, lengths) / self.accumulation_steps
+                loss.backward()
+                self.batch_in_epoch += 1
+                record["loss"] += loss.item()
+                record["samples"] += noisy.shape[0]
+
+                stepped = self.batch_in_epoch % self.accumulation_steps == 0 or self.batch_in_epoch == epoch_batches
+                if stepped:
+                    if self.max_grad_norm is not None:
+                        torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.max_grad_norm)
+                    self.optimizer.step()
+                    self.optimizer.zero_grad(set_to_none = True)
+                    self.global_step += 1
+                self._sync()
+                record["data_wait_s"] += loaded - start
+                record["compute_s"] += time.perf_counter() - loaded
+                progress.update()
+                if not stepped:
+                    continue
+
+                wall = record["data_wait_s"] + record["compute_s"]
+                record.update({
+                    "epoch": self.epoch,
+                    "step": self.global_step,
+                    "samples_per_s": record["samples"] / wall,
+                    "peak_memory_bytes": peak_memory_bytes(self.device),
+                })
+                self._log(record)
+                progress.set_postfix(loss = record["loss"])
+                record = {"data_wait_s": 0.0, "compute_s": 0.0, "samples": 0, "loss": 0.0}
+                if self.device.type == "cuda":
+                    torch.cuda.reset_peak_memory_stats(self.device)
+                if self.checkpoint_path is not None and self.global_step % self.checkpoint_every == 0:
+                    self.save_checkpoint()
+                if max_steps is not None and self.global_step >= max_steps:
+                    progress.close()
+                    return self.history[first_record:]
+            progress.close()
+            self.epoch += 1
+            self.batch_in_epoch = 0
+            if self.checkpoint_path is not None:
+                self.save_checkpoint()
+        return self.history[first_record:]
+
+
+def _segment_dataset(source_dir: Union[str, Path], pattern: str, sr: int) -> SegmentDataset:
+    """Lazily loaded mono segments of a directory, lengths read from the file headers."""
+    paths = sorted(str(p) for p in Path(source_dir).glob(pattern))
+    infos = [sf.info(p) for p in paths]
+    for path, info in zip(paths, infos):
+        if info.samplerate != sr:
+            raise ValueError(f"{path} is sampled at {info.samplerate} Hz, the model at {sr} Hz")
+
+    def load(path):
+        y = sf.read(path, dtype = "float32", always_2d = True)[0]
+        return y.mean(axis = 1)
+
+    return SegmentDataset(paths, loader = load, lengths = [info.frames for info in infos])
+
+
+def main():
+    """CLI for training ANCRN on a directory of clean segments."""
+    parser = argparse.ArgumentParser(description = 'Train ANCRN on clean segments mixed with generated noise.')
+    parser.add_argument('source_dir', type = str, help = 'Directory with the clean segments.')
+    parser.add_argument('--checkpoint', type = str, required = True, help = 'Checkpoint to write and resume from.')
+    parser.add_argument('--pattern', type = str, default = '**/*.wav')
+    parser.add_argument('--sr', type = int, default = 16000)
+    parser.add_argument('--noise', type = str, default = 'pink', help = 'NoiseGenerator method to mix in.')
+    parser.add_argument('--epochs', type = int, default = 10)
+    parser.add_argument('--batch_size', type = int, default = 16)
+    parser.add_argument('--accumulation_steps', type = int, default = 1)
+    parser.add_argument('--lr', type = float, default = 1e-3)
+    parser.add_argument('--workers', type = int, default = 4)
+    parser.add_argument('--device', type = str, default = 'cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--compile', action = 'store_true', help = 'Run the model through torch.compile.')
+    parser.add_argument('--checkpoint_every', type = int, default = 200)
+    parser.add_argument('--log', type = str, default = None, help = 'JSON lines file for the step records.')
+
+    args = parser.parse_args()
+
+    model = ANCRN(sr = args.sr)
+    loader = make_augmented_loader(
+        _segment_dataset(args.source_dir, args.pattern, args.sr),
+        NoiseMixer(args.noise, sr = args.sr),
+        batch_size = args.batch_size,
+        num_workers = args.workers,
+        pad_multiple = model.config["n_fft"] // 4,
+        pin_memory = args.device.startswith('cuda'),
+    )
+    trainer = Trainer(
+        model,
+        loader,
+        lr = args.lr,
+        accumulation_steps = args.accumulation_steps,
+        device = args.device,
+        compile = args.compile,
+        checkpoint_path = args.checkpoint,
+        checkpoint_every = args.checkpoint_every,
+        log_path = args.log,
+    )
+    if trainer.load_checkpoint():
+        print(f"Resuming at epoch {trainer.epoch}, batch {trainer.batch_in_epoch}")
+    trainer.train(args.epochs, use_tqdm = True)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,3 +13,36 @@ def float32_to_int16(data):
     if np.max(data) > 1:
         data = data / np.max(np.abs(data))
     return np.array(data * 32767).astype("int16")
+
+
+def pcm_scale(dtype):
+    """ Full scale of an integer PCM dtype (32768 for int16), None for float audio
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind != "i":
+        return None
+    return float(-np.iinfo(dtype).min)
+
+
+def pcm_to_float(data, out=None):
+    """ Integer PCM to float64 in [-1, 1), written into ``out`` if given; float audio is copied as is
+    """
+    data = np.asarray(data)
+    if out is None:
+        out = np.empty(data.shape, dtype=np.float64)
+    scale = pcm_scale(data.dtype)
+    if scale is None:
+        out[...] = data
+    else:
+        np.multiply(data, 1.0 / scale, out=out)
+    return out
+
+
+def float_to_pcm_(data, dtype):
+    """ Scales float audio in place to the range of an integer PCM dtype, rounded and clipped
+    """
+    info = np.iinfo(dtype)
+    data *= -float(info.min)
+    np.rint(data, out=data)
+    np.clip(data, info.min, info.max, out=data)
+    return data
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from scipy.signal import lfilter
+from anc.models.adaptive import FxNLMS, FxPBFDAF, NLMS, PBFDAF
+
+
+def _scenario(n=48000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = lfilter([1.0], [1.0, -0.7], rng.standard_normal(n))
+    primary = np.concatenate([np.zeros(8), rng.standard_normal(56) * np.exp(-np.arange(56) / 10)])
+    return x, lfilter(primary, [1.0], x), primary
+
+
+def _stream(filt, x, d, block_size):
+    outputs = [filt.process(x[i:i + block_size], d[i:i + block_size]) for i in range(0, len(x), block_size)]
+    return np.concatenate([y for y, _ in outputs]), np.concatenate([e for _, e in outputs])
+
+
+@pytest.mark.parametrize("filt", [NLMS(128), PBFDAF(64, 2)])
+def test_identifies_primary_path(filt):
+    x, d, primary = _scenario()
+    _, e = _stream(filt, x, d, 256)
+    assert np.mean(e[-4800:] ** 2) < 1e-6 * np.mean(d[-4800:] ** 2)
+    np.testing.assert_allclose(filt.weights[:len(primary)], primary, atol=1e-3)
+
+
+def test_nlms_output_does_not_depend_on_block_size():
+    x, d, _ = _scenario(4800)
+    y1, e1 = _stream(NLMS(32), x, d, 480)
+    y2, e2 = _stream(NLMS(32), x, d, 37)
+    np.testing.assert_allclose(y1, y2, atol=1e-10)
+    np.testing.assert_allclose(e1, e2, atol=1e-10)
+
+
+@pytest.mark.parametrize("make", [
+    lambda s, s_true: FxNLMS(128, s, mu=0.5, secondary_path=s_true),
+    lambda s, s_true: FxPBFDAF(64, 2, s, mu=0.1, secondary_path=s_true),
+])
+def test_filtered_x_cancels_with_imperfect_path_estimate(make):
+    x, d, _ = _scenario()
+    secondary = np.array([0.0, 0.0, 0.8, 0.3, -0.1])
+    filt = make(secondary * 1.2 + 0.01, secondary)
+    y, e = _stream(filt, x, d, 256)
+    assert 10 * np.log10(np.mean(d[-4800:] ** 2) / np.mean(e[-4800:] ** 2)) > 20
+    # the residual is what the drive signal leaves of the primary noise
+    np.testing.assert_allclose(e, d - lfilter(secondary, [1.0], y), atol=1e-9)
+
+
+def test_block_validation():
+    with pytest.raises(ValueError):
+        NLMS(8).process(np.zeros(10), np.zeros(9))
+    with pytest.raises(ValueError):
+        PBFDAF(64, 2).process(np.zeros(100), np.zeros(100))
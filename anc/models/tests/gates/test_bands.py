@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import torch
+from anc.models.ancrn.gates.bands import band_centers, band_matrices
+from anc.models.ancrn.gates.profiling import GateProfiler
+from anc.models.ancrn.gates.torchgate import TorchGate
+from anc.models.ancrn.noisereduce import reduce_noise
+
+SR = 16000
+
+
+def _noisy(seconds=2.0, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(SR * seconds)
+    t = np.arange(n) / SR
+    # 50 ms tone bursts at random pitches
+    clean = 0.5 * np.sin(2 * np.pi * np.repeat(rng.uniform(200, 4000, n // 800 + 1), 800)[:n] * t)
+    return clean, clean + 0.3 * rng.standard_normal(n)
+
+
+def _snr(estimate, clean):
+    n = min(len(estimate), len(clean))
+    return 10 * np.log10(np.sum(clean[:n] ** 2) / np.sum((estimate[:n] - clean[:n]) ** 2))
+
+
+@pytest.mark.parametrize("scale", ["erb", "mel"])
+def test_band_matrices(scale):
+    analysis, synthesis = band_matrices(SR, 1024, 48, scale)
+    assert analysis.shape == (48, 513) and synthesis.shape == (513, 48)
+    np.testing.assert_allclose(analysis.sum(axis=1), 1, rtol=1e-6)
+    np.testing.assert_allclose(synthesis.sum(axis=1), 1, rtol=1e-6)
+    # triangles overlap only their neighbours
+    assert synthesis.nnz <= 2 * 513 and analysis.nnz <= 2 * 513 + 48
+    centers = band_centers(SR, 48, scale)
+    assert centers[0] == 0 and centers[-1] == pytest.approx(SR / 2)
+    assert np.all(np.diff(np.diff(centers)) > 0)
+    with pytest.raises(ValueError):
+        band_matrices(SR, 1024, 48, "bark")
+
+
+@pytest.mark.parametrize("nonstationary", [True, False])
+def test_torch_band_mask_quality_and_cost(nonstationary):
+    clean, noisy = _noisy()
+    x = torch.from_numpy(noisy[None])
+    outputs, mask_bytes = {}, {}
+    for n_bands in (None, 48):
+        profiler = GateProfiler()
+        gate = TorchGate(SR, nonstationary=nonstationary, n_movemean_nonstationary=125, n_mask_bands=n_bands,
+                         profiler=profiler)
+        outputs[n_bands] = gate(x)[0].numpy()
+        mask_bytes[n_bands] = profiler.as_dict()["mask"]["bytes"]
+    assert _snr(outputs[48], clean) > _snr(outputs[None], clean) - 1.5
+    assert mask_bytes[48] * 8 < mask_bytes[None]
+
+
+@pytest.mark.parametrize("stationary", [False, True])
+def test_numpy_band_mask(stationary):
+    clean, noisy = _noisy()
+    per_bin = reduce_noise(noisy, SR, stationary=stationary)
+    banded = reduce_noise(noisy, SR, stationary=stationary, n_mask_bands=48)
+    torch_banded = reduce_noise(noisy, SR, stationary=stationary, n_mask_bands=48, use_torch=True, device="cpu")
+    assert banded.shape == noisy.shape
+    assert _snr(banded, clean) > _snr(per_bin, clean) - 1.5
+    assert _snr(torch_banded, clean) > _snr(per_bin, clean) - 1.5
@@ -0,0 +1,66 @@
+import numpy as np
+from anc.models.ancrn.gates.profiling import profile
+from anc.models.ancrn.gates.spectralgate import StreamedTorchGate
+from anc.models.ancrn.gates.spectralgate.cache import ChunkCache
+
+
+def _gate(y, cache, **kwargs):
+    kwargs = dict(dict(sr=16000, chunk_size=8192, padding=4096, n_fft=512, time_constant_s=0.5, device="cpu"),
+                  **kwargs)
+    return StreamedTorchGate(y=y, cache=cache, **kwargs)
+
+
+def test_cached_ranges_match_and_reuse_chunks():
+    y = np.random.default_rng(0).standard_normal((2, 50000))
+    reference = _gate(y, None).get_traces()
+    cache = ChunkCache()
+    sg = _gate(y, cache)
+    with profile(sg) as prof:
+        np.testing.assert_allclose(sg.get_traces(10000, 30000), reference[:, 10000:30000])
+    assert prof.stats["chunk"].calls == 3
+    # the overlapping range only filters the three chunks from 32768 on
+    with profile(sg) as prof:
+        np.testing.assert_allclose(sg.get_traces(20000, 50000), reference[:, 20000:50000])
+    assert prof.stats["chunk"].calls == 3
+    assert cache.stats()["hits"] == 2
+    # other parameters do not hit the cached chunks
+    other = _gate(y, cache, prop_decrease=0.5)
+    with profile(other) as prof:
+        other.get_traces(0, 8192)
+    assert prof.stats["chunk"].calls == 1
+
+
+def test_spill_to_disk(tmp_path):
+    y = np.random.default_rng(1).standard_normal(40000)
+    reference = _gate(y, None).get_traces()
+    cache = ChunkCache(max_bytes=1, spill_dir=str(tmp_path))
+    out = _gate(y, cache).get_traces()
+    np.testing.assert_allclose(out, reference)
+    assert cache.stats()["chunks"] == 1
+    assert cache.stats()["spilled_chunks"] == 4
+    # a new cache over the same directory starts warm
+    warm = ChunkCache(spill_dir=str(tmp_path))
+    sg = _gate(y, warm)
+    with profile(sg) as prof:
+        np.testing.assert_allclose(sg.get_traces(0, 16384), reference[:16384])
+    assert "chunk" not in prof.stats
+    assert warm.stats()["disk_hits"] == 2
+
+
+def test_stationary_fingerprint_hashes_the_threshold_not_the_noise_clip():
+    from anc.models.ancrn.gates.spectralgate import SpectralGateStationary
+    from anc.models.ancrn.gates.spectralgate.cache import gate_fingerprint
+
+    y = np.random.default_rng(2).standard_normal((2, 50000)).astype(np.float32)
+    sg = SpectralGateStationary(
+        y=y, sr=16000, prop_decrease=1.0, chunk_size=8192, padding=4096, n_fft=512, win_length=None,
+        hop_length=None, time_constant_s=2.0, freq_mask_smooth_hz=500, time_mask_smooth_ms=50, tmp_folder=None,
+        use_tqdm=False, n_jobs=1, n_std_thresh_stationary=1.5, clip_noise_stationary=True, cache=ChunkCache(),
+    )
+    # the default noise is the signal itself, not a copy
+    assert np.shares_memory(sg.y_noise, y)
+    fingerprint = gate_fingerprint(sg)
+    sg.y_noise = np.zeros(3)
+    assert gate_fingerprint(sg) == fingerprint
+    sg.noise_thresh = sg.noise_thresh + 1
+    assert gate_fingerprint(sg) != fingerprint
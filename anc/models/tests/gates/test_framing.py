@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+import torch
+from anc.models.ancrn.gates.framing import LowDelayFraming, low_delay_windows
+from anc.models.ancrn.gates.streaming import StreamingGate
+from anc.models.ancrn.gates.torchgate import TorchGate
+from anc.models.ancrn.noisereduce import reduce_noise
+
+SR = 48000
+NO_SMOOTHING = dict(freq_mask_smooth_hz=None, time_mask_smooth_ms=None)
+
+
+@pytest.mark.parametrize("n_fft, hop_length, synthesis_length", [
+    (1024, 128, 256), (1024, 96, 192), (1024, 64, 256), (512, 128, 512), (1000, 100, 300),
+])
+def test_exact_reconstruction(n_fft, hop_length, synthesis_length):
+    framing = LowDelayFraming(n_fft, hop_length, synthesis_length)
+    y = np.random.default_rng(0).standard_normal((2, 5001))
+    spec = framing.stft(y)
+    assert spec.shape == (2, n_fft // 2 + 1, framing.n_frames(5001))
+    np.testing.assert_allclose(framing.istft(spec, 5001), y, atol=1e-12)
+
+    x = torch.from_numpy(y)
+    spec_torch = framing.stft_torch(x)
+    np.testing.assert_allclose(spec_torch.numpy(), spec, atol=1e-9)
+    np.testing.assert_allclose(framing.istft_torch(spec_torch, 5001).numpy(), y, atol=1e-12)
+
+
+def test_windows():
+    analysis, synthesis = low_delay_windows(1024, 128, 256)
+    assert np.all(synthesis[:1024 - 256] == 0) and np.all(synthesis[1024 - 255:] > 0)
+    # the analysis window keeps (almost) all of the frame
+    assert np.all(analysis[1:] > 0)
+    # full-length synthesis is the symmetric square-root Hann pair
+    analysis, synthesis = low_delay_windows(512, 128, 512)
+    np.testing.assert_allclose(analysis, synthesis)
+    np.testing.assert_allclose(analysis ** 2, np.hanning(513)[:-1], atol=1e-12)
+    with pytest.raises(ValueError):
+        low_delay_windows(1024, 128, 200)
+    with pytest.raises(ValueError):
+        low_delay_windows(1024, 128, 128)
+
+
+def test_causal_synthesis():
+    """A sample only reaches the output ``latency_samples`` later, and no earlier output changes."""
+    framing = LowDelayFraming(1024, 128, 256)
+    y = np.random.default_rng(0).standard_normal(4096)
+    spec = framing.stft(y)
+    # gating the frames that end after sample 2048 leaves every output sample before
+    # 2048 - latency_samples untouched
+    end = 2048 // 128
+    gated = spec.copy()
+    gated[:, end:] *= 0.1
+    out = framing.istft(gated, 4096)
+    latency = framing.latency_samples
+    np.testing.assert_allclose(out[:2048 - latency], y[:2048 - latency], atol=1e-12)
+    assert not np.allclose(out[2048 - latency:2048], y[2048 - latency:2048])
+
+
+@pytest.mark.parametrize("use_torch", [False, True])
+def test_gates_pass_through(use_torch):
+    y = np.random.default_rng(1).standard_normal(SR)
+    out = reduce_noise(y, SR, prop_decrease=0.0, hop_length=128, synthesis_length=256, use_torch=use_torch,
+                       device="cpu", **NO_SMOOTHING)
+    assert out.shape == y.shape
+    np.testing.assert_allclose(out, y, atol=1e-5)
+
+
+@pytest.mark.parametrize("use_torch", [False, True])
+def test_low_delay_gating_quality(use_torch):
+    rng = np.random.default_rng(0)
+    n = 3 * SR
+    t = np.arange(n) / SR
+    # 50 ms tone bursts at random pitches in white noise
+    clean = 0.5 * np.sin(2 * np.pi * np.repeat(rng.uniform(200, 4000, n // 2400 + 1), 2400)[:n] * t)
+    noisy = clean + 0.3 * rng.standard_normal(n)
+
+    def snr(estimate):
+        return 10 * np.log10(np.sum(clean ** 2) / np.sum((estimate[:n] - clean[:len(estimate)]) ** 2))
+
+    centred = reduce_noise(noisy, SR, stationary=True, use_torch=use_torch, device="cpu")
+    low_delay = reduce_noise(noisy, SR, stationary=True, use_torch=use_torch, device="cpu", hop_length=128,
+                             synthesis_length=256)
+    assert snr(low_delay) > snr(centred) - 0.5
+
+
+def test_streaming_latency():
+    centred = StreamingGate(TorchGate(SR, nonstationary=True, n_movemean_nonstationary=20), 1024)
+    low_delay = StreamingGate(TorchGate(SR, nonstationary=True, n_movemean_nonstationary=20, hop_length=128,
+                                        synthesis_length=256), 1024)
+    assert 1e3 * centred.latency_samples / SR > 20
+    assert 1e3 * low_delay.latency_samples / SR < 5
+    with pytest.raises(ValueError):
+        TorchGate(SR, win_length=512, synthesis_length=512)
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+from anc.models.ancrn.gates.masks import CompactMask
+from anc.models.ancrn.gates.spectralgate import SpectralGateNonStationary, SpectralGateStationary
+from anc.models.ancrn.noisereduce import reduce_noise
+
+SR = 16000
+
+
+def _noisy(seconds=1.0, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SR * seconds)) / SR
+    return np.sin(2 * np.pi * 440 * t) * (t % 0.5 < 0.25) + 0.1 * rng.standard_normal(t.shape)
+
+
+def _gate(cls, y, **kwargs):
+    params = dict(y=y, sr=SR, prop_decrease=1.0, chunk_size=None, padding=0, n_fft=512, win_length=None,
+                  hop_length=None, time_constant_s=2.0, freq_mask_smooth_hz=500, time_mask_smooth_ms=50,
+                  tmp_folder=None, use_tqdm=False, n_jobs=1)
+    if cls is SpectralGateStationary:
+        params.update(n_std_thresh_stationary=1.5, clip_noise_stationary=True)
+    else:
+        params.update(thresh_n_mult_nonstationary=2, sigmoid_slope_nonstationary=10)
+    params.update(kwargs)
+    return cls(**params)
+
+
+def test_binary_round_trip():
+    mask = np.random.default_rng(0).random((2, 257, 101)) > 0.5
+    packed = CompactMask.from_binary(mask)
+    assert packed.shape == mask.shape and packed.kind == "binary"
+    assert packed.nbytes * 64 >= mask.size * 8 > packed.nbytes * 60
+    np.testing.assert_array_equal(np.asarray(packed), mask)
+    for key in [0, (1, slice(10, 20)), (0, 5, slice(3, 90, 7)), (1, 3, 100), (Ellipsis, 4), np.s_[:, :, -3:]]:
+        np.testing.assert_array_equal(packed[key], mask.astype(np.float32)[key])
+
+
+def test_soft_round_trip(tmp_path):
+    mask = np.random.default_rng(0).uniform(0.2, 1.0, (257, 50))
+    quantized = CompactMask.from_soft(mask, low=0.2, high=1.0)
+    assert quantized.nbytes * 8 == mask.nbytes
+    assert np.abs(quantized.dequantize(np.float64) - mask).max() <= 0.8 / 510 + 1e-12
+    np.testing.assert_array_equal(quantized[10:20, 3], quantized.dequantize()[10:20, 3])
+
+    quantized.save(str(tmp_path / "mask.npz"))
+    loaded = CompactMask.load(str(tmp_path / "mask.npz"))
+    assert (loaded.shape, loaded.kind, loaded.low, loaded.high) == (quantized.shape, "uint8", 0.2, 1.0)
+    np.testing.assert_array_equal(loaded.data, quantized.data)
+
+
+def test_concatenate_shifts_packed_bits():
+    rng = np.random.default_rng(0)
+    pieces = [rng.random((2, 5, n)) > 0.5 for n in (3, 13, 0, 8, 7)]
+    joined = CompactMask.concatenate([CompactMask.from_binary(piece) for piece in pieces])
+    assert joined.shape == (2, 5, 31) and joined.nbytes == 2 * 5 * 4
+    np.testing.assert_array_equal(np.asarray(joined), np.concatenate(pieces, axis=-1))
+    with pytest.raises(ValueError):
+        CompactMask.concatenate([CompactMask.from_binary(pieces[0]), CompactMask.from_soft(pieces[1])])
+
+
+@pytest.mark.parametrize("cls", [SpectralGateStationary, SpectralGateNonStationary])
+def test_soft_mask_is_the_applied_mask(cls):
+    y = _noisy()
+    gate = _gate(cls, y, prop_decrease=0.8)
+    filtered, mask = gate.get_traces(return_mask="soft")
+    np.testing.assert_array_equal(filtered, _gate(cls, y, prop_decrease=0.8).get_traces())
+    spec = gate._stft(y)
+    assert mask.shape == spec.shape and (mask.low, mask.high) == (0.0, 1.0)
+    _, gated, _ = gate._process_channel(y)
+    # the exported mask is the applied one up to half a quantization step
+    error = np.abs(np.abs(gated) - np.abs(spec) * mask.dequantize(np.float64))
+    assert np.all(error <= np.abs(spec) / 510 + 1e-9)
+
+
+@pytest.mark.parametrize("cls, n_jobs", [(SpectralGateStationary, 1), (SpectralGateNonStationary, 1),
+                                         (SpectralGateNonStationary, 2)])
+def test_chunked_mask_is_the_applied_mask(cls, n_jobs):
+    y = np.stack([_noisy(seed=0), _noisy(seed=1)])
+    gate = _gate(cls, y, chunk_size=4096, padding=1024, n_jobs=n_jobs)
+    filtered, mask = gate.get_traces(return_mask="soft")
+    np.testing.assert_array_equal(filtered, _gate(cls, y, chunk_size=4096, padding=1024).get_traces())
+    # chunks and padding on the hop grid: the frames of the whole signal's STFT
+    assert mask.shape == gate._stft(y).shape
+
+    hop = gate._hop_length
+    for start in range(0, y.shape[1], 4096):
+        # the mask each chunk was gated with, over the frames of its unpadded samples
+        padded = gate._read_chunk(start - 1024, start + 4096 + 1024)
+        applied = np.stack([gate._process_channel(channel, "soft")[2] for channel in padded])
+        first = 1024 // hop
+        frames = slice(start // hop, mask.shape[-1] if start + 4096 >= y.shape[1] else (start + 4096) // hop)
+        np.testing.assert_array_equal(mask.data[..., frames], applied[..., first:first + frames.stop - frames.start])
+
+
+def test_binary_mask_of_the_stationary_gate():
+    y = np.stack([_noisy(seed=0), _noisy(seed=1)])
+    gate = _gate(SpectralGateStationary, y, n_mask_bands=32, chunk_size=3000, padding=1000)
+    _, binary = gate.get_traces(return_mask="binary")
+    assert binary.kind == "binary" and binary.shape[:2] == (2, 32)
+    assert 0 < np.asarray(binary).mean() < 1
+    _, shared = _gate(SpectralGateStationary, y, shared_mask="mean").get_traces(return_mask="binary")
+    assert shared.shape[0] == 1
+
+    with pytest.raises(ValueError):
+        _gate(SpectralGateNonStationary, y).get_traces(return_mask="binary")
+
+
+def test_reduce_noise_return_mask():
+    y = _noisy()
+    reduced, mask = reduce_noise(y, SR, stationary=True, return_mask="binary")
+    np.testing.assert_array_equal(reduced, reduce_noise(y, SR, stationary=True))
+    assert mask.kind == "binary" and mask.ndim == 2
+
+    reduced, spans, mask = reduce_noise(y, SR, return_silence_index=True, return_mask="soft")
+    assert spans.shape == (0, 2) and mask.kind == "uint8"
+    with pytest.raises(ValueError):
+        reduce_noise(y, SR, return_mask="float")
+    with pytest.raises(ValueError):
+        reduce_noise(y, SR, use_torch=True, return_mask="soft")
+    with pytest.raises(ValueError):
+        reduce_noise(y, SR, return_mask="binary")
+
+
+def test_reduce_noise_return_mask_with_silence():
+    y = _noisy(2.0)
+    y[8000:24000] = 0
+    reduced, spans, mask = reduce_noise(y, SR, n_fft=512, chunk_size=8192, padding=2048, silence_thresh_db=-60,
+                                        return_silence_index=True, return_mask="soft")
+    assert len(spans) == 1
+    assert mask.shape == (257, 1 + len(y) // 128)
+    start, end = -(-spans[0] // 128)
+    # skipped spans get the closed gate's output, with the default prop_decrease a zero gain
+    assert np.all(mask[:, start:end] == 0) and np.any(mask[:, :start] > 0)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import torch
+from anc.models.ancrn.gates.noise_bank import NoiseProfileBank
+from anc.models.ancrn.gates.torchgate import TorchGate
+from anc.models.ancrn.generate_noise import NoiseGenerator
+from anc.models.ancrn.noisereduce import reduce_noise
+
+SR = 16000
+
+
+def _clips(seconds=2.0, seed=0):
+    gen = NoiseGenerator(SR, seed=seed, dtype=np.float64)
+    n = int(SR * seconds)
+    return {
+        "white": 0.1 * gen.white(1, n)[0],
+        "pink": 0.1 * gen.pink(1, n, min_freq=20)[0],
+        "brown": 0.1 * gen.brown(1, n, min_freq=20)[0],
+        "highway": 0.1 * gen.band_limited(1, n, 50, 1500)[0],
+        "rain": 0.1 * gen.band_limited(1, n, 2000, 7000)[0],
+    }
+
+
+def test_nearest_profile_is_level_invariant():
+    bank = NoiseProfileBank.from_clips(_clips(), SR)
+    for name, clip in _clips(seconds=0.3, seed=1).items():
+        index, distance, offset = bank.nearest(3.0 * clip)
+        assert bank.names[index] == name
+        assert offset == pytest.approx(20 * np.log10(3.0), abs=1.0)
+
+
+def test_profile_stats_match_noise_clip_analysis():
+    clips = _clips()
+    bank = NoiseProfileBank.from_clips(clips, SR)
+    gate = TorchGate(SR, nonstationary=False)
+    x = torch.from_numpy(clips["pink"][None] + 0.2 * np.sin(2 * np.pi * 440 * np.arange(2 * SR) / SR))
+    expected = gate(x, xn=torch.from_numpy(clips["pink"][None]))
+    std_db, mean_db = bank.stats(bank.names.index("pink"))
+    actual = gate(x, noise_stats=(torch.from_numpy(std_db), torch.from_numpy(mean_db)))
+    # the bank's float32 statistics only flip bins sitting on the threshold
+    assert torch.sqrt(torch.mean((actual - expected) ** 2)) < 2e-2 * torch.sqrt(torch.mean(expected ** 2))
+
+
+@pytest.mark.parametrize("use_torch", [False, True])
+def test_reduce_noise_with_bank(use_torch):
+    clips = _clips()
+    bank = NoiseProfileBank.from_clips(clips, SR)
+    t = np.arange(2 * SR) / SR
+    y = clips["highway"] + 0.3 * np.sin(2 * np.pi * 3000 * t) * (t > 1.0)
+    with_clip = reduce_noise(y, SR, stationary=True, y_noise=clips["highway"], use_torch=use_torch, device="cpu")
+    with_bank = reduce_noise(y, SR, stationary=True, noise_bank=bank, use_torch=use_torch, device="cpu")
+    np.testing.assert_allclose(with_bank, with_clip, atol=0.02)
+    with pytest.raises(ValueError):
+        reduce_noise(y, SR, stationary=True, noise_bank=bank, n_fft=512)
+
+
+def test_save_and_load(tmp_path):
+    bank = NoiseProfileBank.from_clips(_clips(), SR, n_fft=512)
+    bank.save(str(tmp_path / "bank.npz"))
+    loaded = NoiseProfileBank.load(str(tmp_path / "bank.npz"))
+    assert loaded.names == bank.names and loaded.n_fft == 512
+    np.testing.assert_array_equal(loaded.threshold(2, 1.5), bank.threshold(2, 1.5))
+    assert loaded.nearest(_clips(0.3, seed=2)["rain"])[0] == bank.names.index("rain")
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from anc.models.ancrn.gates.spectralgate import SpectralGateStationary
+from anc.models.ancrn.gates.spectralgate.utils import _amp_to_db
+from anc.models.ancrn.noisereduce import reduce_noise
+
+SR = 16000
+
+
+def _gate(y, **kwargs):
+    params = dict(y=y, sr=SR, prop_decrease=1.0, chunk_size=SR, padding=SR // 4, n_fft=512, win_length=None,
+                  hop_length=None, time_constant_s=2.0, freq_mask_smooth_hz=500, time_mask_smooth_ms=50,
+                  tmp_folder=None, use_tqdm=False, n_jobs=1, n_std_thresh_stationary=1.5,
+                  clip_noise_stationary=True)
+    params.update(kwargs)
+    return SpectralGateStationary(**params)
+
+
+def _quiet_then_loud(seed=0):
+    rng = np.random.default_rng(seed)
+    y = rng.standard_normal((2, 5 * SR))
+    y[:, :SR] *= 0.01
+    return y
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"synthesis_length": 256}, {"n_mask_bands": 32}])
+def test_default_threshold_is_computed_over_the_whole_signal(kwargs):
+    y = _quiet_then_loud()
+    gate = _gate(y, **kwargs)
+    # the statistics of one STFT of the whole channel-averaged signal
+    noise_db = _amp_to_db(gate._to_bands(np.abs(gate._stft(np.mean(y, axis=0)))))
+    expected = noise_db.mean(axis=1) + 1.5 * noise_db.std(axis=1)
+    np.testing.assert_allclose(gate.noise_thresh, expected, atol=1e-4)
+
+
+def test_int16_threshold_matches_float():
+    y = _quiet_then_loud() * 0.2
+    pcm = np.round(y * 32768).astype(np.int16)
+    np.testing.assert_allclose(_gate(pcm).noise_thresh, _gate(pcm / 32768.0).noise_thresh, atol=1e-6)
+
+
+def test_noise_getting_louder_after_the_first_chunk_is_removed():
+    y = _quiet_then_loud(seed=1)[0]
+    reduced = reduce_noise(y, SR, stationary=True, chunk_size=SR, padding=SR // 4, n_fft=512)
+    assert np.sqrt(np.mean(reduced[2 * SR:] ** 2)) < 0.05 * np.sqrt(np.mean(y[2 * SR:] ** 2))
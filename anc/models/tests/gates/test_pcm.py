@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from anc.models.ancrn.gates.spectralgate import SpectralGateNonStationary
+from anc.models.ancrn.gates.spectralgate.cache import ChunkCache
+from anc.models.ancrn.noisereduce import reduce_noise
+from anc.models.ancrn.silence import detect_silence
+from anc.models.ancrn.utils import float_to_pcm_, pcm_to_float
+
+SR = 16000
+
+
+def _pcm(n_channels=2, seconds=1.0, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SR * seconds)) / SR
+    y = 0.5 * np.sin(2 * np.pi * 300 * t) * (t % 0.4 < 0.2) + 0.05 * rng.standard_normal((n_channels, t.size))
+    return float_to_pcm_(y, np.int16).astype(np.int16)
+
+
+def test_pcm_conversions():
+    pcm = np.array([-32768, -1, 0, 16384, 32767], dtype=np.int16)
+    np.testing.assert_array_equal(pcm_to_float(pcm), [-1.0, -1 / 32768, 0.0, 0.5, 32767 / 32768])
+    out = np.zeros((2, 5))
+    pcm_to_float(pcm, out=out[1])
+    assert out[1, 3] == 0.5 and not out[0].any()
+    data = np.array([-1.5, -1.0, 0.25, 0.99999, 1.2])
+    assert float_to_pcm_(data, np.int16) is data
+    np.testing.assert_array_equal(data, [-32768, -32768, 8192, 32767, 32767])
+
+
+@pytest.mark.parametrize("stationary", [False, True])
+@pytest.mark.parametrize("chunk_size", [None, 4000])
+def test_int16_matches_float_gating(stationary, chunk_size):
+    pcm = _pcm()
+    reduced = reduce_noise(pcm, SR, stationary=stationary, chunk_size=chunk_size, padding=2000)
+    expected = reduce_noise(pcm_to_float(pcm), SR, stationary=stationary, chunk_size=chunk_size, padding=2000)
+    assert reduced.dtype == np.int16 and reduced.shape == pcm.shape
+    np.testing.assert_array_equal(reduced, float_to_pcm_(expected, np.int16))
+
+
+def test_int16_gate_keeps_the_input_and_uses_the_cache():
+    pcm = _pcm(n_channels=1)[0]
+    cache = ChunkCache()
+    params = dict(y=pcm, sr=SR, prop_decrease=1.0, chunk_size=4000, padding=2000, n_fft=1024, win_length=None,
+                  hop_length=None, time_constant_s=2.0, freq_mask_smooth_hz=500, time_mask_smooth_ms=50,
+                  tmp_folder=None, use_tqdm=False, n_jobs=1, thresh_n_mult_nonstationary=2,
+                  sigmoid_slope_nonstationary=10, cache=cache)
+    gate = SpectralGateNonStationary(**params)
+    assert np.shares_memory(gate.y, pcm)
+    first = gate.get_traces()
+    again = SpectralGateNonStationary(**params).get_traces()
+    assert cache.stats()["hits"] > 0
+    assert first.dtype == np.int16
+    np.testing.assert_array_equal(again, first)
+
+
+def test_int16_silence_levels():
+    pcm = _pcm()
+    pcm[:, 2000:14000] //= 1000
+    np.testing.assert_array_equal(detect_silence(pcm, SR, thresh_db=-45), detect_silence(pcm_to_float(pcm), SR, thresh_db=-45))
+    reduced, spans = reduce_noise(pcm, SR, silence_thresh_db=-45, return_silence_index=True)
+    assert len(spans) and reduced.dtype == np.int16
@@ -0,0 +1,60 @@
+import numpy as np
+import torch
+from anc.models.ancrn.gates.profiling import GateProfiler, LatencyAlarm, NULL_PROFILER, profile
+from anc.models.ancrn.gates.spectralgate.nonstationary import SpectralGateNonStationary
+from anc.models.ancrn.gates.torchgate import TorchGate
+
+
+def _gate(y, **kwargs):
+    return SpectralGateNonStationary(
+        y=y, sr=16000, prop_decrease=1.0, chunk_size=8000, padding=2000, n_fft=512, win_length=None,
+        hop_length=None, time_constant_s=0.5, freq_mask_smooth_hz=500, time_mask_smooth_ms=50,
+        tmp_folder=None, use_tqdm=False, n_jobs=1, thresh_n_mult_nonstationary=2,
+        sigmoid_slope_nonstationary=10, **kwargs
+    )
+
+
+def test_gate_profiler_records_stages():
+    sg = _gate(np.random.default_rng(0).standard_normal((2, 20000)))
+    assert sg.profiler is NULL_PROFILER
+    with profile(sg) as prof:
+        sg.get_traces()
+    assert sg.profiler is NULL_PROFILER
+    stats = prof.stats
+    assert stats["chunk"].calls == 3
+    # one write per chunk into the memmap and one copy out of it
+    assert stats["write"].calls == 3
+    assert stats["copy_out"].calls == 1
+    assert stats["stft"].calls == 6
+    assert stats["istft"].bytes > 0
+    for stage in ("read_chunk", "time_smoothing", "mask", "mask_smoothing", "write"):
+        assert stage in stats
+    assert "stft" in prof.summary()
+
+
+def test_latency_alarm_and_callbacks():
+    seen = []
+    breaches = []
+    alarm = LatencyAlarm(0.0, stages=["istft"], handler=lambda name, elapsed: breaches.append(name))
+    profiler = GateProfiler(callbacks=[alarm, lambda name, elapsed, nbytes: seen.append(name)])
+    tg = TorchGate(sr=16000, nonstationary=True, profiler=profiler)
+    tg(torch.randn(2, 16000))
+    assert seen == ["stft", "mask", "mask_smoothing", "apply_mask", "istft"]
+    assert breaches == ["istft"]
+    assert alarm.breaches == 1
+
+
+def test_profiler_survives_worker_processes():
+    from anc.models.ancrn.noisereduce import reduce_noise
+
+    y = np.random.default_rng(1).standard_normal(16000).astype(np.float32)
+    profiler = GateProfiler(callbacks=[lambda name, elapsed, nbytes: None])
+    # the stationary gate gates its channels in a multiprocessing pool
+    reduce_noise(y, 16000, stationary=True, profiler=profiler)
+    assert profiler.stats["chunk"].calls == 1
+    assert "stft" not in profiler.stats
+    # chunks gated and written by joblib workers, the parent only copies the result out
+    profiler.reset()
+    reduce_noise(y, 16000, n_jobs=2, chunk_size=8000, padding=2000, profiler=profiler)
+    assert "copy_out" in profiler.stats
+    assert "chunk" not in profiler.stats
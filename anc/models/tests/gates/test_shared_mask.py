@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+import torch
+from anc.models.ancrn.gates.profiling import GateProfiler
+from anc.models.ancrn.gates.torchgate import TorchGate
+from anc.models.ancrn.noisereduce import reduce_noise
+
+SR = 16000
+
+
+def _capture(n_mics=4, seconds=1.0, seed=0):
+    """One source seen by several mics at different gains."""
+    rng = np.random.default_rng(seed)
+    n = int(SR * seconds)
+    t = np.arange(n) / SR
+    source = np.sin(2 * np.pi * np.repeat(rng.uniform(200, 4000, n // 800 + 1), 800)[:n] * t)
+    return np.outer(np.linspace(1.0, 0.4, n_mics), source) + 0.1 * rng.standard_normal((n_mics, n))
+
+
+@pytest.mark.parametrize("nonstationary", [True, False])
+def test_torch_shared_mask_gates_channels_alike(nonstationary):
+    x = torch.from_numpy(_capture())
+    per_channel = TorchGate(SR, nonstationary=nonstationary)(x[:1].repeat(4, 1))
+    shared = TorchGate(SR, nonstationary=nonstationary, shared_mask="mean")(x[:1].repeat(4, 1))
+    # identical channels combine to themselves
+    torch.testing.assert_close(shared, per_channel)
+
+    gains = torch.tensor([1.0, 0.5, 2.0], dtype=torch.float64)[:, None]
+    y = TorchGate(SR, nonstationary=nonstationary, shared_mask="max")(gains * x[:1])
+    # one mask for all channels, so scaled inputs stay scaled copies
+    torch.testing.assert_close(y, gains * y[:1])
+
+
+def test_torch_shared_mask_work_does_not_grow_with_channels():
+    mask_bytes = {}
+    for n_mics in (1, 8):
+        profiler = GateProfiler()
+        TorchGate(SR, nonstationary=True, shared_mask="mean", profiler=profiler)(torch.from_numpy(_capture(n_mics)))
+        mask_bytes[n_mics] = profiler.as_dict()["mask"]["bytes"]
+    assert mask_bytes[8] == mask_bytes[1]
+
+
+@pytest.mark.parametrize("stationary", [False, True])
+def test_numpy_shared_mask(stationary):
+    x = np.repeat(_capture(1), 3, axis=0)
+    per_channel = reduce_noise(x, SR, stationary=stationary)
+    shared = reduce_noise(x, SR, stationary=stationary, shared_mask="mean")
+    np.testing.assert_allclose(shared, per_channel, atol=1e-6)
+
+    gains = np.array([[1.0], [0.5], [2.0]])
+    y = reduce_noise(gains * x, SR, stationary=stationary, shared_mask="max")
+    np.testing.assert_allclose(y, gains * y[:1], atol=1e-9)
+
+
+def test_invalid_shared_mask():
+    with pytest.raises(ValueError):
+        TorchGate(SR, shared_mask="median")
+    with pytest.raises(ValueError):
+        reduce_noise(_capture(2), SR, shared_mask="median")
+
+
+@pytest.mark.parametrize("shared_mask", ["mean", "max"])
+def test_numpy_shared_mask_noise_statistics_match_torch(shared_mask):
+    rng = np.random.default_rng(3)
+    # independent noise on every mic: combining magnitudes does not lower it like averaging waveforms
+    noise = 0.1 * rng.standard_normal((4, SR))
+    kwargs = dict(stationary=True, y_noise=noise, n_fft=1024, chunk_size=None, shared_mask=shared_mask)
+    reduced = reduce_noise(noise, SR, **kwargs)
+    reduced_torch = reduce_noise(noise, SR, use_torch=True, device="cpu", **kwargs)
+    residual = np.sqrt(np.mean(reduced ** 2) / np.mean(noise ** 2))
+    residual_torch = np.sqrt(np.mean(reduced_torch ** 2) / np.mean(noise ** 2))
+    assert residual < 0.15 and abs(residual - residual_torch) < 0.05
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import torch
+from anc.models.ancrn.gates.torchgate import TorchGate
+from anc.models.ancrn.gates.torchgate.bench import benchmark_precision
+from anc.models.ancrn.gates.torchgate.utils import amp_to_db, db_eps
+from anc.models.ancrn.noisereduce import reduce_noise
+
+
+@pytest.mark.parametrize("nonstationary, bf16_bound", [(True, 0.02), (False, 0.15)])
+def test_precision_accuracy_bounds(nonstationary, bf16_bound):
+    report = benchmark_precision(seconds=2.0, n_channels=2, nonstationary=nonstationary, repeats=1)
+    assert report["float64"]["rel_rms_error"] == 0.0
+    assert report["float32"]["rel_rms_error"] < 1e-5
+    # the stationary mask is a hard threshold, bins sitting on it flip in bfloat16
+    assert report["bfloat16"]["rel_rms_error"] < bf16_bound
+
+
+def test_precision_dtypes_and_silence():
+    gate = TorchGate(16000, nonstationary=True, precision="bfloat16")
+    y = gate(torch.zeros(1, 8000))
+    assert y.dtype == torch.float32
+    assert torch.isfinite(y).all()
+    assert torch.isfinite(amp_to_db(torch.zeros(4, dtype=torch.bfloat16))).all()
+    assert db_eps(torch.complex64) == torch.finfo(torch.float32).tiny
+    with pytest.raises(ValueError):
+        TorchGate(16000, precision="int8")
+
+
+def test_reduce_noise_precision():
+    y = np.random.default_rng(0).standard_normal((1, 16000))
+    kwargs = dict(sr=16000, use_torch=True, device="cpu", chunk_size=16384, padding=4096)
+    ref = reduce_noise(y, **kwargs)
+    out = reduce_noise(y, precision="float32", **kwargs)
+    assert np.abs(out - ref).max() < 1e-4
@@ -0,0 +1,29 @@
+import numpy as np
+from anc.models.ancrn import reduce_noise
+from anc.models.ancrn.autotune import autotune, load_profile, min_safe_padding
+
+
+def test_min_safe_padding_grows_with_time_constant():
+    short = min_safe_padding(16000, time_constant_s=0.5, n_fft=512)
+    long = min_safe_padding(16000, time_constant_s=2.0, n_fft=512)
+    assert short % 128 == 0 and long % 128 == 0
+    assert long > short
+    assert min_safe_padding(16000, stationary=True, n_fft=512) < short
+
+
+def test_autotune_persists_and_is_used(tmp_path, monkeypatch):
+    path = str(tmp_path / "profiles.json")
+    monkeypatch.setenv("ANC_AUTOTUNE_CACHE", path)
+    gate_args = dict(time_constant_s=0.1, n_fft=512, freq_mask_smooth_hz=500, time_mask_smooth_ms=50)
+    profile = autotune(
+        16000, calibration_s=2, chunk_sizes_s=(0.25, 0.5), consider_torch=False, **gate_args
+    )
+    assert profile["chunk_size"] % 128 == 0
+    assert profile["padding"] == min_safe_padding(16000, n_fft=512, time_constant_s=0.1)
+    assert all(c["relative_error"] < 1e-3 for c in profile["candidates"] if c["eligible"])
+    assert load_profile(16000, **gate_args)["chunk_size"] == profile["chunk_size"]
+    assert load_profile(16000, n_channels=2, **gate_args) is None
+
+    y = np.random.default_rng(0).standard_normal(20000)
+    out = reduce_noise(y, 16000, autotune=True, **gate_args)
+    assert out.shape == y.shape
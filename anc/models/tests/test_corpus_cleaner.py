@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+import soundfile as sf
+from utils.data.corpus_cleaner import CorpusCleaner, load_manifest
+
+
+def _corpus(root, n_files=3, sr=16000):
+    rng = np.random.default_rng(0)
+    for i in range(n_files):
+        path = root / f"video{i}" / f"video{i}_segment_1.wav"
+        path.parent.mkdir(parents=True)
+        sf.write(path, 0.1 * rng.standard_normal((sr, 2)).astype(np.float32), sr, subtype="PCM_16")
+
+
+def test_cleans_corpus_and_resumes(tmp_path):
+    source, out = tmp_path / "batches", tmp_path / "clean"
+    _corpus(source)
+    summary = CorpusCleaner(source, out, n_workers=0, use_tqdm=False).process()
+    assert (summary["cleaned"], summary["skipped"], summary["failed"]) == (3, 0, 0)
+
+    cleaned, sr = sf.read(out / "video1" / "video1_segment_1.wav")
+    assert sr == 16000 and cleaned.shape == (16000, 2)
+    assert sf.info(out / "video1" / "video1_segment_1.wav").subtype == "PCM_16"
+    assert np.std(cleaned) < 0.1
+
+    rows = [json.loads(line) for line in (out / "manifest.jsonl").read_text().splitlines()]
+    assert sorted(row["path"] for row in rows) == [f"video{i}/video{i}_segment_1.wav" for i in range(3)]
+    assert all(row["gate_s"] > 0 and row["seconds"] == 1.0 for row in rows)
+
+    # a restart skips what is in the manifest, changed content is cleaned again
+    sf.write(source / "video2" / "video2_segment_1.wav", np.zeros((16000, 2)), 16000, subtype="PCM_16")
+    summary = CorpusCleaner(source, out, n_workers=2, use_tqdm=False).process()
+    assert (summary["cleaned"], summary["skipped"]) == (1, 2)
+    assert len(load_manifest(out / "manifest.jsonl")) == 4
+
+
+def test_shard_and_errors(tmp_path):
+    source = tmp_path / "batches"
+    _corpus(source)
+    (source / "broken.wav").write_bytes(b"not audio")
+    cleaner = CorpusCleaner(source, tmp_path / "clean", n_workers=0, shard=(0, 2), use_tqdm=False)
+    assert [path for _, path, _ in cleaner.files()] == ["broken.wav", "video1/video1_segment_1.wav"]
+    summary = cleaner.process()
+    assert (summary["cleaned"], summary["failed"]) == (1, 1)
+    # failed files are tried again on the next run
+    assert cleaner.process()["failed"] == 1
@@ -0,0 +1,83 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import soundfile as sf
+from anc.models.ancrn.features import FeatureCache, compute_features
+
+SR = 16000
+
+
+@pytest.fixture
+def wav(tmp_path):
+    rng = np.random.default_rng(0)
+    path = str(tmp_path / "clip.wav")
+    sf.write(path, 0.1 * rng.standard_normal(SR).astype(np.float32), SR)
+    return path
+
+
+def test_feature_kinds():
+    y = 0.1 * np.random.default_rng(0).standard_normal(SR).astype(np.float32)
+    frames = 1 + SR // 256
+    assert compute_features(y, SR, "magnitude", n_fft=512, hop_length=256).shape == (257, frames)
+    db = compute_features(y, SR, "db", n_fft=512, hop_length=256)
+    assert db.dtype == np.float32 and db.max() == 0 and db.min() >= -80
+    assert compute_features(y, SR, "mel_db", n_fft=512, hop_length=256, n_mels=40).shape == (40, frames)
+    assert compute_features(y, SR, "mfcc", n_fft=512, hop_length=256, n_mels=40, n_mfcc=13).shape == (13, frames)
+    with pytest.raises(ValueError):
+        compute_features(y, SR, "cqt")
+
+
+def test_cache_is_content_addressed(tmp_path, wav):
+    cache = FeatureCache(str(tmp_path / "cache"))
+    first = cache.features(wav, n_fft=512, hop_length=128)
+    assert cache.stats()["misses"] == 1 and cache.stats()["entries"] == 1
+    np.testing.assert_allclose(first, compute_features(sf.read(wav)[0], SR, n_fft=512, hop_length=128),
+                               rtol=1e-3, atol=1e-3)
+
+    copy = str(tmp_path / "copy.wav")
+    shutil.copy(wav, copy)
+    np.testing.assert_array_equal(cache.features(copy, n_fft=512, hop_length=128), first)
+    # spelling out a default is the same configuration
+    cache.features(wav, n_fft=512, hop_length=128, kind="db", top_db=80.0)
+    assert cache.stats()["hits"] == 2
+
+    cache.features(wav, n_fft=512, hop_length=256)
+    sf.write(copy, np.zeros(SR, dtype=np.float32), SR)
+    cache.features(copy, n_fft=512, hop_length=128)
+    assert cache.stats()["misses"] == 3 and cache.stats()["entries"] == 3
+    assert cache.key(wav, n_fft=512) != FeatureCache(str(tmp_path / "cache"), dtype="float32").key(wav, n_fft=512)
+
+
+def test_lru_eviction(tmp_path):
+    cache = FeatureCache(str(tmp_path), max_bytes=3 * (128 + 1000 * 2))
+    for i, key in enumerate("abc"):
+        cache.put(key, np.full(1000, i, dtype=np.float32))
+        os.utime(cache._path(key), (100 + i, 100 + i))
+    assert cache.get("a") is not None
+    cache.put("d", np.zeros(1000, dtype=np.float32))
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.stats()["evictions"] == 1 and cache.nbytes <= cache.max_bytes
+
+
+def test_float16_overflow_is_stored_as_float32(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    cache.put("loud", np.array([1.0, 1e6], dtype=np.float32))
+    np.testing.assert_array_equal(cache.get("loud"), [1.0, 1e6])
+
+
+def test_concurrent_writers(tmp_path):
+    cache = FeatureCache(str(tmp_path), max_bytes=10 * 1000 * 4)
+
+    def work(i):
+        cache.put(str(i % 20), np.full(1000, i % 20, dtype=np.float32))
+        features = cache.get(str((i * 7) % 20))
+        assert features is None or np.all(features == (i * 7) % 20)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(work, range(200)))
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+    assert cache.nbytes <= cache.max_bytes
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from anc.models.ancrn.generate_noise import NoiseGenerator, band_limited_noise
+
+
+def test_band_limited_noise_legacy_shape():
+    noise = band_limited_noise(100, 200, samples=1000, samplerate=8000)
+    assert noise.shape == (1000,)
+
+
+def test_noise_generator_is_seeded():
+    a = NoiseGenerator(16000, seed=1).pink(4, 2048)
+    b = NoiseGenerator(16000, seed=1).pink(4, 2048)
+    assert a.shape == (4, 2048)
+    assert a.dtype == np.float32
+    np.testing.assert_array_equal(a, b)
+
+
+def test_band_limited_batch_stays_in_band():
+    sr = 16000
+    noise = NoiseGenerator(sr, seed=0).band_limited(8, 4096, 1000, 2000)
+    spectrum = np.abs(np.fft.rfft(noise, axis=-1)) ** 2
+    freqs = np.fft.rfftfreq(4096, 1 / sr)
+    in_band = (freqs >= 1000) & (freqs <= 2000)
+    assert spectrum[:, ~in_band].sum() < 1e-6 * spectrum[:, in_band].sum()
+    assert abs(noise.std() - 1) < 0.05
+
+
+def test_stream_is_continuous_and_unit_variance():
+    gen = NoiseGenerator(16000, seed=0)
+    blocks = list(gen.stream("brown", 512, n_signals=2, n_blocks=64))
+    assert all(block.shape == (2, 512) for block in blocks)
+    signal = np.concatenate(blocks, axis=-1)
+    assert abs(signal.std() - 1) < 0.3
+    # brown noise is smooth, a block boundary must not look like a step
+    assert np.abs(np.diff(signal)).max() < 0.5
+
+
+def test_stream_checks_its_arguments_when_called():
+    gen = NoiseGenerator(16000, seed=0)
+    with pytest.raises(ValueError, match="exponent"):
+        gen.stream("colored", 512)
+    with pytest.raises(ValueError, match="Unknown noise kind"):
+        gen.stream("violet", 512)
+    assert next(gen.stream("colored", 512, exponent=1.5)).shape == (1, 512)
+
+
+def test_engine_stream_matches_harmonic_series():
+    sr = 8000
+    gen = NoiseGenerator(sr, seed=0)
+    signal = np.concatenate(
+        list(gen.stream("engine", 800, n_blocks=10, rpm_start=3000, n_cylinders=4, n_harmonics=1)), axis=-1
+    )[0]
+    spectrum = np.abs(np.fft.rfft(signal))
+    freqs = np.fft.rfftfreq(len(signal), 1 / sr)
+    # 3000 rpm on four cylinders fires at 100 Hz
+    assert freqs[np.argmax(spectrum)] == 100
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+import torch
+from anc.models.ancrn.inference import StreamingANCRN, benchmark_latency
+from anc.models.ancrn.model import ANCRN, fuse, load_model, quantize, save_model
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    model = ANCRN()
+    # non-trivial BatchNorm statistics, so fusing has something to fold
+    model.train()
+    with torch.no_grad():
+        for _ in range(3):
+            model(torch.randn(4, 20, 64))
+    return model.eval()
+
+
+@torch.no_grad()
+def _in_blocks(model, features, frames_per_block):
+    state, masks = None, []
+    for block in features.split(frames_per_block, dim=1):
+        mask, state = model(block, state)
+        masks.append(mask)
+    return torch.cat(masks, dim=1)
+
+
+@torch.no_grad()
+def test_streaming_matches_full_call(model):
+    features = torch.randn(2, 37, 64)
+    full, _ = model(features)
+    assert full.shape == features.shape
+    assert 0 <= full.min() and full.max() <= 1
+    torch.testing.assert_close(_in_blocks(model, features, 4), full)
+    torch.testing.assert_close(_in_blocks(model, features, 1), full)
+
+
+@torch.no_grad()
+def test_fused_and_quantized(model):
+    features = torch.randn(2, 40, 64)
+    full, _ = model(features)
+    fused = fuse(model)
+    assert not any(isinstance(m, torch.nn.BatchNorm2d) for m in fused.modules())
+    torch.testing.assert_close(fused(features)[0], full, atol=1e-5, rtol=0)
+    assert (quantize(model)(features)[0] - full).abs().max() < 0.02
+
+    static = quantize(model, "static", calibration=[torch.randn(2, 40, 64) for _ in range(4)])
+    mask = static(features)[0]
+    assert mask.shape == full.shape and (mask - full).abs().mean() < 0.05
+    assert (_in_blocks(static, features, 4) - mask).abs().max() < 0.02
+
+    with pytest.raises(ValueError):
+        quantize(model, "static")
+    with pytest.raises(ValueError):
+        quantize(model, "float16")
+
+
+def test_save_load(model, tmp_path):
+    save_model(model, tmp_path / "ancrn.pt")
+    loaded = load_model(tmp_path / "ancrn.pt")
+    features = torch.randn(1, 10, 64)
+    with torch.no_grad():
+        torch.testing.assert_close(loaded(features)[0], model(features)[0])
+    with pytest.raises(ValueError):
+        ANCRN(n_bands=60)
+
+
+def test_streaming_wrapper(model):
+    y = np.random.default_rng(0).standard_normal(8000).astype(np.float32)
+    # without gating the analysis/synthesis is an exact reconstruction
+    np.testing.assert_allclose(StreamingANCRN(model, 256, prop_decrease=0.0).enhance(y), y, atol=1e-5)
+
+    stream = StreamingANCRN(model, 256)
+    offline = stream.enhance(y)
+    blocks = np.pad(y, (0, 256 * 32 - len(y))).reshape(-1, 256)
+    streamed = np.concatenate([stream.process(block) for block in blocks])
+    delay = stream.latency_samples
+    np.testing.assert_allclose(streamed[delay:len(y)], offline[:len(y) - delay], atol=1e-5)
+
+    with pytest.raises(ValueError):
+        stream.process(y[:100])
+    with pytest.raises(ValueError):
+        StreamingANCRN(model, 100)
+
+
+def test_benchmark_latency(model):
+    report = benchmark_latency(StreamingANCRN(quantize(model), 512), n_blocks=20, warmup=2)
+    assert report["p50_ms"] <= report["p99_ms"] <= report["max_ms"]
+    assert report["block_ms"] == 32.0 and report["algorithmic_delay_ms"] == 24.0
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from anc.models.ancrn.multirate import band_merge, band_split, scale_samples
+from anc.models.ancrn.noisereduce import reduce_noise
+
+
+@pytest.mark.parametrize("shape", [(4801,), (2, 4800)])
+def test_band_split_reconstructs_input(shape):
+    y = np.random.default_rng(0).standard_normal(shape)
+    low, high = band_split(y, 48000, 16000)
+    assert low.shape[-1] == 1601 if shape[-1] == 4801 else 1600
+    assert high.shape == y.shape
+    np.testing.assert_allclose(band_merge(low, high, 48000, 16000), y, atol=1e-12)
+
+
+def test_high_band_holds_only_high_frequencies():
+    sr = 48000
+    t = np.arange(sr) / sr
+    low, high = band_split(np.sin(2 * np.pi * 500 * t) + np.sin(2 * np.pi * 15000 * t), sr, 16000)
+    spectrum = np.abs(np.fft.rfft(high))
+    assert spectrum[500] < 1e-2 * spectrum[15000]
+
+
+def test_scale_samples():
+    assert scale_samples(1024, 48000, 16000, power_of_two=True) == 256
+    assert scale_samples(600000, 48000, 8000) == 100000
+    assert scale_samples(None, 48000, 8000) is None
+
+
+def test_band_split_gate_reduces_low_frequency_noise():
+    sr = 48000
+    rng = np.random.default_rng(0)
+    n = 2 * sr
+    # 50 ms tone bursts at random pitches in low-passed noise, nothing to gate above 8 kHz
+    freqs = np.repeat(rng.uniform(200, 4000, n // 2400 + 1), 2400)[:n]
+    clean = 0.5 * np.sin(2 * np.pi * np.cumsum(freqs) / sr)
+    noise = np.convolve(rng.standard_normal(n), np.ones(16) / 4, mode="same")
+    noisy = (clean + 0.3 * noise).astype(np.float32)
+    out = reduce_noise(noisy, sr, band_split_sr=16000)
+    full = reduce_noise(noisy, sr)
+    assert out.shape == noisy.shape and out.dtype == noisy.dtype
+
+    def snr(x):
+        return 10 * np.log10(np.sum(clean ** 2) / np.sum((x - clean) ** 2))
+    assert snr(out) > snr(noisy) + 2
+    assert snr(out) > snr(full) - 0.5
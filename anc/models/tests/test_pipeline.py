@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from anc.models.ancrn.evaluate import make_gate
+from anc.models.ancrn.gates.streaming import StreamingGate
+from anc.models.ancrn.pipeline import (ArraySource, Collect, Convert, Denoise, Gate, Meter, Pipeline, Reader,
+                                       Resample, TrimSilence, Writer)
+from scipy.signal import resample_poly
+
+
+class _Delay:
+    """Stream delaying its input by ``latency_samples``."""
+
+    block_size = 160
+    latency_samples = 250
+
+    def __init__(self, sr):
+        self._line = np.zeros(self.latency_samples, dtype=np.float32)
+
+    def process(self, block):
+        line = np.concatenate([self._line, block])
+        self._line = line[len(block):]
+        return line[:len(block)]
+
+
+def _noisy_tone(sr, seconds=1.0, channels=2, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(sr * seconds)) / sr
+    tone = 0.5 * np.sin(2 * np.pi * 440 * t)
+    return (tone + 0.05 * rng.standard_normal((channels, len(t)))).astype(np.float32)
+
+
+def _run(y, sr, stages, block_size=1000, threads=False):
+    sink = Collect()
+    report = Pipeline(ArraySource(y, sr, block_size), list(stages) + [sink], threads=threads).run()
+    return sink.result(), report
+
+
+@pytest.mark.parametrize("sr_in, sr_out", [(48000, 16000), (44100, 48000)])
+def test_resample_stream_matches_whole_signal(sr_in, sr_out):
+    y = _noisy_tone(sr_in, 0.5)
+    out, report = _run(y, sr_in, [Resample(sr_out)], block_size=777)
+    expected = resample_poly(y, sr_out, sr_in, axis=-1)
+    assert out.shape == expected.shape
+    np.testing.assert_allclose(out, expected, atol=1e-5)
+    assert report["output"] == {"sr": sr_out, "channels": 2}
+
+
+def test_denoise_compensates_latency():
+    y = _noisy_tone(16000, 0.3)
+    out, _ = _run(y, 16000, [Denoise(_Delay)], block_size=333)
+    np.testing.assert_array_equal(out, y)
+
+
+def test_gate_matches_streaming_gate_per_channel():
+    sr = 16000
+    y = _noisy_tone(sr, 0.5)
+    out, _ = _run(y, sr, [Gate(block_size=256, stationary=True)], block_size=1000)
+    assert out.shape == y.shape
+
+    gate = make_gate(sr, stationary=True)
+    for channel, x in zip(out, y):
+        stream = StreamingGate(gate, 256)
+        padded = np.concatenate([x, np.zeros(stream.latency_samples + 256, dtype=np.float32)])
+        blocks = [stream.process(block) for block in padded[:len(padded) // 256 * 256].reshape(-1, 256)]
+        expected = np.concatenate(blocks)[stream.latency_samples:stream.latency_samples + len(x)]
+        np.testing.assert_allclose(channel, expected, atol=1e-5)
+
+
+def test_convert_round_trips_int16():
+    y = (np.arange(-3000, 3000, dtype=np.int16) * 10).reshape(2, -1)
+    out, _ = _run(y, 8000, [Convert("float32"), Convert("int16")], block_size=512)
+    assert out.dtype == np.int16
+    np.testing.assert_array_equal(out, y)
+
+
+def test_trim_silence_drops_the_ends_only():
+    sr = 8000
+    y = np.zeros((1, 3 * sr), dtype=np.float32)
+    y[:, 8000:10000] = 0.5
+    y[:, 12000:14000] = 0.5
+    out, report = _run(y, sr, [TrimSilence(thresh_db=-40)], block_size=700)
+    np.testing.assert_array_equal(out, y[:, 8000:14000])
+    assert report["stages"][0]["trimmed_samples"] == y.shape[1] - 6000
+
+
+def test_meter_reports_levels_and_clipping():
+    y = np.full((2, 1000), 0.5, dtype=np.float32)
+    y[1, :10] = 1.0
+    _, report = _run(y, 8000, [Meter()], block_size=300)
+    stats = report["stages"][0]
+    assert stats["samples"] == 1000
+    np.testing.assert_allclose(stats["peak_dbfs"], [20 * np.log10(0.5), 0.0], atol=1e-6)
+    np.testing.assert_allclose(stats["rms_dbfs"][0], 20 * np.log10(0.5), atol=1e-6)
+    assert stats["clipped_samples"] == [0, 10]
+
+
+def test_threaded_runtime_matches_fused():
+    sr = 16000
+    y = _noisy_tone(sr, 1.0)
+    stages = lambda: [Resample(8000), Gate(block_size=256), Meter(), Convert("int16")]  # noqa: E731
+    fused, _ = _run(y, sr, stages(), block_size=500)
+    threaded, report = _run(y, sr, stages(), block_size=500, threads=True)
+    np.testing.assert_array_equal(threaded, fused)
+    assert report["samples_in"] == y.shape[1]
+    assert [stage["stage"] for stage in report["stages"]] == ["Resample", "Gate", "Meter", "Convert", "Collect"]
+
+
+def test_threaded_runtime_raises_stage_errors():
+    class Broken(Meter):
+        def process(self, block):
+            raise RuntimeError("broken stage")
+
+    with pytest.raises(RuntimeError, match="broken stage"):
+        _run(_noisy_tone(8000), 8000, [Broken(), Meter()], block_size=100, threads=True)
+
+
+def test_file_round_trip_from_spec(tmp_path):
+    sr = 16000
+    y = _noisy_tone(sr, 0.5)
+    sf.write(tmp_path / "in.wav", y.T, sr, subtype="FLOAT")
+    spec = {
+        "source": {"stage": "read", "path": str(tmp_path / "in.wav"), "block_size": 1024},
+        "stages": [{"stage": "resample", "sr": 8000},
+                   {"stage": "meter"},
+                   {"stage": "write", "path": str(tmp_path / "out.wav"), "subtype": "FLOAT"}],
+        "threads": True,
+    }
+    report = Pipeline.from_spec(spec).run()
+    written, written_sr = sf.read(tmp_path / "out.wav", dtype="float32", always_2d=True)
+    assert written_sr == 8000
+    np.testing.assert_allclose(written.T, resample_poly(y, 1, 2, axis=-1), atol=1e-5)
+    assert report["stages"][-1]["samples"] == written.shape[0]
+
+    out, _ = _run(written.T, 8000, [], block_size=1024)
+    read = Collect()
+    Pipeline(Reader(str(tmp_path / "out.wav"), block_size=300), [read], threads=True).run()
+    np.testing.assert_array_equal(read.result(), out)
+
+    with pytest.raises(ValueError, match="Unknown stage"):
+        Pipeline.from_spec({"source": {"stage": "nope"}})
+    assert isinstance(Pipeline.from_spec(spec).stages[-1], Writer)
@@ -0,0 +1,37 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+import pytest
+from anc.models.ancrn.plotting import SpectrogramPyramid, plot_spectrogram
+
+
+def test_pyramid_levels_and_views():
+    spec = np.random.default_rng(0).standard_normal((513, 10001))
+    spec[100, 5000] = 50.0
+    pyramid = SpectrogramPyramid(spec, min_size=64, max_freq_bins=128)
+    assert pyramid.clim == (-50.0, 50.0)
+    assert pyramid.levels[-1].shape[1] <= 64 and pyramid.levels[-1].shape[0] <= 128
+    # the peak survives every max reduction
+    assert all(level.max() == 50.0 for level in pyramid.levels)
+    assert pyramid.nbytes < 1.5 * spec.nbytes
+
+    data, extent = pyramid.view(100, 50)
+    assert data.shape[1] >= 100 and data.shape[1] < 400
+    assert extent[:2] == (0, 10001)
+    # zooming in far enough reaches full resolution
+    data, extent = pyramid.view(100, 50, time_range=(4950, 5050), freq_range=(50, 150))
+    np.testing.assert_array_equal(data, spec[50:150, 4950:5050])
+    with pytest.raises(ValueError):
+        SpectrogramPyramid(spec, reduce="median")
+
+
+def test_plot_spectrogram_renders_matching_level():
+    spec = np.random.default_rng(1).standard_normal((257, 200000))
+    fig = plot_spectrogram(spec, "long", show=False)
+    ax = fig.axes[0]
+    image = ax.images[0]
+    assert image.get_array().shape[1] < 8000
+    ax.set_xlim(1000, 1100)
+    assert image.get_array().shape[1] == 100
@@ -0,0 +1,122 @@
+import threading
+import time
+
+import numpy as np
+import soundfile as sf
+from anc.models.ancrn.evaluate import make_gate
+from anc.models.ancrn.gates.streaming import StreamingGate
+from anc.models.ancrn import realtime
+from anc.models.ancrn.realtime import RealtimeHarness, RingBuffer, replay
+
+
+class _Scale:
+    latency_samples = 0
+
+    def __init__(self, delay_s=0.0, slow_blocks=()):
+        self.delay_s = delay_s
+        self.slow_blocks = set(slow_blocks)
+        self.calls = 0
+
+    def process(self, block):
+        if self.calls in self.slow_blocks:
+            time.sleep(self.delay_s)
+        self.calls += 1
+        return 0.5 * block
+
+
+def test_ring_buffer_wraps_and_reports_full_and_empty():
+    ring = RingBuffer(5)
+    assert ring.read(1) is None
+    assert ring.write(np.arange(3))
+    assert not ring.write(np.arange(3))
+    np.testing.assert_array_equal(ring.read(2), [0, 1])
+    assert ring.write(np.arange(3, 7))
+    assert ring.available() == 5 and ring.space() == 0
+    out = np.empty(5, dtype=np.float32)
+    assert ring.read(5, out=out) is out
+    np.testing.assert_array_equal(out, [2, 3, 4, 5, 6])
+
+
+def test_ring_buffer_between_threads():
+    ring = RingBuffer(64, np.int64)
+    data = np.arange(7000)
+    received = []
+
+    def consume():
+        while len(received) < len(data) // 10:
+            chunk = ring.read(10)
+            if chunk is None:
+                time.sleep(0)
+                continue
+            received.append(chunk)
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    for chunk in data.reshape(-1, 7):
+        while not ring.write(chunk):
+            time.sleep(0)
+    consumer.join()
+    np.testing.assert_array_equal(np.concatenate(received), data)
+
+
+def test_harness_keeps_up():
+    y = np.random.default_rng(0).standard_normal(100 * 256).astype(np.float32)
+    harness = RealtimeHarness(_Scale(), block_size=256, sr=16000, buffer_blocks=4, speed=4.0)
+    out, report = harness.run(y[:-10])
+    np.testing.assert_allclose(out, 0.5 * y[:-10])
+    assert report["blocks"] == 100
+    assert report["xruns"] == report["overruns"] == 0
+    assert report["budget_ms"] == 4 * report["period_ms"]
+    assert report["block_latency_p50_ms"] <= report["block_latency_p99_ms"] <= report["block_latency_max_ms"]
+
+
+def test_harness_waits_for_the_block_index(monkeypatch):
+    class SlowRing(RingBuffer):
+        """Ring whose clock-side sample writes return a period and a half late, after the processor's timed wake."""
+
+        def write(self, data):
+            written = super().write(data)
+            if self._buffer.dtype == np.float32 and threading.current_thread() is threading.main_thread():
+                time.sleep(1.5 * 256 / 16000)
+            return written
+
+    monkeypatch.setattr(realtime, "RingBuffer", SlowRing)
+    y = np.random.default_rng(0).standard_normal(10 * 256).astype(np.float32)
+    harness = RealtimeHarness(_Scale(), block_size=256, sr=16000, buffer_blocks=4, speed=1.0)
+    out, report = harness.run(y)
+    # the late clock may miss the last blocks' playout, every block played is the right one in place
+    blocks, expected = out.reshape(-1, 256), 0.5 * y.reshape(-1, 256)
+    played = ~np.all(blocks == 0, axis=1)
+    assert played.sum() >= 5
+    np.testing.assert_allclose(blocks[played], expected[played])
+
+
+def test_harness_counts_xruns_of_a_slow_block():
+    block_size, sr = 160, 16000
+    y = np.ones(60 * block_size, dtype=np.float32)
+    harness = RealtimeHarness(_Scale(delay_s=0.1, slow_blocks=[20]), block_size, sr, speed=1.0)
+    out, report = harness.run(y)
+    assert report["xruns"] > 0
+    assert report["deadline_misses"] > 0
+    assert report["block_latency_max_ms"] > report["budget_ms"]
+    blocks = out.reshape(-1, block_size)
+    # missed blocks are played as silence, the rest untouched and in place
+    silent = np.all(blocks == 0, axis=1)
+    assert silent[20] and silent.sum() == report["xruns"]
+    np.testing.assert_array_equal(blocks[~silent], 0.5)
+
+
+def test_replay_gate_faster_than_real_time(tmp_path):
+    sr = 16000
+    y = 0.1 * np.random.default_rng(0).standard_normal(sr).astype(np.float32)
+    path = str(tmp_path / "noise.wav")
+    sf.write(path, np.stack([y, y], axis=1), sr)
+    gate = make_gate(sr, time_constant_s=0.2, n_fft=512)
+    stream = StreamingGate(gate, 512)
+
+    start = time.perf_counter()
+    out, out_sr, report = replay(path, stream, 512, buffer_blocks=4, speed=8.0)
+    assert time.perf_counter() - start < 1.0
+    assert out_sr == sr and out.shape == y.shape
+    assert report["blocks"] == sr // 512 + 1
+    assert report["algorithmic_delay_ms"] == 1e3 * stream.latency_samples / sr
@@ -0,0 +1,70 @@
+import numpy as np
+from anc.models.ancrn.gates.profiling import GateProfiler
+from anc.models.ancrn.noisereduce import reduce_noise
+from anc.models.ancrn.silence import active_spans, detect_silence, frame_energy_db
+
+
+def _mostly_quiet(sr=16000, seed=0):
+    """Ten seconds of near-silence with one noisy second of tone bursts in the middle."""
+    rng = np.random.default_rng(seed)
+    y = 1e-5 * rng.standard_normal(10 * sr)
+    t = np.arange(sr) / sr
+    freqs = np.repeat(rng.uniform(200, 4000, 20), 800)
+    y[4 * sr: 5 * sr] += 0.5 * np.sin(2 * np.pi * freqs * t) + 0.1 * rng.standard_normal(sr)
+    return y.astype(np.float32)
+
+
+def test_frame_energy_db():
+    y = np.concatenate([np.ones(100), 0.1 * np.ones(50)])
+    np.testing.assert_allclose(frame_energy_db(y, 100), [0.0, -20.0], atol=1e-6)
+    # the loudest channel decides
+    np.testing.assert_allclose(frame_energy_db(np.stack([y, y / 10]), 100), [0.0, -20.0], atol=1e-6)
+
+
+def test_detect_silence_spans():
+    sr = 16000
+    spans = detect_silence(_mostly_quiet(sr), sr, thresh_db=-60)
+    np.testing.assert_array_equal(spans, [[0, 4 * sr], [5 * sr, 10 * sr]])
+    np.testing.assert_array_equal(active_spans(spans, 10 * sr), [[4 * sr, 5 * sr]])
+    # silent runs shorter than min_silence_ms are kept
+    assert len(detect_silence(_mostly_quiet(sr), sr, thresh_db=-60, min_silence_ms=5000)) == 1
+
+
+def test_reduce_noise_skips_silence():
+    sr = 16000
+    y = _mostly_quiet(sr)
+    full_profiler, skip_profiler = GateProfiler(), GateProfiler()
+    full = reduce_noise(y, sr, chunk_size=sr, padding=sr // 4, profiler=full_profiler)
+    out, spans = reduce_noise(y, sr, chunk_size=sr, padding=sr // 4, profiler=skip_profiler,
+                              silence_thresh_db=-60, return_silence_index=True)
+    assert out.shape == y.shape and out.dtype == y.dtype
+    assert np.all(out[:4 * sr] == 0) and np.all(out[5 * sr:] == 0)
+    np.testing.assert_array_equal(spans, [[0, 4 * sr], [5 * sr, 10 * sr]])
+    # the active second, with the same padding around it, is gated as before
+    np.testing.assert_allclose(out[4 * sr: 5 * sr], full[4 * sr: 5 * sr], atol=1e-5)
+    # only the active audio and its padding go through the gate
+    read = skip_profiler.as_dict()["read_chunk"]["bytes"]
+    assert read < 0.2 * full_profiler.as_dict()["read_chunk"]["bytes"]
+
+
+def test_skipped_silence_gets_the_closed_gate_output():
+    sr = 16000
+    y = _mostly_quiet(sr)
+    full = reduce_noise(y, sr, stationary=True, prop_decrease=0.5, chunk_size=sr, padding=sr // 4)
+    out, mask = reduce_noise(y, sr, stationary=True, prop_decrease=0.5, chunk_size=sr, padding=sr // 4,
+                             silence_thresh_db=-60, return_mask="soft")
+    # the stationary gate closes on frames below the noise threshold, leaving half of them
+    np.testing.assert_allclose(out[:4 * sr], 0.5 * y[:4 * sr])
+    np.testing.assert_allclose(out[5 * sr:], 0.5 * y[5 * sr:])
+    # up to the STFT round trip of the quiet signal
+    np.testing.assert_allclose(out[sr:3 * sr], full[sr:3 * sr], atol=0.2 * np.std(y[sr:3 * sr]))
+    np.testing.assert_allclose(mask[:, :4 * sr // 256], 0.5, atol=1e-2)
+
+
+def test_band_split_reports_spans_at_full_rate():
+    sr = 48000
+    y = np.repeat(_mostly_quiet(16000), 3)
+    out, spans = reduce_noise(y, sr, band_split_sr=16000, silence_thresh_db=-60, return_silence_index=True)
+    # the decimation filter's ringing can extend the active audio by a frame
+    np.testing.assert_allclose(spans, [[0, 4 * sr], [5 * sr, 10 * sr]], atol=0.02 * sr)
+    assert np.all(out[:4 * sr] == 0)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from anc.models.ancrn.noisereduce import reduce_noise
+from anc.models.ancrn.sweep import parameter_grid, sweep
+
+CHUNKING = dict(chunk_size=16384, padding=4096, time_constant_s=0.5)
+
+
+def _signals():
+    t = np.arange(40000) / 16000
+    clean = np.stack([0.5 * np.sin(2 * np.pi * 440 * t) * (t % 1 < 0.5)] * 2)
+    return clean, clean + 0.1 * np.random.default_rng(0).standard_normal(clean.shape)
+
+
+@pytest.mark.parametrize("stationary, swept", [
+    (False, "thresh_n_mult_nonstationary"),
+    (True, "n_std_thresh_stationary"),
+])
+def test_sweep_matches_reduce_noise(stationary, swept):
+    clean, noisy = _signals()
+    grid = {"prop_decrease": [0.5, 1.0], swept: [1.0, 3.0]}
+    result = sweep(noisy, 16000, grid, stationary=stationary, reference=clean, batch_size=3, **CHUNKING)
+    assert result["signals"].shape == (4,) + noisy.shape
+    for setting, signal in zip(result["settings"], result["signals"]):
+        expected = reduce_noise(noisy, 16000, stationary=stationary, use_torch=True, device="cpu",
+                                **setting, **CHUNKING)
+        np.testing.assert_allclose(signal, expected, atol=1e-12)
+
+    # metrics-only sweeps accumulate the same numbers without keeping the signals
+    metrics = sweep(noisy, 16000, grid, stationary=stationary, reference=clean, return_signals=False,
+                    **CHUNKING)
+    assert "signals" not in metrics
+    error = np.sum((result["signals"] - clean) ** 2, axis=(1, 2))
+    np.testing.assert_allclose(metrics["metrics"]["snr_db"], 10 * np.log10(np.sum(clean ** 2) / error))
+    assert set(metrics["metrics"]) == {"reduction_db", "snr_db", "si_sdr_db"}
+
+
+def test_parameter_grid_validation():
+    settings = parameter_grid({"prop_decrease": [0.5, 1.0], "sigmoid_slope_nonstationary": [5, 10, 20]})
+    assert len(settings) == 6
+    assert settings[0]["n_std_thresh_stationary"] == 1.5
+    with pytest.raises(ValueError):
+        parameter_grid({"n_fft": [512]})
+    with pytest.raises(ValueError):
+        sweep(np.zeros(4096), 16000, {"prop_decrease": [1.0]}, metrics=["snr_db"])
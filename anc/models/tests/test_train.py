@@ -0,0 +1,63 @@
+import numpy as np
+import torch
+from anc.models.ancrn.augment import NoiseMixer, SegmentDataset, make_augmented_loader
+from anc.models.ancrn.model import ANCRN, load_model
+from anc.models.ancrn.train import Trainer
+
+SR = 16000
+
+
+def _loader(seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(SR) / SR
+    segments = [(0.5 * np.sin(2 * np.pi * rng.uniform(200, 2000) * t[:n])).astype(np.float32)
+                for n in rng.integers(SR // 4, SR // 2, size=10)]
+    return make_augmented_loader(SegmentDataset(segments), NoiseMixer("white", sr=SR, seed=seed, snr_range_db=(0, 5)),
+                                 batch_size=2, num_workers=0, pad_multiple=128)
+
+
+def _model():
+    torch.manual_seed(0)
+    return ANCRN(channels=(8, 16), hidden_size=32)
+
+
+def test_trainer_records_and_learns(tmp_path):
+    trainer = Trainer(_model(), _loader(), lr=3e-3, log_path=tmp_path / "log.jsonl")
+    history = trainer.train(epochs=4)
+    assert len(history) == 4 * len(trainer.loader) == trainer.global_step
+    for record in history:
+        assert record["samples"] == 2 and record["samples_per_s"] > 0
+        assert record["data_wait_s"] >= 0 and record["compute_s"] > 0
+        assert record["peak_memory_bytes"] > 0
+    assert len((tmp_path / "log.jsonl").read_text().splitlines()) == len(history)
+    first, last = np.mean([r["loss"] for r in history[:5]]), np.mean([r["loss"] for r in history[-5:]])
+    assert last < first
+
+
+def test_gradient_accumulation():
+    trainer = Trainer(_model(), _loader(), accumulation_steps=2, channels_last=False)
+    history = trainer.train(epochs=1)
+    # five batches: two full steps and the remainder of the epoch
+    assert trainer.global_step == len(history) == 3
+    assert [r["samples"] for r in history] == [4, 4, 2]
+
+
+def test_resume_mid_epoch(tmp_path):
+    checkpoint = tmp_path / "run" / "ancrn.pt"
+    interrupted = Trainer(_model(), _loader(), checkpoint_path=checkpoint, checkpoint_every=1)
+    interrupted.train(epochs=2, max_steps=3)
+    assert not list(checkpoint.parent.glob("*.part"))
+
+    resumed = Trainer(_model(), _loader(), checkpoint_path=checkpoint)
+    assert resumed.load_checkpoint()
+    assert (resumed.epoch, resumed.batch_in_epoch, resumed.global_step) == (0, 3, 3)
+    for a, b in zip(resumed.model.parameters(), interrupted.model.parameters()):
+        torch.testing.assert_close(a, b)
+    history = resumed.train(epochs=2)
+    # the rest of the first epoch, then a full one
+    assert len(history) == 2 + 5
+    assert (resumed.epoch, resumed.batch_in_epoch) == (2, 0)
+
+    model = load_model(checkpoint)
+    assert isinstance(model, ANCRN) and not model.training
+    assert not Trainer(_model(), _loader(), checkpoint_path=tmp_path / "missing.pt").load_checkpoint()
@@ -0,0 +1,164 @@
+import argparse
+from contextlib import asynccontextmanager
+from typing import Iterator, Optional
+
+import numpy as np
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from anc.models.ancrn.gates.torchgate import TorchGate
+from anc.service.batcher import MicroBatcher
+
+_PCM_DTYPES = {"int16": np.int16, "float32": np.float32}
+
+
+def decode_pcm(data: bytes, dtype: str) -> np.ndarray:
+    """Little-endian PCM bytes to float32 samples in [-1, 1]."""
+    samples = np.frombuffer(data, dtype=np.dtype(_PCM_DTYPES[dtype]).newbyteorder("<"))
+    if dtype == "int16":
+        return samples.astype(np.float32) / 32768.0
+    return samples.astype(np.float32)
+
+
+def encode_pcm(samples: np.ndarray, dtype: str) -> bytes:
+    """Float samples to little-endian PCM bytes, int16 is clipped to its range."""
+    if dtype == "int16":
+        samples = np.clip(samples * 32768.0, -32768, 32767).astype("<i2")
+    else:
+        samples = samples.astype("<f4")
+    return samples.tobytes()
+
+
+class FrameAssembler:
+    """Cut a byte stream of arbitrary chunk sizes into frames of ``block_size`` samples."""
+
+    def __init__(self, block_size: int, dtype: str):
+        self.frame_bytes = block_size * np.dtype(_PCM_DTYPES[dtype]).itemsize
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        self._buffer.extend(data)
+        while len(self._buffer) >= self.frame_bytes:
+            frame = bytes(self._buffer[:self.frame_bytes])
+            del self._buffer[:self.frame_bytes]
+            yield frame
+
+
+def create_app(
+    sr: int = 16000,
+    block_size: int = 512,
+    nonstationary: bool = True,
+    max_batch: int = 64,
+    max_delay_ms: float = 2.0,
+    context: Optional[int] = None,
+    lookahead: Optional[int] = None,
+    device: str = "cpu",
+    **gate_kwargs,
+) -> FastAPI:
+    """
+    Build the denoise service.
+
+    Endpoints:
+        ``WS /ws/denoise?dtype=int16`` -- binary messages of PCM in, denoised PCM frames out.
+        ``POST /denoise?dtype=int16`` -- chunked PCM request body, chunked denoised PCM response once
+                                         the upload is complete.
+        ``GET /metrics`` -- per-session p50/p99 latency and throughput, batching statistics.
+
+    Every connection is a session with its own gate state; frames of all sessions are gated
+    together by a `MicroBatcher`. Output lags input by the session lookahead and trailing
+    samples that do not fill a frame are dropped.
+
+    Arguments:
+        sr (int): Sample rate of every stream.
+        block_size (int): Samples per frame.
+        nonstationary (bool): Gate mode, see `TorchGate`.
+        max_batch (int): Upper bound of frames per gate call.
+        max_delay_ms (float): Batching deadline.
+        context (Optional[int]): History samples per session, see `StreamingGate`.
+        lookahead (Optional[int]): Delay samples per session, see `StreamingGate`.
+        device (str): Device of the gate.
+        **gate_kwargs: Forwarded to `TorchGate`.
+    """
+    gate = TorchGate(sr=sr, nonstationary=nonstationary, **gate_kwargs).to(device)
+    batcher = MicroBatcher(
+        gate, block_size, max_batch=max_batch, max_delay_ms=max_delay_ms,
+        context=context, lookahead=lookahead, device=device,
+    )
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await batcher.start()
+        yield
+        await batcher.stop()
+
+    app = FastAPI(title="ANC denoise service", lifespan=lifespan)
+    app.state.batcher = batcher
+
+    @app.websocket("/ws/denoise")
+    async def denoise_ws(websocket: WebSocket, dtype: str = "int16"):
+        await websocket.accept()
+        session = batcher.open_session()
+        assembler = FrameAssembler(block_size, dtype)
+        try:
+            while True:
+                data = await websocket.receive_bytes()
+                for frame in assembler.feed(data):
+                    out = await batcher.submit(session, decode_pcm(frame, dtype))
+                    await websocket.send_bytes(encode_pcm(out, dtype))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            batcher.close_session(session.id)
+
+    @app.post("/denoise")
+    async def denoise_http(request: Request, dtype: str = "int16"):
+        # frames are gated while the upload is still arriving, but the response only starts once the
+        # request body is consumed: Starlette's streaming response listens for the client disconnect
+        # on the same receive channel, so it cannot be full duplex. Use the WebSocket for that.
+        session = batcher.open_session()
+        assembler = FrameAssembler(block_size, dtype)
+        outputs = []
+        try:
+            async for data in request.stream():
+                for frame in assembler.feed(data):
+                    out = await batcher.submit(session, decode_pcm(frame, dtype))
+                    outputs.append(encode_pcm(out, dtype))
+        finally:
+            batcher.close_session(session.id)
+        return StreamingResponse(iter(outputs), media_type="application/octet-stream")
+
+    @app.get("/metrics")
+    async def metrics():
+        return batcher.metrics()
+
+    return app
+
+
+def main():
+    """Serve the denoise service with uvicorn."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Real-time denoise service.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--sr", type=int, default=16000)
+    parser.add_argument("--block_size", type=int, default=512)
+    parser.add_argument("--stationary", action="store_true", help="Use the stationary gate.")
+    parser.add_argument("--max_batch", type=int, default=64)
+    parser.add_argument("--max_delay_ms", type=float, default=2.0)
+    parser.add_argument("--device", type=str, default="cpu")
+    args = parser.parse_args()
+
+    app = create_app(
+        sr=args.sr,
+        block_size=args.block_size,
+        nonstationary=not args.stationary,
+        max_batch=args.max_batch,
+        max_delay_ms=args.max_delay_ms,
+        device=args.device,
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
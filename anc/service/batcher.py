@@ -0,0 +1,150 @@
+import asyncio
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+
+from anc.models.ancrn.gates.streaming import StreamingGate
+from anc.models.ancrn.gates.torchgate import TorchGate
+from anc.service.metrics import LatencyStats
+
+
+class Session:
+    """
+    One client stream: its gate state (the sliding window of a `StreamingGate`) and its metrics.
+    """
+
+    def __init__(self, session_id: str, stream: StreamingGate, sr: int):
+        self.id = session_id
+        self.stream = stream
+        self.stats = LatencyStats(sr)
+
+
+class MicroBatcher:
+    """
+    Gate the frames of many concurrent sessions with one batched `TorchGate` call.
+
+    ``submit`` shifts the frame into its session's window and queues the window. A single worker
+    task takes the first queued window, keeps collecting until ``max_batch`` windows are queued or
+    ``max_delay_ms`` has passed, gates them all at once in a worker thread (so the event loop keeps
+    accepting frames) and resolves every submitter with its denoised frame.
+
+    Arguments:
+        gate {TorchGate} -- Gate shared by all sessions.
+        block_size {int} -- Samples per frame.
+
+    Keyword Arguments:
+        max_batch {int} -- Upper bound of windows per gate call (default: {64}).
+        max_delay_ms {float} -- Longest time the first frame of a batch waits for company (default: {2.0}).
+        context {[int]} -- History samples per session, see `StreamingGate` (default: {None}).
+        lookahead {[int]} -- Delay samples per session, see `StreamingGate` (default: {None}).
+        device {str} -- Device the gate lives on (default: {"cpu"}).
+    """
+
+    def __init__(
+        self,
+        gate: TorchGate,
+        block_size: int,
+        max_batch: int = 64,
+        max_delay_ms: float = 2.0,
+        context: Optional[int] = None,
+        lookahead: Optional[int] = None,
+        device: str = "cpu",
+    ):
+        self.gate = gate
+        self.block_size = block_size
+        self.max_batch = max_batch
+        self.max_delay_s = max_delay_ms / 1e3
+        self._stream_args = dict(context=context, lookahead=lookahead, device=device)
+        self.sessions: Dict[str, Session] = {}
+        self._ids = itertools.count()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # a single thread: gate calls are serialized and torch parallelizes inside each call
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.batches = 0
+        self.batched_frames = 0
+
+    def open_session(self, session_id: Optional[str] = None) -> Session:
+        if session_id is None:
+            session_id = str(next(self._ids))
+        stream = StreamingGate(self.gate, self.block_size, **self._stream_args)
+        session = self.sessions[session_id] = Session(session_id, stream, self.gate.sr)
+        return session
+
+    def close_session(self, session_id: str) -> Optional[Session]:
+        return self.sessions.pop(session_id, None)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, session: Session, block: np.ndarray) -> np.ndarray:
+        """Denoise one frame of ``session``. Frames of a session must be submitted in order."""
+        if self._task is None:
+            await self.start()
+        # the window is copied now, the session may push its next frame before the batch runs
+        window = session.stream.push(block).copy()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((session, window, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_delay_s
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            windows = np.stack([window for _, window, _, _ in batch])
+            stream = batch[0][0].stream
+            try:
+                filtered = await loop.run_in_executor(self._executor, stream.gate_windows, windows)
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_frames += len(batch)
+            done = time.perf_counter()
+            for (session, _, future, submitted), out in zip(batch, filtered):
+                session.stats.record(done - submitted, self.block_size)
+                if not future.done():
+                    future.set_result(session.stream.pop(out).copy())
+
+    def metrics(self) -> dict:
+        return {
+            "sessions": {sid: session.stats.as_dict() for sid, session in self.sessions.items()},
+            "batches": self.batches,
+            "mean_batch_size": self.batched_frames / self.batches if self.batches else 0.0,
+            "latency_samples": self.gate.win_length if self._stream_args["lookahead"] is None
+            else self._stream_args["lookahead"],
+        }
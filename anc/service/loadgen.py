@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import json
+import time
+from typing import Optional
+
+import numpy as np
+
+from anc.models.ancrn.generate_noise import NoiseGenerator
+from anc.service.metrics import LatencyStats
+
+
+async def _paced(n_frames: int, frame_s: float, realtime: bool):
+    """Yield frame indices, sleeping to the audio clock when ``realtime`` is set."""
+    start = time.perf_counter()
+    for i in range(n_frames):
+        if realtime:
+            delay = start + i * frame_s - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield i
+
+
+async def _local_session(batcher, audio: np.ndarray, realtime: bool) -> LatencyStats:
+    session = batcher.open_session()
+    block_size = batcher.block_size
+    try:
+        async for i in _paced(len(audio) // block_size, block_size / batcher.gate.sr, realtime):
+            await batcher.submit(session, audio[i * block_size: (i + 1) * block_size])
+    finally:
+        batcher.close_session(session.id)
+    return session.stats
+
+
+async def _ws_session(url: str, audio: np.ndarray, sr: int, block_size: int, realtime: bool) -> LatencyStats:
+    import websockets
+
+    from anc.service.app import encode_pcm
+
+    stats = LatencyStats(sr)
+    async with websockets.connect(url) as ws:
+        async for i in _paced(len(audio) // block_size, block_size / sr, realtime):
+            sent = time.perf_counter()
+            await ws.send(encode_pcm(audio[i * block_size: (i + 1) * block_size], "int16"))
+            await ws.recv()
+            stats.record(time.perf_counter() - sent, block_size)
+    return stats
+
+
+async def run_load(
+    batcher=None,
+    url: Optional[str] = None,
+    n_sessions: int = 16,
+    seconds: float = 5.0,
+    sr: int = 16000,
+    block_size: int = 512,
+    realtime: bool = True,
+    seed: int = 0,
+) -> dict:
+    """
+    Drive ``n_sessions`` concurrent streams of synthetic cabin noise through the service.
+
+    Either in-process through a running ``MicroBatcher`` or over the network against the
+    WebSocket endpoint at ``url`` (needs the ``websockets`` package). With ``realtime`` every session
+    sends at the pace of the audio clock, otherwise as fast as the service answers.
+
+    Returns:
+        dict: per-session metrics plus the worst p99 latency and the aggregate throughput.
+    """
+    if batcher is not None:
+        sr, block_size = batcher.gate.sr, batcher.block_size
+    n_samples = int(seconds * sr)
+    gen = NoiseGenerator(sr, seed=seed)
+    audio = 0.1 * (gen.pink(n_sessions, n_samples) + gen.engine(n_sessions, n_samples, 1200, 2500))
+
+    start = time.perf_counter()
+    if batcher is not None:
+        await batcher.start()
+        tasks = [_local_session(batcher, audio[i], realtime) for i in range(n_sessions)]
+    else:
+        tasks = [_ws_session(url, audio[i], sr, block_size, realtime) for i in range(n_sessions)]
+    stats = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    sessions = [s.as_dict() for s in stats]
+    total_samples = sum(s.samples for s in stats)
+    report = {
+        "sessions": sessions,
+        "n_sessions": n_sessions,
+        "worst_p99_ms": max(s["p99_ms"] for s in sessions if s["p99_ms"] is not None),
+        "samples_per_s": total_samples / elapsed,
+        "realtime_streams": total_samples / sr / elapsed,
+    }
+    if batcher is not None:
+        report["mean_batch_size"] = batcher.metrics()["mean_batch_size"]
+    return report
+
+
+def main():
+    """CLI for load testing the denoise service, in-process or against a running server."""
+    parser = argparse.ArgumentParser(description="Load generator for the denoise service.")
+    parser.add_argument("--url", type=str, default=None,
+                        help="WebSocket URL, e.g. ws://127.0.0.1:8000/ws/denoise. In-process if omitted.")
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--sr", type=int, default=16000)
+    parser.add_argument("--block_size", type=int, default=512)
+    parser.add_argument("--max_batch", type=int, default=64)
+    parser.add_argument("--max_delay_ms", type=float, default=2.0)
+    parser.add_argument("--flood", action="store_true", help="Send as fast as possible instead of real time.")
+    args = parser.parse_args()
+
+    batcher = None
+    if args.url is None:
+        from anc.models.ancrn.gates.torchgate import TorchGate
+        from anc.service.batcher import MicroBatcher
+
+        batcher = MicroBatcher(
+            TorchGate(sr=args.sr, nonstationary=True), args.block_size,
+            max_batch=args.max_batch, max_delay_ms=args.max_delay_ms,
+        )
+    report = asyncio.run(run_load(
+        batcher=batcher, url=args.url, n_sessions=args.sessions, seconds=args.seconds,
+        sr=args.sr, block_size=args.block_size, realtime=not args.flood,
+    ))
+    report.pop("sessions")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class LatencyStats:
+    """
+    Latency and throughput of one stream.
+
+    Keeps the last ``window`` latencies for the percentiles and running totals for throughput.
+
+    Arguments:
+        sr {int} -- Sample rate, used to express throughput as a real-time factor.
+
+    Keyword Arguments:
+        window {int} -- Number of recent latencies the percentiles are computed over (default: {10000}).
+    """
+
+    def __init__(self, sr: int, window: int = 10000):
+        self.sr = sr
+        self._latencies = deque(maxlen=window)
+        self.frames = 0
+        self.samples = 0
+        self.started = time.perf_counter()
+
+    def record(self, latency_s: float, n_samples: int) -> None:
+        self._latencies.append(latency_s)
+        self.frames += 1
+        self.samples += n_samples
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        return float(np.percentile(np.fromiter(self._latencies, dtype=np.float64), q))
+
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        elapsed = time.perf_counter() - self.started
+        audio_s = self.samples / self.sr
+        return {
+            "frames": self.frames,
+            "audio_s": audio_s,
+            "p50_ms": _ms(self.percentile(50)),
+            "p99_ms": _ms(self.percentile(99)),
+            "max_ms": _ms(max(self._latencies) if self._latencies else None),
+            "samples_per_s": self.samples / elapsed if elapsed > 0 else 0.0,
+            "realtime_factor": audio_s / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else seconds * 1e3
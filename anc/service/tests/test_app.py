@@ -0,0 +1,43 @@
+import asyncio
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from anc.models.ancrn.gates.torchgate import TorchGate
+from anc.service.app import create_app, decode_pcm, encode_pcm
+from anc.service.batcher import MicroBatcher
+from anc.service.loadgen import run_load
+
+
+def test_pcm_round_trip():
+    x = np.linspace(-1, 1, 101, dtype=np.float32)
+    np.testing.assert_allclose(decode_pcm(encode_pcm(x, "int16"), "int16"), x, atol=1 / 32768)
+    np.testing.assert_array_equal(decode_pcm(encode_pcm(x, "float32"), "float32"), x)
+
+
+def test_websocket_and_http_sessions():
+    app = create_app(sr=16000, block_size=256, n_fft=512)
+    frames = (np.random.default_rng(0).standard_normal(256 * 8) * 3000).astype("<i2")
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/denoise") as ws:
+            # frames may arrive split at arbitrary byte offsets
+            payload = frames.tobytes()
+            ws.send_bytes(payload[:1001])
+            ws.send_bytes(payload[1001:])
+            replies = [ws.receive_bytes() for _ in range(8)]
+            assert all(len(reply) == 512 for reply in replies)
+            metrics = client.get("/metrics").json()
+            assert len(metrics["sessions"]) == 1
+            assert metrics["batches"] >= 1
+
+        response = client.post("/denoise", content=frames.tobytes())
+        assert len(response.content) == frames.nbytes
+        assert client.get("/metrics").json()["sessions"] == {}
+
+
+def test_micro_batcher_combines_sessions():
+    batcher = MicroBatcher(TorchGate(sr=16000, nonstationary=True, n_fft=512), 256, max_delay_ms=20)
+    report = asyncio.run(run_load(batcher, n_sessions=4, seconds=0.5, realtime=False))
+    assert report["n_sessions"] == 4
+    assert report["mean_batch_size"] > 1
+    assert report["worst_p99_ms"] > 0
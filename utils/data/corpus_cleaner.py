@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+import torch
+from tqdm import tqdm
+
+from anc.models.ancrn.evaluate import make_gate
+
+# per-process state: one warm gate per sample rate, the read buffer and the hashes already cleaned
+_WORKER: Dict[str, object] = {}
+
+
+def content_hash(data: bytes) -> str:
+    """BLAKE2b digest of a file's bytes, the key a cleaned file is recorded under in the manifest."""
+    return hashlib.blake2b(data, digest_size = 16).hexdigest()
+
+
+def load_manifest(manifest_path: Union[str, Path]) -> Dict[str, dict]:
+    """
+    Read the rows of a manifest, keyed by content hash.
+    :param manifest_path: JSON lines manifest written by `CorpusCleaner`.
+    :return: dict: the last successful row of every content hash; a missing file gives an empty dict.
+    """
+    rows = {}
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return rows
+    with manifest_path.open("r") as file:
+        for line in file:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut short by an interruption
+                continue
+            if not row.get("error"):
+                rows[row["hash"]] = row
+    return rows
+
+
+def _init_worker(gate_kwargs: dict, device: str, done: frozenset) -> None:
+    # one torch thread per process, the pool provides the parallelism
+    torch.set_num_threads(1)
+    _WORKER["gates"] = {}
+    _WORKER["gate_kwargs"] = gate_kwargs
+    _WORKER["device"] = device
+    _WORKER["done"] = done
+    _WORKER["buffer"] = np.empty(0, dtype = np.float32)
+
+
+def _gate(sr: int):
+    gates = _WORKER["gates"]
+    if sr not in gates:
+        gates[sr] = make_gate(sr, **_WORKER["gate_kwargs"]).to(_WORKER["device"])
+    return gates[sr]
+
+
+def _read(data: bytes) -> Tuple[np.ndarray, object]:
+    """Decode into the worker's buffer, grown only when a longer file comes along."""
+    info = sf.info(io.BytesIO(data))
+    size = info.frames * info.channels
+    if _WORKER["buffer"].size < size:
+        _WORKER["buffer"] = np.empty(size, dtype = np.float32)
+    audio = _WORKER["buffer"][:size].reshape(info.frames, info.channels)
+    sf.read(io.BytesIO(data), dtype = "float32", always_2d = True, out = audio)
+    return audio, info
+
+
+@torch.no_grad()
+def _clean_file(task: Tuple[str, str, str]) -> dict:
+    path, rel_path, out_path = task
+    row = {"path": rel_path}
+    try:
+        start = time.perf_counter()
+        data = Path(path).read_bytes()
+        row["hash"] = content_hash(data)
+        if row["hash"] in _WORKER["done"] and Path(out_path).exists():
+            row["skipped"] = True
+            return row
+        audio, info = _read(data)
+        read_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        x = torch.from_numpy(np.ascontiguousarray(audio.T)).to(_WORKER["device"])
+        cleaned = _gate(info.samplerate)(x).cpu().numpy()
+        # the ISTFT drops the samples past the last full hop, pad them back with silence
+        cleaned = np.pad(cleaned, ((0, 0), (0, info.frames - cleaned.shape[-1])))
+        gate_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        Path(out_path).parent.mkdir(parents = True, exist_ok = True)
+        # written next to the target and renamed, so an interruption never leaves a partial output
+        part_path = f"{out_path}.part"
+        sf.write(part_path, cleaned.T, info.samplerate, subtype = info.subtype, format = info.format)
+        os.replace(part_path, out_path)
+        write_s = time.perf_counter() - start
+
+        row.update({
+            "out": str(Path(out_path)),
+            "sr": info.samplerate,
+            "channels": info.channels,
+            "seconds": info.frames / info.samplerate,
+            "read_s": read_s,
+            "gate_s": gate_s,
+            "write_s": write_s,
+        })
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+class CorpusCleaner:
+    """
+    Class CorpusCleaner for running the spectral gate over a directory of audio files.
+
+    Files are spread over a pool of worker processes, each holding a warm gate per sample rate
+    and a reusable decode buffer. Every cleaned file is written to ``save_to`` under its relative
+    path and appended to a JSON lines manifest with its content hash and per-stage timings. On a
+    restart, files whose content hash is already in the manifest (and whose output exists) are
+    skipped, so an interrupted job continues where it stopped.
+
+    Attributes:
+        source_dir (Path): Directory to scan.
+        save_to (Path): Directory the cleaned files and the manifest are written to.
+        pattern (str): Glob of the files to clean (default: "**/*.wav").
+        n_workers (int): Worker processes, 0 cleans in the calling process (default: all cores).
+        shard (tuple): ``(i, n)`` cleans only every n-th file starting at i, to split a corpus over
+            machines (default: None).
+        device (str): Device of the gates (default: "cpu").
+        manifest_name (str): File name of the manifest in ``save_to`` (default: "manifest.jsonl").
+        gate_kwargs (dict): Gate configuration in `reduce_noise` terms, see `make_gate`.
+
+    Methods:
+        files: Lists the (path, relative path, output path) of the files to clean.
+        process: Cleans the files not cleaned yet and returns a summary.
+    """
+    def __init__(self, source_dir: Union[str, Path], save_to: Union[str, Path], pattern: str = "**/*.wav",
+                 n_workers: Optional[int] = None, shard: Optional[Tuple[int, int]] = None, device: str = "cpu",
+                 manifest_name: str = "manifest.jsonl", use_tqdm: bool = True, **gate_kwargs) -> None:
+        self.source_dir = Path(source_dir)
+        self.save_to = Path(save_to)
+        self.pattern = pattern
+        self.n_workers = os.cpu_count() if n_workers is None else n_workers
+        self.shard = shard
+        self.device = device
+        self.manifest_path = self.save_to / manifest_name
+        self.use_tqdm = use_tqdm
+        self.gate_kwargs = gate_kwargs
+
+    def files(self) -> List[Tuple[str, str, str]]:
+        """
+        Scan the source directory.
+        :return: List of (path, path relative to the source, output path), sorted, for this shard.
+        """
+        paths = sorted(p for p in self.source_dir.glob(self.pattern) if p.is_file())
+        paths = [p for p in paths if self.save_to.resolve() not in p.resolve().parents]
+        tasks = [(str(p), str(p.relative_to(self.source_dir)), str(self.save_to / p.relative_to(self.source_dir)))
+                 for p in paths]
+        if self.shard is not None:
+            tasks = tasks[self.shard[0]::self.shard[1]]
+        return tasks
+
+    def _iter_rows(self, tasks: List[Tuple[str, str, str]], done: frozenset) -> Iterable[dict]:
+        if self.n_workers == 0:
+            previous = dict(_WORKER)
+            threads = torch.get_num_threads()
+            _init_worker(self.gate_kwargs, self.device, done)
+            torch.set_num_threads(threads)
+            try:
+                for task in tasks:
+                    yield _clean_file(task)
+            finally:
+                _WORKER.clear()
+                _WORKER.update(previous)
+            return
+        with ProcessPoolExecutor(self.n_workers, initializer = _init_worker,
+                                 initargs = (self.gate_kwargs, self.device, done)) as pool:
+            futures = [pool.submit(_clean_file, task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def process(self) -> dict:
+        """
+        Clean every file not in the manifest yet, appending a manifest row as each one finishes.
+        :return: dict: counts of cleaned, skipped and failed files, the seconds of audio cleaned and
+            the wall time.
+        """
+        self.save_to.mkdir(parents = True, exist_ok = True)
+        tasks = self.files()
+        done = frozenset(load_manifest(self.manifest_path))
+        summary = {"cleaned": 0, "skipped": 0, "failed": 0, "audio_s": 0.0}
+        start = time.perf_counter()
+        with self.manifest_path.open("a") as manifest:
+            rows = self._iter_rows(tasks, done)
+            for row in tqdm(rows, total = len(tasks), desc = "Cleaning corpus", disable = not self.use_tqdm):
+                if row.get("skipped"):
+                    summary["skipped"] += 1
+                    continue
+                manifest.write(json.dumps(row) + "\n")
+                manifest.flush()
+                if row.get("error"):
+                    summary["failed"] += 1
+                else:
+                    summary["cleaned"] += 1
+                    summary["audio_s"] += row["seconds"]
+        summary["wall_s"] = time.perf_counter() - start
+        return summary
+
+
+def main():
+    """CLI for cleaning a directory of audio files with the spectral gate."""
+    parser = argparse.ArgumentParser(prog = 'anc-clean', description = 'Run spectral gating over an audio corpus.')
+    parser.add_argument('source_dir', type = str, help = 'Directory with the audio files, e.g. ./dataset/batches/.')
+    parser.add_argument('--save_to', type = str, required = True,
+                        help = 'Directory for the cleaned files and the manifest.')
+    parser.add_argument('--pattern', type = str, default = '**/*.wav', help = 'Glob of the files to clean.')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'Worker processes.')
+    parser.add_argument('--shard', type = str, default = None, help = 'i/n, clean every n-th file starting at i.')
+    parser.add_argument('--device', type = str, default = 'cpu')
+    parser.add_argument('--stationary', action = 'store_true', help = 'Use the stationary gate.')
+    parser.add_argument('--prop_decrease', type = float, default = 1.0)
+    parser.add_argument('--time_constant_s', type = float, default = 2.0)
+    parser.add_argument('--n_fft', type = int, default = 1024)
+
+    args = parser.parse_args()
+
+    cleaner = CorpusCleaner(
+        source_dir = args.source_dir,
+        save_to = args.save_to,
+        pattern = args.pattern,
+        n_workers = args.workers,
+        shard = tuple(int(v) for v in args.shard.split('/')) if args.shard else None,
+        device = args.device,
+        stationary = args.stationary,
+        prop_decrease = args.prop_decrease,
+        time_constant_s = args.time_constant_s,
+        n_fft = args.n_fft,
+    )
+    print(json.dumps(cleaner.process(), indent = 2))
+
+
+if __name__ == "__main__":
+    main()